@@ -4,7 +4,7 @@ Clan.com API Microservice
 Provides access to clan.com product and category data
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, url_for
 from clan_client import ClanAPIClient
 from transformers import flatten_category_tree, transform_product_for_ui
 import logging
@@ -118,111 +118,142 @@ def get_products():
         logger.error(f"Exception fetching products: {str(e)}")
         return jsonify([]), 500
 
+enrichment_runner = None
+
+def get_enrichment_runner():
+    """Shared background enrichment runner (created on first use)"""
+    global enrichment_runner
+    if enrichment_runner is None:
+        from enrichment import EnrichmentRunner
+        enrichment_runner = EnrichmentRunner()
+    return enrichment_runner
+
+def start_enrichment_job(kind, work):
+    """Start ``work(job)`` in the background and answer 202 with the job id, or 409 if one is running"""
+    try:
+        job = get_enrichment_runner().start(kind, work)
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': url_for('get_enrichment_job', job_id=job.id),
+        'job': job.to_dict()
+    }), 202
+
 @app.route('/api/products/incremental-download', methods=['POST'])
 def incremental_product_download():
-    """Download all products incrementally, saving to database as we go"""
+    """Download all products and enrich them concurrently, writing to the cache in batches.
+    
+    Runs in the background: returns 202 with a job id; poll
+    /api/products/enrichment/jobs/<job_id> for progress.
+    """
     try:
         from clan_client import ClanAPIClient
-        import time
+        from enrichment import ProductEnricher
         
+        options = request.get_json(silent=True) or {}
         client = ClanAPIClient()
-        
-        # Get basic product list first
-        all_basic_products = []
-        offset = 0
-        batch_size = 100
-        
-        logger.info("Starting incremental product download...")
-        
-        # Get ALL basic products first
-        while True:
-            params = {'limit': batch_size, 'offset': offset}
-            basic_result = client.make_api_request('/getProducts', params)
+        enricher = ProductEnricher(
+            client,
+            concurrency=options.get('concurrency'),
+            rate=options.get('rate'),
+            batch_size=options.get('batch_size', 50)
+        )
+        
+        def work(job):
+            # Resume the last interrupted run without re-listing the catalogue
+            if options.get('resume'):
+                checkpoint = enricher.writer.load_checkpoint()
+                if checkpoint and checkpoint.get('remaining'):
+                    return enricher.run([], resume=True, on_progress=job.progress)
             
-            if not basic_result.get('success', True):
-                break
+            # Get basic product list first
+            all_basic_products = []
+            offset = 0
+            batch_size = 100
             
-            batch_products = basic_result.get('data', [])
-            if not batch_products:
-                break
+            logger.info("Starting incremental product download...")
             
-            all_basic_products.extend(batch_products)
-            offset += batch_size
+            # Get ALL basic products first
+            while True:
+                params = {'limit': batch_size, 'offset': offset}
+                basic_result = client.make_api_request('/getProducts', params)
+                
+                if not basic_result.get('success', True):
+                    break
+                
+                batch_products = basic_result.get('data', [])
+                if not batch_products:
+                    break
+                
+                all_basic_products.extend(batch_products)
+                offset += batch_size
+                
+                logger.info(f"Fetched {len(all_basic_products)} basic products so far...")
+                
+                # Last page
+                if len(batch_products) < batch_size:
+                    break
             
-            logger.info(f"Fetched {len(all_basic_products)} basic products so far...")
+            logger.info(f"Total basic products to process: {len(all_basic_products)}")
             
-            # Small delay between batches
-            time.sleep(0.1)
+            skus = [p[1] for p in all_basic_products if isinstance(p, list) and len(p) > 1]
+            stats = enricher.run(skus, on_progress=job.progress)
+            stats['total_listed'] = len(all_basic_products)
+            return stats
         
-        logger.info(f"Total basic products to process: {len(all_basic_products)}")
+        return start_enrichment_job('incremental-download', work)
         
-        # Now process each product individually and save immediately
-        successful_products = 0
-        failed_products = 0
-        
-        for i, product in enumerate(all_basic_products):
-            try:
-                if isinstance(product, list) and len(product) > 1:
-                    sku = product[1]
-                    detailed_result = client.get_product_data(sku, all_images=True)
-                    
-                    if detailed_result.get('success', True):
-                        product_data = detailed_result.get('data')
-                        if product_data:
-                            # Transform the product for storage
-                            from transformers import transform_product_for_ui
-                            transformed_product = transform_product_for_ui(product_data)
-                            
-                            # Save to database immediately
-                            # We'll need to call the blog-launchpad's clan_cache to save
-                            import requests
-                            save_response = requests.post(
-                                'http://localhost:5001/api/clan/cache/save-product',
-                                json=transformed_product,
-                                timeout=10
-                            )
-                            
-                            if save_response.status_code == 200:
-                                successful_products += 1
-                                if successful_products % 10 == 0:
-                                    logger.info(f"Saved {successful_products} products to database...")
-                            else:
-                                failed_products += 1
-                                logger.error(f"Failed to save product {sku}: {save_response.status_code}")
-                        else:
-                            failed_products += 1
-                    else:
-                        failed_products += 1
-                        logger.warning(f"Failed to get detailed data for product {sku}")
-                else:
-                    failed_products += 1
-                
-                # Delay to avoid rate limiting
-                time.sleep(0.5)
-                
-            except Exception as e:
-                failed_products += 1
-                logger.error(f"Error processing product {i}: {str(e)}")
-                continue
+    except Exception as e:
+        logger.error(f"Error in incremental download: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/products/enrichment/jobs/<job_id>')
+def get_enrichment_job(job_id):
+    """Progress of a background enrichment job"""
+    job = get_enrichment_runner().get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown enrichment job: {job_id}'
+        }), 404
+    
+    return jsonify({'success': True, **job.to_dict()})
+
+@app.route('/api/products/enrichment/status')
+def enrichment_status():
+    """Get the checkpoint of the current or last enrichment run"""
+    try:
+        from enrichment import CacheWriter
         
-        logger.info(f"Incremental download complete: {successful_products} successful, {failed_products} failed")
+        checkpoint = CacheWriter().load_checkpoint()
+        if not checkpoint:
+            return jsonify({'success': True, 'checkpoint': None})
         
         return jsonify({
             'success': True,
-            'message': f'Incremental download complete: {successful_products} products saved, {failed_products} failed',
-            'stats': {
-                'total_processed': len(all_basic_products),
-                'successful': successful_products,
-                'failed': failed_products
+            'checkpoint': {
+                'run_id': checkpoint.get('run_id'),
+                'status': checkpoint.get('status'),
+                'started_at': checkpoint.get('started_at'),
+                'total': checkpoint.get('total'),
+                'written': checkpoint.get('written'),
+                'remaining': len(checkpoint.get('remaining', [])),
+                'failed': checkpoint.get('failed', [])
             }
         })
         
     except Exception as e:
-        logger.error(f"Error in incremental download: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        logger.error(f"Error reading enrichment status: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/products/download-all-basic', methods=['POST'])
 def download_all_basic_products():
@@ -314,10 +345,13 @@ def download_all_basic_products():
 
 @app.route('/api/products/populate-details', methods=['POST'])
 def populate_product_details():
-    """Populate detailed data for all products that don't have has_detailed_data=True"""
+    """Populate detailed data for all products that don't have has_detailed_data=True.
+    
+    The enrichment runs in the background: returns 202 with a job id; poll
+    /api/products/enrichment/jobs/<job_id> for progress.
+    """
     try:
         from clan_client import ClanAPIClient
-        import time
         import requests
         
         client = ClanAPIClient()
@@ -358,93 +392,27 @@ def populate_product_details():
                 }
             })
         
-        # Process products in batches
-        batch_size = 10
-        successful_updates = 0
-        failed_updates = 0
-        total_processed = 0
+        # Enrich concurrently in the background, writing straight to the cache in batches
+        from enrichment import ProductEnricher
         
-        for i in range(0, len(products_needing_details), batch_size):
-            batch = products_needing_details[i:i + batch_size]
-            batch_start = i + 1
-            batch_end = min(i + batch_size, len(products_needing_details))
-            
-            logger.info(f"Processing batch {batch_start}-{batch_end} of {len(products_needing_details)} products...")
-            
-            for product in batch:
-                try:
-                    sku = product.get('sku')
-                    if not sku:
-                        logger.warning(f"Product {product.get('id')} has no SKU, skipping")
-                        failed_updates += 1
-                        continue
-                    
-                    # Get detailed product data from external API
-                    detailed_result = client.get_product_data(sku, all_images=False)
-                    
-                    if not detailed_result.get('success', True):
-                        logger.warning(f"Failed to get detailed data for SKU {sku}")
-                        failed_updates += 1
-                        continue
-                    
-                    detailed_data = detailed_result.get('data', {})
-                    
-                    # Prepare updated product data with ALL available fields
-                    updated_product = {
-                        'id': product.get('id'),
-                        'name': detailed_data.get('title', product.get('name', '')),
-                        'sku': sku,
-                        'url': detailed_data.get('product_url', product.get('url', '')),
-                        'image_url': detailed_data.get('image', ''),
-                        'price': str(detailed_data.get('price', '')) if detailed_data.get('price') else '',
-                        'description': detailed_data.get('description', product.get('description', '')),
-                        'has_detailed_data': True
-                    }
-                    
-                    # Send updated product to blog-launchpad
-                    save_response = requests.post(
-                        'http://localhost:5001/api/clan/cache/save-product',
-                        json=updated_product,
-                        timeout=10
-                    )
-                    
-                    if save_response.status_code == 200:
-                        successful_updates += 1
-                        if successful_updates % 50 == 0:
-                            logger.info(f"Successfully updated {successful_updates} products...")
-                    else:
-                        failed_updates += 1
-                        logger.error(f"Failed to save updated product {sku}: {save_response.status_code}")
-                    
-                    total_processed += 1
-                    
-                    # Rate limiting - delay between individual products
-                    time.sleep(0.5)
-                    
-                except Exception as e:
-                    failed_updates += 1
-                    logger.error(f"Error processing product {product.get('sku', 'unknown')}: {str(e)}")
-                    continue
+        enricher = ProductEnricher(client)
+        
+        def work(job):
+            stats = enricher.run([p.get('sku') for p in products_needing_details], on_progress=job.progress)
+            successful_updates = stats['successful']
+            failed_updates = stats['failed'] + sum(1 for p in products_needing_details if not p.get('sku'))
             
-            # Progress report after each batch
-            logger.info(f"Batch {batch_start}-{batch_end} complete. Progress: {total_processed}/{len(products_needing_details)} products processed")
+            logger.info(f"Detailed data population complete: {successful_updates} successful, {failed_updates} failed")
             
-            # Rate limiting - delay between batches
-            time.sleep(1)
-        
-        logger.info(f"Detailed data population complete: {successful_updates} successful, {failed_updates} failed")
-        
-        return jsonify({
-            'success': True,
-            'message': f'Detailed data population complete. {successful_updates} products updated successfully.',
-            'stats': {
+            return {
                 'total_products': len(all_products),
                 'products_needing_details': len(products_needing_details),
-                'products_processed': total_processed,
+                'products_processed': stats['total_processed'],
                 'products_updated': successful_updates,
                 'products_failed': failed_updates
             }
-        })
+        
+        return start_enrichment_job('populate-details', work)
         
     except Exception as e:
         logger.error(f"Error in detailed data population: {str(e)}")
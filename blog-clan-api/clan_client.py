@@ -4,6 +4,7 @@ Clan.com API Client
 Python implementation of the PHP API client for clan.com
 """
 
+import os
 import requests
 import json
 from typing import Optional, Dict, List
@@ -12,9 +13,10 @@ import logging
 logger = logging.getLogger(__name__)
 
 class ClanAPIClient:
-    def __init__(self):
-        self.base_url = 'https://clan.com/clan/api'
-        self.fallback_url = 'https://bast-clan.hotcheck.co.uk/clan/api'
+    def __init__(self, base_url: Optional[str] = None, fallback_url: Optional[str] = None):
+        # CLAN_COM_API_URL lets the service run against a local fake (see fake_clan_server.py)
+        self.base_url = base_url or os.environ.get('CLAN_COM_API_URL', 'https://clan.com/clan/api')
+        self.fallback_url = fallback_url or os.environ.get('CLAN_COM_FALLBACK_URL', 'https://bast-clan.hotcheck.co.uk/clan/api')
         self.session = requests.Session()
         self.session.headers.update({
             'Content-Type': 'application/json'
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Concurrent product enrichment for the clan.com cache
+Fetches getProductData for many SKUs with bounded concurrency, a token-bucket
+rate limit and retry with backoff, and writes the results straight into
+clan_products in batches. Progress is checkpointed in clan_cache_metadata so
+an interrupted run can be resumed. Runs started from the API go through
+EnrichmentRunner, which runs them in a background thread; callers poll
+progress by job id.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+import psycopg
+from requests.adapters import HTTPAdapter
+
+# The shared rate limiter lives in the project root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = 'product_enrichment_checkpoint'
+
+# Messages produced by ClanAPIClient.make_api_request for transport failures
+# (timeouts, 429/5xx, bad JSON); anything else is a real answer from clan.com
+TRANSIENT_ERROR_PREFIXES = ('API error', 'JSON decoding error', 'Unexpected error')
+
+# Finished jobs kept in memory for the progress endpoint
+MAX_FINISHED_JOBS = 20
+
+
+class CacheWriter:
+    """Writes enriched products and checkpoints directly to the PostgreSQL cache"""
+
+    def __init__(self):
+        self.db_config = {
+            'host': 'localhost',
+            'dbname': 'blog',
+            'user': 'autojenny',
+            'password': ''
+        }
+
+    def get_db_conn(self):
+        """Get database connection"""
+        return psycopg.connect(**self.db_config)
+
+    def write_batch(self, products: List[Dict], checkpoint: Optional[Dict] = None) -> int:
+        """Upsert a batch of enriched products by SKU in one statement.
+
+        The checkpoint (if given) has its 'written' count advanced by this
+        batch and is saved in the same transaction, so it never claims
+        progress that was not written, nor misses progress that was. content_hash is recomputed from
+        the written row by the clan_products_content_hash trigger (migration
+        004), so the next catalogue sync compares
+        against the enriched values.
+        """
+        with self.get_db_conn() as conn:
+            cursor = conn.cursor()
+            written = 0
+            if products:
+                cursor.execute('''
+                    WITH src AS (
+                        SELECT * FROM jsonb_to_recordset(%s::jsonb) AS s(
+                            id INTEGER, sku TEXT, name TEXT, url TEXT,
+                            image_url TEXT, price TEXT, description TEXT
+                        )
+                    ),
+                    updated AS (
+                        UPDATE clan_products p SET
+                            name = COALESCE(NULLIF(s.name, ''), p.name),
+                            url = COALESCE(NULLIF(s.url, ''), p.url),
+                            image_url = COALESCE(NULLIF(s.image_url, ''), p.image_url),
+                            price = COALESCE(NULLIF(s.price, ''), p.price),
+                            description = COALESCE(NULLIF(s.description, ''), p.description),
+                            has_detailed_data = TRUE,
+                            last_updated = CURRENT_TIMESTAMP
+                        FROM src s
+                        WHERE p.sku = s.sku
+                        RETURNING p.sku
+                    ),
+                    inserted AS (
+                        INSERT INTO clan_products (id, name, sku, url, image_url, price, description, has_detailed_data)
+                        SELECT id, name, sku, url, image_url, price, description, TRUE
+                        FROM src s
+                        WHERE s.id IS NOT NULL
+                        AND NOT EXISTS (SELECT 1 FROM clan_products p WHERE p.sku = s.sku)
+                        ON CONFLICT (id) DO NOTHING
+                        RETURNING sku
+                    )
+                    SELECT (SELECT COUNT(*) FROM updated) + (SELECT COUNT(*) FROM inserted)
+                ''', (json.dumps(products),))
+                written = cursor.fetchone()[0]
+            if checkpoint is not None:
+                checkpoint['written'] = checkpoint.get('written', 0) + written
+                self._save_checkpoint(cursor, checkpoint)
+            conn.commit()
+            return written
+
+    def load_checkpoint(self, key: str = CHECKPOINT_KEY) -> Optional[Dict]:
+        """Load the last saved enrichment checkpoint"""
+        with self.get_db_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT value FROM clan_cache_metadata WHERE key = %s', (key,))
+            row = cursor.fetchone()
+            return json.loads(row[0]) if row and row[0] else None
+
+    def save_checkpoint(self, checkpoint: Dict):
+        """Save an enrichment checkpoint"""
+        with self.get_db_conn() as conn:
+            self._save_checkpoint(conn.cursor(), checkpoint)
+            conn.commit()
+
+    def _save_checkpoint(self, cursor, checkpoint: Dict):
+        cursor.execute('''
+            INSERT INTO clan_cache_metadata (key, value, last_updated)
+            VALUES (%s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (key) DO UPDATE SET
+                value = EXCLUDED.value,
+                last_updated = EXCLUDED.last_updated
+        ''', (checkpoint.get('key', CHECKPOINT_KEY), json.dumps(checkpoint)))
+
+
+class ProductEnricher:
+    """Bounded-concurrency getProductData fetcher with batched cache writes"""
+
+    def __init__(self, client, writer: Optional[CacheWriter] = None,
+                 concurrency: Optional[int] = None, rate: Optional[float] = None,
+                 max_retries: int = 3, backoff: float = 0.5, batch_size: int = 50,
+                 checkpoint_key: str = CHECKPOINT_KEY):
+        self.client = client
+        self.writer = writer or CacheWriter()
+        self.concurrency = concurrency or int(os.environ.get('CLAN_ENRICH_CONCURRENCY', 8))
+        self.rate = rate or float(os.environ.get('CLAN_ENRICH_RATE', 5))  # requests per second
+        self.bucket = TokenBucket(self.rate, capacity=self.concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.checkpoint_key = checkpoint_key
+
+        # Let every worker keep its own keep-alive connection
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.concurrency)
+        self.client.session.mount('https://', adapter)
+        self.client.session.mount('http://', adapter)
+
+    def fetch_one(self, sku: str) -> Optional[Dict]:
+        """Fetch and normalise one product, retrying transient failures"""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            result = self.client.get_product_data(sku, all_images=True)
+            data = result.get('data') if result.get('success', True) else None
+            if data:
+                return self.to_cache_row(sku, data)
+
+            message = str(result.get('message', ''))
+            if not message.startswith(TRANSIENT_ERROR_PREFIXES) or attempt == self.max_retries:
+                logger.warning(f"No detailed data for SKU {sku}: {message or 'empty response'}")
+                return None
+
+            # Exponential backoff with jitter
+            delay = self.backoff * (2 ** attempt) * (1 + random.random())
+            logger.info(f"Retrying SKU {sku} in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+        return None
+
+    @staticmethod
+    def to_cache_row(sku: str, data: Dict) -> Dict:
+        """Map a getProductData payload onto clan_products columns"""
+        image_url = data.get('image', '')
+        if not image_url and data.get('images'):
+            image_url = data['images'][0].get('url', '')
+        return {
+            'id': int(data['product_id']) if data.get('product_id') else None,
+            'sku': sku,
+            'name': data.get('title', ''),
+            'url': data.get('product_url', ''),
+            'image_url': image_url,
+            'price': str(data.get('price', '')) if data.get('price') else '',
+            'description': data.get('description', '')
+        }
+
+    def run(self, skus: Iterable[str], resume: bool = False,
+            on_progress: Optional[Callable[[int, int, int], None]] = None) -> Dict:
+        """Enrich ``skus``; with ``resume`` continue the last checkpointed run instead
+
+        ``on_progress(processed, total, written)`` is called after each batch write.
+        """
+        skus = list(dict.fromkeys(s for s in skus if s))
+        checkpoint = self.writer.load_checkpoint(self.checkpoint_key) if resume else None
+
+        if checkpoint and checkpoint.get('remaining'):
+            skus = checkpoint['remaining']
+            logger.info(f"Resuming enrichment run {checkpoint['run_id']}: {len(skus)} SKUs remaining")
+        else:
+            checkpoint = {
+                'key': self.checkpoint_key,
+                'run_id': uuid.uuid4().hex[:12],
+                'started_at': datetime.now().isoformat(),
+                'total': len(skus),
+                'written': 0
+            }
+        checkpoint.update({'status': 'running', 'failed': [], 'remaining': list(skus)})
+        self.writer.save_checkpoint(checkpoint)
+
+        remaining = set(skus)
+        failed = []
+        batch = []
+        written = 0
+        processed = 0
+        started = time.monotonic()
+
+        def flush():
+            nonlocal written
+            checkpoint['remaining'] = [s for s in skus if s in remaining]
+            checkpoint['failed'] = failed
+            written += self.writer.write_batch(batch, checkpoint)
+            batch.clear()
+            if on_progress:
+                on_progress(processed, len(skus), written)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='clan-enrich') as pool:
+            futures = {pool.submit(self.fetch_one, sku): sku for sku in skus}
+            for processed, future in enumerate(as_completed(futures), 1):
+                sku = futures[future]
+                try:
+                    product = future.result()
+                except Exception as e:
+                    logger.error(f"Error enriching SKU {sku}: {str(e)}")
+                    product = None
+
+                if product:
+                    batch.append(product)
+                    remaining.discard(sku)
+                else:
+                    # Failed SKUs stay in 'remaining' so a resume retries them
+                    failed.append(sku)
+
+                if len(batch) >= self.batch_size:
+                    flush()
+                    logger.info(f"Enriched {processed}/{len(skus)} products ({written} written)...")
+
+        checkpoint['status'] = 'complete'
+        flush()
+
+        elapsed = time.monotonic() - started
+        stats = {
+            'run_id': checkpoint['run_id'],
+            'total_processed': len(skus),
+            'successful': written,
+            'failed': len(failed),
+            'failed_skus': failed,
+            'elapsed_seconds': round(elapsed, 2),
+            'products_per_second': round(len(skus) / elapsed, 2) if elapsed else None
+        }
+        logger.info(f"Enrichment complete: {written} written, {len(failed)} failed in {elapsed:.1f}s")
+        return stats
+
+
+class EnrichmentJob:
+    """Progress of one background enrichment run; safe to read from any thread"""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = 'queued'
+        self.processed = 0
+        self.total = 0
+        self.written = 0
+        self.stats = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.status = 'running'
+            self.started_at = datetime.now()
+
+    def progress(self, processed: int, total: int, written: int):
+        with self._lock:
+            self.processed, self.total, self.written = processed, total, written
+
+    def finish(self, stats: Optional[Dict] = None, error: Optional[str] = None):
+        with self._lock:
+            self.stats = stats
+            self.error = error
+            self.status = 'failed' if error else 'completed'
+            self.finished_at = datetime.now()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            end = self.finished_at or datetime.now()
+            return {
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'processed': self.processed,
+                'total': self.total,
+                'written': self.written,
+                'progress': round(self.processed / self.total, 3) if self.total else 0,
+                'elapsed_seconds': round((end - self.started_at).total_seconds(), 1) if self.started_at else 0,
+                'created_at': self.created_at.isoformat(),
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+                'stats': self.stats,
+                'error': self.error
+            }
+
+
+class EnrichmentRunner:
+    """Runs enrichment jobs in background threads, one at a time, and keeps their progress
+
+    Only one job may run at once: every run shares the checkpoint row.
+    """
+
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, kind: str, work: Callable[[EnrichmentJob], Dict]) -> EnrichmentJob:
+        """Register a job and call ``work(job)`` in the background; its return value becomes the job's stats
+
+        Raises RuntimeError if another enrichment job is still running.
+        """
+        job = EnrichmentJob(kind)
+        with self._lock:
+            running = next((other for other in self._jobs.values() if not other.done), None)
+            if running is not None:
+                raise RuntimeError(f"Enrichment job {running.id} is still running")
+            self._jobs[job.id] = job
+            finished = [job_id for job_id, other in self._jobs.items() if other.done]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self._jobs[job_id]
+
+        threading.Thread(target=self._run, args=(job, work), name=f'clan-enrich-{job.id}', daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[EnrichmentJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: EnrichmentJob, work: Callable[[EnrichmentJob], Dict]):
+        job.start()
+        try:
+            stats = work(job)
+        except Exception as e:
+            logger.error(f"Enrichment job {job.id} failed: {e}")
+            job.finish(error=str(e))
+            return
+        job.finish(stats)
+        logger.info(f"Enrichment job {job.id} finished")
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Local fake of the clan.com product API
+Serves getProducts/getProductData with configurable latency, rate limiting
+and error injection so product enrichment can be developed and benchmarked
+offline.
+
+    # Serve on :8765 and point the clan-api service at it
+    python fake_clan_server.py --port 8765
+    CLAN_COM_API_URL=http://localhost:8765/clan/api python app.py
+
+    # Benchmark the enrichment engine against it (no database writes)
+    python fake_clan_server.py --benchmark --products 1100 --latency 0.3
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+def make_catalog(count: int):
+    """Build a deterministic fake catalogue in the getProducts array format"""
+    return [
+        [f'Fake Tartan Product {i}', f'fake_sku_{i:05d}', f'https://clan.com/fake-product-{i}',
+         f'Description for fake product {i}', '', str(100000 + i)]
+        for i in range(count)
+    ]
+
+
+class FakeClanState:
+    """Shared catalogue, latency and rate-limit settings for the handler"""
+
+    def __init__(self, products: int, latency: float, max_rps: float, error_rate: float):
+        self.catalog = make_catalog(products)
+        self.by_sku = {p[1]: p for p in self.catalog}
+        self.latency = latency
+        self.max_rps = max_rps
+        self.error_rate = error_rate
+        self.requests = 0
+        self.throttled = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def admit(self) -> bool:
+        """Sliding one-second window rate limit; False means respond 429"""
+        with self._lock:
+            self.requests += 1
+            if not self.max_rps:
+                return True
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.max_rps:
+                self.throttled += 1
+                return False
+            self._recent.append(now)
+            return True
+
+
+class FakeClanHandler(BaseHTTPRequestHandler):
+    state: FakeClanState = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        state = self.state
+
+        if not state.admit():
+            return self._send_json({'success': False, 'message': 'Too Many Requests'}, 429)
+        time.sleep(state.latency)
+        if state.error_rate and random.random() < state.error_rate:
+            return self._send_json({'success': False, 'message': 'Internal Server Error'}, 500)
+
+        if url.path.endswith('/getProducts'):
+            offset = int(params.get('offset', 0))
+            limit = int(params.get('limit', 10000))
+            return self._send_json({'success': True, 'data': state.catalog[offset:offset + limit]})
+
+        if url.path.endswith('/getProductData'):
+            product = state.by_sku.get(params.get('sku'))
+            if not product:
+                return self._send_json({'success': False, 'message': 'Product not found'})
+            title, sku, product_url, description, _, product_id = product
+            return self._send_json({'success': True, 'data': {
+                'product_id': product_id,
+                'sku': sku,
+                'title': title,
+                'product_url': product_url,
+                'description': description,
+                'price': f'{random.randint(20, 400)}.99',
+                'image': f'https://static.clan.com/media/catalog/product/fake/{sku}.jpg',
+                'images': [{'url': f'https://static.clan.com/media/catalog/product/fake/{sku}.jpg'}]
+            }})
+
+        self._send_json({'success': False, 'message': 'Unknown endpoint'}, 404)
+
+
+def start_server(port: int = 0, products: int = 1100, latency: float = 0.3,
+                 max_rps: float = 0, error_rate: float = 0.0):
+    """Start the fake server in a daemon thread; returns (server, base_url)"""
+    handler = type('BoundFakeClanHandler', (FakeClanHandler,), {
+        'state': FakeClanState(products, latency, max_rps, error_rate)
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/clan/api'
+
+
+class _NullWriter:
+    """In-memory stand-in for CacheWriter so benchmarks don't touch the database"""
+
+    def __init__(self):
+        self.checkpoint = None
+        self.rows = 0
+
+    def write_batch(self, products, checkpoint=None):
+        self.rows += len(products)
+        if checkpoint is not None:
+            self.checkpoint = json.loads(json.dumps(checkpoint))
+        return len(products)
+
+    def load_checkpoint(self, key=None):
+        return self.checkpoint
+
+    def save_checkpoint(self, checkpoint):
+        self.checkpoint = json.loads(json.dumps(checkpoint))
+
+
+def benchmark(args):
+    from clan_client import ClanAPIClient
+    from enrichment import CacheWriter, ProductEnricher
+
+    server, base_url = start_server(0, args.products, args.latency, args.max_rps, args.error_rate)
+    client = ClanAPIClient(base_url=base_url, fallback_url=base_url)
+    client.timeout = 10
+    writer = CacheWriter() if args.write else _NullWriter()
+
+    skus = [p[1] for p in client.make_api_request('/getProducts', {'limit': args.products})['data']]
+    enricher = ProductEnricher(client, writer, concurrency=args.concurrency, rate=args.rate,
+                               backoff=0.1, batch_size=args.batch_size)
+    stats = enricher.run(skus)
+    server.shutdown()
+
+    sequential = args.products * (args.latency + 0.5)  # old loop: request + time.sleep(0.5)
+    print(json.dumps({
+        'products': args.products,
+        'concurrency': args.concurrency,
+        'rate_limit_rps': args.rate,
+        'server_latency_s': args.latency,
+        'elapsed_s': stats['elapsed_seconds'],
+        'products_per_second': stats['products_per_second'],
+        'failed': stats['failed'],
+        'server_requests': server.RequestHandlerClass.state.requests,
+        'server_throttled': server.RequestHandlerClass.state.throttled,
+        'sequential_estimate_s': round(sequential, 1),
+        'speedup': round(sequential / stats['elapsed_seconds'], 1) if stats['elapsed_seconds'] else None
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake clan.com API for offline testing')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--products', type=int, default=1100)
+    parser.add_argument('--latency', type=float, default=0.3, help='seconds per request')
+    parser.add_argument('--max-rps', type=float, default=0, help='server-side rate limit (0 = none)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    parser.add_argument('--benchmark', action='store_true', help='run the enrichment engine against the fake')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=20.0, help='client-side token bucket rate (req/s)')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--write', action='store_true', help='write results to the real cache database')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.benchmark:
+        benchmark(args)
+        return
+
+    server, base_url = start_server(args.port, args.products, args.latency, args.max_rps, args.error_rate)
+    print(f'Fake clan.com API serving {args.products} products at {base_url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
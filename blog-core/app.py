@@ -2,6 +2,7 @@ from flask import Flask, render_template, jsonify, request, redirect
 from flask_cors import CORS
 import requests
 import os
+import sys
 import logging
 from datetime import datetime
 from datetime import datetime
@@ -10,6 +11,9 @@ from humanize import naturaltime
 from db import get_db_conn
 import psycopg.rows
 
+# Shared llm_client package (Ollama supervisor) lives in the project root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1041,28 +1045,16 @@ def get_step_id():
 
 @app.route('/api/ollama/start', methods=['POST'])
 def start_ollama():
-    """Start the Ollama server if not already running."""
-    import socket
-    import subprocess
-    import time
-    
-    # Check if Ollama is already running on localhost:11434
-    def is_ollama_running():
-        try:
-            with socket.create_connection(("localhost", 11434), timeout=2):
-                return True
-        except Exception:
-            return False
-    
-    if is_ollama_running():
+    """Start the Ollama server if not already running (shared supervisor, no fixed sleep)."""
+    from llm_client import get_ollama_supervisor
+
+    supervisor = get_ollama_supervisor()
+    if supervisor.is_healthy():
+        supervisor.warm_up_async()
         return jsonify({"success": True, "message": "Ollama already running."})
     
     try:
-        # Start Ollama in the background
-        subprocess.Popen(["ollama", "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        # Wait briefly and check again
-        time.sleep(2)
-        if is_ollama_running():
+        if supervisor.ensure_running():
             return jsonify({"success": True, "message": "Ollama started."})
         else:
             return jsonify({"success": False, "error": "Ollama did not start."})
@@ -7,7 +7,7 @@ from flask import jsonify, request, current_app, render_template, redirect, url_
 import logging
 from app.llm import bp
 from app.llm.services import execute_llm_request
-import httpx
+from llm_client import LLMError, get_llm_client
 from app.blog.fields import WORKFLOW_FIELDS
 import psycopg
 from psycopg.rows import dict_row
@@ -131,28 +131,16 @@ def test_prompt():
         logger.info(f"[TEST] Final prompt to send to LLM: {final_prompt}")
         
         # Call LLM
-        logger.info(f"[TEST] Calling LLM at {config.api_base} with model {config.model_name}")
-        response = httpx.post(
-            f"{config.api_base}/api/generate",
-            json={
-                "model": data.get('model', config.model_name),
-                "prompt": final_prompt,
-                "stream": False
-            },
-            timeout=30.0
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"[TEST] LLM error: {response.text}")
+        logger.info(f"[TEST] Calling LLM with model {config.model_name}")
+        try:
+            result = get_llm_client().generate(final_prompt, model=data.get('model', config.model_name),
+                                               timeout=30)
+        except LLMError as e:
+            logger.error(f"[TEST] LLM error: {e}")
             return jsonify({'error': 'LLM service error'}), 500
             
-        result = response.json()
-        if 'response' not in result:
-            logger.error(f"[TEST] Invalid LLM response: {result}")
-            return jsonify({'error': 'Invalid response from LLM'}), 500
-            
-        logger.info(f"[TEST] Success! Response: {result['response'][:100]}...")
-        return jsonify({'response': result['response']}), 200
+        logger.info(f"[TEST] Success! Response: {result[:100]}...")
+        return jsonify({'response': result}), 200
         
     except Exception as e:
         logger.exception("[TEST] Error")
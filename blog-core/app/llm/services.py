@@ -4,6 +4,7 @@ import httpx
 import logging
 import re
 import os
+import sys
 from flask import current_app
 from datetime import datetime
 from jinja2 import Template
@@ -14,6 +15,9 @@ import json
 from typing import Dict, Any, Optional
 from app.utils.json_extractor import extract_and_parse_json, extract_json_with_fallback
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from llm_client import LLMClient, LLMTimeoutError, get_llm_client
+
 logger = logging.getLogger(__name__)
 # All ORM model imports removed. Use direct SQL via psycopg2 for any DB access.
 
@@ -185,6 +189,10 @@ class LLMService:
         self.ollama_url = ollama_url or os.environ.get("OLLAMA_API_URL", "http://localhost:11434")
         self.openai_api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
         self.default_model = default_model or os.environ.get("DEFAULT_LLM_MODEL", "mistral")
+        self.client = get_llm_client()
+        if ollama_url or openai_api_key:
+            self.client = LLMClient(ollama_url=self.ollama_url, openai_api_key=self.openai_api_key,
+                                    default_model=self.default_model)
 
     def plan_structure(self, title, idea, facts):
         """Plan the structure of a blog post using LLM."""
@@ -244,67 +252,26 @@ Example format:
             logger.error(f"Error planning structure: {str(e)}")
             raise
 
-    def generate(self, prompt, model_name=None, temperature=0.7, max_tokens=1000, timeout=60):
+    def generate(self, prompt, model_name=None, temperature=0.7, max_tokens=1000, timeout=60, bypass_cache=False):
         """Generate text using configured LLM, supporting both OpenAI (messages) and Ollama (string)."""
         if not model_name:
             model_name = self.default_model
         logger.info(f"Generating with model: {model_name}, temperature: {temperature}, max_tokens: {max_tokens}, timeout: {timeout}")
         if self.ollama_url:
-            return self._generate_ollama(prompt, model_name, temperature, max_tokens, timeout)
+            provider = 'ollama'
         elif self.openai_api_key:
-            return self._generate_openai(prompt, model_name, temperature, max_tokens)
+            provider = 'openai'
         else:
             raise ValueError(f"Unsupported provider type: {self.ollama_url}")
-
-    def _generate_ollama(self, prompt, model_name, temperature=0.7, max_tokens=1000, timeout=60):
-        """Generate text using Ollama."""
+        options = {'temperature': float(temperature), 'max_tokens': int(max_tokens), 'timeout': timeout or 60,
+                   'bypass_cache': bypass_cache}
         try:
-            # Format request JSON consistently
-            request_data = {
-                "model": model_name,
-                "prompt": prompt,
-                "temperature": float(temperature),  # Ensure temperature is float
-                "max_tokens": int(max_tokens),      # Ensure max_tokens is int
-                "stream": False  # Ensure we get a complete response
-            }
-            logger.debug(f"[REQUESTS] Sending request to Ollama: {request_data}")
-            if not self.ollama_url:
-                raise ValueError("Ollama API URL not set on LLMService")
-            # Use requests instead of httpx
-            import requests
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json=request_data,
-                timeout=timeout or 60
-            )
-            logger.debug(f"[REQUESTS] Request headers: {response.request.headers}")
-            logger.debug(f"[REQUESTS] Request body: {response.request.body}")
-            logger.debug(f"[REQUESTS] Raw response: {response.text}")
-            response.raise_for_status()
-            response_data = response.json()
-            logger.debug(f"Received response from Ollama: {response_data}")
-            # Handle both response formats
-            if "response" in response_data:
-                return response_data["response"]
-            elif isinstance(response_data, dict) and "model_used" in response_data and "response" in response_data:
-                return response_data["response"]
-            else:
-                logger.error(f"Unexpected response format from Ollama: {response_data}")
-                raise ValueError("Unexpected response format from Ollama")
-        except requests.Timeout:
-            logger.error(f"Timeout while generating with Ollama (model: {model_name})")
-            raise TimeoutError("Request to Ollama timed out")
-        except requests.RequestException as e:
-            logger.error(f"HTTP error while generating with Ollama: {str(e)}")
-            raise
-        except Exception as e:
-            logger.exception(f"Error generating with Ollama: {str(e)}")
-            raise
-
-    def _generate_openai(self, prompt, model_name, temperature=0.7, max_tokens=1000):
-        """Generate text using OpenAI (stubbed for testing)."""
-        # Return a dummy response for testing if no API key is set
-        return "[DUMMY OPENAI RESPONSE]"
+            if isinstance(prompt, list):
+                return self.client.chat(prompt, model=model_name, provider=provider, **options)
+            return self.client.generate(prompt, model=model_name, provider=provider, **options)
+        except LLMTimeoutError:
+            logger.error(f"Timeout while generating with {provider} (model: {model_name})")
+            raise TimeoutError(f"Request to {provider} timed out")
 
     def execute_action(self, action, fields: dict, post_id=None, model_name=None):
         model = None
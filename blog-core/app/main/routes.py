@@ -334,35 +334,15 @@ def docs_live_field_mapping():
 def api_start_ollama():
     """Start Ollama LLM provider."""
     try:
-        # Check if Ollama is already running
-        import subprocess
-        import socket
-        
-        # Try to connect to Ollama's default port
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        result = sock.connect_ex(('localhost', 11434))
-        sock.close()
-        
-        if result == 0:
+        from llm_client import get_ollama_supervisor
+
+        supervisor = get_ollama_supervisor()
+        if supervisor.is_healthy():
+            supervisor.warm_up_async()
             return jsonify({'status': 'already_running', 'message': 'Ollama is already running'})
         
-        # Try to start Ollama
         try:
-            # Start Ollama in the background
-            subprocess.Popen(['ollama', 'serve'], 
-                           stdout=subprocess.DEVNULL, 
-                           stderr=subprocess.DEVNULL)
-            
-            # Wait a moment for it to start
-            import time
-            time.sleep(2)
-            
-            # Check if it started successfully
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            result = sock.connect_ex(('localhost', 11434))
-            sock.close()
-            
-            if result == 0:
+            if supervisor.ensure_running():
                 return jsonify({'status': 'started', 'message': 'Ollama started successfully'})
             else:
                 return jsonify({'status': 'error', 'message': 'Failed to start Ollama - service not responding'}), 500
@@ -4,16 +4,29 @@ Blog Images - Image Generation and Management Application
 """
 
 import os
+import sys
 import json
+import logging
 import re
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify
 from werkzeug.utils import secure_filename
 import requests
 import psycopg2
 import psycopg2.extras
 from datetime import datetime
+from image_pipeline import ImagePipeline, get_compositor, load_watermark, DEFAULT_SETTINGS, WATERMARK_PATH
+
+# Shared modules (image index, LLM client) live in the project root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.image_index import get_image_index
+from config.image_serving import file_version, send_image
+from llm_client import LLMConnectionError, get_llm_client
+from storage_stats import StorageLedger, scan_post_totals
+from image_variants import VariantCache, VariantSpec
+from image_metadata import ImageMetadataGenerator, save_metadata
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
 
 # Configure port
 port = int(os.environ.get('PORT', 5005))
@@ -38,9 +51,44 @@ def get_db_conn():
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_section_images_path(post_id, section_id):
-    """Get the path for section images"""
-    return os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections', str(section_id), 'raw')
+def get_post_image_index():
+    """Index of the post image tree under UPLOAD_FOLDER"""
+    return get_image_index(app.config['UPLOAD_FOLDER'])
+
+_storage_ledger = None
+
+def get_storage_ledger():
+    """Storage accounting for the images under UPLOAD_FOLDER"""
+    global _storage_ledger
+    if _storage_ledger is None:
+        _storage_ledger = StorageLedger(get_db_conn, app.config['UPLOAD_FOLDER'])
+    return _storage_ledger
+
+def record_written(paths):
+    """Update the image index and storage ledger after image files are written"""
+    index = get_post_image_index()
+    for path in paths:
+        index.invalidate_path(path)
+    try:
+        get_storage_ledger().record(paths)
+    except Exception as e:
+        print(f"Storage ledger update failed: {e}")
+
+def get_post_storage(post_id):
+    """Per (image_type, stage) file counts and bytes for a post.
+    
+    Read from the storage ledger; walks the post directory if the database is unavailable.
+    """
+    try:
+        return get_storage_ledger().post_totals(post_id)
+    except Exception as e:
+        print(f"Storage ledger unavailable: {e}")
+        return scan_post_totals(app.config['UPLOAD_FOLDER'], post_id)
+
+def list_images(post_id, kind, stage, section_id=None):
+    """Allowed image filenames in one stage directory, from the image index"""
+    return [filename for filename in get_post_image_index().files(post_id, kind, stage, section_id)
+            if allowed_file(filename)]
 
 def get_upload_path(post_id, image_type, section_id=None):
     """Get upload path based on image type"""
@@ -141,6 +189,7 @@ def upload_image():
         filename = secure_filename(file.filename)
         file_path = os.path.join(upload_path, filename)
         file.save(file_path)
+        record_written([file_path])
         
         return jsonify({
             'success': True,
@@ -156,78 +205,95 @@ def upload_image():
 def get_section_images(post_id, section_id):
     """Get list of images for a specific section"""
     try:
-        images_path = get_section_images_path(post_id, section_id)
-        
-        if not os.path.exists(images_path):
-            return jsonify({'images': []})
-        
         images = []
-        for filename in os.listdir(images_path):
-            if allowed_file(filename):
-                images.append({
-                    'filename': filename,
-                    'url': f'/static/content/posts/{post_id}/sections/{section_id}/raw/{filename}'
-                })
+        for filename in list_images(post_id, 'sections', 'raw', section_id):
+            images.append({
+                'filename': filename,
+                'url': f'/static/content/posts/{post_id}/sections/{section_id}/raw/{filename}'
+            })
         
         return jsonify({'images': images})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/static/content/posts/<int:post_id>/sections/<int:section_id>/raw/<filename>')
-def serve_section_image(post_id, section_id, filename):
-    """Serve section images"""
+@app.route('/static/content/posts/<path:filename>')
+def serve_post_image(filename):
+    """Serve post images (all types and stages) with ETag, Range and cache headers"""
+    return send_image(app.config['UPLOAD_FOLDER'], filename)
+
+_variant_cache = None
+
+def get_variant_cache():
+    """Disk cache and encode pool for on-demand image variants"""
+    global _variant_cache
+    if _variant_cache is None:
+        _variant_cache = VariantCache()
+    return _variant_cache
+
+@app.route('/img/<int:post_id>/<section>')
+def serve_image_variant(post_id, section):
+    """Serve a resized variant of a post's best header or section image.
+    
+    ``section`` is a section id or ``header``. Query parameters: w, h,
+    fmt (webp, avif, jpeg, png), fit (inside, cover, contain) and q. Pass
+    v=<source version> to have the response cached as immutable.
+    """
     try:
-        images_path = get_section_images_path(post_id, section_id)
-        return send_from_directory(images_path, filename)
+        spec = VariantSpec.from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if section != 'header' and not section.isdigit():
+        return jsonify({'error': 'Image not found'}), 404
+    source = get_post_image_index().best_path(post_id, None if section == 'header' else section)
+    source_version = file_version(source) if source else None
+    if not source_version:
+        return jsonify({'error': 'Image not found'}), 404
+    
+    try:
+        variant_cache = get_variant_cache()
+        relative = variant_cache.get(source, source_version, spec)
     except Exception as e:
-        return jsonify({'error': str(e)}), 404
+        return jsonify({'error': f'Could not render image: {e}'}), 500
+    return send_image(variant_cache.cache_dir, relative, mimetype=spec.mimetype,
+                      immutable=request.args.get('v') == source_version)
 
 @app.route('/api/images/<int:post_id>')
 def get_all_images(post_id):
     """Get all images for a post across all types"""
     try:
         images = []
+        post_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id))
         
         # Check for header images
-        header_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'raw')
-        if os.path.exists(header_path):
-            for filename in os.listdir(header_path):
-                if allowed_file(filename):
-                    images.append({
-                        'filename': filename,
-                        'url': f'/static/content/posts/{post_id}/header/raw/{filename}',
-                        'type': 'header',
-                        'path': os.path.join(header_path, filename)
-                    })
+        for filename in list_images(post_id, 'header', 'raw'):
+            images.append({
+                'filename': filename,
+                'url': f'/static/content/posts/{post_id}/header/raw/{filename}',
+                'type': 'header',
+                'path': os.path.join(post_path, 'header', 'raw', filename)
+            })
         
         # Check for featured images
-        featured_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'featured', 'raw')
-        if os.path.exists(featured_path):
-            for filename in os.listdir(featured_path):
-                if allowed_file(filename):
-                    images.append({
-                        'filename': filename,
-                        'url': f'/static/content/posts/{post_id}/featured/raw/{filename}',
-                        'type': 'featured',
-                        'path': os.path.join(featured_path, filename)
-                    })
+        for filename in list_images(post_id, 'featured', 'raw'):
+            images.append({
+                'filename': filename,
+                'url': f'/static/content/posts/{post_id}/featured/raw/{filename}',
+                'type': 'featured',
+                'path': os.path.join(post_path, 'featured', 'raw', filename)
+            })
         
         # Check for section images
-        sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-        if os.path.exists(sections_path):
-            for section_dir in os.listdir(sections_path):
-                section_path = os.path.join(sections_path, section_dir, 'raw')
-                if os.path.exists(section_path):
-                    for filename in os.listdir(section_path):
-                        if allowed_file(filename):
-                            images.append({
-                                'filename': filename,
-                                'url': f'/static/content/posts/{post_id}/sections/{section_dir}/raw/{filename}',
-                                'type': 'section',
-                                'section_id': section_dir,
-                                'path': os.path.join(section_path, filename)
-                            })
+        for section_dir in get_post_image_index().section_ids(post_id):
+            for filename in list_images(post_id, 'sections', 'raw', section_dir):
+                images.append({
+                    'filename': filename,
+                    'url': f'/static/content/posts/{post_id}/sections/{section_dir}/raw/{filename}',
+                    'type': 'section',
+                    'section_id': section_dir,
+                    'path': os.path.join(post_path, 'sections', section_dir, 'raw', filename)
+                })
         
         return jsonify({'images': images})
         
@@ -266,43 +332,37 @@ def get_images_by_type(post_id, image_type):
             print(f"Database error getting titles: {e}")
             # Continue without titles if database fails
         
+        post_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id))
+        
         # Handle processing stages (raw, optimized, watermarked, captioned)
         if image_type in ['raw', 'optimized', 'watermarked', 'captioned']:
             processing_stage = image_type
             
             # Get header images for this processing stage
-            header_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', processing_stage)
-            if os.path.exists(header_path):
-                for filename in os.listdir(header_path):
-                    if allowed_file(filename):
-                        images.append({
-                            'filename': filename,
-                            'url': f'/static/content/posts/{post_id}/header/{processing_stage}/{filename}',
-                            'type': 'header',
-                            'section_id': None,
-                            'section_title': post_title,  # Header images get post title
-                            'processing_stage': processing_stage,
-                            'path': os.path.join(header_path, filename)
-                        })
+            for filename in list_images(post_id, 'header', processing_stage):
+                images.append({
+                    'filename': filename,
+                    'url': f'/static/content/posts/{post_id}/header/{processing_stage}/{filename}',
+                    'type': 'header',
+                    'section_id': None,
+                    'section_title': post_title,  # Header images get post title
+                    'processing_stage': processing_stage,
+                    'path': os.path.join(post_path, 'header', processing_stage, filename)
+                })
             
             # Get section images for this processing stage
-            sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-            if os.path.exists(sections_path):
-                for section_dir in os.listdir(sections_path):
-                    section_path = os.path.join(sections_path, section_dir, processing_stage)
-                    if os.path.exists(section_path):
-                        section_title = section_titles.get(section_dir, f"Section {section_dir}")
-                        for filename in os.listdir(section_path):
-                            if allowed_file(filename):
-                                images.append({
-                                    'filename': filename,
-                                    'url': f'/static/content/posts/{post_id}/sections/{section_dir}/{processing_stage}/{filename}',
-                                    'type': 'section',
-                                    'section_id': section_dir,
-                                    'section_title': section_title,
-                                    'processing_stage': processing_stage,
-                                    'path': os.path.join(section_path, filename)
-                                })
+            for section_dir in get_post_image_index().section_ids(post_id):
+                section_title = section_titles.get(section_dir, f"Section {section_dir}")
+                for filename in list_images(post_id, 'sections', processing_stage, section_dir):
+                    images.append({
+                        'filename': filename,
+                        'url': f'/static/content/posts/{post_id}/sections/{section_dir}/{processing_stage}/{filename}',
+                        'type': 'section',
+                        'section_id': section_dir,
+                        'section_title': section_title,
+                        'processing_stage': processing_stage,
+                        'path': os.path.join(post_path, 'sections', section_dir, processing_stage, filename)
+                    })
             
             # Return unified response format
             header_count = len([img for img in images if img['type'] == 'header'])
@@ -317,45 +377,25 @@ def get_images_by_type(post_id, image_type):
             })
         
         # Handle legacy image types (header, section, featured)
-        elif image_type == 'header':
-            header_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'raw')
-            if os.path.exists(header_path):
-                for filename in os.listdir(header_path):
-                    if allowed_file(filename):
-                        images.append({
-                            'filename': filename,
-                            'url': f'/static/content/posts/{post_id}/header/raw/{filename}',
-                            'type': 'header',
-                            'path': os.path.join(header_path, filename)
-                        })
-        
-        elif image_type == 'featured':
-            featured_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'featured', 'raw')
-            if os.path.exists(featured_path):
-                for filename in os.listdir(featured_path):
-                    if allowed_file(filename):
-                        images.append({
-                            'filename': filename,
-                            'url': f'/static/content/posts/{post_id}/featured/raw/{filename}',
-                            'type': 'featured',
-                            'path': os.path.join(featured_path, filename)
-                        })
+        elif image_type in ('header', 'featured'):
+            for filename in list_images(post_id, image_type, 'raw'):
+                images.append({
+                    'filename': filename,
+                    'url': f'/static/content/posts/{post_id}/{image_type}/raw/{filename}',
+                    'type': image_type,
+                    'path': os.path.join(post_path, image_type, 'raw', filename)
+                })
         
         elif image_type == 'section':
-            sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-            if os.path.exists(sections_path):
-                for section_dir in os.listdir(sections_path):
-                    section_path = os.path.join(sections_path, section_dir, 'raw')
-                    if os.path.exists(section_path):
-                        for filename in os.listdir(section_path):
-                            if allowed_file(filename):
-                                images.append({
-                                    'filename': filename,
-                                    'url': f'/static/content/posts/{post_id}/sections/{section_dir}/raw/{filename}',
-                                    'type': 'section',
-                                    'section_id': section_dir,
-                                    'path': os.path.join(section_path, filename)
-                                })
+            for section_dir in get_post_image_index().section_ids(post_id):
+                for filename in list_images(post_id, 'sections', 'raw', section_dir):
+                    images.append({
+                        'filename': filename,
+                        'url': f'/static/content/posts/{post_id}/sections/{section_dir}/raw/{filename}',
+                        'type': 'section',
+                        'section_id': section_dir,
+                        'path': os.path.join(post_path, 'sections', section_dir, 'raw', filename)
+                    })
         
         return jsonify({'images': images})
         
@@ -366,77 +406,26 @@ def get_images_by_type(post_id, image_type):
 def get_image_stats(post_id):
     """Get image count, sizes, processing status"""
     try:
-        stats = {
-            'total_images': 0,
-            'header_images': 0,
-            'section_images': 0,
-            'featured_images': 0,
-            'optimized_images': 0,
-            'optimized_header_images': 0,
-            'optimized_section_images': 0,
-            'total_size': 0
-        }
+        storage = get_post_storage(post_id)
         
-        # Count header images
-        header_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'raw')
-        if os.path.exists(header_path):
-            for filename in os.listdir(header_path):
-                if allowed_file(filename):
-                    stats['header_images'] += 1
-                    stats['total_images'] += 1
-                    file_path = os.path.join(header_path, filename)
-                    if os.path.exists(file_path):
-                        stats['total_size'] += os.path.getsize(file_path)
-        
-        # Count featured images
-        featured_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'featured', 'raw')
-        if os.path.exists(featured_path):
-            for filename in os.listdir(featured_path):
-                if allowed_file(filename):
-                    stats['featured_images'] += 1
-                    stats['total_images'] += 1
-                    file_path = os.path.join(featured_path, filename)
-                    if os.path.exists(file_path):
-                        stats['total_size'] += os.path.getsize(file_path)
+        def count(image_type, stage):
+            return storage.get((image_type, stage), {}).get('files', 0)
         
-        # Count section images
-        sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-        if os.path.exists(sections_path):
-            for section_dir in os.listdir(sections_path):
-                section_path = os.path.join(sections_path, section_dir, 'raw')
-                if os.path.exists(section_path):
-                    for filename in os.listdir(section_path):
-                        if allowed_file(filename):
-                            stats['section_images'] += 1
-                            stats['total_images'] += 1
-                            file_path = os.path.join(section_path, filename)
-                            if os.path.exists(file_path):
-                                stats['total_size'] += os.path.getsize(file_path)
-        
-        # Count optimized images
-        # Optimized header images
-        header_optimized_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'optimized')
-        if os.path.exists(header_optimized_path):
-            for filename in os.listdir(header_optimized_path):
-                if allowed_file(filename):
-                    stats['optimized_header_images'] += 1
-                    stats['optimized_images'] += 1
-                    file_path = os.path.join(header_optimized_path, filename)
-                    if os.path.exists(file_path):
-                        stats['total_size'] += os.path.getsize(file_path)
+        def size(image_type, stage):
+            return storage.get((image_type, stage), {}).get('bytes', 0)
         
-        # Optimized section images
-        if os.path.exists(sections_path):
-            for section_dir in os.listdir(sections_path):
-                section_optimized_path = os.path.join(sections_path, section_dir, 'optimized')
-                if os.path.exists(section_optimized_path):
-                    for filename in os.listdir(section_optimized_path):
-                        if allowed_file(filename):
-                            stats['optimized_section_images'] += 1
-                            stats['optimized_images'] += 1
-                            file_path = os.path.join(section_optimized_path, filename)
-                            if os.path.exists(file_path):
-                                stats['total_size'] += os.path.getsize(file_path)
+        stats = {
+            'header_images': count('header', 'raw'),
+            'section_images': count('section', 'raw'),
+            'featured_images': count('featured', 'raw'),
+            'optimized_header_images': count('header', 'optimized'),
+            'optimized_section_images': count('section', 'optimized')
+        }
+        stats['total_images'] = stats['header_images'] + stats['section_images'] + stats['featured_images']
+        stats['optimized_images'] = stats['optimized_header_images'] + stats['optimized_section_images']
+        # Raw images of every type plus optimized header and section images
+        stats['total_size'] = (size('header', 'raw') + size('section', 'raw') + size('featured', 'raw') +
+                               size('header', 'optimized') + size('section', 'optimized'))
         
         return jsonify(stats)
         
@@ -447,63 +436,48 @@ def get_image_stats(post_id):
 def get_optimized_stats(post_id):
     """Get optimized image count and sizes"""
     try:
-        stats = {
-            'optimized_images': 0,
-            'optimized_header_images': 0,
-            'optimized_section_images': 0,
-            'optimized_size': 0
-        }
+        storage = get_post_storage(post_id)
+        header = storage.get(('header', 'optimized'), {'files': 0, 'bytes': 0})
+        section = storage.get(('section', 'optimized'), {'files': 0, 'bytes': 0})
         
-        # Count optimized header images
-        header_optimized_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'optimized')
-        if os.path.exists(header_optimized_path):
-            for filename in os.listdir(header_optimized_path):
-                if allowed_file(filename):
-                    stats['optimized_header_images'] += 1
-                    stats['optimized_images'] += 1
-                    file_path = os.path.join(header_optimized_path, filename)
-                    if os.path.exists(file_path):
-                        stats['optimized_size'] += os.path.getsize(file_path)
-        
-        # Count optimized section images
-        sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-        if os.path.exists(sections_path):
-            for section_dir in os.listdir(sections_path):
-                section_optimized_path = os.path.join(sections_path, section_dir, 'optimized')
-                if os.path.exists(section_optimized_path):
-                    for filename in os.listdir(section_optimized_path):
-                        if allowed_file(filename):
-                            stats['optimized_section_images'] += 1
-                            stats['optimized_images'] += 1
-                            file_path = os.path.join(section_optimized_path, filename)
-                            if os.path.exists(file_path):
-                                stats['optimized_size'] += os.path.getsize(file_path)
-        
-        return jsonify(stats)
+        return jsonify({
+            'optimized_images': header['files'] + section['files'],
+            'optimized_header_images': header['files'],
+            'optimized_section_images': section['files'],
+            'optimized_size': header['bytes'] + section['bytes']
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Image Processing Pipeline Endpoints
 @app.route('/api/process/optimize', methods=['POST'])
 def optimize_images():
-    """Optimize images with specified quality settings"""
+    """Optimize (and by default watermark) a post's selected images in the background.
+    
+    Returns the image_processing_jobs id; poll /api/pipeline/status/<job_id>.
+    """
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         post_id = data.get('post_id')
-        image_paths = data.get('image_paths', [])
-        quality = data.get('quality', 85)
+        settings = data.get('settings')
+        if not settings:
+            quality = data.get('quality')
+            settings = f"webp_1200_{int(quality)}" if quality else DEFAULT_SETTINGS
+        watermark = bool(data.get('watermark', True))
         
         if not post_id:
             return jsonify({'error': 'Missing post_id'}), 400
         
-        # For now, return a mock response indicating processing would happen
-        # In a real implementation, this would use PIL/Pillow to optimize images
-        job_id = f"optimize_{post_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        tasks = get_optimize_tasks(int(post_id), settings, watermark)
+        if not tasks:
+            return jsonify({'error': 'No images to optimize'}), 404
+        
+        job_id = get_pipeline().start_job(int(post_id), tasks, {'settings': settings, 'watermark': watermark})
         
         return jsonify({
             'success': True,
             'job_id': job_id,
-            'message': f'Optimization job created for {len(image_paths)} images',
+            'message': f'Optimization job created for {len(tasks)} images',
             'status': 'queued'
         })
         
@@ -537,119 +511,41 @@ def watermark_images():
 
 @app.route('/api/process/caption', methods=['POST'])
 def generate_captions():
-    """Generate captions for images using LLM"""
+    """Generate captions for images using LLM (one batched request per post)"""
     try:
         data = request.get_json()
         post_id = data.get('post_id')
         caption_style = data.get('caption_style', 'Descriptive')
         caption_language = data.get('caption_language', 'English')
+        regenerate = bool(data.get('regenerate', False))
         
         if not post_id:
             return jsonify({'error': 'Missing post_id'}), 400
         
-        # Get post and section data for context
-        with get_db_conn() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                # Get post data
-                cur.execute("""
-                    SELECT p.title, p.subtitle, pd.basic_idea, pd.idea_scope
-                    FROM post p
-                    LEFT JOIN post_development pd ON p.id = pd.post_id
-                    WHERE p.id = %s
-                """, (post_id,))
-                post_data = cur.fetchone()
-                
-                if not post_data:
-                    return jsonify({'error': 'Post not found'}), 404
-                
-                # Get section data
-                cur.execute("""
-                    SELECT id, section_heading, section_description, image_filename
-                    FROM post_section
-                    WHERE post_id = %s
-                    ORDER BY section_order
-                """, (post_id,))
-                sections = cur.fetchall()
+        post_data, watermarked_images = find_watermarked_images(post_id)
+        if not post_data:
+            return jsonify({'error': 'Post not found'}), 404
+        print(f"Total watermarked images found: {len(watermarked_images)}")
+        if not watermarked_images:
+            return jsonify({'error': 'No watermarked images found'}), 404
         
-                # Get watermarked images
-                watermarked_images = []
-                
-                # Check header watermarked images
-                header_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'watermarked')
-                print(f"Checking header path: {header_path}")
-                if os.path.exists(header_path):
-                    for filename in os.listdir(header_path):
-                        if allowed_file(filename):
-                            watermarked_images.append({
-                                'type': 'header',
-                                'path': os.path.join(header_path, filename),
-                                'filename': filename,
-                                'section_id': None
-                            })
-                            print(f"Found header image: {filename}")
-                
-                # Check section watermarked images
-                sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-                for section in sections:
-                    section_watermarked_path = os.path.join(sections_path, str(section['id']), 'watermarked')
-                    print(f"Checking section path: {section_watermarked_path}")
-                    if os.path.exists(section_watermarked_path):
-                        for filename in os.listdir(section_watermarked_path):
-                            if allowed_file(filename):
-                                watermarked_images.append({
-                                    'type': 'section',
-                                    'path': os.path.join(section_watermarked_path, filename),
-                                    'filename': filename,
-                                    'section_id': section['id'],
-                                    'section_heading': section['section_heading']
-                                })
-                                print(f"Found section image: {filename}")
-                
-                print(f"Total watermarked images found: {len(watermarked_images)}")
-                if not watermarked_images:
-                    return jsonify({'error': 'No watermarked images found'}), 404
-        
-                # Generate captions using LLM
-        captions_generated = 0
-        captions_data = []
-        
-        for image_info in watermarked_images:
-            try:
-                # Prepare context for LLM
-                context = {
-                    'post_title': post_data['title'],
-                    'post_subtitle': post_data['subtitle'],
-                    'basic_idea': post_data['basic_idea'],
-                    'idea_scope': post_data['idea_scope'],
-                    'image_type': image_info['type'],
-                    'caption_style': caption_style,
-                    'caption_language': caption_language
-                }
-                
-                if image_info['type'] == 'section':
-                    context['section_heading'] = image_info['section_heading']
-                
-                # Generate caption using LLM
-                caption = generate_caption_via_llm(context, image_info)
-                
-                # Save caption to database
-                save_caption_to_database(image_info, caption, post_id)
-                
-                captions_data.append({
-                    'image_path': image_info['path'],
-                    'caption': caption,
-                    'type': image_info['type'],
-                    'section_id': image_info.get('section_id')
-                })
-                
-                captions_generated += 1
-                
-            except Exception as e:
-                print(f"Error generating caption for {image_info['filename']}: {e}")
-                # If it's an Ollama connection error, stop processing and return error
-                if 'Ollama LLM service is not running' in str(e):
-                    return jsonify({'error': str(e)}), 503
-                continue
+        try:
+            results = get_metadata_generator().generate(post_data, watermarked_images, caption_style,
+                                                        caption_language, bypass_cache=regenerate)
+        except LLMConnectionError:
+            return jsonify({'error': 'Ollama LLM service is not running. Please start Ollama to generate captions.'}), 503
+        
+        for result in results:
+            result['caption'] = clean_caption(result['caption']) or None
+        save_metadata(get_db_conn, post_id, results, ['caption'])
+        
+        captions_data = [{
+            'image_path': result['path'],
+            'caption': result['caption'],
+            'type': result['type'],
+            'section_id': result.get('section_id')
+        } for result in results if result['caption']]
+        captions_generated = len(captions_data)
         
         return jsonify({
             'success': True,
@@ -662,178 +558,73 @@ def generate_captions():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def generate_caption_via_llm(context, image_info):
-    """Generate caption using LLM via blog-core API"""
-    try:
-        # Fetch prompts from workflow system
-        system_prompt_response = requests.get('http://localhost:5000/api/workflow/prompts/all')
-        if system_prompt_response.status_code == 200:
-            prompts = system_prompt_response.json()
+def find_watermarked_images(post_id):
+    """Post context and watermarked header/section images (with dimensions) for a post"""
+    with get_db_conn() as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            # Get post data
+            cur.execute("""
+                SELECT p.title, p.subtitle, pd.basic_idea, pd.idea_scope
+                FROM post p
+                LEFT JOIN post_development pd ON p.id = pd.post_id
+                WHERE p.id = %s
+            """, (post_id,))
+            post_data = cur.fetchone()
             
-            # Find the image captions system prompt (ID 110)
-            system_prompt = next((p for p in prompts if p['id'] == 110), None)
-            # Find the image captions task prompt (ID 111)
-            task_prompt = next((p for p in prompts if p['id'] == 111), None)
+            if not post_data:
+                return None, []
             
-            if system_prompt and task_prompt:
-                # Construct the full prompt using system and task prompts
-                system_content = system_prompt.get('prompt_text', '')
-                task_content = task_prompt.get('prompt_text', '')
-                
-                # Build context information
-                context_info = f"""Section: {context['section_heading'] if context['image_type'] != 'header' else 'Header'}"""
-                
-                # Combine system prompt, task prompt, and context
-                full_prompt = f"""{system_content}
-
-{task_content}
-
-{context_info}
-
-Write exactly 6-8 words:"""
-                
-                print(f"Using workflow prompts for captioning: System={system_prompt['name']}, Task={task_prompt['name']}")
-            else:
-                # Fallback to hardcoded prompts if workflow prompts not found
-                print("Workflow prompts not found, using fallback prompts")
-                if context['image_type'] == 'header':
-                    prompt = f"""You are an expert image caption writer for blog posts.
-
-Given the post context:
-- Title: {context['post_title']}
-- Subtitle: {context['post_subtitle']}
-- Basic Idea: {context['basic_idea']}
-- Idea Scope: {context['idea_scope']}
-
-Generate a compelling, descriptive caption for this header image that:
-1. Accurately describes what's shown
-2. Connects to the blog post content
-3. Is engaging and informative
-4. Uses {context['caption_style'].lower()} style
-5. Is written in {context['caption_language']}
-
-Keep the caption concise (1-2 sentences) and avoid redundancy.
-Return only the caption text, with no additional commentary or formatting."""
-                else:
-                    prompt = f"""You are an expert image caption writer for blog posts.
-
-Given the post context:
-- Title: {context['post_title']}
-- Subtitle: {context['post_subtitle']}
-- Basic Idea: {context['basic_idea']}
-- Idea Scope: {context['idea_scope']}
-- Section: {context['section_heading']}
-
-Generate a compelling, descriptive caption for this section image that:
-1. Accurately describes what's shown
-2. Connects to the section content
-3. Is engaging and informative
-4. Uses {context['caption_style'].lower()} style
-5. Is written in {context['caption_language']}
-
-Keep the caption concise (1-2 sentences) and avoid redundancy.
-Return only the caption text, with no additional commentary or formatting."""
-        else:
-            # Fallback to hardcoded prompts if API call fails
-            print(f"Failed to fetch workflow prompts: {system_prompt_response.status_code}")
-            if context['image_type'] == 'header':
-                prompt = f"""You are an expert image caption writer for blog posts.
-
-Given the post context:
-- Title: {context['post_title']}
-- Subtitle: {context['post_subtitle']}
-- Basic Idea: {context['basic_idea']}
-- Idea Scope: {context['idea_scope']}
-
-Generate a compelling, descriptive caption for this header image that:
-1. Accurately describes what's shown
-2. Connects to the blog post content
-3. Is engaging and informative
-4. Uses {context['caption_style'].lower()} style
-5. Is written in {context['caption_language']}
-
-Keep the caption concise (1-2 sentences) and avoid redundancy.
-Return only the caption text, with no additional commentary or formatting."""
-            else:
-                prompt = f"""You are an expert image caption writer for blog posts.
-
-Given the post context:
-- Title: {context['post_title']}
-- Subtitle: {context['post_subtitle']}
-- Basic Idea: {context['basic_idea']}
-- Idea Scope: {context['idea_scope']}
-- Section: {context['section_heading']}
+            # Get section data
+            cur.execute("""
+                SELECT id, section_heading, section_description, image_filename
+                FROM post_section
+                WHERE post_id = %s
+                ORDER BY section_order
+            """, (post_id,))
+            sections = cur.fetchall()
+    
+    watermarked_images = []
+    
+    # Check header watermarked images
+    header_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'watermarked')
+    if os.path.exists(header_path):
+        for filename in sorted(os.listdir(header_path)):
+            if allowed_file(filename):
+                watermarked_images.append({
+                    'type': 'header',
+                    'path': os.path.join(header_path, filename),
+                    'filename': filename,
+                    'section_id': None
+                })
+    
+    # Check section watermarked images
+    sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
+    for section in sections:
+        section_watermarked_path = os.path.join(sections_path, str(section['id']), 'watermarked')
+        if os.path.exists(section_watermarked_path):
+            for filename in sorted(os.listdir(section_watermarked_path)):
+                if allowed_file(filename):
+                    watermarked_images.append({
+                        'type': 'section',
+                        'path': os.path.join(section_watermarked_path, filename),
+                        'filename': filename,
+                        'section_id': section['id'],
+                        'section_heading': section['section_heading']
+                    })
+    
+    for image_info in watermarked_images:
+        image_info['width'], image_info['height'] = get_image_dimensions(image_info['path'])
+    
+    return dict(post_data), watermarked_images
 
-Generate a compelling, descriptive caption for this section image that:
-1. Accurately describes what's shown
-2. Connects to the section content
-3. Is engaging and informative
-4. Uses {context['caption_style'].lower()} style
-5. Is written in {context['caption_language']}
+_metadata_generator = None
 
-Keep the caption concise (1-2 sentences) and avoid redundancy.
-Return only the caption text, with no additional commentary or formatting."""
-        
-        # Call LLM service directly via the test endpoint
-        llm_response = requests.post(
-            'http://localhost:5002/api/llm/test',
-            json={
-                'prompt': full_prompt,
-                'model': 'mistral'
-            },
-            timeout=30
-        )
-        
-        if llm_response.status_code == 200:
-            result = llm_response.json()
-            if result.get('status') == 'success':
-                return result.get('response', '').strip()
-            else:
-                error_msg = result.get('error', 'Unknown error')
-                print(f"LLM API error: {error_msg}")
-                # Check if it's an Ollama connection error
-                if 'Connection refused' in error_msg or '11434' in error_msg:
-                    raise Exception("Ollama LLM service is not running. Please start Ollama to generate captions.")
-                else:
-                    raise Exception(f"LLM API error: {error_msg}")
-        else:
-            raise Exception(f"LLM API request failed: {llm_response.status_code}")
-            
-    except Exception as e:
-        print(f"Error in generate_caption_via_llm: {e}")
-        # Re-raise the exception instead of returning fallback captions
-        raise e
-
-def save_caption_to_database(image_info, caption, post_id):
-    """Save caption to appropriate database field"""
-    try:
-        # Clean up the caption
-        caption = clean_caption(caption)
-        words = caption.strip().split()
-        
-        with get_db_conn() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                if image_info['type'] == 'header':
-                    # Save to post.header_image_caption
-                    cur.execute("""
-                        UPDATE post 
-                        SET header_image_caption = %s, updated_at = CURRENT_TIMESTAMP
-                        WHERE id = %s
-                    """, (caption, post_id))
-                else:
-                    # Save to post_section.image_captions
-                    cur.execute("""
-                        UPDATE post_section 
-                        SET image_captions = %s
-                        WHERE post_id = %s AND id = %s
-                    """, (caption, post_id, image_info['section_id']))
-                
-                conn.commit()
-                print(f"Saved caption for {image_info['filename']}: {caption} ({len(words)} words)")
-                
-    except Exception as e:
-        print(f"Error saving caption to database: {e}")
-        raise
+def get_metadata_generator():
+    """Shared batched caption/alt text/title generator"""
+    global _metadata_generator
+    if _metadata_generator is None:
+        _metadata_generator = ImageMetadataGenerator(get_llm_client())
+    return _metadata_generator
 
 def clean_caption(caption):
     """Clean up caption by removing alternatives, quotes, and meta-commentary"""
@@ -872,23 +663,9 @@ def clean_caption(caption):
 @app.route('/api/process/status/<job_id>')
 def get_processing_status(job_id):
     """Check processing status for a job"""
-    try:
-        # For now, return a mock status
-        # In a real implementation, this would check a job queue or database
-        return jsonify({
-            'job_id': job_id,
-            'status': 'completed',
-            'progress': 100,
-            'message': 'Processing completed successfully',
-            'results': {
-                'processed_images': 5,
-                'errors': 0,
-                'output_paths': []
-            }
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    if not str(job_id).isdigit():
+        return jsonify({'error': 'Job not found'}), 404
+    return get_pipeline_status(int(job_id))
 
 # Image Management Features
 @app.route('/api/manage/images/<image_id>/preview')
@@ -1061,42 +838,49 @@ def get_processing_stats():
 def get_storage_stats():
     """Get storage usage statistics"""
     try:
-        # For now, return a mock response
+        summary = get_storage_ledger().summary(largest=int(request.args.get('largest', 10)))
+        
+        def mb(nbytes):
+            return round(nbytes / (1024 * 1024), 2)
+        
+        daily = summary['daily']
         return jsonify({
-            'total_storage_mb': 156.8,
-            'storage_by_type': {
-                'header_images': 12.5,
-                'section_images': 134.2,
-                'featured_images': 10.1
-            },
-            'storage_by_post': {
-                '53': 27.5,
-                '1': 15.2,
-                '2': 22.1
-            },
+            'total_storage_mb': mb(summary['total_bytes']),
+            'total_files': summary['total_files'],
+            'storage_by_type': {f"{image_type}_images": mb(nbytes)
+                                for image_type, nbytes in summary['by_type'].items()},
+            'storage_by_stage': {stage: mb(nbytes) for stage, nbytes in summary['by_stage'].items()},
+            'storage_by_post': {str(post_id): mb(nbytes) for post_id, nbytes in summary['by_post'].items()},
             'largest_files': [
                 {
-                    'filename': 'header.png',
-                    'post_id': 53,
-                    'size_mb': 2.8,
-                    'type': 'header'
-                },
-                {
-                    'filename': '713.png',
-                    'post_id': 53,
-                    'size_mb': 2.1,
-                    'type': 'section'
+                    'filename': entry['filename'],
+                    'post_id': entry['post_id'],
+                    'section_id': entry['section_id'],
+                    'size_mb': mb(entry['size_bytes']),
+                    'type': entry['type'],
+                    'stage': entry['stage']
                 }
+                for entry in summary['largest_files']
             ],
             'storage_trends': {
-                'daily_uploads_mb': [5.2, 3.8, 7.1, 4.5, 6.2],
-                'total_growth_mb': 45.8
+                'days': [day['day'] for day in daily],
+                'daily_uploads_mb': [mb(day['bytes_added']) for day in daily],
+                'total_growth_mb': mb(daily[-1]['total_bytes'] - daily[0]['total_bytes']
+                                      + daily[0]['bytes_added'] - daily[0]['bytes_removed']) if daily else 0
             }
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stats/storage/reconcile', methods=['POST'])
+def reconcile_storage_stats():
+    """Re-sync the storage ledger with files changed outside the app"""
+    try:
+        return jsonify({'success': True, **get_storage_ledger().reconcile()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ============================================================================
 # PROCESSING PIPELINE ENDPOINTS
 # ============================================================================
@@ -2049,380 +1833,165 @@ def generate_filename_from_title(title, max_length=50):
     
     return filename
 
-def optimize_image(input_path, output_path, settings):
-    """Optimize an image with the specified settings."""
-    from PIL import Image
-    
-    # Parse settings (format: format_width_quality)
-    parts = settings.split('_')
-    format_type = parts[0]  # webp, jpeg, png
-    max_width = int(parts[1])  # 800, 1200, 1600
-    quality = int(parts[2]) if len(parts) > 2 else 85  # 85, 100
-    
-    # Open image
-    with Image.open(input_path) as img:
-        # Convert to RGB if necessary (for JPEG/WebP)
-        if format_type in ['jpeg', 'webp'] and img.mode in ['RGBA', 'LA', 'P']:
-            # Create white background for transparent images
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-            img = background
-        
-        # Calculate new dimensions
-        width, height = img.size
-        if width > max_width:
-            ratio = max_width / width
-            new_width = max_width
-            new_height = int(height * ratio)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        # Save with appropriate settings
-        if format_type == 'webp':
-            img.save(output_path, 'WEBP', quality=quality, method=6)
-        elif format_type == 'jpeg':
-            img.save(output_path, 'JPEG', quality=quality, optimize=True)
-        elif format_type == 'png':
-            if quality == 100:  # Lossless
-                img.save(output_path, 'PNG', optimize=True)
-            else:
-                img.save(output_path, 'PNG', optimize=True, compress_level=9)
-        
-        return True
-
-@app.route('/api/optimize/preview/<int:post_id>')
-def preview_optimization(post_id):
-    """Preview what files will be optimized during optimization."""
-    try:
-        preview = []
-        settings = request.args.get('settings', 'webp_1200_85')  # Default to recommended settings
-        
-        # Get post title and section titles
-        with get_db_conn() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute("SELECT title FROM post WHERE id = %s", (post_id,))
-                post_result = cur.fetchone()
-                post_title = post_result['title'] if post_result else f"post_{post_id}"
-                
-                # Get section titles and selections
-                cur.execute("""
-                    SELECT id, section_heading, image_filename 
-                    FROM post_section 
-                    WHERE post_id = %s 
-                    ORDER BY section_order
-                """, (post_id,))
-                sections = cur.fetchall()
-                section_titles = {str(section['id']): section['section_heading'] for section in sections}
-                section_selections = {str(section['id']): section['image_filename'] for section in sections if section['image_filename']}
-        
-        # Determine file extension based on settings
-        format_type = settings.split('_')[0]
-        file_ext = format_type if format_type != 'jpeg' else 'jpg'
-        
-        # Preview header image selection
-        header_selection_file = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'selected_image.txt')
-        selected_header_filename = None
-        if os.path.exists(header_selection_file):
-            with open(header_selection_file, 'r') as f:
-                selected_header_filename = f.read().strip()
-        
-        if selected_header_filename:
-            header_new_name = f"{generate_filename_from_title(post_title)}.{file_ext}"
-            preview.append({
-                'type': 'header',
-                'original': selected_header_filename,
-                'new_name': header_new_name,
-                'settings': settings
-            })
-        
-        # Preview section image selections
-        sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-        for section_id, selected_filename in section_selections.items():
-            section_title = section_titles.get(section_id, f"Section {section_id}")
-            section_new_name = f"{generate_filename_from_title(section_title)}.{file_ext}"
-            preview.append({
-                'type': 'section',
-                'section_id': section_id,
-                'original': selected_filename,
-                'new_name': section_new_name,
-                'settings': settings
-            })
-        
-        # Add fallback images for sections without explicit selections
-        for section_id in section_titles.keys():
-            if section_id not in section_selections:
-                # Use first available image in raw directory
-                raw_dir = os.path.join(sections_path, section_id, 'raw')
-                if os.path.exists(raw_dir):
-                    for filename in os.listdir(raw_dir):
-                        if allowed_file(filename):
-                            section_title = section_titles.get(section_id, f"Section {section_id}")
-                            section_new_name = f"{generate_filename_from_title(section_title)}.{file_ext}"
-                            preview.append({
-                                'type': 'section',
-                                'section_id': section_id,
-                                'original': filename,
-                                'new_name': section_new_name,
-                                'settings': settings
-                            })
-                            break
-        
-        return jsonify({
-            'success': True,
-            'preview': preview
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/optimize/rename/<int:post_id>', methods=['POST'])
-def optimize_rename_images(post_id):
-    """Optimize selected images and move them to optimized stage."""
+@app.route('/api/optimize/preview/<int:post_id>')
+def preview_optimization(post_id):
+    """Preview what files will be optimized during optimization.
+    
+    Sizes and whether a cached derivative can be re-used come from the
+    derivative manifest; no image is decoded or encoded.
+    """
     try:
-        optimized_count = 0
-        settings = request.json.get('settings', 'webp_1200_85') if request.json else 'webp_1200_85'
-        
-        # Get post title and section titles
-        with get_db_conn() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute("SELECT title FROM post WHERE id = %s", (post_id,))
-                post_result = cur.fetchone()
-                post_title = post_result['title'] if post_result else f"post_{post_id}"
-                
-                # Get section titles and selections
-                cur.execute("""
-                    SELECT id, section_heading, image_filename 
-                    FROM post_section 
-                    WHERE post_id = %s 
-                    ORDER BY section_order
-                """, (post_id,))
-                sections = cur.fetchall()
-                section_titles = {str(section['id']): section['section_heading'] for section in sections}
-                section_selections = {str(section['id']): section['image_filename'] for section in sections if section['image_filename']}
-        
-        # Determine file extension based on settings
-        format_type = settings.split('_')[0]
-        file_ext = format_type if format_type != 'jpeg' else 'jpg'
-        
-        # Process header image selection
-        header_selection_file = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'selected_image.txt')
-        selected_header_filename = None
-        if os.path.exists(header_selection_file):
-            with open(header_selection_file, 'r') as f:
-                selected_header_filename = f.read().strip()
+        settings = request.args.get('settings', DEFAULT_SETTINGS)  # Default to recommended settings
+        tasks = get_optimize_tasks(post_id, settings)
         
-        if selected_header_filename:
-            header_old_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'raw', selected_header_filename)
-            header_new_name = f"{generate_filename_from_title(post_title)}.{file_ext}"
-            header_new_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'optimized', header_new_name)
-            
-            # Create optimized directory
-            os.makedirs(os.path.dirname(header_new_path), exist_ok=True)
-            
-            # Optimize and save image
-            if os.path.exists(header_old_path):
-                if optimize_image(header_old_path, header_new_path, settings):
-                    optimized_count += 1
+        try:
+            cached = get_pipeline().manifest.outputs_for_sources([task['source'] for task in tasks], settings)
+        except Exception as e:
+            logger.warning(f"Derivative manifest unavailable: {e}")
+            cached = {}
         
-        # Process section images using the same logic as the selected endpoint
-        sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-        for section_id in section_titles.keys():
-            selected_filename = section_selections.get(section_id)
-            section_processed = False
-            
-            if selected_filename:
-                # Try to use the selected filename from database
-                raw_path = os.path.join(sections_path, section_id, 'raw', selected_filename)
-                if os.path.exists(raw_path):
-                    section_old_path = raw_path
-                    section_title = section_titles.get(section_id, f"Section {section_id}")
-                    section_new_name = f"{generate_filename_from_title(section_title)}.{file_ext}"
-                    section_new_path = os.path.join(sections_path, section_id, 'optimized', section_new_name)
-                    
-                    # Create optimized directory
-                    os.makedirs(os.path.dirname(section_new_path), exist_ok=True)
-                    
-                    # Optimize and save image
-                    if optimize_image(section_old_path, section_new_path, settings):
-                        optimized_count += 1
-                        section_processed = True
-                else:
-                    # Check optimized directory
-                    optimized_path = os.path.join(sections_path, section_id, 'optimized', selected_filename)
-                    if os.path.exists(optimized_path):
-                        section_old_path = optimized_path
-                        section_title = section_titles.get(section_id, f"Section {section_id}")
-                        section_new_name = f"{generate_filename_from_title(section_title)}.{file_ext}"
-                        section_new_path = os.path.join(sections_path, section_id, 'optimized', section_new_name)
-                        
-                        # Create optimized directory
-                        os.makedirs(os.path.dirname(section_new_path), exist_ok=True)
-                        
-                        # Optimize and save image
-                        if optimize_image(section_old_path, section_new_path, settings):
-                            optimized_count += 1
-                            section_processed = True
-            
-            # If not processed yet, use fallback to first available image
-            if not section_processed:
-                raw_dir = os.path.join(sections_path, section_id, 'raw')
-                if os.path.exists(raw_dir):
-                    for filename in os.listdir(raw_dir):
-                        if allowed_file(filename):
-                            section_old_path = os.path.join(raw_dir, filename)
-                            section_title = section_titles.get(section_id, f"Section {section_id}")
-                            section_new_name = f"{generate_filename_from_title(section_title)}.{file_ext}"
-                            section_new_path = os.path.join(sections_path, section_id, 'optimized', section_new_name)
-                            
-                            # Create optimized directory
-                            os.makedirs(os.path.dirname(section_new_path), exist_ok=True)
-                            
-                            # Optimize and save image
-                            if optimize_image(section_old_path, section_new_path, settings):
-                                optimized_count += 1
-                                break
+        preview = []
+        for task in tasks:
+            entry = cached.get(task['source'])
+            item = {
+                'type': task['image_type'],
+                'original': os.path.basename(task['source']),
+                'new_name': os.path.basename(task['optimized_path']),
+                'settings': settings,
+                'cached': entry is not None,
+                'original_size': entry['source_size'] if entry else None,
+                'optimized_size': entry['size_bytes'] if entry else None
+            }
+            if task['image_type'] == 'section':
+                item['section_id'] = str(task['section_id'])
+            preview.append(item)
         
         return jsonify({
             'success': True,
-            'optimized_count': optimized_count,
-            'message': f'Successfully optimized and moved {optimized_count} images to optimized stage'
+            'preview': preview
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def load_watermark(watermark_path):
-    """Load the watermark image."""
-    try:
-        from PIL import Image
-        watermark = Image.open(watermark_path)
-        return watermark
-    except Exception as e:
-        print(f"❌ Error loading watermark: {e}")
-        return None
-
-def get_font(size=20):
-    """Get a font for text rendering."""
-    try:
-        from PIL import ImageFont
-        # Try to use a system font
-        font = ImageFont.truetype("/System/Library/Fonts/Arial.ttf", size)
-    except:
-        try:
-            # Fallback to default font
-            font = ImageFont.load_default()
-        except:
-            # Last resort - no font
-            font = None
-    
-    return font
-
-def add_watermark(image, watermark, position='bottom-right'):
-    """Add watermark to image with 0% transparency against 80% transparent background."""
-    if watermark is None:
-        return image
-    
-    # Resize watermark to reasonable size (max 200px width)
-    watermark_width = min(200, image.width // 4)
-    watermark_height = int(watermark.height * (watermark_width / watermark.width))
-    watermark_resized = watermark.resize((watermark_width, watermark_height), Image.Resampling.LANCZOS)
+_pipeline = None
+
+def get_pipeline():
+    """Shared multi-core image pipeline (process pool created on first use)"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = ImagePipeline(get_db_conn, on_outputs=record_written)
+    return _pipeline
+
+def get_post_image_context(post_id):
+    """Post title, section titles and section image selections for a post."""
+    with get_db_conn() as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            cur.execute("SELECT title FROM post WHERE id = %s", (post_id,))
+            post_result = cur.fetchone()
+            post_title = post_result['title'] if post_result else f"post_{post_id}"
+            
+            # Get section titles and selections
+            cur.execute("""
+                SELECT id, section_heading, image_filename 
+                FROM post_section 
+                WHERE post_id = %s 
+                ORDER BY section_order
+            """, (post_id,))
+            sections = cur.fetchall()
+            section_titles = {str(section['id']): section['section_heading'] for section in sections}
+            section_selections = {str(section['id']): section['image_filename'] for section in sections if section['image_filename']}
+    return post_title, section_titles, section_selections
+
+def get_optimize_tasks(post_id, settings, watermark=False):
+    """One pipeline task per selected image (header plus one per section).
     
-    # Create watermark with 0% transparency (fully visible)
-    watermark_with_alpha = Image.new('RGBA', watermark_resized.size, (0, 0, 0, 0))
-    watermark_with_alpha.paste(watermark_resized, (0, 0))
+    Sections without a selection fall back to the first raw image. With
+    ``watermark`` the watermarked copy is written in the same pass.
+    """
+    post_title, section_titles, section_selections = get_post_image_context(post_id)
     
-    # Calculate position with 10px margins
-    margin = 10
-    if position == 'bottom-right':
-        x = image.width - watermark_width - margin
-        y = image.height - watermark_height - margin
-    else:
-        x = margin
-        y = image.height - watermark_height - margin
+    # Determine file extension based on settings
+    format_type = settings.split('_')[0]
+    file_ext = format_type if format_type != 'jpeg' else 'jpg'
+    post_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id))
     
-    # Create new image with alpha channel if needed
-    if image.mode != 'RGBA':
-        image = image.convert('RGBA')
+    def task(source, base_dir, title, image_type, section_id=None):
+        slug = generate_filename_from_title(title)
+        return {
+            'post_id': post_id,
+            'source': source,
+            'image_id': os.path.relpath(source, post_path),
+            'image_type': image_type,
+            'section_id': int(section_id) if section_id else None,
+            'settings': settings,
+            'optimized_path': os.path.join(base_dir, 'optimized', f"{slug}.{file_ext}"),
+            'watermarked_path': os.path.join(base_dir, 'watermarked', f"{slug}.webp") if watermark else None,
+            'watermark_path': WATERMARK_PATH
+        }
     
-    # Create grey background with 80% transparency (20% opacity)
-    grey_bg = Image.new('RGBA', (watermark_width + 20, watermark_height + 20), (128, 128, 128, 51))  # Grey with 20% alpha (80% transparent)
+    tasks = []
     
-    # Paste grey background first
-    bg_x = x - 10
-    bg_y = y - 10
-    image.paste(grey_bg, (bg_x, bg_y), grey_bg)
+    # Header image selection
+    header_selection_file = os.path.join(post_path, 'header', 'selected_image.txt')
+    if os.path.exists(header_selection_file):
+        with open(header_selection_file, 'r') as f:
+            selected_header_filename = f.read().strip()
+        header_old_path = os.path.join(post_path, 'header', 'raw', selected_header_filename)
+        if selected_header_filename and os.path.exists(header_old_path):
+            tasks.append(task(header_old_path, os.path.join(post_path, 'header'), post_title, 'header'))
     
-    # Paste fully visible watermark
-    image.paste(watermark_with_alpha, (x, y), watermark_with_alpha)
+    # Section images: selected raw image, else selected optimized image, else first raw image
+    sections_path = os.path.join(post_path, 'sections')
+    for section_id, section_title in section_titles.items():
+        section_title = section_title or f"Section {section_id}"
+        section_dir = os.path.join(sections_path, section_id)
+        selected_filename = section_selections.get(section_id)
+        source = None
+        if selected_filename:
+            for stage in ('raw', 'optimized'):
+                candidate = os.path.join(section_dir, stage, selected_filename)
+                if os.path.exists(candidate):
+                    source = candidate
+                    break
+        if source is None:
+            raw_images = list_images(post_id, 'sections', 'raw', section_id)
+            if raw_images:
+                source = os.path.join(section_dir, 'raw', raw_images[0])
+        if source:
+            tasks.append(task(source, section_dir, section_title, 'section', section_id))
     
-    return image
+    return tasks
 
-def add_ai_generated_text(image):
-    """Add 'AI-generated image' text to bottom left."""
-    from PIL import ImageDraw
-    draw = ImageDraw.Draw(image)
-    font = get_font(16)
-    
-    text = "AI-generated image"
-    text_color = (128, 128, 128, 180)  # Grey with transparency
-    
-    # Calculate text position (bottom left with padding)
-    if font:
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-    else:
-        text_width = len(text) * 8  # Approximate width
-        text_height = 16
-    
-    x = 20
-    y = image.height - text_height - 20
-    
-    # Draw text
-    if font:
-        draw.text((x, y), text, fill=text_color, font=font)
-    else:
-        # Fallback without font
-        draw.text((x, y), text, fill=text_color)
+@app.route('/api/optimize/rename/<int:post_id>', methods=['POST'])
+def optimize_rename_images(post_id):
+    """Optimize selected images and move them to optimized stage.
     
-    return image
-
-def watermark_single_image(image_path, watermark, output_path):
-    """Process a single image with watermark and AI text."""
+    Images are processed in parallel across all cores. Pass
+    ``"watermark": true`` to write the watermarked stage in the same pass.
+    """
     try:
-        from PIL import Image
-        print(f"🖼️  Processing: {os.path.basename(image_path)}")
-        print(f"DEBUG: Image path: {image_path}")
-        print(f"DEBUG: Image path exists: {os.path.exists(image_path)}")
-        print(f"DEBUG: Output path: {output_path}")
-        
-        # Load image
-        image = Image.open(image_path)
-        print(f"DEBUG: Image loaded successfully, size: {image.size}")
-        
-        # Add watermark
-        image = add_watermark(image, watermark, 'bottom-right')
-        print(f"DEBUG: Watermark added")
-        
-        # Add AI-generated text
-        image = add_ai_generated_text(image)
-        print(f"DEBUG: AI text added")
-        
-        # Save as WebP
-        if output_path.endswith('.webp'):
-            image.save(output_path, 'WEBP', quality=85, method=6)
-        else:
-            image.save(output_path, optimize=True)
+        data = request.get_json(silent=True) or {}
+        settings = data.get('settings', DEFAULT_SETTINGS)
+        watermark = bool(data.get('watermark', False))
+        
+        tasks = get_optimize_tasks(post_id, settings, watermark)
+        results = get_pipeline().run(tasks)
+        optimized_count = sum(1 for result in results if result['success'])
+        errors = [result['error'] for result in results if not result['success']]
         
-        print(f"✅ Saved: {os.path.basename(output_path)}")
-        return True
+        response = {
+            'success': True,
+            'optimized_count': optimized_count,
+            'errors': errors,
+            'message': f'Successfully optimized and moved {optimized_count} images to optimized stage'
+        }
+        if watermark:
+            response['watermarked_count'] = optimized_count
+        return jsonify(response)
         
     except Exception as e:
-        print(f"❌ Error processing {os.path.basename(image_path)}: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/watermark/preview/<int:post_id>')
 def preview_watermarking(post_id):
@@ -2530,88 +2099,46 @@ def preview_watermarking(post_id):
 
 @app.route('/api/watermark/process/<int:post_id>', methods=['POST'])
 def process_watermarking(post_id):
-    """Process watermarking for a post."""
+    """Process watermarking for a post (all optimized images, in parallel)."""
     try:
-        from PIL import Image
-        
-        # Load watermark
-        watermark_path = os.path.join('static', 'images', 'site', 'clan-watermark.png')
-        watermark = load_watermark(watermark_path)
-        if watermark is None:
+        # Decoded once per process; worker processes keep their own copy
+        if not get_compositor(WATERMARK_PATH).load():
             return jsonify({'error': 'Could not load watermark image'}), 500
         
-        watermarked_count = 0
+        post_title, section_titles, section_selections = get_post_image_context(post_id)
+        post_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id))
         
-        # Get post and section data
-        with get_db_conn() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                # Get post title
-                cur.execute("SELECT title FROM post WHERE id = %s", (post_id,))
-                post_result = cur.fetchone()
-                post_title = post_result['title'] if post_result else f"Post {post_id}"
-                
-                # Get section titles and selections
-                cur.execute("""
-                    SELECT id, section_heading, image_filename
-                    FROM post_section 
-                    WHERE post_id = %s 
-                    ORDER BY section_order
-                """, (post_id,))
-                sections = cur.fetchall()
-                section_titles = {str(section['id']): section['section_heading'] for section in sections}
-                section_selections = {str(section['id']): section['image_filename'] for section in sections if section['image_filename']}
+        # One task per output file; when several optimized images map to the
+        # same name the last one wins, as it did when they were written in turn
+        tasks = {}
+        stage_dirs = [(os.path.join(post_path, 'header'), post_title, 'header', None)]
+        for section_id, section_title in section_titles.items():
+            stage_dirs.append((os.path.join(post_path, 'sections', section_id),
+                               section_title or f"Section {section_id}", 'section', int(section_id)))
         
-        # Process header image - process all optimized images
-        header_optimized_dir = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'optimized')
-        print(f"DEBUG: Processing header optimized dir: {header_optimized_dir}")
-        if os.path.exists(header_optimized_dir):
-            for filename in os.listdir(header_optimized_dir):
+        for base_dir, title, image_type, section_id in stage_dirs:
+            optimized_dir = os.path.join(base_dir, 'optimized')
+            if not os.path.exists(optimized_dir):
+                continue
+            output_path = os.path.join(base_dir, 'watermarked', f"{generate_filename_from_title(title)}.webp")
+            for filename in os.listdir(optimized_dir):
                 if allowed_file(filename):
-                    header_old_path = os.path.join(header_optimized_dir, filename)
-                    header_new_name = f"{generate_filename_from_title(post_title)}.webp"
-                    header_new_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'watermarked', header_new_name)
-                    
-                    print(f"DEBUG: Processing header image: {header_old_path} -> {header_new_path}")
-                    
-                    # Create watermarked directory
-                    os.makedirs(os.path.dirname(header_new_path), exist_ok=True)
-                    
-                    # Process image
-                    if watermark_single_image(header_old_path, watermark, header_new_path):
-                        watermarked_count += 1
-                        print(f"DEBUG: Successfully watermarked header image")
-                    else:
-                        print(f"DEBUG: Failed to watermark header image")
+                    tasks[output_path] = {
+                        'post_id': post_id,
+                        'source': os.path.join(optimized_dir, filename),
+                        'image_type': image_type,
+                        'section_id': section_id,
+                        'watermarked_path': output_path,
+                        'watermark_path': WATERMARK_PATH
+                    }
         
-        # Process section images - process all optimized images
-        sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-        print(f"DEBUG: Processing sections path: {sections_path}")
-        for section_id in section_titles.keys():
-            optimized_dir = os.path.join(sections_path, section_id, 'optimized')
-            print(f"DEBUG: Processing section {section_id} optimized dir: {optimized_dir}")
-            if os.path.exists(optimized_dir):
-                for filename in os.listdir(optimized_dir):
-                    if allowed_file(filename):
-                        section_old_path = os.path.join(optimized_dir, filename)
-                        section_title = section_titles.get(section_id, f"Section {section_id}")
-                        section_new_name = f"{generate_filename_from_title(section_title)}.webp"
-                        section_new_path = os.path.join(sections_path, section_id, 'watermarked', section_new_name)
-                        
-                        print(f"DEBUG: Processing section image: {section_old_path} -> {section_new_path}")
-                        
-                        # Create watermarked directory
-                        os.makedirs(os.path.dirname(section_new_path), exist_ok=True)
-                        
-                        # Process image
-                        if watermark_single_image(section_old_path, watermark, section_new_path):
-                            watermarked_count += 1
-                            print(f"DEBUG: Successfully watermarked section {section_id} image")
-                        else:
-                            print(f"DEBUG: Failed to watermark section {section_id} image")
+        results = get_pipeline().run(list(tasks.values()))
+        watermarked_count = sum(1 for result in results if result['success'])
         
         return jsonify({
             'success': True,
             'watermarked_count': watermarked_count,
+            'errors': [result['error'] for result in results if not result['success']],
             'message': f'Successfully watermarked {watermarked_count} images'
         })
         
@@ -2670,33 +2197,13 @@ def test_watermark_loading(post_id):
 def get_watermarked_stats(post_id):
     """Get statistics for watermarked images."""
     try:
-        total_count = 0
-        total_size = 0
-        
-        # Count header watermarked images
-        header_watermarked_dir = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'watermarked')
-        if os.path.exists(header_watermarked_dir):
-            for filename in os.listdir(header_watermarked_dir):
-                if allowed_file(filename):
-                    file_path = os.path.join(header_watermarked_dir, filename)
-                    total_count += 1
-                    total_size += os.path.getsize(file_path)
-        
-        # Count section watermarked images
-        sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-        if os.path.exists(sections_path):
-            for section_dir in os.listdir(sections_path):
-                section_watermarked_dir = os.path.join(sections_path, section_dir, 'watermarked')
-                if os.path.exists(section_watermarked_dir):
-                    for filename in os.listdir(section_watermarked_dir):
-                        if allowed_file(filename):
-                            file_path = os.path.join(section_watermarked_dir, filename)
-                            total_count += 1
-                            total_size += os.path.getsize(file_path)
+        storage = get_post_storage(post_id)
+        watermarked = [storage.get((image_type, 'watermarked'), {'files': 0, 'bytes': 0})
+                       for image_type in ('header', 'section')]
         
         return jsonify({
-            'watermarked_count': total_count,
-            'watermarked_size': total_size
+            'watermarked_count': sum(entry['files'] for entry in watermarked),
+            'watermarked_size': sum(entry['bytes'] for entry in watermarked)
         })
         
     except Exception as e:
@@ -2869,117 +2376,46 @@ Return only the caption text, with no additional commentary or formatting."""
 
 @app.route('/api/process/metadata', methods=['POST'])
 def generate_metadata():
-    """Generate alt text and title attributes for watermarked images using LLM"""
+    """Generate alt text and title attributes for watermarked images using LLM (one batched request per post)"""
     try:
         data = request.get_json()
         post_id = data.get('post_id')
+        # Same style/language as captioning, so both steps share one cached generation
+        caption_style = data.get('caption_style', 'Descriptive')
+        caption_language = data.get('caption_language', 'English')
         
         if not post_id:
             return jsonify({'error': 'Missing post_id'}), 400
         
-        # Get post and section data for context
-        with get_db_conn() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                # Get post data
-                cur.execute("""
-                    SELECT p.title, p.subtitle, pd.basic_idea, pd.idea_scope
-                    FROM post p
-                    LEFT JOIN post_development pd ON p.id = pd.post_id
-                    WHERE p.id = %s
-                """, (post_id,))
-                post_data = cur.fetchone()
-                
-                if not post_data:
-                    return jsonify({'error': 'Post not found'}), 404
-                
-                # Get section data
-                cur.execute("""
-                    SELECT id, section_heading, section_description, image_filename
-                    FROM post_section
-                    WHERE post_id = %s
-                    ORDER BY section_order
-                """, (post_id,))
-                sections = cur.fetchall()
-        
-                # Get watermarked images
-                watermarked_images = []
-                
-                # Check header watermarked images
-                header_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'header', 'watermarked')
-                if os.path.exists(header_path):
-                    for filename in os.listdir(header_path):
-                        if allowed_file(filename):
-                            watermarked_images.append({
-                                'type': 'header',
-                                'path': os.path.join(header_path, filename),
-                                'filename': filename,
-                                'section_id': None
-                            })
-                
-                # Check section watermarked images
-                sections_path = os.path.join(app.config['UPLOAD_FOLDER'], str(post_id), 'sections')
-                for section in sections:
-                    section_watermarked_path = os.path.join(sections_path, str(section['id']), 'watermarked')
-                    if os.path.exists(section_watermarked_path):
-                        for filename in os.listdir(section_watermarked_path):
-                            if allowed_file(filename):
-                                watermarked_images.append({
-                                    'type': 'section',
-                                    'path': os.path.join(section_watermarked_path, filename),
-                                    'filename': filename,
-                                    'section_id': section['id'],
-                                    'section_heading': section['section_heading']
-                                })
-                
-                if not watermarked_images:
-                    return jsonify({'error': 'No watermarked images found'}), 404
+        post_data, watermarked_images = find_watermarked_images(post_id)
+        if not post_data:
+            return jsonify({'error': 'Post not found'}), 404
+        if not watermarked_images:
+            return jsonify({'error': 'No watermarked images found'}), 404
         
-                # Generate metadata using LLM
-                metadata_generated = 0
-                metadata_data = []
-                
-                for image_info in watermarked_images:
-                    try:
-                        # Get image dimensions
-                        width, height = get_image_dimensions(image_info['path'])
-                        
-                        # Prepare context for LLM
-                        context = {
-                            'post_title': post_data['title'],
-                            'post_subtitle': post_data['subtitle'],
-                            'image_type': image_info['type'],
-                            'image_width': width,
-                            'image_height': height
-                        }
-                        
-                        if image_info['type'] == 'section':
-                            context['section_heading'] = image_info['section_heading']
-                        
-                        # Generate alt text and title using LLM
-                        alt_text = generate_alt_text_via_llm(context, image_info)
-                        title_text = generate_title_via_llm(context, image_info)
-                        
-                        # Save metadata to database
-                        save_metadata_to_database(image_info, alt_text, title_text, width, height, post_id)
-                        
-                        metadata_data.append({
-                            'filename': image_info['filename'],
-                            'type': image_info['type'],
-                            'alt_text': alt_text,
-                            'title_text': title_text,
-                            'width': width,
-                            'height': height
-                        })
-                        
-                        metadata_generated += 1
-                        
-                    except Exception as e:
-                        print(f"Error generating metadata for {image_info['filename']}: {e}")
-                        continue
+        try:
+            results = get_metadata_generator().generate(post_data, watermarked_images, caption_style,
+                                                        caption_language, bypass_cache=bool(data.get('regenerate')))
+        except LLMConnectionError:
+            return jsonify({'error': 'Ollama LLM service is not running. Please start Ollama to generate metadata.'}), 503
+        
+        for result in results:
+            result['alt_text'] = clean_caption(result['alt_text'])
+            result['title'] = clean_caption(result['title'])
+        save_metadata(get_db_conn, post_id, results, ['title'])
+        
+        metadata_data = [{
+            'filename': result['filename'],
+            'type': result['type'],
+            'alt_text': result['alt_text'],
+            'title_text': result['title'],
+            'width': result['width'],
+            'height': result['height']
+        } for result in results]
         
         return jsonify({
             'success': True,
-            'metadata_generated': metadata_generated,
+            'metadata_generated': len(metadata_data),
             'metadata': metadata_data
         })
         
@@ -3053,173 +2489,5 @@ def get_image_dimensions(image_path):
         print(f"Error getting image dimensions for {image_path}: {e}")
         return 800, 600  # Default fallback dimensions
 
-def generate_alt_text_via_llm(context, image_info):
-    """Generate alt text using LLM"""
-    try:
-        # Fetch prompts from workflow system
-        system_prompt_response = requests.get('http://localhost:5000/api/workflow/prompts/all')
-        if system_prompt_response.status_code == 200:
-            prompts = system_prompt_response.json()
-            
-            # Find the alt text prompts (IDs 112, 113)
-            system_prompt = next((p for p in prompts if p['id'] == 112), None)
-            task_prompt = next((p for p in prompts if p['id'] == 113), None)
-            
-            if system_prompt and task_prompt:
-                system_content = system_prompt.get('prompt_text', '')
-                task_content = task_prompt.get('prompt_text', '')
-                
-                # Build context information
-                if context['image_type'] == 'header':
-                    context_info = f"Post: {context['post_title']} - {context['post_subtitle']}"
-                else:
-                    context_info = f"Section: {context['section_heading']}"
-                
-                full_prompt = f"""{system_content}
-
-{task_content}
-
-{context_info}
-
-Write exactly 6-8 words:"""
-            else:
-                # Fallback prompt
-                full_prompt = f"""Generate a concise alt text (6-8 words) for an image in a blog post.
-
-Context: {context_info}
-Image type: {context['image_type']}
-Dimensions: {context['image_width']}x{context['image_height']}
-
-Write only the alt text, no quotes or additional text:"""
-        else:
-            # Fallback prompt if API call fails
-            full_prompt = f"""Generate a concise alt text (6-8 words) for an image in a blog post.
-
-Context: {context_info}
-Image type: {context['image_type']}
-Dimensions: {context['image_width']}x{context['image_height']}
-
-Write only the alt text, no quotes or additional text:"""
-        
-        # Call LLM service
-        llm_response = requests.post('http://localhost:5002/api/llm/test', json={
-            'prompt': full_prompt
-        }, timeout=30)
-        
-        if llm_response.status_code == 200:
-            response_data = llm_response.json()
-            if response_data.get('status') == 'success':
-                alt_text = response_data.get('response', '').strip()
-                return clean_caption(alt_text)
-            else:
-                raise Exception(f"LLM service error: {response_data.get('error', 'Unknown error')}")
-        else:
-            raise Exception(f"LLM service returned status {llm_response.status_code}")
-            
-    except Exception as e:
-        print(f"Error generating alt text: {e}")
-        # Fallback alt text
-        if context['image_type'] == 'header':
-            return f"Header image for {context['post_title']}"
-        else:
-            return f"Image for {context['section_heading']}"
-
-def generate_title_via_llm(context, image_info):
-    """Generate title attribute using LLM"""
-    try:
-        # Fetch prompts from workflow system
-        system_prompt_response = requests.get('http://localhost:5000/api/workflow/prompts/all')
-        if system_prompt_response.status_code == 200:
-            prompts = system_prompt_response.json()
-            
-            # Find the title prompts (IDs 114, 115)
-            system_prompt = next((p for p in prompts if p['id'] == 114), None)
-            task_prompt = next((p for p in prompts if p['id'] == 115), None)
-            
-            if system_prompt and task_prompt:
-                system_content = system_prompt.get('prompt_text', '')
-                task_content = task_prompt.get('prompt_text', '')
-                
-                # Build context information
-                if context['image_type'] == 'header':
-                    context_info = f"Post: {context['post_title']} - {context['post_subtitle']}"
-                else:
-                    context_info = f"Section: {context['section_heading']}"
-                
-                full_prompt = f"""{system_content}
-
-{task_content}
-
-{context_info}
-
-Write exactly 6-8 words:"""
-            else:
-                # Fallback prompt
-                full_prompt = f"""Generate a concise title attribute (6-8 words) for an image in a blog post.
-
-Context: {context_info}
-Image type: {context['image_type']}
-Dimensions: {context['image_width']}x{context['image_height']}
-
-Write only the title, no quotes or additional text:"""
-        else:
-            # Fallback prompt if API call fails
-            full_prompt = f"""Generate a concise title attribute (6-8 words) for an image in a blog post.
-
-Context: {context_info}
-Image type: {context['image_type']}
-Dimensions: {context['image_width']}x{context['image_height']}
-
-Write only the title, no quotes or additional text:"""
-        
-        # Call LLM service
-        llm_response = requests.post('http://localhost:5002/api/llm/test', json={
-            'prompt': full_prompt
-        }, timeout=30)
-        
-        if llm_response.status_code == 200:
-            response_data = llm_response.json()
-            if response_data.get('status') == 'success':
-                title_text = response_data.get('response', '').strip()
-                return clean_caption(title_text)
-            else:
-                raise Exception(f"LLM service error: {response_data.get('error', 'Unknown error')}")
-        else:
-            raise Exception(f"LLM service returned status {llm_response.status_code}")
-            
-    except Exception as e:
-        print(f"Error generating title: {e}")
-        # Fallback title
-        if context['image_type'] == 'header':
-            return f"Header image for {context['post_title']}"
-        else:
-            return f"Image for {context['section_heading']}"
-
-def save_metadata_to_database(image_info, alt_text, title_text, width, height, post_id):
-    """Save metadata to database"""
-    try:
-        with get_db_conn() as conn:
-            with conn.cursor() as cur:
-                if image_info['type'] == 'header':
-                    # Update post table
-                    cur.execute("""
-                        UPDATE post 
-                        SET header_image_title = %s, header_image_width = %s, header_image_height = %s
-                        WHERE id = %s
-                    """, (title_text, width, height, post_id))
-                else:
-                    # Update post_section table
-                    cur.execute("""
-                        UPDATE post_section 
-                        SET image_title = %s, image_width = %s, image_height = %s
-                        WHERE id = %s AND post_id = %s
-                    """, (title_text, width, height, image_info['section_id'], post_id))
-                
-                conn.commit()
-                
-    except Exception as e:
-        print(f"Error saving metadata to database: {e}")
-        raise
-
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=port) 
\ No newline at end of file
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Content-addressed derivative store for blog-images
+Encoded derivatives (optimized and watermarked images) are stored once per
+source content hash plus settings variant, and hard-linked into the post
+directories. Re-running optimize or watermark on an unchanged source is a
+lookup and a link instead of a WebP method=6 encode.
+
+The filesystem store is authoritative for whether a derivative exists. The
+image_derivatives / image_derivative_outputs manifest tables record sizes,
+usage (for LRU eviction) and which post files came from which derivative,
+so previews can answer without touching the files.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv('IMAGE_DERIVATIVE_CACHE_DIR',
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'derivatives'))
+
+# Evict least recently used derivatives once the store grows past this
+CACHE_MAX_BYTES = int(os.getenv('IMAGE_DERIVATIVE_CACHE_MB', 2048)) * 1024 * 1024
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS image_derivatives (
+        cache_key VARCHAR(200) PRIMARY KEY,
+        source_hash CHAR(64) NOT NULL,
+        variant VARCHAR(100) NOT NULL,
+        store_path TEXT NOT NULL,
+        size_bytes BIGINT NOT NULL,
+        width INTEGER,
+        height INTEGER,
+        hits INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT NOW(),
+        last_used_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_image_derivatives_last_used ON image_derivatives (last_used_at)",
+    """
+    CREATE TABLE IF NOT EXISTS image_derivative_outputs (
+        output_path TEXT PRIMARY KEY,
+        post_id INTEGER,
+        stage VARCHAR(20) NOT NULL,
+        cache_key VARCHAR(200) NOT NULL,
+        variant VARCHAR(100) NOT NULL,
+        source_path TEXT NOT NULL,
+        source_hash CHAR(64) NOT NULL,
+        source_size BIGINT,
+        source_mtime_ns BIGINT,
+        size_bytes BIGINT NOT NULL,
+        width INTEGER,
+        height INTEGER,
+        updated_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_image_derivative_outputs_post ON image_derivative_outputs (post_id, stage)",
+    "CREATE INDEX IF NOT EXISTS idx_image_derivative_outputs_source ON image_derivative_outputs (source_path, variant)",
+]
+
+
+# ============================================================================
+# FILESYSTEM STORE (safe to use from worker processes)
+# ============================================================================
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(source_hash: str, variant: str) -> str:
+    return f"{source_hash}_{variant}"
+
+
+def store_path(key: str, ext: str) -> str:
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.{ext}")
+
+
+def lookup(key: str, ext: str) -> Optional[str]:
+    """Path of a stored derivative, or None"""
+    path = store_path(key, ext)
+    return path if os.path.exists(path) else None
+
+
+def temp_path(key: str, ext: str) -> str:
+    """Where to encode a new derivative before it is published with add()"""
+    path = store_path(key, ext)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return f"{path}.{uuid.uuid4().hex[:8]}.tmp.{ext}"
+
+
+def add(tmp: str, key: str, ext: str) -> str:
+    """Atomically publish an encoded temp file as the derivative for ``key``"""
+    path = store_path(key, ext)
+    os.replace(tmp, path)
+    return path
+
+
+def link_into_place(stored: str, output_path: str):
+    """Hard-link a stored derivative to ``output_path`` (copy across devices).
+
+    The output is replaced atomically, so a file being served is never seen
+    half-written and the stored copy is never written through.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp = f"{output_path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        os.link(stored, tmp)
+    except OSError:
+        shutil.copy2(stored, tmp)
+    os.replace(tmp, output_path)
+
+
+def source_info(path: str, known_hash: Optional[str] = None) -> Dict:
+    """Hash plus the stat fields used to trust a previously computed hash"""
+    stat = os.stat(path)
+    return {
+        'source_path': path,
+        'source_hash': known_hash or file_hash(path),
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns
+    }
+
+
+# ============================================================================
+# MANIFEST (web process)
+# ============================================================================
+
+class DerivativeManifest:
+    """Manifest tables over the derivative store, with size-bounded LRU eviction"""
+
+    def __init__(self, connect: Callable, max_bytes: int = CACHE_MAX_BYTES):
+        self.connect = connect
+        self.max_bytes = max_bytes
+        self._schema_ready = False
+        self._lock = threading.Lock()
+
+    def _execute(self, callback):
+        conn = self.connect()
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    if not self._schema_ready:
+                        for sql in SCHEMA_SQL:
+                            cur.execute(sql)
+                        self._schema_ready = True
+                    return callback(cur)
+        finally:
+            conn.close()
+
+    def known_hashes(self, paths: Iterable[str]) -> Dict[str, str]:
+        """Source hashes from the manifest for files whose size and mtime still match"""
+        stats = {}
+        for path in set(paths):
+            try:
+                stat = os.stat(path)
+                stats[path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+        if not stats:
+            return {}
+
+        def query(cur):
+            cur.execute("""
+                SELECT DISTINCT ON (source_path) source_path, source_hash, source_size, source_mtime_ns
+                FROM image_derivative_outputs
+                WHERE source_path = ANY(%s)
+                ORDER BY source_path, updated_at DESC
+            """, (list(stats),))
+            return {path: source_hash for path, source_hash, size, mtime in cur.fetchall()
+                    if stats.get(path) == (size, mtime)}
+        return self._execute(query)
+
+    def record(self, derivatives: List[Dict]):
+        """Upsert derivative and output rows reported by the pipeline workers"""
+        if not derivatives:
+            return
+
+        def write(cur):
+            for d in derivatives:
+                cur.execute("""
+                    INSERT INTO image_derivatives
+                    (cache_key, source_hash, variant, store_path, size_bytes, width, height, hits)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (cache_key) DO UPDATE
+                    SET store_path = EXCLUDED.store_path, size_bytes = EXCLUDED.size_bytes,
+                        hits = image_derivatives.hits + EXCLUDED.hits, last_used_at = NOW()
+                """, (d['cache_key'], d['source_hash'], d['variant'], d['store_path'], d['size_bytes'],
+                      d.get('width'), d.get('height'), 1 if d['hit'] else 0))
+                cur.execute("""
+                    INSERT INTO image_derivative_outputs
+                    (output_path, post_id, stage, cache_key, variant, source_path, source_hash,
+                     source_size, source_mtime_ns, size_bytes, width, height)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (output_path) DO UPDATE
+                    SET post_id = EXCLUDED.post_id, stage = EXCLUDED.stage, cache_key = EXCLUDED.cache_key,
+                        variant = EXCLUDED.variant, source_path = EXCLUDED.source_path,
+                        source_hash = EXCLUDED.source_hash, source_size = EXCLUDED.source_size,
+                        source_mtime_ns = EXCLUDED.source_mtime_ns, size_bytes = EXCLUDED.size_bytes,
+                        width = EXCLUDED.width, height = EXCLUDED.height, updated_at = NOW()
+                """, (d['output_path'], d.get('post_id'), d['stage'], d['cache_key'], d['variant'],
+                      d['source_path'], d['source_hash'], d.get('source_size'), d.get('source_mtime_ns'),
+                      d['size_bytes'], d.get('width'), d.get('height')))
+        self._execute(write)
+
+    def outputs_for_sources(self, paths: Iterable[str], variant: str) -> Dict[str, Dict]:
+        """Latest manifest output per source for ``variant`` (sources unchanged since)"""
+        hashes = self.known_hashes(paths)
+        if not hashes:
+            return {}
+
+        def query(cur):
+            cur.execute("""
+                SELECT DISTINCT ON (o.source_path) o.source_path, o.output_path, o.size_bytes,
+                       o.source_size, o.width, o.height
+                FROM image_derivative_outputs o
+                WHERE o.source_path = ANY(%s) AND o.variant = %s
+                ORDER BY o.source_path, o.updated_at DESC
+            """, (list(hashes), variant))
+            return {row[0]: {'output_path': row[1], 'size_bytes': row[2], 'source_size': row[3],
+                             'width': row[4], 'height': row[5]} for row in cur.fetchall()}
+        return self._execute(query)
+
+    def evict(self) -> int:
+        """Delete least recently used derivatives until the store fits ``max_bytes``"""
+        with self._lock:
+            def select(cur):
+                cur.execute("""
+                    SELECT cache_key, store_path, size_bytes,
+                           SUM(size_bytes) OVER (ORDER BY last_used_at DESC, cache_key) AS running
+                    FROM image_derivatives
+                """)
+                return [row for row in cur.fetchall() if row[3] > self.max_bytes]
+            victims = self._execute(select)
+            if not victims:
+                return 0
+
+            for key, path, size, running in victims:
+                try:
+                    # Post files are hard links and keep their data
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Could not evict derivative {path}: {e}")
+
+            def delete(cur):
+                cur.execute("DELETE FROM image_derivatives WHERE cache_key = ANY(%s)", ([v[0] for v in victims],))
+            self._execute(delete)
+            logger.info(f"Evicted {len(victims)} derivatives ({sum(v[2] for v in victims)} bytes)")
+            return len(victims)
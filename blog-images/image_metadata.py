@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Batched image metadata generation for blog-images
+One structured-JSON LLM request returns the caption, alt text and title of
+every watermarked image in a post, instead of one request per image per
+field. Posts with many images are split into chunks of
+IMAGE_METADATA_BATCH_SIZE that run in parallel.
+
+Replies are parsed with blog-core's json_extractor and validated per
+image. A chunk whose reply is unusable is asked again once. Any field
+still missing gets the fallback the per-image generators used. The
+prompt does not depend on which fields a caller stores, so the captioning
+and metadata steps share one generation through the LLM response cache.
+"""
+
+import importlib.util
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('caption', 'alt_text', 'title')
+
+# Images per LLM request, and chunk requests run at once
+BATCH_SIZE = int(os.getenv('IMAGE_METADATA_BATCH_SIZE', 8))
+MAX_PARALLEL = int(os.getenv('IMAGE_METADATA_PARALLEL', 3))
+
+MODEL = os.getenv('IMAGE_METADATA_MODEL', 'mistral')
+MAX_FIELD_CHARS = 200
+
+RETRY_REMINDER = ("\n\nYour previous reply was incomplete or not valid JSON. Reply with the JSON object only, "
+                  "with all {count} images.")
+
+WORKFLOW_PROMPTS_URL = 'http://localhost:5000/api/workflow/prompts/all'
+
+# Workflow (system, task) prompt ids per field
+WORKFLOW_PROMPT_IDS = {
+    'caption': (110, 111),
+    'alt_text': (112, 113),
+    'title': (114, 115),
+}
+
+DEFAULT_GUIDANCE = {
+    'caption': 'A compelling caption of 6-8 words that connects the image to its section.',
+    'alt_text': 'Concise alt text of 6-8 words describing what the image shows, for screen readers.',
+    'title': 'A concise title attribute of 6-8 words.',
+}
+
+
+def _load_json_extractor():
+    # blog-core's utilities live in its "app" package, which clashes with this service's app.py
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        'blog-core', 'app', 'utils', 'json_extractor.py')
+    spec = importlib.util.spec_from_file_location('blog_core_json_extractor', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+json_extractor = _load_json_extractor()
+
+
+def fetch_guidance() -> Dict[str, str]:
+    """Per-field instructions from the workflow prompts (one request), or the defaults"""
+    guidance = dict(DEFAULT_GUIDANCE)
+    try:
+        response = requests.get(WORKFLOW_PROMPTS_URL, timeout=5)
+        response.raise_for_status()
+        prompts = {p['id']: p for p in response.json()}
+    except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Workflow prompts unavailable, using default guidance: {e}")
+        return guidance
+    for field, ids in WORKFLOW_PROMPT_IDS.items():
+        texts = [prompts[i].get('prompt_text', '').strip() for i in ids if i in prompts]
+        if all(texts) and len(texts) == len(ids):
+            guidance[field] = '\n'.join(texts)
+    return guidance
+
+
+def build_prompt(post: Dict, images: List[Dict], guidance: Dict[str, str],
+                 caption_style: str = 'Descriptive', caption_language: str = 'English') -> str:
+    """Prompt asking for every field of every image in ``images`` as one JSON object"""
+    lines = []
+    for number, image in enumerate(images, 1):
+        where = 'Header image' if image['type'] == 'header' else f"Section: {image.get('section_heading')}"
+        lines.append(f"{number}. {where} (file {image['filename']}, {image['width']}x{image['height']})")
+    field_rules = '\n\n'.join(f"{field}:\n{guidance[field]}" for field in FIELDS)
+    return f"""You write image metadata for a blog post.
+
+Post title: {post.get('title')}
+Post subtitle: {post.get('subtitle')}
+Basic idea: {post.get('basic_idea')}
+Idea scope: {post.get('idea_scope')}
+
+Images:
+{chr(10).join(lines)}
+
+Write every field in {caption_language}, in a {caption_style.lower()} style. Field instructions:
+
+{field_rules}
+
+Return only JSON, no commentary, in exactly this shape with one entry per image:
+{{"images": [{{"id": 1, "caption": "...", "alt_text": "...", "title": "..."}}]}}"""
+
+
+def _clean(value) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    value = ' '.join(value.split()).strip().strip('"').strip("'").strip()
+    value = re.sub(r'\s*\[[^\]]*\]', '', value)
+    if not value or len(value) > MAX_FIELD_CHARS:
+        return None
+    return value
+
+
+def parse_reply(text: str, count: int) -> Dict[int, Dict[str, str]]:
+    """Valid fields per image number (1-based) from an LLM reply; empty if it is not usable JSON"""
+    parsed = json_extractor.extract_and_parse_json(text)
+    if isinstance(parsed, dict):
+        parsed = parsed.get('images')
+    if not isinstance(parsed, list):
+        return {}
+    results = {}
+    for position, entry in enumerate(parsed, 1):
+        if not isinstance(entry, dict):
+            continue
+        number = entry.get('id', position)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= number <= count:
+            continue
+        fields = {field: _clean(entry.get(field)) for field in FIELDS}
+        results[number] = {field: value for field, value in fields.items() if value}
+    return results
+
+
+def fallback(image: Dict, post: Dict, field: str) -> Optional[str]:
+    """Stand-in for a field the model did not provide (none for captions)"""
+    if field == 'caption':
+        return None
+    if image['type'] == 'header':
+        return f"Header image for {post.get('title')}"
+    return f"Image for {image.get('section_heading')}"
+
+
+class ImageMetadataGenerator:
+    """Caption, alt text and title for all of a post's images in a few LLM requests"""
+
+    def __init__(self, client, batch_size: int = BATCH_SIZE, max_parallel: int = MAX_PARALLEL, model: str = MODEL):
+        self.client = client
+        self.batch_size = max(1, batch_size)
+        self.max_parallel = max(1, max_parallel)
+        self.model = model
+
+    def generate(self, post: Dict, images: List[Dict], caption_style: str = 'Descriptive',
+                 caption_language: str = 'English', bypass_cache: bool = False) -> List[Dict]:
+        """Return ``images`` with caption, alt_text and title added (caption may be None)
+
+        Each image needs type, filename, width, height and, for sections,
+        section_heading. LLM connection errors propagate to the caller.
+        """
+        guidance = fetch_guidance()
+        chunks = [images[i:i + self.batch_size] for i in range(0, len(images), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(chunks) or 1)) as executor:
+            replies = list(executor.map(
+                lambda chunk: self._generate_chunk(post, chunk, guidance, caption_style, caption_language,
+                                                   bypass_cache),
+                chunks))
+
+        results = []
+        for chunk, reply in zip(chunks, replies):
+            for number, image in enumerate(chunk, 1):
+                fields = reply.get(number, {})
+                result = dict(image)
+                for field in FIELDS:
+                    result[field] = fields.get(field) or fallback(image, post, field)
+                results.append(result)
+        logger.info(f"Image metadata for {len(images)} images in {len(chunks)} LLM requests")
+        return results
+
+    def _generate_chunk(self, post, chunk, guidance, caption_style, caption_language, bypass_cache):
+        prompt = build_prompt(post, chunk, guidance, caption_style, caption_language)
+        max_tokens = 120 * len(chunk) + 100
+        reply = {}
+        for attempt in range(2):
+            text = self.client.generate(prompt, model=self.model, temperature=0.4, max_tokens=max_tokens,
+                                        timeout=60, bypass_cache=bypass_cache)
+            attempt_reply = parse_reply(text, len(chunk))
+            reply = {**attempt_reply, **reply} if attempt else attempt_reply
+            if len(reply) == len(chunk):
+                break
+            logger.warning(f"Image metadata reply covered {len(attempt_reply)} of {len(chunk)} images "
+                           f"(attempt {attempt + 1})")
+            # A distinct retry prompt, so the retry is not answered by the same (cached) reply
+            prompt += RETRY_REMINDER.format(count=len(chunk))
+        return reply
+
+
+def save_metadata(connect: Callable, post_id: int, results: List[Dict], fields: List[str]):
+    """Write ``fields`` ('caption' and/or 'title' plus dimensions) for every image in one transaction"""
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            for result in results:
+                header = result['type'] == 'header'
+                if 'caption' in fields and result.get('caption'):
+                    if header:
+                        cur.execute("""
+                            UPDATE post
+                            SET header_image_caption = %s, updated_at = CURRENT_TIMESTAMP
+                            WHERE id = %s
+                        """, (result['caption'], post_id))
+                    else:
+                        cur.execute("""
+                            UPDATE post_section
+                            SET image_captions = %s
+                            WHERE post_id = %s AND id = %s
+                        """, (result['caption'], post_id, result['section_id']))
+                if 'title' in fields:
+                    if header:
+                        cur.execute("""
+                            UPDATE post
+                            SET header_image_title = %s, header_image_width = %s, header_image_height = %s
+                            WHERE id = %s
+                        """, (result['title'], result['width'], result['height'], post_id))
+                    else:
+                        cur.execute("""
+                            UPDATE post_section
+                            SET image_title = %s, image_width = %s, image_height = %s
+                            WHERE id = %s AND post_id = %s
+                        """, (result['title'], result['width'], result['height'], result['section_id'], post_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
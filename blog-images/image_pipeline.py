@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+"""
+Image processing pipeline for blog-images
+Runs the optimize and watermark stages in a process pool sized to the
+machine's cores. Each source image is decoded once in a worker; the optimized
+pixels go straight on to the watermark stage in memory and both outputs are
+written in the same pass. Encoded outputs come from (and go into) the
+content-addressed derivative store, so unchanged sources are just re-linked.
+Background jobs report progress through the
+image_processing_jobs, image_processing_steps and image_processing_status
+tables.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+import derivative_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = 'webp_1200_85'
+WATERMARK_PATH = os.path.join('static', 'images', 'site', 'clan-watermark.png')
+
+# Worker processes; defaults to one per core
+PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 0)) or os.cpu_count() or 1
+
+PIPELINE_STEPS = ('optimization', 'watermarking')
+
+# Bump when the compositor's output changes so cached watermarked images are redone
+WATERMARK_VERSION = 1
+
+
+# ============================================================================
+# IMAGE OPERATIONS (run inside worker processes)
+# ============================================================================
+
+def parse_settings(settings):
+    """Split 'format_width_quality' (e.g. 'webp_1200_85') into its parts."""
+    parts = settings.split('_')
+    format_type = parts[0]  # webp, jpeg, png
+    max_width = int(parts[1])  # 800, 1200, 1600
+    quality = int(parts[2]) if len(parts) > 2 else 85  # 85, 100
+    return format_type, max_width, quality
+
+
+def prepare_optimized(img, format_type, max_width):
+    """Flatten transparency for lossy formats and scale down to max_width."""
+    # Convert to RGB if necessary (for JPEG/WebP)
+    if format_type in ['jpeg', 'webp'] and img.mode in ['RGBA', 'LA', 'P']:
+        # Create white background for transparent images
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode in ['RGBA', 'LA'] else None)
+        img = background
+
+    # Calculate new dimensions
+    width, height = img.size
+    if width > max_width:
+        ratio = max_width / width
+        new_height = int(height * ratio)
+        img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+    return img
+
+
+def save_optimized(img, output_path, format_type, quality):
+    """Save with the encoder settings for the chosen format."""
+    if format_type == 'webp':
+        img.save(output_path, 'WEBP', quality=quality, method=6)
+    elif format_type == 'jpeg':
+        img.save(output_path, 'JPEG', quality=quality, optimize=True)
+    elif format_type == 'png':
+        if quality == 100:  # Lossless
+            img.save(output_path, 'PNG', optimize=True)
+        else:
+            img.save(output_path, 'PNG', optimize=True, compress_level=9)
+
+
+def file_extension(format_type):
+    return format_type if format_type != 'jpeg' else 'jpg'
+
+
+def optimize_image(input_path, output_path, settings):
+    """Optimize an image with the specified settings (reusing a stored derivative if there is one)."""
+    format_type = parse_settings(settings)[0]
+    ext = file_extension(format_type)
+    key = derivative_cache.cache_key(derivative_cache.file_hash(input_path), settings)
+    stored = derivative_cache.lookup(key, ext)
+    if stored is None:
+        format_type, max_width, quality = parse_settings(settings)
+        tmp = derivative_cache.temp_path(key, ext)
+        with Image.open(input_path) as img:
+            save_optimized(prepare_optimized(img, format_type, max_width), tmp, format_type, quality)
+        stored = derivative_cache.add(tmp, key, ext)
+    derivative_cache.link_into_place(stored, output_path)
+    return True
+
+
+def load_watermark(watermark_path):
+    """Load the watermark image."""
+    try:
+        watermark = Image.open(watermark_path)
+        watermark.load()
+        return watermark
+    except Exception as e:
+        print(f"❌ Error loading watermark: {e}")
+        return None
+
+
+def get_font(size=20):
+    """Get a font for text rendering."""
+    try:
+        # Try to use a system font
+        font = ImageFont.truetype("/System/Library/Fonts/Arial.ttf", size)
+    except:
+        try:
+            # Fallback to default font
+            font = ImageFont.load_default()
+        except:
+            # Last resort - no font
+            font = None
+
+    return font
+
+
+def add_watermark(image, watermark, position='bottom-right'):
+    """Add watermark to image with 0% transparency against 80% transparent background.
+
+    Kept as the reference implementation; the pipeline uses WatermarkCompositor.
+    """
+    if watermark is None:
+        return image
+
+    # Resize watermark to reasonable size (max 200px width)
+    watermark_width = min(200, image.width // 4)
+    watermark_height = int(watermark.height * (watermark_width / watermark.width))
+    watermark_resized = watermark.resize((watermark_width, watermark_height), Image.Resampling.LANCZOS)
+
+    # Create watermark with 0% transparency (fully visible)
+    watermark_with_alpha = Image.new('RGBA', watermark_resized.size, (0, 0, 0, 0))
+    watermark_with_alpha.paste(watermark_resized, (0, 0))
+
+    # Calculate position with 10px margins
+    margin = 10
+    if position == 'bottom-right':
+        x = image.width - watermark_width - margin
+        y = image.height - watermark_height - margin
+    else:
+        x = margin
+        y = image.height - watermark_height - margin
+
+    # Create new image with alpha channel if needed
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+
+    # Create grey background with 80% transparency (20% opacity)
+    grey_bg = Image.new('RGBA', (watermark_width + 20, watermark_height + 20), (128, 128, 128, 51))  # Grey with 20% alpha (80% transparent)
+
+    # Paste grey background first
+    bg_x = x - 10
+    bg_y = y - 10
+    image.paste(grey_bg, (bg_x, bg_y), grey_bg)
+
+    # Paste fully visible watermark
+    image.paste(watermark_with_alpha, (x, y), watermark_with_alpha)
+
+    return image
+
+
+def add_ai_generated_text(image):
+    """Add 'AI-generated image' text to bottom left."""
+    draw = ImageDraw.Draw(image)
+    font = get_font(16)
+
+    text = "AI-generated image"
+    text_color = (128, 128, 128, 180)  # Grey with transparency
+
+    # Calculate text position (bottom left with padding)
+    if font:
+        bbox = draw.textbbox((0, 0), text, font=font)
+        text_height = bbox[3] - bbox[1]
+    else:
+        text_height = 16
+
+    x = 20
+    y = image.height - text_height - 20
+
+    # Draw text
+    if font:
+        draw.text((x, y), text, fill=text_color, font=font)
+    else:
+        # Fallback without font
+        draw.text((x, y), text, fill=text_color)
+
+    return image
+
+
+def save_watermarked(image, output_path):
+    """Save as WebP (or in the format implied by the extension)."""
+    if output_path.endswith('.webp'):
+        image.save(output_path, 'WEBP', quality=85, method=6)
+    else:
+        image.save(output_path, optimize=True)
+
+
+class WatermarkCompositor:
+    """Watermark and 'AI-generated image' label with cached, pre-rendered layers.
+
+    The watermark is decoded once, then scaled once per target width (with
+    its grey backdrop composited in); the label is rendered once. Only the
+    two corner regions are converted to RGBA and blended, never the whole
+    frame. Output matches add_watermark + add_ai_generated_text, except that
+    the overlays are alpha-blended instead of punching translucent holes into
+    the image's alpha channel.
+    """
+
+    def __init__(self, watermark_path=WATERMARK_PATH, margin=10, padding=10, max_width=200,
+                 text="AI-generated image", font_size=16, max_cached=32):
+        self.watermark_path = watermark_path
+        self.margin = margin
+        self.padding = padding
+        self.max_width = max_width
+        self.text = text
+        self.font_size = font_size
+        self.max_cached = max_cached
+        self._watermark = None
+        self._overlays = {}
+        self._text_layer = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Decode the watermark; returns False if it cannot be read"""
+        with self._lock:
+            if self._watermark is None:
+                watermark = load_watermark(self.watermark_path)
+                if watermark is None:
+                    return False
+                self._watermark = watermark.convert('RGBA')
+            return True
+
+    def _overlay(self, width):
+        """Watermark scaled to ``width`` on its backdrop, built once per width"""
+        with self._lock:
+            overlay = self._overlays.get(width)
+            if overlay is not None:
+                return overlay
+
+            watermark = self._watermark
+            height = int(watermark.height * (width / watermark.width))
+            scaled = watermark.resize((width, height), Image.Resampling.LANCZOS)
+
+            # Grey background with 80% transparency (20% opacity)
+            overlay = Image.new('RGBA', (width + 2 * self.padding, height + 2 * self.padding), (128, 128, 128, 51))
+            overlay.alpha_composite(scaled, (self.padding, self.padding))
+
+            if len(self._overlays) >= self.max_cached:
+                self._overlays.pop(next(iter(self._overlays)))
+            self._overlays[width] = overlay
+            return overlay
+
+    def _label(self):
+        """The 'AI-generated image' text on a transparent layer, rendered once"""
+        with self._lock:
+            if self._text_layer is None:
+                font = get_font(self.font_size)
+                probe = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+                bbox = probe.textbbox((0, 0), self.text, font=font) if font else (0, 0, len(self.text) * 8, 16)
+                layer = Image.new('RGBA', (max(1, bbox[2]), max(1, bbox[3])), (0, 0, 0, 0))
+                draw = ImageDraw.Draw(layer)
+                if font:
+                    draw.text((0, 0), self.text, fill=(128, 128, 128, 180), font=font)
+                else:
+                    draw.text((0, 0), self.text, fill=(128, 128, 128, 180))
+                self._text_layer = (layer, bbox[3] - bbox[1])
+            return self._text_layer
+
+    @staticmethod
+    def _blend(image, layer, x, y):
+        """Alpha-blend ``layer`` onto ``image`` at (x, y), touching only that region"""
+        left, top = max(0, x), max(0, y)
+        right, bottom = min(image.width, x + layer.width), min(image.height, y + layer.height)
+        if left >= right or top >= bottom:
+            return
+        layer = layer.crop((left - x, top - y, right - x, bottom - y))
+        if image.mode == 'RGBA':
+            image.alpha_composite(layer, (left, top))
+            return
+        region = image.crop((left, top, right, bottom)).convert('RGBA')
+        region.alpha_composite(layer)
+        image.paste(region.convert(image.mode), (left, top))
+
+    def apply(self, image, position='bottom-right'):
+        """Watermark ``image`` (modified in place when it is RGB or RGBA)"""
+        if not self.load():
+            raise ValueError('Could not load watermark image')
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+        width = min(self.max_width, image.width // 4)
+        if width > 0:
+            overlay = self._overlay(width)
+            inner_width, inner_height = width, overlay.height - 2 * self.padding
+            if position == 'bottom-right':
+                x = image.width - inner_width - self.margin
+            else:
+                x = self.margin
+            y = image.height - inner_height - self.margin
+            self._blend(image, overlay, x - self.padding, y - self.padding)
+
+        # Text at the bottom left with 20px padding
+        label, text_height = self._label()
+        self._blend(image, label, 20, image.height - text_height - 20)
+        return image
+
+
+_compositors = {}
+
+
+def get_compositor(watermark_path=WATERMARK_PATH):
+    """Shared compositor for a watermark file (one per process)"""
+    if watermark_path not in _compositors:
+        _compositors[watermark_path] = WatermarkCompositor(watermark_path)
+    return _compositors[watermark_path]
+
+
+_watermark_hashes = {}
+
+
+def _watermark_variant(watermark_path, base_variant):
+    """Variant name for a watermarked derivative (changes with the watermark file)"""
+    if watermark_path not in _watermark_hashes:
+        _watermark_hashes[watermark_path] = derivative_cache.file_hash(watermark_path)[:12]
+    return f"{base_variant}+wm{WATERMARK_VERSION}-{_watermark_hashes[watermark_path]}"
+
+
+def process_image(task):
+    """Run the requested stages for one image; the worker-process entry point.
+
+    ``task`` holds ``source`` plus ``optimized_path`` (with ``settings``)
+    and/or ``watermarked_path`` (with ``watermark_path``). Each output is
+    looked up in the derivative store by source hash and settings first;
+    only misses are encoded. The source is decoded at most once, and the
+    optimized pixels go straight on to the watermark stage.
+    """
+    started = time.monotonic()
+    result = {'key': task['key'], 'source': task['source'], 'success': False, 'outputs': {}, 'derivatives': []}
+    try:
+        source = derivative_cache.source_info(task['source'], task.get('source_hash'))
+        pixels = {}
+
+        def decoded():
+            if 'source' not in pixels:
+                with Image.open(task['source']) as img:
+                    img.load()
+                    pixels['source'] = img
+            return pixels['source']
+
+        def publish(stage, output_path, key, variant, ext, stored, hit, size):
+            derivative_cache.link_into_place(stored, output_path)
+            result['outputs'][stage] = output_path
+            result['derivatives'].append(dict(
+                source, stage=stage, output_path=output_path, cache_key=key, variant=variant,
+                store_path=stored, size_bytes=os.path.getsize(stored), hit=hit,
+                width=size[0] if size else None, height=size[1] if size else None,
+                post_id=task.get('post_id')))
+
+        base_variant = 'source'
+        optimized_stored = None
+        if task.get('optimized_path'):
+            settings = task.get('settings') or DEFAULT_SETTINGS
+            format_type, max_width, quality = parse_settings(settings)
+            ext = file_extension(format_type)
+            key = derivative_cache.cache_key(source['source_hash'], settings)
+            optimized_stored = derivative_cache.lookup(key, ext)
+            hit = optimized_stored is not None
+            size = None
+            if not hit:
+                img = prepare_optimized(decoded(), format_type, max_width)
+                pixels['optimized'] = img
+                size = img.size
+                tmp = derivative_cache.temp_path(key, ext)
+                save_optimized(img, tmp, format_type, quality)
+                optimized_stored = derivative_cache.add(tmp, key, ext)
+            publish('optimized', task['optimized_path'], key, settings, ext, optimized_stored, hit, size)
+            base_variant = settings
+
+        if task.get('watermarked_path'):
+            watermark_path = task.get('watermark_path') or WATERMARK_PATH
+            variant = _watermark_variant(watermark_path, base_variant)
+            ext = os.path.splitext(task['watermarked_path'])[1].lstrip('.').lower() or 'webp'
+            key = derivative_cache.cache_key(source['source_hash'], variant)
+            stored = derivative_cache.lookup(key, ext)
+            hit = stored is not None
+            size = None
+            if not hit:
+                if 'optimized' in pixels:
+                    img = pixels['optimized']
+                elif optimized_stored:
+                    # Optimized stage was a cache hit: decode the small derivative, not the source
+                    with Image.open(optimized_stored) as cached:
+                        cached.load()
+                        img = cached
+                else:
+                    img = decoded()
+                # The pixels are not needed any more, so mark them in place
+                marked = get_compositor(watermark_path).apply(img)
+                size = marked.size
+                tmp = derivative_cache.temp_path(key, ext)
+                save_watermarked(marked, tmp)
+                stored = derivative_cache.add(tmp, key, ext)
+            publish('watermarked', task['watermarked_path'], key, variant, ext, stored, hit, size)
+
+        result['success'] = True
+        result['cache_hits'] = sum(1 for d in result['derivatives'] if d['hit'])
+    except Exception as e:
+        result['error'] = f"{os.path.basename(task['source'])}: {e}"
+    result['seconds'] = round(time.monotonic() - started, 3)
+    return result
+
+
+# ============================================================================
+# PIPELINE (runs in the web process)
+# ============================================================================
+
+class ImagePipeline:
+    """Fans image tasks out over a shared process pool"""
+
+    def __init__(self, connect: Callable, workers: int = PIPELINE_WORKERS,
+                 on_outputs: Optional[Callable[[List[str]], None]] = None):
+        self.connect = connect
+        self.workers = max(1, workers)
+        # Called with the output paths of each finished image (index and storage accounting)
+        self.on_outputs = on_outputs
+        self.manifest = derivative_cache.DerivativeManifest(connect)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def run(self, tasks: List[Dict], on_result: Optional[Callable] = None) -> List[Dict]:
+        """Process tasks in parallel and wait for all of them.
+
+        ``on_result(result)`` is called in this thread as each image finishes;
+        returning False cancels the images that have not started yet.
+        """
+        if not tasks:
+            return []
+        # Sources unchanged since their last run skip re-hashing
+        try:
+            known = self.manifest.known_hashes(task['source'] for task in tasks)
+        except Exception as e:
+            logger.warning(f"Derivative manifest unavailable: {e}")
+            known = {}
+        for position, task in enumerate(tasks):
+            task.setdefault('key', position)
+            task['source_hash'] = known.get(task['source'])
+
+        futures = [self.executor().submit(process_image, task) for task in tasks]
+        results = []
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            result = future.result()
+            results.append(result)
+            if not result['success']:
+                logger.error(f"Image pipeline failed for {result['error']}")
+            if self.on_outputs is not None and result['outputs']:
+                self.on_outputs(list(result['outputs'].values()))
+            if on_result is not None and on_result(result) is False:
+                for pending in futures:
+                    pending.cancel()
+
+        try:
+            self.manifest.record([d for result in results for d in result.get('derivatives', [])])
+            self.manifest.evict()
+        except Exception as e:
+            logger.warning(f"Could not update derivative manifest: {e}")
+        return results
+
+    def start_job(self, post_id: int, tasks: List[Dict], settings: Dict, job_type: str = 'optimize_watermark') -> int:
+        """Record a processing job and run it in the background; returns the job id"""
+        steps = [step for step, output in zip(PIPELINE_STEPS, ('optimized_path', 'watermarked_path'))
+                 if any(task.get(output) for task in tasks)]
+
+        conn = self.connect()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO image_processing_jobs
+                    (post_id, job_type, status, total_images, settings)
+                    VALUES (%s, %s, 'pending', %s, %s)
+                    RETURNING id
+                """, (post_id, job_type, len(tasks), json.dumps(settings)))
+                job_id = cur.fetchone()[0]
+
+                for step in steps:
+                    cur.execute("""
+                        INSERT INTO image_processing_steps (job_id, step_name, status)
+                        VALUES (%s, %s, 'pending')
+                    """, (job_id, step))
+
+                for position, task in enumerate(tasks):
+                    task['key'] = position
+                    cur.execute("""
+                        INSERT INTO image_processing_status
+                        (image_id, post_id, image_type, section_id, current_step, pipeline_status, processing_job_id)
+                        VALUES (%s, %s, %s, %s, %s, 'queued', %s)
+                        RETURNING id
+                    """, (task.get('image_id') or os.path.basename(task['source']), post_id,
+                          task.get('image_type', 'section'), task.get('section_id'), steps[0] if steps else None, job_id))
+                    task['status_id'] = cur.fetchone()[0]
+        finally:
+            conn.close()
+
+        threading.Thread(target=self._run_job, args=(job_id, tasks, steps), name=f'image-job-{job_id}', daemon=True).start()
+        return job_id
+
+    def _run_job(self, job_id: int, tasks: List[Dict], steps: List[str]):
+        conn = self.connect()
+        conn.autocommit = True
+        done = {'processed': 0, 'failed': 0}
+        status_ids = {task['key']: task.get('status_id') for task in tasks}
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE image_processing_jobs SET status = 'processing', started_at = NOW()
+                    WHERE id = %s AND status = 'pending'
+                """, (job_id,))
+                cur.execute("""
+                    UPDATE image_processing_steps SET status = 'processing', started_at = NOW()
+                    WHERE job_id = %s AND status = 'pending'
+                """, (job_id,))
+
+            def on_result(result):
+                done['processed' if result['success'] else 'failed'] += 1
+                finished = done['processed'] + done['failed']
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE image_processing_status
+                        SET pipeline_status = %s, current_step = %s, updated_at = NOW()
+                        WHERE id = %s
+                    """, ('watermarked' if result['outputs'].get('watermarked') else
+                          'optimized' if result['success'] else 'failed',
+                          steps[-1] if steps else None, status_ids.get(result['key'])))
+                    cur.execute("""
+                        UPDATE image_processing_steps
+                        SET progress = %s, error_message = COALESCE(%s, error_message)
+                        WHERE job_id = %s AND status = 'processing'
+                    """, (int(finished * 100 / len(tasks)), result.get('error'), job_id))
+                    cur.execute("""
+                        UPDATE image_processing_jobs SET processed_images = %s
+                        WHERE id = %s
+                        RETURNING status
+                    """, (done['processed'], job_id))
+                    row = cur.fetchone()
+                # Stop handing out images once the job has been cancelled
+                return not (row and row[0] == 'cancelled')
+
+            self.run(tasks, on_result)
+            status = 'completed' if done['processed'] or not tasks else 'failed'
+        except Exception as e:
+            logger.error(f"Image processing job {job_id} failed: {e}")
+            status = 'failed'
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE image_processing_steps
+                    SET status = %s, completed_at = NOW(), progress = CASE WHEN %s = 'completed' THEN 100 ELSE progress END
+                    WHERE job_id = %s AND status = 'processing'
+                """, (status, status, job_id))
+                cur.execute("""
+                    UPDATE image_processing_jobs SET status = %s, completed_at = NOW()
+                    WHERE id = %s AND status <> 'cancelled'
+                """, (status, job_id))
+        finally:
+            conn.close()
+        logger.info(f"Image processing job {job_id} {status}: {done['processed']} processed, {done['failed']} failed")
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+On-demand responsive image variants for blog-images
+Resizes and re-encodes a post's best header/section image (watermarked >
+optimized > raw) to the size and format a page asks for:
+
+    /img/53/710?w=800&fmt=webp
+    /img/53/header?w=1200&h=630&fit=contain&fmt=jpeg    (Facebook preview)
+
+Concurrent requests for the same variant share one encode, encodes run on a
+small bounded thread pool, and results are kept in a size-bounded disk cache
+(least recently used files are evicted). A variant is keyed by the source
+file's version, so replacing the source image produces new variants.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv('IMAGE_VARIANT_CACHE_DIR',
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'variants'))
+
+CACHE_MAX_BYTES = int(os.getenv('IMAGE_VARIANT_CACHE_MB', 512)) * 1024 * 1024
+
+# Concurrent encodes; further requests queue for a worker
+VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 0)) or min(4, os.cpu_count() or 1)
+
+MAX_DIMENSION = 2400
+
+FORMATS = {
+    # fmt: (PIL format, extension, mimetype, default quality)
+    'webp': ('WEBP', 'webp', 'image/webp', 82),
+    'avif': ('AVIF', 'avif', 'image/avif', 60),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg', 85),
+    'png': ('PNG', 'png', 'image/png', None),
+}
+
+FITS = ('inside', 'cover', 'contain')
+
+# Bump when encoding changes so cached variants are redone
+VARIANT_VERSION = 2
+
+
+def avif_supported() -> bool:
+    """Pillow 11.3+ encodes AVIF natively; older versions need pillow-avif-plugin"""
+    if features.check('avif'):
+        return True
+    try:
+        import pillow_avif  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class VariantSpec:
+    """Validated variant request parameters"""
+
+    def __init__(self, width: Optional[int] = None, height: Optional[int] = None,
+                 fmt: str = 'webp', fit: str = 'inside', quality: Optional[int] = None):
+        if fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}' (use {', '.join(FORMATS)})")
+        if fit not in FITS:
+            raise ValueError(f"Unsupported fit '{fit}' (use {', '.join(FITS)})")
+        for name, value in (('w', width), ('h', height)):
+            if value is not None and not 1 <= value <= MAX_DIMENSION:
+                raise ValueError(f"{name} must be between 1 and {MAX_DIMENSION}")
+        if fit != 'inside' and not (width and height):
+            raise ValueError(f"fit={fit} needs both w and h")
+        if quality is not None and not 1 <= quality <= 100:
+            raise ValueError("q must be between 1 and 100")
+        if fmt == 'avif' and not avif_supported():
+            logger.warning("AVIF encoding unavailable, serving WebP instead")
+            fmt = 'webp'
+        self.width = width
+        self.height = height
+        self.fmt = fmt
+        self.fit = fit
+        self.quality = quality if quality is not None else FORMATS[fmt][3]
+
+    @classmethod
+    def from_args(cls, args) -> 'VariantSpec':
+        """Build from request args (w, h, fmt, fit, q)"""
+        def number(name):
+            value = args.get(name)
+            if value in (None, ''):
+                return None
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError(f"{name} must be an integer")
+        return cls(number('w'), number('h'), args.get('fmt', 'webp').lower(),
+                   args.get('fit', 'inside').lower(), number('q'))
+
+    @property
+    def extension(self) -> str:
+        return FORMATS[self.fmt][1]
+
+    @property
+    def mimetype(self) -> str:
+        return FORMATS[self.fmt][2]
+
+    def key(self, source_path: str, source_version: str) -> str:
+        raw = f"{VARIANT_VERSION}|{source_path}|{source_version}|{self.width}|{self.height}|{self.fmt}|{self.fit}|{self.quality}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def render(source_path: str, spec: VariantSpec, output_path: str):
+    """Resize ``source_path`` per ``spec`` and encode it to ``output_path``"""
+    with Image.open(source_path) as img:
+        # Let JPEG decode at reduced scale when the target is much smaller
+        if spec.width or spec.height:
+            img.draft('RGB', (spec.width or img.width, spec.height or img.height))
+        img = ImageOps.exif_transpose(img)
+
+        keep_alpha = spec.fmt in ('webp', 'avif', 'png') and img.mode in ('RGBA', 'LA', 'P')
+        img = img.convert('RGBA' if keep_alpha else 'RGB')
+
+        # No fit ever upscales the source
+        if spec.fit == 'cover':
+            # Crop to the requested aspect ratio; a source smaller than the box
+            # gives the largest crop it has rather than an enlarged one
+            scale = min(1.0, img.width / spec.width, img.height / spec.height)
+            box = (max(1, round(spec.width * scale)), max(1, round(spec.height * scale)))
+            img = ImageOps.fit(img, box, Image.Resampling.LANCZOS)
+        elif spec.fit == 'contain':
+            # Letterboxed on white to exactly the requested size, as
+            # resize_to_facebook.py does; a smaller source is centred unscaled
+            size = (spec.width, spec.height)
+            if img.width > spec.width or img.height > spec.height:
+                img = ImageOps.contain(img, size, Image.Resampling.LANCZOS)
+            canvas = Image.new(img.mode, size, (255, 255, 255, 0) if keep_alpha else (255, 255, 255))
+            canvas.paste(img, ((spec.width - img.width) // 2, (spec.height - img.height) // 2))
+            img = canvas
+        elif spec.width or spec.height:
+            img.thumbnail((spec.width or img.width, spec.height or img.height),
+                          Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        pil_format = FORMATS[spec.fmt][0]
+        if spec.fmt == 'png':
+            img.save(output_path, pil_format, optimize=True)
+        elif spec.fmt == 'jpeg':
+            img.save(output_path, pil_format, quality=spec.quality, optimize=True, progressive=True)
+        else:
+            img.save(output_path, pil_format, quality=spec.quality)
+
+
+class VariantCache:
+    """Bounded disk cache of encoded variants with per-variant request coalescing"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 workers: int = VARIANT_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='image-variant')
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._size = None
+
+    def relative_path(self, key: str, spec: VariantSpec) -> str:
+        return os.path.join(key[:2], f"{key}.{spec.extension}")
+
+    def get(self, source_path: str, source_version: str, spec: VariantSpec) -> str:
+        """Path (relative to cache_dir) of the variant, encoding it if needed"""
+        key = spec.key(source_path, source_version)
+        relative = self.relative_path(key, spec)
+        path = os.path.join(self.cache_dir, relative)
+        if os.path.exists(path):
+            self._touch(path)
+            return relative
+
+        with self._lock:
+            future = self._inflight.get(key)
+            started = future is None
+            if started:
+                future = self._executor.submit(self._encode, source_path, spec, path)
+                self._inflight[key] = future
+        if started:
+            future.add_done_callback(lambda _: self._forget(key))
+        future.result()
+        return relative
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _touch(path: str):
+        """Record use in atime (mtime is part of the served ETag)"""
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+
+    def _encode(self, source_path: str, spec: VariantSpec, path: str):
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            render(source_path, spec, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._account(path)
+
+    def _account(self, path: str):
+        added = os.path.getsize(path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry['size'] for entry in self._entries())
+            else:
+                self._size += added
+            over = self._size > self.max_bytes
+        if over:
+            # The new variant is about to be served, so it is never the one evicted
+            self.evict(keep=path)
+
+    def _entries(self):
+        for directory, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield {'path': path, 'size': stat.st_size, 'used': stat.st_atime}
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Remove least recently used variants until the cache is back under 90% of max_bytes
+
+        ``keep`` (a path) is never removed, even if it alone exceeds the budget.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry['used'])
+        total = sum(entry['size'] for entry in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for entry in entries:
+            if total <= target:
+                break
+            if entry['path'] == keep:
+                continue
+            try:
+                os.remove(entry['path'])
+            except OSError:
+                continue
+            total -= entry['size']
+            removed += 1
+        with self._lock:
+            self._size = total
+        if removed:
+            logger.info(f"Evicted {removed} image variants")
+        return removed
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Watermark Micro-benchmark
+Compares the original per-image watermarking (add_watermark +
+add_ai_generated_text on the full frame, as watermark_single_image did) with
+the cached WatermarkCompositor. Each variant runs in its own process so peak
+RSS is measured independently.
+
+    python scripts/benchmark_watermark.py                       # synthetic images
+    python scripts/benchmark_watermark.py --images static/content/posts/53/sections/710/optimized
+    python scripts/benchmark_watermark.py --count 50 --no-save  # compositing only
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BLOG_IMAGES_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BLOG_IMAGES_DIR))
+
+SYNTHETIC_SIZES = [(1200, 800), (1600, 1067), (800, 600), (1200, 1200)]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def make_synthetic_images(directory, count):
+    """Noisy RGB WebP images in a few typical blog sizes"""
+    from PIL import Image
+    paths = []
+    for i in range(count):
+        width, height = SYNTHETIC_SIZES[i % len(SYNTHETIC_SIZES)]
+        image = Image.effect_noise((width, height), 64).convert('RGB')
+        path = os.path.join(directory, f'synthetic_{i}.webp')
+        image.save(path, 'WEBP', quality=85)
+        paths.append(path)
+    return paths
+
+
+def run_variant(mode, paths, watermark_path, output_dir):
+    """Watermark every image with one variant; returns timings in milliseconds"""
+    from PIL import Image
+    from image_pipeline import (WatermarkCompositor, add_ai_generated_text, add_watermark,
+                                load_watermark, save_watermarked)
+
+    started = time.perf_counter()
+    if mode == 'legacy':
+        watermark = load_watermark(watermark_path)
+    else:
+        compositor = WatermarkCompositor(watermark_path)
+        compositor.load()
+    setup_ms = (time.perf_counter() - started) * 1000
+
+    composite_ms, total_ms = [], []
+    for i, path in enumerate(paths):
+        t0 = time.perf_counter()
+        image = Image.open(path)
+        image.load()
+        t1 = time.perf_counter()
+        if mode == 'legacy':
+            image = add_ai_generated_text(add_watermark(image, watermark, 'bottom-right'))
+        else:
+            image = compositor.apply(image)
+        t2 = time.perf_counter()
+        if output_dir:
+            save_watermarked(image, os.path.join(output_dir, f'{mode}_{i}.webp'))
+        t3 = time.perf_counter()
+        composite_ms.append((t2 - t1) * 1000)
+        total_ms.append((t3 - t0) * 1000)
+
+    def summary(values):
+        ordered = sorted(values)
+        return {
+            'mean_ms': round(statistics.mean(values), 2),
+            'p50_ms': round(ordered[len(ordered) // 2], 2),
+            'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2)
+        }
+
+    return {
+        'mode': mode,
+        'images': len(paths),
+        'setup_ms': round(setup_ms, 2),
+        'composite': summary(composite_ms),
+        'per_image_total': summary(total_ms),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark watermark compositing')
+    parser.add_argument('--images', help='directory of images to watermark (default: synthetic)')
+    parser.add_argument('--count', type=int, default=20, help='number of synthetic images')
+    parser.add_argument('--watermark', default=str(BLOG_IMAGES_DIR / 'static' / 'images' / 'site' / 'clan-watermark.png'))
+    parser.add_argument('--no-save', action='store_true', help='time compositing without encoding the output')
+    parser.add_argument('--mode', choices=['legacy', 'compositor'], help=argparse.SUPPRESS)
+    parser.add_argument('--paths', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process: run one variant and report as JSON
+    if args.mode:
+        paths = json.loads(args.paths)
+        print(json.dumps(run_variant(args.mode, paths, args.watermark, args.output)))
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.images:
+            supported = {'.png', '.jpg', '.jpeg', '.webp'}
+            paths = sorted(str(p) for p in Path(args.images).iterdir() if p.suffix.lower() in supported)
+        else:
+            paths = make_synthetic_images(workdir, args.count)
+        if not paths:
+            print(f"No images found in {args.images}")
+            sys.exit(1)
+
+        results = {}
+        for mode in ('legacy', 'compositor'):
+            output = None if args.no_save else os.path.join(workdir, mode)
+            if output:
+                os.makedirs(output)
+            completed = subprocess.run(
+                [sys.executable, __file__, '--mode', mode, '--paths', json.dumps(paths),
+                 '--watermark', args.watermark] + (['--output', output] if output else []),
+                cwd=str(BLOG_IMAGES_DIR), capture_output=True, text=True, check=True
+            )
+            results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    legacy, compositor = results['legacy'], results['compositor']
+    results['speedup'] = {
+        'composite': round(legacy['composite']['mean_ms'] / compositor['composite']['mean_ms'], 1),
+        'per_image_total': round(legacy['per_image_total']['mean_ms'] / compositor['per_image_total']['mean_ms'], 2)
+    }
+    results['peak_rss_saved_mb'] = round(legacy['peak_rss_mb'] - compositor['peak_rss_mb'], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
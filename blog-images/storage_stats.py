@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Incremental storage accounting for blog-images
+Keeps a ledger of every image under static/content/posts with running totals
+per post, image type (header/section/featured) and stage (raw/optimized/
+watermarked/...), plus one growth row per day. Writers (upload, the image
+pipeline) record files as they write them, so dashboard stats are a handful
+of row reads instead of a walk over the whole library.
+
+Files changed outside the writers are picked up by reconcile(), which walks
+the tree once, records the differences and rebuilds the totals. It runs
+automatically the first time an empty ledger is used, and from cron:
+
+    python storage_stats.py --reconcile
+"""
+
+import argparse
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+IMAGE_TYPES = ('header', 'section', 'featured')
+
+# Days of history returned with the storage trends
+TREND_DAYS = int(os.getenv('IMAGE_STORAGE_TREND_DAYS', 7))
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS image_storage_files (
+        path TEXT PRIMARY KEY,
+        post_id INTEGER NOT NULL,
+        image_type VARCHAR(20) NOT NULL,
+        stage VARCHAR(20) NOT NULL,
+        section_id INTEGER,
+        filename TEXT NOT NULL,
+        size_bytes BIGINT NOT NULL,
+        mtime_ns BIGINT,
+        updated_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_image_storage_files_size ON image_storage_files (size_bytes DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_image_storage_files_post ON image_storage_files (post_id)",
+    """
+    CREATE TABLE IF NOT EXISTS image_storage_totals (
+        post_id INTEGER NOT NULL,
+        image_type VARCHAR(20) NOT NULL,
+        stage VARCHAR(20) NOT NULL,
+        file_count INTEGER NOT NULL DEFAULT 0,
+        total_bytes BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (post_id, image_type, stage)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS image_storage_daily (
+        day DATE PRIMARY KEY,
+        bytes_added BIGINT NOT NULL DEFAULT 0,
+        bytes_removed BIGINT NOT NULL DEFAULT 0,
+        files_added INTEGER NOT NULL DEFAULT 0,
+        files_removed INTEGER NOT NULL DEFAULT 0,
+        total_bytes BIGINT NOT NULL DEFAULT 0,
+        total_files INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+
+def classify(relative_path: str) -> Optional[Dict]:
+    """Post, type, stage and section of a path relative to the posts root (None if not a post image)"""
+    parts = relative_path.replace(os.sep, '/').split('/')
+    filename = parts[-1]
+    if filename.startswith('.') or not filename.lower().endswith(IMAGE_EXTENSIONS) or not parts[0].isdigit():
+        return None
+    if len(parts) == 4 and parts[1] in ('header', 'featured'):
+        return {'post_id': int(parts[0]), 'image_type': parts[1], 'stage': parts[2],
+                'section_id': None, 'filename': filename}
+    if len(parts) == 5 and parts[1] == 'sections' and parts[2].isdigit():
+        return {'post_id': int(parts[0]), 'image_type': 'section', 'stage': parts[3],
+                'section_id': int(parts[2]), 'filename': filename}
+    return None
+
+
+def walk(root: str, post_id: Optional[int] = None) -> Dict[str, Tuple[int, int]]:
+    """{relative path: (size, mtime_ns)} for every post image under ``root`` (or one post)"""
+    files = {}
+    start = os.path.join(root, str(post_id)) if post_id is not None else root
+    for directory, subdirs, filenames in os.walk(start):
+        subdirs[:] = [d for d in subdirs if not d.startswith('.')]
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            relative = os.path.relpath(path, root)
+            if classify(relative) is None:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[relative] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def scan_post_totals(root: str, post_id: int) -> Dict[Tuple[str, str], Dict]:
+    """Per (image_type, stage) counts and bytes for one post, from the filesystem"""
+    totals = {}
+    for relative, (size, _) in walk(root, post_id).items():
+        info = classify(relative)
+        entry = totals.setdefault((info['image_type'], info['stage']), {'files': 0, 'bytes': 0})
+        entry['files'] += 1
+        entry['bytes'] += size
+    return totals
+
+
+class StorageLedger:
+    """Ledger and running totals for the images under one posts root"""
+
+    def __init__(self, connect: Callable, root: str):
+        self.connect = connect
+        self.root = os.path.abspath(root)
+        self._schema_ready = False
+        self._checked_backfill = False
+        self._lock = threading.Lock()
+
+    def _execute(self, callback):
+        conn = self.connect()
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    if not self._schema_ready:
+                        for sql in SCHEMA_SQL:
+                            cur.execute(sql)
+                        self._schema_ready = True
+                    return callback(cur)
+        finally:
+            conn.close()
+
+    def _ensure_backfilled(self):
+        """Baseline an empty ledger from the filesystem once per process"""
+        if self._checked_backfill:
+            return
+        with self._lock:
+            if self._checked_backfill:
+                return
+            def is_empty(cur):
+                cur.execute("SELECT 1 FROM image_storage_daily LIMIT 1")
+                return cur.fetchone() is None
+            if self._execute(is_empty):
+                self.reconcile(baseline=True)
+            self._checked_backfill = True
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _apply(cur, path: str, info: Optional[Dict], size: Optional[int], mtime_ns: Optional[int]) -> Tuple[int, int]:
+        """Upsert (or delete, when ``size`` is None) one file row and move the totals; returns (byte delta, file delta)"""
+        # FOR UPDATE locks nothing while the path has no row yet, so concurrent
+        # first records of one path are serialised on a per-path advisory lock
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (path,))
+        cur.execute("""
+            SELECT post_id, image_type, stage, size_bytes FROM image_storage_files
+            WHERE path = %s FOR UPDATE
+        """, (path,))
+        old = cur.fetchone()
+        if size is None:
+            if old is None:
+                return 0, 0
+            cur.execute("DELETE FROM image_storage_files WHERE path = %s", (path,))
+        else:
+            cur.execute("""
+                INSERT INTO image_storage_files
+                (path, post_id, image_type, stage, section_id, filename, size_bytes, mtime_ns)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (path) DO UPDATE
+                SET size_bytes = EXCLUDED.size_bytes, mtime_ns = EXCLUDED.mtime_ns, updated_at = NOW()
+            """, (path, info['post_id'], info['image_type'], info['stage'], info['section_id'],
+                  info['filename'], size, mtime_ns))
+
+        moves = []
+        if old is not None:
+            moves.append((old[0], old[1], old[2], -1, -old[3]))
+        if size is not None:
+            moves.append((info['post_id'], info['image_type'], info['stage'], 1, size))
+        for post_id, image_type, stage, files, nbytes in moves:
+            cur.execute("""
+                INSERT INTO image_storage_totals (post_id, image_type, stage, file_count, total_bytes)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (post_id, image_type, stage) DO UPDATE
+                SET file_count = image_storage_totals.file_count + EXCLUDED.file_count,
+                    total_bytes = image_storage_totals.total_bytes + EXCLUDED.total_bytes
+            """, (post_id, image_type, stage, files, nbytes))
+
+        files_delta = (1 if size is not None else 0) - (1 if old is not None else 0)
+        return (size or 0) - (old[3] if old else 0), files_delta
+
+    @staticmethod
+    def _record_day(cur, bytes_added: int, bytes_removed: int, files_added: int, files_removed: int):
+        """Add to today's growth row and stamp it with the current library totals"""
+        cur.execute("""
+            INSERT INTO image_storage_daily
+            (day, bytes_added, bytes_removed, files_added, files_removed, total_bytes, total_files)
+            SELECT CURRENT_DATE, %s, %s, %s, %s,
+                   COALESCE(SUM(total_bytes), 0), COALESCE(SUM(file_count), 0)
+            FROM image_storage_totals
+            ON CONFLICT (day) DO UPDATE
+            SET bytes_added = image_storage_daily.bytes_added + EXCLUDED.bytes_added,
+                bytes_removed = image_storage_daily.bytes_removed + EXCLUDED.bytes_removed,
+                files_added = image_storage_daily.files_added + EXCLUDED.files_added,
+                files_removed = image_storage_daily.files_removed + EXCLUDED.files_removed,
+                total_bytes = EXCLUDED.total_bytes, total_files = EXCLUDED.total_files
+        """, (bytes_added, bytes_removed, files_added, files_removed))
+
+    def record(self, paths: Iterable[str]):
+        """Account for files that were just written, replaced or deleted"""
+        changes = []
+        for path in paths:
+            relative = os.path.relpath(os.path.abspath(path), self.root)
+            info = classify(relative)
+            if info is None:
+                continue
+            try:
+                stat = os.stat(path)
+                changes.append((relative, info, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                changes.append((relative, info, None, None))
+        if not changes:
+            return
+        self._ensure_backfilled()
+
+        def write(cur):
+            added = removed = files_added = files_removed = 0
+            # Path order, so transactions take the per-path locks in the same order
+            for relative, info, size, mtime_ns in sorted(changes, key=lambda change: change[0]):
+                delta, files_delta = self._apply(cur, relative, info, size, mtime_ns)
+                added += max(delta, 0)
+                removed += max(-delta, 0)
+                files_added += max(files_delta, 0)
+                files_removed += max(-files_delta, 0)
+            self._record_day(cur, added, removed, files_added, files_removed)
+        self._execute(write)
+
+    def reconcile(self, baseline: bool = False) -> Dict:
+        """Bring the ledger in line with the filesystem and rebuild the totals.
+
+        With ``baseline`` the differences are not counted as growth (first fill).
+        """
+        on_disk = walk(self.root)
+
+        def sync(cur):
+            cur.execute("SELECT path, size_bytes, mtime_ns FROM image_storage_files")
+            recorded = {path: (size, mtime) for path, size, mtime in cur.fetchall()}
+            changed = [path for path, stat in on_disk.items() if recorded.get(path) != stat]
+            missing = [path for path in recorded if path not in on_disk]
+
+            added = removed = 0
+            for path in changed:
+                info = classify(path)
+                size, mtime_ns = on_disk[path]
+                cur.execute("""
+                    INSERT INTO image_storage_files
+                    (path, post_id, image_type, stage, section_id, filename, size_bytes, mtime_ns)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (path) DO UPDATE
+                    SET size_bytes = EXCLUDED.size_bytes, mtime_ns = EXCLUDED.mtime_ns, updated_at = NOW()
+                """, (path, info['post_id'], info['image_type'], info['stage'], info['section_id'],
+                      info['filename'], size, mtime_ns))
+                delta = size - (recorded[path][0] if path in recorded else 0)
+                added += max(delta, 0)
+                removed += max(-delta, 0)
+            if missing:
+                removed += sum(recorded[path][0] for path in missing)
+                cur.execute("DELETE FROM image_storage_files WHERE path = ANY(%s)", (missing,))
+
+            cur.execute("DELETE FROM image_storage_totals")
+            cur.execute("""
+                INSERT INTO image_storage_totals (post_id, image_type, stage, file_count, total_bytes)
+                SELECT post_id, image_type, stage, COUNT(*), SUM(size_bytes)
+                FROM image_storage_files
+                GROUP BY post_id, image_type, stage
+            """)
+            new_files = len([path for path in changed if path not in recorded])
+            if baseline:
+                self._record_day(cur, 0, 0, 0, 0)
+            else:
+                self._record_day(cur, added, removed, new_files, len(missing))
+            return {'files': len(on_disk), 'changed': len(changed), 'removed': len(missing)}
+
+        result = self._execute(sync)
+        logger.info(f"Storage ledger reconciled: {result}")
+        return result
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def post_totals(self, post_id: int) -> Dict[Tuple[str, str], Dict]:
+        """Per (image_type, stage) counts and bytes for one post"""
+        self._ensure_backfilled()
+
+        def query(cur):
+            cur.execute("""
+                SELECT image_type, stage, file_count, total_bytes FROM image_storage_totals
+                WHERE post_id = %s AND file_count > 0
+            """, (post_id,))
+            return {(image_type, stage): {'files': files, 'bytes': int(nbytes)}
+                    for image_type, stage, files, nbytes in cur.fetchall()}
+        return self._execute(query)
+
+    def summary(self, largest: int = 10, trend_days: int = TREND_DAYS) -> Dict:
+        """Library-wide totals, largest files and daily growth"""
+        self._ensure_backfilled()
+
+        def query(cur):
+            cur.execute("""
+                SELECT post_id, image_type, stage, file_count, total_bytes FROM image_storage_totals
+                WHERE file_count > 0
+            """)
+            totals = cur.fetchall()
+            cur.execute("""
+                SELECT path, post_id, image_type, stage, section_id, filename, size_bytes
+                FROM image_storage_files
+                ORDER BY size_bytes DESC
+                LIMIT %s
+            """, (largest,))
+            files = cur.fetchall()
+            cur.execute("""
+                SELECT day, bytes_added, bytes_removed, files_added, total_bytes, total_files
+                FROM image_storage_daily
+                ORDER BY day DESC
+                LIMIT %s
+            """, (trend_days,))
+            days = list(reversed(cur.fetchall()))
+            return totals, files, days
+        totals, files, days = self._execute(query)
+
+        by_type = {image_type: 0 for image_type in IMAGE_TYPES}
+        by_stage, by_post = {}, {}
+        total_bytes = total_files = 0
+        for post_id, image_type, stage, count, nbytes in totals:
+            by_type[image_type] = by_type.get(image_type, 0) + nbytes
+            by_stage[stage] = by_stage.get(stage, 0) + nbytes
+            by_post[post_id] = by_post.get(post_id, 0) + nbytes
+            total_bytes += nbytes
+            total_files += count
+
+        return {
+            'total_bytes': int(total_bytes),
+            'total_files': int(total_files),
+            'by_type': {key: int(value) for key, value in by_type.items()},
+            'by_stage': {key: int(value) for key, value in by_stage.items()},
+            'by_post': {key: int(value) for key, value in by_post.items()},
+            'largest_files': [
+                {'path': path, 'post_id': post_id, 'type': image_type, 'stage': stage,
+                 'section_id': section_id, 'filename': filename, 'size_bytes': int(size)}
+                for path, post_id, image_type, stage, section_id, filename, size in files
+            ],
+            'daily': [
+                {'day': day.isoformat(), 'bytes_added': int(added), 'bytes_removed': int(removed),
+                 'files_added': files_added, 'total_bytes': int(day_total), 'total_files': day_files}
+                for day, added, removed, files_added, day_total, day_files in days
+            ]
+        }
+
+
+def main():
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description='Blog image storage ledger')
+    parser.add_argument('--reconcile', action='store_true', help='sync the ledger with the filesystem')
+    parser.add_argument('--root', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                       'static', 'content', 'posts'))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    def connect():
+        return psycopg2.connect(
+            host=os.getenv('DB_HOST', 'localhost'),
+            database=os.getenv('DB_NAME', 'blog'),
+            user=os.getenv('DB_USER', 'nickfiddes'),
+            password=os.getenv('DB_PASSWORD', '')
+        )
+
+    ledger = StorageLedger(connect, args.root)
+    if args.reconcile:
+        print(ledger.reconcile())
+    summary = ledger.summary()
+    print(f"{summary['total_files']} files, {summary['total_bytes'] / (1024 * 1024):.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from flask import Flask, render_template, jsonify, request, send_file, redirect, url_for
 import requests
 import os
+import sys
 import logging
 import json
 from datetime import datetime
@@ -12,44 +13,19 @@ import psycopg.rows
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+app = Flask(__name__, template_folder="templates", static_folder="static")
+
+# Shared modules (image serving) live in the project root's config package
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+from config.image_serving import send_image, versioned_url
+from llm_client import LLMError, LLMTimeoutError, get_llm_client, get_ollama_supervisor
+
+
 def ensure_ollama_running():
-    """Check if Ollama is running and start it if needed."""
+    """Check if Ollama is running and start it if needed (shared supervisor, warms models)."""
     try:
-        # Check if Ollama is already running
-        response = requests.get('http://localhost:11434/api/tags', timeout=5)
-        if response.status_code == 200:
-            logger.info("Ollama is already running")
-            return True
-    except requests.exceptions.ConnectionError:
-        logger.info("Ollama is not running, attempting to start it...")
-    except Exception as e:
-        logger.warning(f"Error checking Ollama status: {e}")
-    
-    try:
-        # Try to start Ollama
-        import subprocess
-        import time
-        
-        logger.info("Starting Ollama service...")
-        # Start Ollama in the background
-        subprocess.Popen(['ollama', 'serve'], 
-                        stdout=subprocess.DEVNULL, 
-                        stderr=subprocess.DEVNULL)
-        
-        # Wait for Ollama to start up
-        for attempt in range(30):  # Wait up to 30 seconds
-            time.sleep(1)
-            try:
-                response = requests.get('http://localhost:11434/api/tags', timeout=2)
-                if response.status_code == 200:
-                    logger.info("Ollama started successfully")
-                    return True
-            except requests.exceptions.ConnectionError:
-                continue
-        
-        logger.error("Failed to start Ollama after 30 seconds")
-        return False
-        
+        return get_ollama_supervisor().ensure_running()
     except FileNotFoundError:
         logger.error("Ollama not found in PATH. Please install Ollama first.")
         return False
@@ -57,7 +33,9 @@ def ensure_ollama_running():
         logger.error(f"Error starting Ollama: {e}")
         return False
 
-app = Flask(__name__, template_folder="templates", static_folder="static")
+# Posts directory of the blog-images static tree
+POSTS_IMAGES_ROOT = os.getenv('BLOG_IMAGES_POSTS_ROOT',
+                              os.path.join(PROJECT_ROOT, 'blog-images', 'static', 'content', 'posts'))
 
 # Custom Jinja2 filter to strip HTML document structure
 @app.template_filter('strip_html_doc')
@@ -92,26 +70,17 @@ def strip_html_doc(content):
 @app.route('/static/content/posts/<int:post_id>/sections/<int:section_id>/<directory>/<filename>')
 def serve_section_image(post_id, section_id, directory, filename):
     """Serve section images from the blog-images directory."""
-    import os
-    blog_images_static = "/Users/nickfiddes/Code/projects/blog/blog-images/static"
-    image_path = os.path.join(blog_images_static, "content", "posts", str(post_id), "sections", str(section_id), directory, filename)
-    
-    if os.path.exists(image_path):
-        return send_file(image_path)
-    else:
-        return "Image not found", 404
+    return send_image(POSTS_IMAGES_ROOT, f"{post_id}/sections/{section_id}/{directory}/{filename}")
 
 @app.route('/static/content/posts/<int:post_id>/header/<directory>/<filename>')
 def serve_header_image(post_id, directory, filename):
     """Serve header images from the blog-images directory."""
-    import os
-    blog_images_static = "/Users/nickfiddes/Code/projects/blog/blog-images/static"
-    image_path = os.path.join(blog_images_static, "content", "posts", str(post_id), "header", directory, filename)
-    
-    if os.path.exists(image_path):
-        return send_file(image_path)
-    else:
-        return "Image not found", 404
+    return send_image(POSTS_IMAGES_ROOT, f"{post_id}/header/{directory}/{filename}")
+
+@app.template_filter('versioned_image')
+def versioned_image(url):
+    """Post image URL with its version token, so the browser can cache it as immutable."""
+    return versioned_url(url, POSTS_IMAGES_ROOT)
 
 # Database connection function (shared with blog-core)
 def get_db_connection():
@@ -300,7 +269,7 @@ def test_simple():
             cur.execute("""
                 SELECT id, name, sku, price, description, image_url, url, category_ids
                 FROM clan_products 
-                WHERE price IS NOT NULL AND price != ''
+                WHERE price IS NOT NULL AND price != '' AND deleted_at IS NULL
                 ORDER BY RANDOM() 
                 LIMIT 1
             """)
@@ -328,7 +297,7 @@ def select_random_product():
             cur.execute("""
                 SELECT id, name, sku, price, description, image_url, url, category_ids
                 FROM clan_products 
-                WHERE price IS NOT NULL AND price != ''
+                WHERE price IS NOT NULL AND price != '' AND deleted_at IS NULL
                 ORDER BY RANDOM() 
                 LIMIT 100
             """)
@@ -436,45 +405,25 @@ def generate_product_content():
             )
             
             # Call LLM
-            llm_request = {
-                'provider': 'ollama',
-                'model': 'mistral',
-                'prompt': prompt,
-                'temperature': 0.8,
-                'max_tokens': 200
-            }
+            try:
+                generated_text = get_llm_client().generate(prompt, model='mistral', temperature=0.8,
+                                                           max_tokens=200, timeout=30)
+            except LLMError as e:
+                logger.error(f"LLM call failed: {e}")
+                return jsonify({'success': False, 'error': 'LLM service unavailable'})
             
-            response = requests.post('http://localhost:11434/api/generate', 
-                                   json=llm_request, timeout=30)
+            # Save to database
+            today = datetime.now().date()
+            cur.execute("""
+                INSERT INTO daily_posts (product_id, post_date, content_text, content_type, status)
+                VALUES (%s, %s, %s, %s, 'draft')
+            """, (product_id, today, generated_text, content_type))
+            conn.commit()
             
-            if response.status_code == 200:
-                # Parse streaming response
-                response_lines = response.text.strip().split('\n')
-                generated_text = ""
-                
-                for line in response_lines:
-                    if line.strip():
-                        try:
-                            line_data = json.loads(line)
-                            if 'response' in line_data:
-                                generated_text += line_data['response']
-                        except json.JSONDecodeError:
-                            continue
-                
-                # Save to database
-                today = datetime.now().date()
-                cur.execute("""
-                    INSERT INTO daily_posts (product_id, post_date, content_text, content_type, status)
-                    VALUES (%s, %s, %s, %s, 'draft')
-                """, (product_id, today, generated_text, content_type))
-                conn.commit()
-                
-                return jsonify({
-                    'success': True, 
-                    'content': generated_text
-                })
-            else:
-                return jsonify({'success': False, 'error': 'LLM service unavailable'})
+            return jsonify({
+                'success': True, 
+                'content': generated_text
+            })
                 
     except Exception as e:
         logger.error(f"Error generating content: {e}")
@@ -2578,7 +2527,7 @@ def update_cross_promotion(post_id):
             return jsonify({'error': 'Post not found'}), 404
 
 # Clan API functionality moved to separate module
-from clan_api import get_categories, get_products, get_category_products, get_related_products, refresh_cache, get_cache_stats
+from clan_api import get_categories, get_products, search_products, get_category_products, get_related_products, refresh_cache, get_cache_stats
 
 @app.route('/api/clan/categories')
 def clan_categories():
@@ -2588,11 +2537,20 @@ def clan_categories():
 
 @app.route('/api/clan/products')
 def clan_products():
-    """Search products from clan.com API."""
+    """Search cached clan.com products.
+    
+    Optional ?category=<id> filter; the next page's cursor is returned in the
+    X-Next-Cursor header and passed back as ?cursor=.
+    """
     query = request.args.get('q', '')
-    limit = request.args.get('limit', 50)
-    products = get_products(limit=int(limit), query=query)
-    return jsonify(products)
+    limit = request.args.get('limit', 50, type=int)
+    category_id = request.args.get('category', type=int)
+    result = search_products(query=query, category_id=category_id, limit=limit,
+                             after=request.args.get('cursor'))
+    response = jsonify(result['products'])
+    if result['next_cursor']:
+        response.headers['X-Next-Cursor'] = result['next_cursor']
+    return response
 
 @app.route('/api/clan/category/<int:category_id>/products')
 def clan_category_products(category_id):
@@ -2713,65 +2671,77 @@ def save_individual_product():
         logger.error(f"Error saving individual product: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _load_post_for_publish(post_id):
+    """Post and sections as publish_to_clan expects them, or (None, None) if the post does not exist"""
+    # Get post data
+    post = get_post_with_development(post_id)
+    if not post:
+        return None, None
+    
+    sections = get_post_sections_with_images(post_id)
+    
+    # Fix field mapping - ensure post has the fields our function expects
+    if post.get('post_id') and not post.get('id'):
+        post['id'] = post['post_id']
+    
+    # Ensure summary field exists and has content
+    if not post.get('summary'):
+        post['summary'] = post.get('intro_blurb')
+        if not post['summary']:
+            raise ValueError("Post must have either summary or intro_blurb")
+    
+    # Ensure created_at is handled properly
+    if post.get('created_at') and not isinstance(post['created_at'], str):
+        post['created_at'] = post['created_at'].isoformat() if hasattr(post['created_at'], 'isoformat') else str(post['created_at'])
+    
+    # Add header image if exists
+    header_image_path = find_header_image(post_id)
+    if header_image_path:
+        with get_db_connection() as conn:
+            cur = conn.cursor(row_factory=psycopg.rows.dict_row)
+            cur.execute("""
+                SELECT header_image_caption, header_image_title, header_image_width, header_image_height,
+                       cross_promotion_category_id, cross_promotion_category_title,
+                       cross_promotion_product_id, cross_promotion_product_title,
+                       cross_promotion_category_position, cross_promotion_product_position,
+                       cross_promotion_category_widget_html, cross_promotion_product_widget_html
+                FROM post WHERE id = %s
+            """, (post_id,))
+            header_data = cur.fetchone()
+            
+            post['header_image'] = {
+                'path': header_image_path,
+                'alt_text': f"Header image for {post.get('title', 'this post')}",
+                'caption': header_data['header_image_caption'] if header_data else None,
+                'title': header_data['header_image_title'] if header_data else None,
+                'width': header_data['header_image_width'] if header_data else None,
+                'height': header_data['header_image_height'] if header_data else None
+            }
+            
+            post['cross_promotion'] = {
+                'category_id': header_data['cross_promotion_category_id'] if header_data else None,
+                'category_title': header_data['cross_promotion_category_title'] if header_data else None,
+                'product_id': header_data['cross_promotion_product_id'] if header_data else None,
+                'product_title': header_data['cross_promotion_product_title'] if header_data else None,
+                'category_position': header_data.get('cross_promotion_category_position'),
+                'product_position': header_data.get('cross_promotion_product_position'),
+                'category_widget_html': header_data.get('cross_promotion_category_widget_html'),
+                'product_widget_html': header_data.get('cross_promotion_product_widget_html')
+            }
+    
+    return post, sections
+
 @app.route('/api/publish/<int:post_id>', methods=['POST'])
 def publish_post_to_clan(post_id):
     """Publish a post to clan.com"""
     try:
         # Get post data
-        post = get_post_with_development(post_id)
+        post, sections = _load_post_for_publish(post_id)
         if not post:
             return jsonify({'success': False, 'error': 'Post not found'}), 404
         
-        sections = get_post_sections_with_images(post_id)
-        
-        # Fix field mapping - ensure post has the fields our function expects
-        if post.get('post_id') and not post.get('id'):
-            post['id'] = post['post_id']
-        
-        # Ensure summary field exists and has content
-        if not post.get('summary'):
-            post['summary'] = post.get('intro_blurb')
-            if not post['summary']:
-                raise ValueError("Post must have either summary or intro_blurb")
-        
-        # Ensure created_at is handled properly
-        if post.get('created_at') and not isinstance(post['created_at'], str):
-            post['created_at'] = post['created_at'].isoformat() if hasattr(post['created_at'], 'isoformat') else str(post['created_at'])
-        
-        # Add header image if exists
-        header_image_path = find_header_image(post_id)
-        if header_image_path:
-            with get_db_connection() as conn:
-                cur = conn.cursor(row_factory=psycopg.rows.dict_row)
-                cur.execute("""
-                    SELECT header_image_caption, header_image_title, header_image_width, header_image_height,
-                           cross_promotion_category_id, cross_promotion_category_title,
-                           cross_promotion_product_id, cross_promotion_product_title,
-                           cross_promotion_category_position, cross_promotion_product_position,
-                           cross_promotion_category_widget_html, cross_promotion_product_widget_html
-                    FROM post WHERE id = %s
-                """, (post_id,))
-                header_data = cur.fetchone()
-                
-                post['header_image'] = {
-                    'path': header_image_path,
-                    'alt_text': f"Header image for {post.get('title', 'this post')}",
-                    'caption': header_data['header_image_caption'] if header_data else None,
-                    'title': header_data['header_image_title'] if header_data else None,
-                    'width': header_data['header_image_width'] if header_data else None,
-                    'height': header_data['header_image_height'] if header_data else None
-                }
-                
-                post['cross_promotion'] = {
-                    'category_id': header_data['cross_promotion_category_id'] if header_data else None,
-                    'category_title': header_data['cross_promotion_category_title'] if header_data else None,
-                    'product_id': header_data['cross_promotion_product_id'] if header_data else None,
-                    'product_title': header_data['cross_promotion_product_title'] if header_data else None,
-                    'category_position': header_data.get('cross_promotion_category_position'),
-                    'product_position': header_data.get('cross_promotion_product_position'),
-                    'category_widget_html': header_data.get('cross_promotion_category_widget_html'),
-                    'product_widget_html': header_data.get('cross_promotion_product_widget_html')
-                }
+        # Republish even if nothing changed since the last publish
+        force = bool((request.get_json(silent=True) or {}).get('force')) or request.args.get('force') == '1'
         
         # Import publishing class
         from clan_publisher import ClanPublisher
@@ -2786,7 +2756,7 @@ def publish_post_to_clan(post_id):
         
         # Create publisher instance and attempt to publish
         publisher = ClanPublisher()
-        result = publisher.publish_to_clan(post, sections)
+        result = publisher.publish_to_clan(post, sections, force=force)
         
         # Debug: Log the result
         logger.info(f"Publishing result: {result}")
@@ -2808,9 +2778,11 @@ def publish_post_to_clan(post_id):
             
             return jsonify({
                 'success': True, 
-                'message': 'Post published successfully to clan.com',
+                'message': 'No changes since last publish' if result.get('skipped') else 'Post published successfully to clan.com',
                 'clan_post_id': result.get('clan_post_id'),
-                'url': result.get('url')
+                'url': result.get('url'),
+                'skipped': bool(result.get('skipped')),
+                'changes': result.get('changes')
             })
         else:
             # Update database with error
@@ -2850,6 +2822,23 @@ def publish_post_to_clan(post_id):
         
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/publish/<int:post_id>/diff')
+def publish_post_diff(post_id):
+    """Dry run of a republish: what changed since the last publish to clan.com (nothing is uploaded)"""
+    try:
+        post, sections = _load_post_for_publish(post_id)
+        if not post:
+            return jsonify({'success': False, 'error': 'Post not found'}), 404
+        
+        from clan_publisher import ClanPublisher
+        publisher = ClanPublisher()
+        result = publisher.publish_to_clan(post, sections, dry_run=True)
+        return jsonify(result), 200 if result['success'] else 500
+        
+    except Exception as e:
+        logger.error(f"Error diffing post {post_id} against last publish: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/clan/catalog/download', methods=['POST'])
 def download_catalog():
     """Manually trigger full catalog download from clan.com"""
@@ -2864,7 +2853,9 @@ def download_catalog():
                 'success': True,
                 'message': result.get('message'),
                 'total_downloaded': result.get('total_downloaded'),
-                'stored_count': result.get('stored_count')
+                'stored_count': result.get('stored_count'),
+                'not_modified': result.get('not_modified', False),
+                'diff': result.get('diff')
             })
         else:
             return jsonify({
@@ -3710,46 +3701,18 @@ def execute_llm_request():
                 'error': 'Failed to start Ollama service. Please ensure Ollama is installed and try again.'
             }), 500
         
-        # Call Ollama directly
-        import requests
-        ollama_response = requests.post(
-            'http://localhost:11434/api/generate',
-            json={
-                'model': model,
-                'prompt': prompt,
-                'options': {
-                    'temperature': temperature,
-                    'num_predict': max_tokens
-                }
-            },
-            timeout=60
-        )
+        generated_text = get_llm_client().generate(prompt, model=model, temperature=temperature,
+                                                   max_tokens=max_tokens, timeout=60)
         
-        if ollama_response.status_code == 200:
-            # Ollama returns streaming JSON lines, we need to parse them
-            response_lines = ollama_response.text.strip().split('\n')
-            generated_text = ""
-            
-            for line in response_lines:
-                if line.strip():
-                    try:
-                        line_data = json.loads(line)
-                        if 'response' in line_data:
-                            generated_text += line_data['response']
-                    except json.JSONDecodeError:
-                        continue  # Skip malformed lines
-            
-            return jsonify({
-                'output': generated_text,
-                'result': generated_text,
-                'status': 'success',
-                'model_used': model,
-                'tokens_generated': len(generated_text.split())
-            })
-        else:
-            return jsonify({'error': f'Ollama error: {ollama_response.status_code}'}), ollama_response.status_code
+        return jsonify({
+            'output': generated_text,
+            'result': generated_text,
+            'status': 'success',
+            'model_used': model,
+            'tokens_generated': len(generated_text.split())
+        })
             
-    except requests.exceptions.RequestException as e:
+    except LLMError as e:
         logger.error(f"Error connecting to Ollama: {e}")
         return jsonify({'error': 'Failed to connect to Ollama'}), 500
     except Exception as e:
@@ -3759,7 +3722,6 @@ def execute_llm_request():
 @app.route('/api/syndication/ollama/direct', methods=['POST'])
 def direct_ollama_request():
     """NEW DIRECT OLLAMA ENDPOINT - bypasses old code completely."""
-    import requests  # Import at top of function to avoid UnboundLocalError
     import time  # Import for sleep function in retry mechanism
     
     try:
@@ -3777,9 +3739,6 @@ def direct_ollama_request():
         if not prompt:
             return jsonify({'error': 'No prompt provided'}), 400
         
-        # Call Ollama directly
-        # Note: requests import moved to top of function to avoid UnboundLocalError
-        
         # Add better error handling and model validation
         logger.info(f"Making Ollama request to model: {model}")
         logger.info(f"Prompt length: {len(prompt)} characters")
@@ -3791,26 +3750,10 @@ def direct_ollama_request():
             prompt = prompt[:max_prompt_length] + "\n\n[Content truncated due to length]"
             logger.info(f"Truncated prompt length: {len(prompt)} characters")
         
-        # First check if the model is available (with better error handling)
-        available_models = []
+        # First check if the model is available
         try:
-            model_check = requests.get('http://localhost:11434/api/tags', timeout=5)  # Reduced timeout
-            if model_check.status_code == 200:
-                try:
-                    available_models = [m['name'] for m in model_check.json().get('models', [])]
-                    logger.info(f"Available models: {available_models}")
-                except Exception as parse_error:
-                    logger.warning(f"Failed to parse models response: {parse_error}")
-                    available_models = []
-            else:
-                logger.warning(f"Model check returned status {model_check.status_code}")
-                available_models = []
-        except requests.exceptions.ConnectionError:
-            logger.warning("Cannot connect to Ollama for model check - proceeding with default model")
-            available_models = []
-        except requests.exceptions.Timeout:
-            logger.warning("Model check timed out - proceeding with default model")
-            available_models = []
+            available_models = get_llm_client().list_models('ollama')
+            logger.info(f"Available models: {available_models}")
         except Exception as e:
             logger.warning(f"Error checking models: {e} - proceeding with default model")
             available_models = []
@@ -3834,114 +3777,40 @@ def direct_ollama_request():
                 logger.info(f"Defaulting to stable model: mistral:latest")
                 model = 'mistral:latest'
         
-        # Make the actual request with retry mechanism
+        # Make the actual request with retry mechanism; the shared client
+        # restarts Ollama through the supervisor if it is not running
         max_retries = 2
-        retry_count = 0
         
-        while retry_count <= max_retries:
+        for attempt in range(max_retries + 1):
             try:
-                logger.info(f"Attempting Ollama request (attempt {retry_count + 1}/{max_retries + 1})")
-                ollama_response = requests.post(
-                    'http://localhost:11434/api/generate',
-                    json={
-                        'model': model,
-                        'prompt': prompt,
-                        'options': {
-                            'temperature': temperature,
-                            'num_predict': max_tokens
-                        }
-                    },
-                    timeout=120  # Increased timeout for large models
-                )
+                logger.info(f"Attempting Ollama request (attempt {attempt + 1}/{max_retries + 1})")
+                generated_text = get_llm_client().generate(prompt, model=model, temperature=temperature,
+                                                           max_tokens=max_tokens, timeout=120)  # Increased timeout for large models
                 break  # Success, exit retry loop
                 
-            except requests.exceptions.Timeout:
-                logger.error(f"Ollama request timed out after 120 seconds (attempt {retry_count + 1})")
-                if retry_count == max_retries:
+            except LLMTimeoutError:
+                logger.error(f"Ollama request timed out after 120 seconds (attempt {attempt + 1})")
+                if attempt == max_retries:
                     return jsonify({'error': 'Ollama request timed out after multiple attempts. The model might be too large or the prompt too long.'}), 504
-                retry_count += 1
-                logger.info(f"Retrying in 2 seconds...")
-                time.sleep(2)
                 
-            except requests.exceptions.ConnectionError as e:
-                logger.error(f"Ollama connection error (attempt {retry_count + 1}): {e}")
-                if retry_count == max_retries:
-                    # Try to restart Ollama automatically
-                    logger.info("Attempting to restart Ollama automatically...")
-                    try:
-                        import subprocess
-                        import os
-                        import signal
-                        
-                        # Start Ollama in background
-                        process = subprocess.Popen(
-                            ['ollama', 'serve'],
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            preexec_fn=os.setsid if hasattr(os, 'setsid') else None
-                        )
-                        
-                        # Wait for Ollama to start
-                        time.sleep(5)
-                        
-                        # Test if it's working
-                        test_response = requests.get('http://localhost:11434/api/tags', timeout=10)
-                        if test_response.status_code == 200:
-                            logger.info("Ollama restarted successfully, retrying request...")
-                            # Reset retry count and try again
-                            retry_count = 0
-                            max_retries = 1  # Give it one more try
-                            time.sleep(2)
-                            continue
-                        else:
-                            logger.error("Failed to restart Ollama automatically")
-                            return jsonify({'error': f'Ollama connection error after multiple attempts: {str(e)}. Ollama may have crashed and could not be restarted automatically.'}), 500
-                            
-                    except Exception as restart_error:
-                        logger.error(f"Failed to restart Ollama: {restart_error}")
-                        return jsonify({'error': f'Ollama connection error after multiple attempts: {str(e)}. Ollama may have crashed and could not be restarted automatically.'}), 500
-                
-                retry_count += 1
-                logger.info(f"Retrying in 2 seconds...")
-                time.sleep(2)
-                
-            except Exception as e:
-                logger.error(f"Unexpected error during Ollama request (attempt {retry_count + 1}): {e}")
-                if retry_count == max_retries:
-                    return jsonify({'error': f'Unexpected error after multiple attempts: {str(e)}'}), 500
-                retry_count += 1
-                logger.info(f"Retrying in 2 seconds...")
-                time.sleep(2)
-        
-        logger.info(f"Ollama request successful after {retry_count + 1} attempts")
-        
-        if ollama_response.status_code == 200:
-            # Ollama returns streaming JSON lines, we need to parse them
-            response_lines = ollama_response.text.strip().split('\n')
-            generated_text = ""
-            
-            for line in response_lines:
-                if line.strip():
-                    try:
-                        line_data = json.loads(line)
-                        if 'response' in line_data:
-                            generated_text += line_data['response']
-                    except json.JSONDecodeError:
-                        continue  # Skip malformed lines
+            except LLMError as e:
+                logger.error(f"Ollama request failed (attempt {attempt + 1}): {e}")
+                if attempt == max_retries:
+                    return jsonify({'error': f'Ollama error after multiple attempts: {str(e)}'}), 500
             
-            return jsonify({
-                'output': generated_text,
-                'result': generated_text,
-                'status': 'success',
-                'model_used': model,
-                'tokens_generated': len(generated_text.split())
-            })
-        else:
-            return jsonify({'error': f'Ollama error: {ollama_response.status_code}'}), ollama_response.status_code
+            logger.info(f"Retrying in 2 seconds...")
+            time.sleep(2)
+        
+        logger.info(f"Ollama request successful after {attempt + 1} attempts")
+        
+        return jsonify({
+            'output': generated_text,
+            'result': generated_text,
+            'status': 'success',
+            'model_used': model,
+            'tokens_generated': len(generated_text.split())
+        })
             
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error connecting to Ollama: {e}")
-        return jsonify({'error': f'Failed to connect to Ollama: {str(e)}'}), 500
     except Exception as e:
         logger.error(f"Error executing LLM request: {e}")
         return jsonify({'error': f'Failed to execute LLM request: {str(e)}'}), 500
@@ -3950,19 +3819,12 @@ def direct_ollama_request():
 def test_ollama_connection():
     """Simple test endpoint to check Ollama connectivity."""
     try:
-        import requests
-        response = requests.get('http://localhost:11434/api/tags', timeout=10)
-        if response.status_code == 200:
-            return jsonify({
-                'status': 'success',
-                'message': 'Ollama is accessible',
-                'models': response.json().get('models', [])
-            })
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': f'Ollama returned status {response.status_code}'
-            }), 500
+        models = get_llm_client().list_models('ollama')
+        return jsonify({
+            'status': 'success',
+            'message': 'Ollama is accessible',
+            'models': models
+        })
     except Exception as e:
         logger.error(f"Error testing Ollama connection: {e}")
         return jsonify({
@@ -3972,75 +3834,34 @@ def test_ollama_connection():
 
 @app.route('/api/syndication/ollama/start', methods=['POST'])
 def start_ollama():
-    """Start Ollama as a background process."""
+    """Start Ollama through the shared supervisor (readiness polling, model warm-up)."""
+    supervisor = get_ollama_supervisor()
     try:
-        import subprocess
-        import os
-        import signal
-        import time
-        
-        # Check if Ollama is already running
-        try:
-            import requests
-            response = requests.get('http://localhost:11434/api/tags', timeout=5)
-            if response.status_code == 200:
-                return jsonify({
-                    'status': 'success',
-                    'message': 'Ollama is already running',
-                    'already_running': True
-                })
-        except:
-            pass  # Ollama is not running, continue to start it
-        
-        # Start Ollama in the background
-        try:
-            # Use subprocess.Popen to start Ollama in background
-            process = subprocess.Popen(
-                ['ollama', 'serve'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                preexec_fn=os.setsid if hasattr(os, 'setsid') else None
-            )
-            
-            # Wait a moment for Ollama to start
-            time.sleep(3)
-            
-            # Test if Ollama is now accessible
-            try:
-                response = requests.get('http://localhost:11434/api/tags', timeout=10)
-                if response.status_code == 200:
-                    return jsonify({
-                        'status': 'success',
-                        'message': 'Ollama started successfully',
-                        'process_id': process.pid,
-                        'already_running': False
-                    })
-                else:
-                    # Kill the process if it didn't start properly
-                    if hasattr(os, 'killpg'):
-                        os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-                    else:
-                        process.terminate()
-                    raise Exception(f'Ollama started but returned status {response.status_code}')
-            except Exception as e:
-                # Kill the process if connection test failed
-                if hasattr(os, 'killpg'):
-                    os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-                else:
-                    process.terminate()
-                raise Exception(f'Failed to connect to Ollama after starting: {str(e)}')
-                
-        except FileNotFoundError:
+        if supervisor.is_healthy():
+            supervisor.warm_up_async()
             return jsonify({
-                'status': 'error',
-                'message': 'Ollama command not found. Please ensure Ollama is installed and in your PATH.'
-            }), 500
-        except Exception as e:
+                'status': 'success',
+                'message': 'Ollama is already running',
+                'already_running': True
+            })
+        if not supervisor.ensure_running():
             return jsonify({
                 'status': 'error',
-                'message': f'Failed to start Ollama: {str(e)}'
+                'message': 'Failed to start Ollama: not responding after start'
             }), 500
-            
+        stats = supervisor.stats()
+        return jsonify({
+            'status': 'success',
+            'message': 'Ollama started successfully',
+            'process_id': supervisor.pid,
+            'start_seconds': stats['start_seconds'],
+            'already_running': False
+        })
+    except FileNotFoundError:
+        return jsonify({
+            'status': 'error',
+            'message': 'Ollama command not found. Please ensure Ollama is installed and in your PATH.'
+        }), 500
     except Exception as e:
         logger.error(f"Error starting Ollama: {e}")
         return jsonify({
@@ -4048,6 +3869,11 @@ def start_ollama():
             'message': f'Error starting Ollama: {str(e)}'
         }), 500
 
+@app.route('/api/syndication/ollama/status', methods=['GET'])
+def ollama_status():
+    """Ollama health, loaded models and request latency."""
+    return jsonify(get_ollama_supervisor().stats())
+
 @app.route('/api/syndication/pieces', methods=['GET', 'POST'])
 def syndication_pieces():
     """Handle syndication pieces using existing llm_interaction table."""
@@ -4379,62 +4205,28 @@ def update_products():
 @app.route('/api/daily-product-posts/start-ollama', methods=['POST'])
 def start_ollama_daily_posts():
     """Start the Ollama service for AI content generation."""
+    supervisor = get_ollama_supervisor()
     try:
-        import subprocess
-        import os
-        
-        # Check if Ollama is already running
-        try:
-            result = subprocess.run(['pgrep', '-f', 'ollama'], 
-                                  capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                return jsonify({
-                    'success': True,
-                    'message': 'Ollama is already running'
-                })
-        except subprocess.TimeoutExpired:
-            pass
-        except Exception:
-            pass
-        
-        # Start Ollama in the background
-        try:
-            # Try to start Ollama serve
-            subprocess.Popen(['ollama', 'serve'], 
-                           stdout=subprocess.DEVNULL, 
-                           stderr=subprocess.DEVNULL,
-                           preexec_fn=os.setsid if hasattr(os, 'setsid') else None)
-            
-            # Give it a moment to start
-            import time
-            time.sleep(2)
-            
-            # Verify it's running
-            result = subprocess.run(['pgrep', '-f', 'ollama'], 
-                                  capture_output=True, text=True, timeout=5)
-            
-            if result.returncode == 0:
-                return jsonify({
-                    'success': True,
-                    'message': 'Ollama service started successfully'
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': 'Failed to start Ollama service'
-                })
-                
-        except FileNotFoundError:
+        if supervisor.is_healthy():
+            supervisor.warm_up_async()
             return jsonify({
-                'success': False,
-                'error': 'Ollama not found. Please install Ollama first.'
+                'success': True,
+                'message': 'Ollama is already running'
             })
-        except Exception as e:
+        if supervisor.ensure_running():
             return jsonify({
-                'success': False,
-                'error': f'Failed to start Ollama: {str(e)}'
+                'success': True,
+                'message': 'Ollama service started successfully'
             })
-            
+        return jsonify({
+            'success': False,
+            'error': 'Failed to start Ollama service'
+        })
+    except FileNotFoundError:
+        return jsonify({
+            'success': False,
+            'error': 'Ollama not found. Please install Ollama first.'
+        })
     except Exception as e:
         logger.error(f"Error starting Ollama: {e}")
         return jsonify({
@@ -5015,231 +4807,82 @@ def clear_queue():
             'error': f'Failed to clear queue: {str(e)}'
         }), 500
 
+batch_generator = None
+
+def get_batch_generator():
+    """Shared background batch generator (created on first use)."""
+    global batch_generator
+    if batch_generator is None:
+        from batch_generation import BatchGenerator
+        batch_generator = BatchGenerator(get_db_connection)
+    return batch_generator
+
 @app.route('/api/daily-product-posts/generate-batch', methods=['POST'])
 def generate_batch_items():
-    """Generate multiple items for the posting queue automatically."""
-    import time
-    start_time = time.time()
-    max_processing_time = 120  # 2 minutes max
+    """Start generating multiple items for the posting queue in the background.
     
+    Returns 202 with a job id; poll /api/daily-product-posts/generate-batch/<job_id>
+    for progress. Items appear in posting_queue as each one is generated.
+    """
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         count = data.get('count', 10)
         
-        if count < 1 or count > 50:
+        if not isinstance(count, int) or count < 1 or count > 50:
             return jsonify({
                 'success': False,
                 'error': 'Count must be between 1 and 50'
             }), 400
         
+        from batch_generation import LLM_PROVIDER
+        provider = data.get('provider', LLM_PROVIDER)
+        
         # Ensure Ollama is running before starting
-        if not ensure_ollama_running():
+        if provider == 'ollama' and not ensure_ollama_running():
             return jsonify({
                 'success': False,
                 'error': 'Failed to start Ollama service. Please ensure Ollama is installed and try again.'
             }), 500
         
-        generated_items = []
-        errors = []
-        
-        with get_db_connection() as conn:
-            cur = conn.cursor(row_factory=psycopg.rows.dict_row)
-            
-            # Get current queue count for scheduling
-            cur.execute("SELECT COUNT(*) as count FROM posting_queue WHERE status = 'pending'")
-            current_count = cur.fetchone()['count']
-            
-            # Get available content types
-            cur.execute("SELECT id, template_name, content_type, template_prompt FROM product_content_templates WHERE is_active = true")
-            content_types = cur.fetchall()
-            
-            if not content_types:
-                return jsonify({
-                    'success': False,
-                    'error': 'No content templates available'
-                }), 400
-            
-            # Generate items
-            for i in range(count):
-                # Check if we're running out of time
-                if time.time() - start_time > max_processing_time:
-                    logger.warning(f"Processing timeout reached after {i} items")
-                    errors.append(f"Processing timeout reached after {i} items")
-                    break
-                    
-                try:
-                    # Select random product using existing logic
-                    cur.execute("""
-                        SELECT id, name, sku, price, description, image_url, url, category_ids
-                        FROM clan_products
-                        WHERE price IS NOT NULL AND price != ''
-                        ORDER BY RANDOM()
-                        LIMIT 100
-                    """)
-                    all_products = cur.fetchall()
-                    
-                    if not all_products:
-                        errors.append(f"Item {i+1}: No products available")
-                        continue
-                    
-                    # Category-first selection
-                    category_ids = [20, 328, 18, 37, 19, 21, 100, 16]
-                    import random
-                    selected_category_id = random.choice(category_ids)
-                    
-                    # Filter products by selected category
-                    matching_products = []
-                    for product in all_products:
-                        if product['category_ids'] and selected_category_id in product['category_ids']:
-                            matching_products.append(product)
-                    
-                    # If no products found in this category, try other categories
-                    if not matching_products:
-                        for cat_id in category_ids:
-                            if cat_id != selected_category_id:
-                                for product in all_products:
-                                    if product['category_ids'] and cat_id in product['category_ids']:
-                                        matching_products.append(product)
-                                        selected_category_id = cat_id
-                                        break
-                                if matching_products:
-                                    break
-                    
-                    # If still no matches, just pick any product
-                    if not matching_products:
-                        selected_product = random.choice(all_products)
-                    else:
-                        selected_product = random.choice(matching_products)
-                    
-                    # Select random content type
-                    content_type = random.choice(content_types)
-                    logger.debug(f"Selected content type: {content_type}")
-                    
-                    # Generate content using Ollama - MUST succeed or skip this item
-                    
-                    # Prepare prompt with URL for call to action
-                    try:
-                        if not selected_product['description']:
-                            raise ValueError(f"Product {selected_product['name']} has no description")
-                        
-                        prompt = content_type['template_prompt'].format(
-                            product_name=selected_product['name'],
-                            product_description=selected_product['description'],
-                            product_url=selected_product['url']
-                        )
-                    except KeyError as e:
-                        logger.error(f"Missing field in content_type for item {i+1}: {e}")
-                        errors.append(f"Item {i+1}: Missing field in content_type - {str(e)}")
-                        continue
-                    except Exception as e:
-                        logger.error(f"Error formatting prompt for item {i+1}: {e}")
-                        errors.append(f"Item {i+1}: Error formatting prompt - {str(e)}")
-                        continue
-                    
-                    # Call Ollama API - this MUST work or we skip this item
-                    try:
-                        ollama_response = requests.post('http://localhost:11434/api/generate', 
-                            json={
-                                'model': 'mistral',
-                                'prompt': prompt,
-                                'stream': False
-                            },
-                            timeout=10  # Reduced timeout to prevent browser timeout
-                        )
-                        
-                        if ollama_response.status_code != 200:
-                            logger.error(f"Ollama API returned status {ollama_response.status_code} for item {i+1}")
-                            errors.append(f"Item {i+1}: Ollama API failed with status {ollama_response.status_code}")
-                            continue
-                            
-                        generated_content = ollama_response.json().get('response', '').strip()
-                        
-                        if not generated_content or len(generated_content) < 10:
-                            logger.error(f"Ollama returned empty or too short content for item {i+1}")
-                            errors.append(f"Item {i+1}: Ollama returned empty content")
-                            continue
-                            
-                    except requests.exceptions.ConnectionError:
-                        logger.error(f"Cannot connect to Ollama for item {i+1} - is Ollama running?")
-                        errors.append(f"Item {i+1}: Cannot connect to Ollama - please start Ollama first")
-                        continue
-                    except Exception as e:
-                        logger.error(f"Ollama generation failed for item {i+1}: {e}")
-                        errors.append(f"Item {i+1}: Ollama generation failed - {str(e)}")
-                        continue
-                    
-                    # Calculate next available posting time
-                    # Simple approach: spread items across next few days
-                    from datetime import datetime, timedelta
-                    base_date = datetime.now() + timedelta(days=1)  # Start tomorrow
-                    item_date = base_date + timedelta(days=i // 3)  # 3 items per day
-                    scheduled_date = item_date.strftime('%Y-%m-%d')
-                    
-                    # Distribute times throughout the day
-                    time_slots = ['09:00:00', '13:00:00', '17:00:00']
-                    scheduled_time = time_slots[i % 3]
-                    
-                    # Calculate scheduled_timestamp
-                    from datetime import datetime
-                    scheduled_timestamp = None
-                    if scheduled_date and scheduled_time:
-                        try:
-                            scheduled_timestamp = datetime.combine(scheduled_date, datetime.strptime(scheduled_time, '%H:%M:%S').time())
-                        except:
-                            scheduled_timestamp = None
-                    
-                    # Add to queue - all items in queue are ready by definition
-                    # Platform/channel/type come from daily-product-posts module context
-                    cur.execute("""
-                        INSERT INTO posting_queue 
-                        (product_id, scheduled_date, scheduled_time, schedule_name, timezone, 
-                         generated_content, queue_order, status, platform, channel_type, content_type, scheduled_timestamp)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, 'ready', 'facebook', 'feed_post', 'product', %s)
-                        RETURNING id, created_at
-                    """, (
-                        selected_product['id'],
-                        scheduled_date,
-                        scheduled_time,
-                        f"Auto-generated {content_type['template_name']}",
-                        'GMT',  # Default timezone
-                        generated_content,
-                        current_count + i + 1,
-                        scheduled_timestamp
-                    ))
-                    
-                    result = cur.fetchone()
-                    queue_id = result[0]
-                    created_at = result[1]
-                    
-                    generated_items.append({
-                        'product_name': selected_product['name'],
-                        'content_type': content_type['template_name'],
-                        'scheduled_date': scheduled_date,
-                        'scheduled_time': scheduled_time
-                    })
-                    
-                except Exception as e:
-                    logger.error(f"Error generating item {i+1}: {e}")
-                    errors.append(f"Item {i+1}: {str(e)}")
-                    continue
-            
-            conn.commit()
-            
+        try:
+            job = get_batch_generator().start(
+                count,
+                provider=provider,
+                model=data.get('model'),
+                concurrency=data.get('concurrency')
+            )
+        except ValueError as e:
             return jsonify({
-                'success': True,
-                'generated_count': len(generated_items),
-                'total_requested': count,
-                'errors': errors,
-                'items': generated_items
-            })
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('get_batch_generation_status', job_id=job.id),
+            'job': job.to_dict()
+        }), 202
         
     except Exception as e:
-        logger.error(f"Error generating batch items: {e}")
+        logger.error(f"Error starting batch generation: {e}")
         return jsonify({
             'success': False,
             'error': f'Failed to generate batch items: {str(e)}'
         }), 500
 
+@app.route('/api/daily-product-posts/generate-batch/<job_id>', methods=['GET'])
+def get_batch_generation_status(job_id):
+    """Progress of a background batch generation job."""
+    job = get_batch_generator().get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown batch job: {job_id}'
+        }), 404
+    
+    return jsonify({'success': True, **job.to_dict()})
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5001))
     app.run(debug=True, host='0.0.0.0', port=port) 
\ No newline at end of file
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Background batch generation of product posts for the posting queue
+Draws the products up front, sends every prompt to Ollama or OpenAI through
+the shared LLM client with bounded concurrency and writes each post into
+posting_queue as soon as its prompt completes. Jobs run in a background
+thread; callers poll progress by job id.
+
+Ollama calls are also limited by the shared client's worker pool and the
+supervisor's OLLAMA_NUM_PARALLEL request slots; extra concurrency queues
+there.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import psycopg.rows
+
+from llm_client import LLMError, get_llm_client
+
+logger = logging.getLogger(__name__)
+
+LLM_PROVIDER = os.getenv('BATCH_LLM_PROVIDER', 'ollama')
+LLM_MODELS = {
+    'ollama': os.getenv('BATCH_OLLAMA_MODEL', 'mistral'),
+    'openai': os.getenv('BATCH_OPENAI_MODEL', 'gpt-4o-mini'),
+}
+
+# Prompts in flight at once, and the most a single request may ask for
+DEFAULT_CONCURRENCY = int(os.getenv('BATCH_LLM_CONCURRENCY', 8))
+MAX_CONCURRENCY = 50
+
+# Seconds allowed for one prompt (each prompt has its own deadline, the batch has none)
+PROMPT_TIMEOUT = int(os.getenv('BATCH_LLM_TIMEOUT', 180))
+PROMPT_RETRIES = 2
+
+# Finished jobs kept in memory for the progress endpoint
+MAX_FINISHED_JOBS = 50
+
+# Top-level clan.com categories, weighted evenly when drawing products
+PRODUCT_CATEGORY_IDS = [20, 328, 18, 37, 19, 21, 100, 16]
+
+# Generated posts are spread over the days after the batch, three a day
+POSTS_PER_DAY = 3
+TIME_SLOTS = ['09:00:00', '13:00:00', '17:00:00']
+
+MIN_CONTENT_LENGTH = 10
+
+
+def generate_text(prompt: str, provider: str, model: str) -> str:
+    """Complete one prompt through the shared LLM client, retrying failed calls
+
+    Each batch asks for fresh posts, so the response cache is bypassed (the
+    replies are still stored).
+    """
+    for attempt in range(PROMPT_RETRIES + 1):
+        try:
+            return get_llm_client().generate(prompt, model=model, provider=provider, timeout=PROMPT_TIMEOUT,
+                                             bypass_cache=True).strip()
+        except LLMError as e:
+            error = e
+        if attempt < PROMPT_RETRIES:
+            time.sleep(2 ** attempt + random.random())
+    raise error
+
+
+class BatchJob:
+    """Progress of one batch; every method is safe to call from any thread"""
+
+    def __init__(self, requested: int, provider: str, model: str, concurrency: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.requested = requested
+        self.provider = provider
+        self.model = model
+        self.concurrency = concurrency
+        self.status = 'queued'
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+        self.items = []
+        self.errors = []
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def start(self, total: int):
+        with self._lock:
+            self.total = total
+            self.status = 'running'
+            self.started_at = datetime.now()
+
+    def add_item(self, item: Dict):
+        with self._lock:
+            self.completed += 1
+            self.items.append(item)
+
+    def add_error(self, message: str, counts_as_item: bool = True):
+        with self._lock:
+            if counts_as_item:
+                self.failed += 1
+            self.errors.append(message)
+
+    def finish(self, status: str = 'completed'):
+        with self._lock:
+            self.status = status
+            self.finished_at = datetime.now()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            end = self.finished_at or datetime.now()
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'provider': self.provider,
+                'model': self.model,
+                'concurrency': self.concurrency,
+                'total_requested': self.requested,
+                'total': self.total,
+                'generated_count': self.completed,
+                'failed_count': self.failed,
+                'progress': round((self.completed + self.failed) / self.total, 3) if self.total else 0,
+                'elapsed_seconds': round((end - self.started_at).total_seconds(), 1) if self.started_at else 0,
+                'created_at': self.created_at.isoformat(),
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+                'items': list(self.items),
+                'errors': list(self.errors)
+            }
+
+
+class BatchGenerator:
+    """Starts batch jobs in background threads and keeps their progress"""
+
+    def __init__(self, connect: Callable, sampler=None):
+        self.connect = connect
+        self.sampler = sampler
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, count: int, provider: Optional[str] = None, model: Optional[str] = None,
+              concurrency: Optional[int] = None) -> BatchJob:
+        """Validate the settings, register the job and run it in the background"""
+        concurrency = max(1, min(int(concurrency or DEFAULT_CONCURRENCY), MAX_CONCURRENCY, count))
+        provider = provider or LLM_PROVIDER
+        if provider not in LLM_MODELS:
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+        if provider == 'openai' and not get_llm_client().provider('openai').api_key:
+            raise ValueError('OPENAI_API_KEY is not set')
+        job = BatchJob(count, provider, model or LLM_MODELS[provider], concurrency)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [job_id for job_id, other in self._jobs.items() if other.done]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self._jobs[job_id]
+
+        threading.Thread(target=self._run, args=(job,), name=f'batch-{job.id}', daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _get_sampler(self):
+        if self.sampler is None:
+            from product_sampler import product_sampler
+            self.sampler = product_sampler
+        return self.sampler
+
+    def _run(self, job: BatchJob):
+        try:
+            with self.connect() as conn:
+                cur = conn.cursor(row_factory=psycopg.rows.dict_row)
+                prompts, current_count = self._prepare(cur, job)
+                conn.commit()
+
+                job.start(len(prompts))
+                logger.info(f"Batch {job.id}: generating {len(prompts)} posts with {job.provider}/"
+                            f"{job.model}, {job.concurrency} at a time")
+
+                with ThreadPoolExecutor(max_workers=job.concurrency, thread_name_prefix=f'batch-{job.id}') as pool:
+                    futures = {pool.submit(generate_text, prompt['prompt'], job.provider, job.model): prompt for prompt in prompts}
+                    for future in as_completed(futures):
+                        prompt = futures[future]
+                        try:
+                            content = future.result()
+                            if len(content) < MIN_CONTENT_LENGTH:
+                                raise LLMError(f"{job.provider} returned empty content")
+                            job.add_item(self._insert(conn, cur, prompt, content, current_count))
+                        except Exception as e:
+                            conn.rollback()
+                            logger.error(f"Batch {job.id} item {prompt['position'] + 1}: {e}")
+                            job.add_error(f"Item {prompt['position'] + 1}: {e}")
+
+            job.finish()
+            logger.info(f"Batch {job.id} finished: {job.completed} generated, {job.failed} failed")
+        except Exception as e:
+            logger.error(f"Batch {job.id} failed: {e}")
+            job.add_error(str(e), counts_as_item=False)
+            job.finish('failed')
+
+    def _prepare(self, cur, job: BatchJob):
+        """Draw the products and build one prompt per product"""
+        cur.execute("SELECT COUNT(*) as count FROM posting_queue WHERE status = 'pending'")
+        current_count = cur.fetchone()['count']
+
+        cur.execute("SELECT id, template_name, content_type, template_prompt FROM product_content_templates WHERE is_active = true")
+        content_types = cur.fetchall()
+        if not content_types:
+            raise ValueError('No content templates available')
+
+        from product_sampler import DEFAULT_EXCLUDE_DAYS, DEFAULT_RECENCY_DAYS
+        products = self._get_sampler().sample(
+            cur, job.requested,
+            category_weights=dict.fromkeys(PRODUCT_CATEGORY_IDS, 1),
+            exclude_days=DEFAULT_EXCLUDE_DAYS,
+            recency_days=DEFAULT_RECENCY_DAYS,
+            require_price=True
+        )
+        if len(products) < job.requested:
+            job.add_error(f"Only {len(products)} of {job.requested} products available", counts_as_item=False)
+
+        base_date = (datetime.now() + timedelta(days=1)).date()  # Start tomorrow
+        prompts = []
+        for position, product in enumerate(products):
+            content_type = random.choice(content_types)
+            try:
+                if not product['description']:
+                    raise ValueError(f"Product {product['name']} has no description")
+                prompt = content_type['template_prompt'].format(
+                    product_name=product['name'],
+                    product_description=product['description'],
+                    product_url=product['url']
+                )
+            except KeyError as e:
+                job.add_error(f"Item {position + 1}: Missing field in content_type - {e}")
+                continue
+            except Exception as e:
+                job.add_error(f"Item {position + 1}: Error formatting prompt - {e}")
+                continue
+
+            # The slot depends on the product's position, not on when its prompt finishes
+            scheduled_date = base_date + timedelta(days=position // POSTS_PER_DAY)
+            scheduled_time = TIME_SLOTS[position % len(TIME_SLOTS)]
+            prompts.append({
+                'position': position,
+                'prompt': prompt,
+                'product': product,
+                'content_type': content_type,
+                'scheduled_date': scheduled_date,
+                'scheduled_time': scheduled_time,
+                'scheduled_timestamp': datetime.combine(
+                    scheduled_date, datetime.strptime(scheduled_time, '%H:%M:%S').time())
+            })
+        return prompts, current_count
+
+    def _insert(self, conn, cur, prompt: Dict, content: str, current_count: int) -> Dict:
+        """Write one generated post and commit it straight away"""
+        # Platform/channel/type come from daily-product-posts module context
+        cur.execute("""
+            INSERT INTO posting_queue
+            (product_id, scheduled_date, scheduled_time, schedule_name, timezone,
+             generated_content, queue_order, status, platform, channel_type, content_type, scheduled_timestamp)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, 'ready', 'facebook', 'feed_post', 'product', %s)
+            RETURNING id
+        """, (
+            prompt['product']['id'],
+            prompt['scheduled_date'],
+            prompt['scheduled_time'],
+            f"Auto-generated {prompt['content_type']['template_name']}",
+            'GMT',  # Default timezone
+            content,
+            current_count + prompt['position'] + 1,
+            prompt['scheduled_timestamp']
+        ))
+        queue_id = cur.fetchone()['id']
+        conn.commit()
+        return {
+            'queue_id': queue_id,
+            'product_name': prompt['product']['name'],
+            'content_type': prompt['content_type']['template_name'],
+            'scheduled_date': prompt['scheduled_date'].isoformat(),
+            'scheduled_time': prompt['scheduled_time']
+        }
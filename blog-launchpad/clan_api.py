@@ -63,6 +63,11 @@ def get_products(limit: int = 50, query: str = '') -> List[Dict]:
     logger.info("Using cached products")
     return clan_cache.get_products(limit=limit, query=query)
 
+def search_products(query: str = '', category_id: Optional[int] = None,
+                    limit: Optional[int] = None, after: Optional[str] = None) -> Dict:
+    """Ranked, paginated product search over the cache."""
+    return clan_cache.search_products(query=query, category_id=category_id, limit=limit, after=after)
+
 def get_category_products(category_id: int) -> List[Dict]:
     """Get products from a specific category (random selection from cache)."""
     # Use cached products and return random selection
@@ -11,8 +11,43 @@ from typing import Dict, List, Optional
 import psycopg
 from psycopg.rows import dict_row
 
+from product_sampler import product_sampler
+from product_search import product_search
+
 logger = logging.getLogger(__name__)
 
+# clan_products columns written by bulk ingest
+PRODUCT_COLUMNS = [
+    'id', 'name', 'sku', 'price', 'image_url', 'url', 'description',
+    'category_ids', 'printable_design_type', 'has_detailed_data'
+]
+
+# Columns a product's content hash covers, whichever path wrote the row; must
+# match the clan_products_content_hash trigger in migration 004
+HASH_COLUMNS = [c for c in PRODUCT_COLUMNS if c != 'id']
+
+# Columns carried by the basic getProducts catalogue feed
+CATALOG_COLUMNS = ['id', 'name', 'sku', 'url', 'description']
+
+# Placeholder columns set only when the catalogue feed inserts a new product
+CATALOG_PLACEHOLDER_COLUMNS = ['image_url', 'price', 'has_detailed_data']
+
+# Placeholders for products that have not been enriched with getProductData yet
+DEFAULT_IMAGE_URL = 'https://static.clan.com/media/catalog/product/cache/5/image/9df78eab33525d08d6e5fb8d27136e95/e/s/essential.jpg'
+DEFAULT_PRICE = '29.99'
+
+# Unchanged products only get last_seen rewritten when it is older than this,
+# so a daily sync does not rewrite every row just to record that it was seen
+LAST_SEEN_RESOLUTION_HOURS = 168
+
+CATALOG_URL = 'https://clan.com/clan/api/getProducts'
+
+
+def content_hash_sql(alias: str) -> str:
+    """SQL expression for the content hash of the clan_products row ``alias``"""
+    return f"md5(ROW({', '.join(f'{alias}.{c}' for c in HASH_COLUMNS)})::text)"
+
+
 class ClanCache:
     """PostgreSQL cache for clan.com data"""
     
@@ -49,6 +84,17 @@ class ClanCache:
                 )
             ''')
             
+            # Incremental sync columns: content hash of the feed row, when the
+            # feed last listed the product, and a tombstone for removed products
+            cursor.execute('''
+                ALTER TABLE clan_products
+                ADD COLUMN IF NOT EXISTS printable_design_type VARCHAR(50),
+                ADD COLUMN IF NOT EXISTS has_detailed_data BOOLEAN DEFAULT TRUE,
+                ADD COLUMN IF NOT EXISTS content_hash TEXT,
+                ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP,
+                ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP
+            ''')
+            
             # Categories table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS clan_categories (
@@ -71,6 +117,9 @@ class ClanCache:
             ''')
             
             conn.commit()
+            
+            # Full-text/trigram search column and indexes
+            product_search.ensure_indexes(conn)
     
     def is_cache_fresh(self, cache_type: str, max_age_hours: int = 24) -> bool:
         """Check if cache is fresh (not older than max_age_hours)"""
@@ -92,52 +141,183 @@ class ClanCache:
         """Update the cache timestamp"""
         with self.get_db_conn() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO clan_cache_metadata (key, value, last_updated)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (key) DO UPDATE SET 
-                    value = EXCLUDED.value,
-                    last_updated = EXCLUDED.last_updated
-            ''', (f'{cache_type}_last_update', datetime.now().isoformat(), datetime.now()))
+            self._touch_cache_timestamp(cursor, cache_type)
             conn.commit()
     
-    def store_products(self, products: List[Dict]):
-        """Store products in PostgreSQL cache"""
+    def _touch_cache_timestamp(self, cursor, cache_type: str):
+        """Update the cache timestamp inside an existing transaction"""
+        cursor.execute('''
+            INSERT INTO clan_cache_metadata (key, value, last_updated)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (key) DO UPDATE SET 
+                value = EXCLUDED.value,
+                last_updated = EXCLUDED.last_updated
+        ''', (f'{cache_type}_last_update', datetime.now().isoformat(), datetime.now()))
+    
+    def store_products(self, products: List[Dict]) -> Dict:
+        """Store products in PostgreSQL cache (full refresh via bulk merge)"""
+        rows = [self._product_row(product) for product in products]
+        report = self.bulk_ingest_products(rows, tombstone_missing=True)
+        logger.info(f"Stored {len(products)} products in PostgreSQL cache")
+        return report
+    
+    def _product_row(self, product: Dict) -> Dict:
+        """Normalise a product from either API format into clan_products columns"""
+        return {
+            'id': product.get('product_id') or product.get('id'),  # Handle both new and old API formats
+            'name': product.get('title') or product.get('name'),     # Handle both new and old API formats
+            'sku': product.get('sku'),
+            'price': product.get('price'),
+            'image_url': product.get('image') or product.get('image_url'),  # Handle both new and old API formats
+            'url': product.get('product_url') or product.get('url'),  # Handle both new and old API formats
+            'description': product.get('description'),
+            'category_ids': json.dumps(product.get('category_ids', [])),
+            'printable_design_type': product.get('printable_design_type'),
+            'has_detailed_data': product.get('has_detailed_data', True)
+        }
+    
+    def bulk_ingest_products(self, rows: List[Dict], columns: Optional[List[str]] = None,
+                             insert_only: Optional[List[str]] = None,
+                             tombstone_missing: bool = False) -> Dict:
+        """Bulk load products with COPY into a staging table and merge in one pass.
+        
+        ``columns`` (default: all of PRODUCT_COLUMNS) are loaded; those not
+        listed in ``insert_only`` are updated on existing rows. Insert-only
+        columns (e.g. placeholders) are written for new products only, and
+        columns absent from the feed keep their cached values. A product is
+        rewritten only when the content hash (over HASH_COLUMNS) of the row
+        it would become differs from the stored one.
+        
+        With ``tombstone_missing`` products not in the feed get ``deleted_at``
+        set instead of being deleted; a tombstoned product that reappears is
+        restored. Unchanged products only have ``last_seen`` bumped once per
+        LAST_SEEN_RESOLUTION_HOURS, so write volume tracks the number of
+        changes. Everything happens in one transaction, so readers never see
+        a partial refresh.
+        
+        Returns a diff report with inserted/updated/unchanged/deleted counts
+        and the SKUs affected.
+        """
+        columns = list(columns or PRODUCT_COLUMNS)
+        if 'id' not in columns or 'sku' not in columns:
+            raise ValueError("Bulk ingest requires at least the id and sku columns")
+        
+        col_list = ', '.join(columns)
+        data_cols = [c for c in columns if c != 'id' and c not in (insert_only or [])]
+        set_clause = ', '.join(f'{c} = c.{c}' for c in data_cols)
+        # The row as it will be stored: feed columns, plus the cached values of
+        # insert-only and absent columns for existing products
+        merged_cols = ', '.join(
+            f's.{c}' if c in data_cols else f'CASE WHEN p.id IS NULL THEN s.{c} ELSE p.{c} END AS {c}'
+            for c in HASH_COLUMNS
+        )
+        
         with self.get_db_conn() as conn:
             cursor = conn.cursor()
             
-            # Clear existing products
-            cursor.execute('DELETE FROM clan_products')
+            cursor.execute('''
+                CREATE TEMP TABLE clan_products_staging
+                (LIKE clan_products INCLUDING DEFAULTS) ON COMMIT DROP
+            ''')
             
-            # Insert new products
-            for product in products:
+            # Stream the whole feed in one COPY
+            with cursor.copy(f'COPY clan_products_staging ({col_list}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row([row.get(c) for c in columns])
+            
+            # Last occurrence of an id in the feed wins
+            cursor.execute(f'''
+                WITH src AS (
+                    SELECT DISTINCT ON (id) *
+                    FROM clan_products_staging
+                    WHERE id IS NOT NULL AND sku IS NOT NULL
+                    ORDER BY id, ctid DESC
+                ),
+                merged AS (
+                    SELECT s.id, {merged_cols},
+                           p.id IS NOT NULL AS existing,
+                           p.deleted_at IS NOT NULL AS restored,
+                           p.content_hash AS stored_hash
+                    FROM src s
+                    LEFT JOIN clan_products p ON p.id = s.id
+                ),
+                hashed AS (
+                    SELECT m.*, {content_hash_sql('m')} AS content_hash FROM merged m
+                ),
+                changed AS (
+                    SELECT * FROM hashed
+                    WHERE existing
+                    AND (stored_hash IS DISTINCT FROM content_hash OR restored)
+                ),
+                updated AS (
+                    UPDATE clan_products p
+                    SET {set_clause},
+                        content_hash = c.content_hash,
+                        deleted_at = NULL,
+                        last_seen = CURRENT_TIMESTAMP,
+                        last_updated = CURRENT_TIMESTAMP
+                    FROM changed c
+                    WHERE p.id = c.id
+                    RETURNING p.sku, c.restored
+                ),
+                seen AS (
+                    UPDATE clan_products p
+                    SET last_seen = CURRENT_TIMESTAMP
+                    FROM hashed h
+                    WHERE p.id = h.id
+                    AND h.existing
+                    AND NOT h.restored
+                    AND h.stored_hash = h.content_hash
+                    AND (p.last_seen IS NULL OR p.last_seen < CURRENT_TIMESTAMP - make_interval(hours => %s))
+                    RETURNING p.id
+                ),
+                inserted AS (
+                    INSERT INTO clan_products ({col_list}, content_hash, last_seen)
+                    SELECT {col_list}, content_hash, CURRENT_TIMESTAMP FROM hashed
+                    WHERE NOT existing
+                    RETURNING sku
+                )
+                SELECT
+                    (SELECT COUNT(*) FROM src) AS total,
+                    (SELECT COALESCE(array_agg(sku), '{{}}') FROM inserted) AS inserted,
+                    (SELECT COALESCE(array_agg(sku), '{{}}') FROM updated) AS updated,
+                    (SELECT COUNT(*) FROM updated WHERE restored) AS restored,
+                    (SELECT COUNT(*) FROM seen) AS seen
+            ''', (LAST_SEEN_RESOLUTION_HOURS,))
+            total, inserted, updated, restored, seen = cursor.fetchone()
+            
+            deleted = []
+            if tombstone_missing:
                 cursor.execute('''
-                    INSERT INTO clan_products (id, name, sku, price, image_url, url, description, category_ids, printable_design_type)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO UPDATE SET
-                        name = EXCLUDED.name,
-                        sku = EXCLUDED.sku,
-                        price = EXCLUDED.price,
-                        image_url = EXCLUDED.image_url,
-                        url = EXCLUDED.url,
-                        description = EXCLUDED.description,
-                        category_ids = EXCLUDED.category_ids,
-                        printable_design_type = EXCLUDED.printable_design_type
-                ''', (
-                    product.get('product_id') or product.get('id'),  # Handle both new and old API formats
-                    product.get('title') or product.get('name'),     # Handle both new and old API formats
-                    product.get('sku'),
-                    product.get('price'),
-                    product.get('image') or product.get('image_url'),  # Handle both new and old API formats
-                    product.get('product_url') or product.get('url'),  # Handle both new and old API formats
-                    product.get('description'),
-                    json.dumps(product.get('category_ids', [])),
-                    product.get('printable_design_type')
-                ))
-            
+                    UPDATE clan_products p
+                    SET deleted_at = CURRENT_TIMESTAMP
+                    WHERE p.deleted_at IS NULL
+                    AND NOT EXISTS (SELECT 1 FROM clan_products_staging s WHERE s.id = p.id)
+                    RETURNING sku
+                ''')
+                deleted = [row[0] for row in cursor.fetchall()]
+            
+            self._touch_cache_timestamp(cursor, 'products')
             conn.commit()
-            self.update_cache_timestamp('products')
-            logger.info(f"Stored {len(products)} products in PostgreSQL cache")
+        
+        if inserted or updated or deleted:
+            product_sampler.invalidate()
+        
+        report = {
+            'total': total,
+            'inserted': len(inserted),
+            'updated': len(updated),
+            'restored': restored,  # tombstoned products that reappeared (included in updated)
+            'unchanged': total - len(inserted) - len(updated),
+            'deleted': len(deleted),
+            'last_seen_refreshed': seen,
+            'inserted_skus': list(inserted),
+            'updated_skus': list(updated),
+            'deleted_skus': deleted
+        }
+        logger.info(f"Bulk product merge: {report['inserted']} inserted, {report['updated']} updated, "
+                    f"{report['unchanged']} unchanged, {report['deleted']} tombstoned")
+        return report
     
     def store_categories(self, categories: List[Dict]):
         """Store categories in PostgreSQL cache"""
@@ -165,21 +345,19 @@ class ClanCache:
             logger.info(f"Stored {len(categories)} categories in PostgreSQL cache")
     
     def get_products(self, limit: Optional[int] = None, query: str = '') -> List[Dict]:
-        """Get products from PostgreSQL cache"""
+        """Get products from PostgreSQL cache, ranked by relevance when a query is given"""
+        if query:
+            return self.search_products(query=query, limit=limit)['products']
+        
         with self.get_db_conn() as conn:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor = conn.cursor(row_factory=dict_row)
             
-            sql = 'SELECT id, name, sku, price, image_url, url, description, category_ids FROM clan_products'
+            sql = 'SELECT id, name, sku, price, image_url, url, description, category_ids FROM clan_products WHERE deleted_at IS NULL ORDER BY name, id'
             params = []
             
-            if query:
-                sql += ' WHERE name ILIKE %s OR description ILIKE %s'
-                params.extend([f'%{query}%', f'%{query}%'])
-            
-            sql += ' ORDER BY name'
-            
             if limit:
-                sql += f' LIMIT {limit}'
+                sql += ' LIMIT %s'
+                params.append(int(limit))
             
             cursor.execute(sql, params)
             rows = cursor.fetchall()
@@ -199,6 +377,17 @@ class ClanCache:
             
             return products
     
+    def search_products(self, query: str = '', category_id: Optional[int] = None,
+                        limit: Optional[int] = None, after: Optional[str] = None) -> Dict:
+        """Ranked product search with category filter and keyset pagination.
+        
+        Returns {'products': [...], 'next_cursor': str or None}; pass
+        next_cursor back as ``after`` to fetch the following page.
+        """
+        with self.get_db_conn() as conn:
+            return product_search.search(conn.cursor(row_factory=dict_row), query=query, category_id=category_id,
+                                         limit=limit, after=after)
+    
     def get_categories(self) -> List[Dict]:
         """Get categories from PostgreSQL cache"""
         with self.get_db_conn() as conn:
@@ -223,44 +412,51 @@ class ClanCache:
             return categories
     
     def get_random_products(self, count: int = 3, offset: int = 0) -> List[Dict]:
-        """Get random products from PostgreSQL cache with offset-based variety"""
+        """Get distinct random products from PostgreSQL cache (offset kept for API compatibility)"""
         with self.get_db_conn() as conn:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            rows = product_sampler.sample(conn.cursor(row_factory=dict_row), count)
             
-            # Simple random selection - offset will be handled by different random seeds
-            cursor.execute('''
-                SELECT id, name, sku, price, image_url, url, description, category_ids 
-                FROM clan_products 
-                ORDER BY RANDOM() 
-                LIMIT %s
-            ''', (count,))
-            
-            rows = cursor.fetchall()
             products = []
             for row in rows:
                 products.append({
                     'id': row.get('id', 0),
                     'name': row.get('name', 'Product Name'),
                     'sku': row.get('sku', ''),
-                    'price': row.get('price', '29.99'),
-                    'image_url': row.get('image_url', 'https://static.clan.com/media/catalog/product/cache/5/image/9df78eab33525d08d6e5fb8d27136e95/e/s/essential.jpg'),
+                    'price': row.get('price') or DEFAULT_PRICE,
+                    'image_url': row.get('image_url') or DEFAULT_IMAGE_URL,
                     'url': row.get('url', ''),
                     'description': row.get('description'),
-                    'category_ids': row.get('category_ids', []) if row.get('category_ids') else []
+                    'category_ids': row.get('category_ids') or []
                 })
             
             return products
     
-    def download_full_catalog(self) -> Dict:
-        """Download the full catalog from clan.com API and store locally"""
+    def download_full_catalog(self, force: bool = False) -> Dict:
+        """Download the full catalog from clan.com API and store locally
+        
+        Sends the ETag/Last-Modified validators from the previous download so
+        an unchanged catalogue costs a 304 and no writes; ``force`` skips them.
+        """
         try:
             import requests
-            import time
             
             logger.info("Starting full catalog download from clan.com...")
             
+            headers = {} if force else self._get_catalog_validators()
+            
             # Download the full product list (1,116 products)
-            response = requests.get("https://clan.com/clan/api/getProducts", timeout=30)
+            response = requests.get(CATALOG_URL, headers=headers, timeout=30)
+            
+            if response.status_code == 304:
+                self.update_cache_timestamp('products')
+                logger.info("Catalog not modified since last download")
+                return {
+                    'success': True,
+                    'not_modified': True,
+                    'total_downloaded': 0,
+                    'stored_count': 0,
+                    'message': 'Catalog unchanged since last download'
+                }
             
             if response.status_code != 200:
                 logger.error(f"Failed to download catalog: HTTP {response.status_code}")
@@ -275,35 +471,35 @@ class ClanCache:
             products = api_data['data']
             logger.info(f"Downloaded {len(products)} products from clan.com API")
             
-            # Store basic product info (without detailed data)
-            stored_count = 0
+            # Store basic product info (without detailed data) in one bulk merge;
+            # price/image placeholders only apply to newly inserted products so
+            # details fetched earlier are not overwritten
+            rows = []
             for i, product in enumerate(products):
                 try:
                     # Extract basic info from clan.com API response
-                    product_data = {
+                    rows.append({
                         'id': int(product[5]) if len(product) > 5 and product[5] else i + 1,  # Use actual product ID from API
                         'name': product[0],  # title
                         'sku': product[1],   # sku
                         'url': product[2],   # product_url - use actual URL from API
                         'description': product[3],  # description
-                        'image_url': 'https://static.clan.com/media/catalog/product/cache/5/image/9df78eab33525d08d6e5fb8d27136e95/e/s/essential.jpg',  # Default image
-                        'price': '29.99',  # Default price
+                        'image_url': DEFAULT_IMAGE_URL,  # Default image
+                        'price': DEFAULT_PRICE,  # Default price
                         'has_detailed_data': False  # Mark as needing detailed data
-                    }
-                    
-                    if self.store_single_product(product_data):
-                        stored_count += 1
-                    
-                    # Progress logging every 100 products
-                    if (i + 1) % 100 == 0:
-                        logger.info(f"Processed {i + 1}/{len(products)} products...")
-                    
+                    })
                 except Exception as e:
                     logger.error(f"Error processing product {i}: {str(e)}")
                     continue
             
-            # Update cache timestamp
-            self.update_cache_timestamp('products')
+            report = self.bulk_ingest_products(
+                rows,
+                columns=CATALOG_COLUMNS + CATALOG_PLACEHOLDER_COLUMNS,
+                insert_only=CATALOG_PLACEHOLDER_COLUMNS,
+                tombstone_missing=True
+            )
+            self._save_catalog_validators(response)
+            stored_count = report['inserted'] + report['updated'] + report['unchanged']
             
             logger.info(f"Successfully stored {stored_count}/{len(products)} products in local cache")
             
@@ -311,6 +507,7 @@ class ClanCache:
                 'success': True,
                 'total_downloaded': len(products),
                 'stored_count': stored_count,
+                'diff': report,
                 'message': f'Catalog download complete: {stored_count} products stored locally'
             }
             
@@ -318,6 +515,44 @@ class ClanCache:
             logger.error(f"Error downloading full catalog: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    def _get_catalog_validators(self) -> Dict:
+        """Conditional request headers from the last successful catalogue download"""
+        with self.get_db_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT key, value FROM clan_cache_metadata
+                WHERE key IN ('products_etag', 'products_last_modified')
+            ''')
+            validators = dict(cursor.fetchall())
+        
+        headers = {}
+        if validators.get('products_etag'):
+            headers['If-None-Match'] = validators['products_etag']
+        if validators.get('products_last_modified'):
+            headers['If-Modified-Since'] = validators['products_last_modified']
+        return headers
+    
+    def _save_catalog_validators(self, response):
+        """Remember ETag/Last-Modified (if the server sends them) for the next download"""
+        validators = {
+            'products_etag': response.headers.get('ETag'),
+            'products_last_modified': response.headers.get('Last-Modified')
+        }
+        with self.get_db_conn() as conn:
+            cursor = conn.cursor()
+            for key, value in validators.items():
+                if value:
+                    cursor.execute('''
+                        INSERT INTO clan_cache_metadata (key, value, last_updated)
+                        VALUES (%s, %s, CURRENT_TIMESTAMP)
+                        ON CONFLICT (key) DO UPDATE SET
+                            value = EXCLUDED.value,
+                            last_updated = EXCLUDED.last_updated
+                    ''', (key, value))
+                else:
+                    cursor.execute('DELETE FROM clan_cache_metadata WHERE key = %s', (key,))
+            conn.commit()
+    
     def get_products_with_detailed_data(self, skus: List[str]) -> List[Dict]:
         """Fetch detailed data for specific SKUs from clan.com API"""
         try:
@@ -395,8 +630,8 @@ class ClanCache:
             cursor = conn.cursor()
             
             # Count products
-            cursor.execute('SELECT COUNT(*) FROM clan_products')
-            product_count = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FILTER (WHERE deleted_at IS NULL), COUNT(*) FILTER (WHERE deleted_at IS NOT NULL) FROM clan_products')
+            product_count, tombstoned_count = cursor.fetchone()
             
             # Count categories
             cursor.execute('SELECT COUNT(*) FROM clan_categories')
@@ -414,6 +649,7 @@ class ClanCache:
             
             return {
                 'products_count': product_count,
+                'tombstoned_count': tombstoned_count,
                 'categories_count': category_count,
                 'last_updates': updates
             }
@@ -466,6 +702,7 @@ class ClanCache:
             
             cursor.execute("TRUNCATE TABLE clan_products")
             conn.commit()
+            product_sampler.invalidate()
             cursor.close()
             conn.close()
             
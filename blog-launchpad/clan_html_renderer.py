@@ -0,0 +1,117 @@
+"""
+Clan.com HTML Renderer
+Renders templates/launchpad/clan_post_raw.html for clan.com uploads and
+previews. The template is compiled once per process (with compiled
+bytecode kept on disk across restarts) and recompiled only when the file's
+mtime changes. Local image paths are rewritten to their uploaded clan.com
+URLs in a single regex pass over the rendered HTML.
+
+Set CLAN_HTML_DEBUG=1 to keep a copy of each rendered upload in /tmp.
+"""
+
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates', 'launchpad')
+TEMPLATE_NAME = 'clan_post_raw.html'
+
+BYTECODE_CACHE_DIR = os.getenv('CLAN_TEMPLATE_CACHE_DIR',
+                               os.path.join(tempfile.gettempdir(), 'blog-launchpad-jinja'))
+
+DEBUG_HTML = os.getenv('CLAN_HTML_DEBUG', '0') == '1'
+
+_DOCTYPE_RE = re.compile(r'<!DOCTYPE[^>]*>')
+_HTML_RE = re.compile(r'<html[^>]*>.*?</html>', re.DOTALL)
+_HEAD_RE = re.compile(r'<head[^>]*>.*?</head>', re.DOTALL)
+_BODY_RE = re.compile(r'<body[^>]*>.*?</body>', re.DOTALL)
+
+_LOCALHOST = r'http://localhost:\d+'
+
+
+def strip_html_doc(content):
+    """Strip HTML document tags and return just the content"""
+    if not content:
+        return content
+    # Remove DOCTYPE, html, head, body tags and their content
+    content = _DOCTYPE_RE.sub('', content)
+    content = _HTML_RE.sub('', content)
+    content = _HEAD_RE.sub('', content)
+    content = _BODY_RE.sub('', content)
+    return content.strip()
+
+
+def rewrite_urls(html: str, uploaded_images: Optional[Dict[str, str]] = None) -> str:
+    """Point local image paths at their clan.com URLs and drop localhost origins, in one pass.
+
+    Paths are matched as given and without their /static/ prefix.
+    """
+    mapping = {}
+    for local_path, clan_url in (uploaded_images or {}).items():
+        mapping[local_path] = clan_url
+        if local_path.startswith('/static/'):
+            mapping[local_path[7:]] = clan_url
+
+    alternatives = [_LOCALHOST]
+    if mapping:
+        # Longest first, so a full path wins over its /static/-less suffix
+        alternatives.append('|'.join(re.escape(path) for path in sorted(mapping, key=len, reverse=True)))
+    pattern = re.compile('|'.join(f'({alternative})' for alternative in alternatives))
+
+    def replace(match):
+        return '' if match.group(1) else mapping[match.group(2)]
+
+    return pattern.sub(replace, html)
+
+
+class ClanHtmlRenderer:
+    """Cached clan_post_raw.html environment"""
+
+    def __init__(self, template_dir: str = TEMPLATE_DIR, bytecode_cache_dir: str = BYTECODE_CACHE_DIR):
+        bytecode_cache = None
+        try:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+        except OSError as e:
+            logger.warning(f"Template bytecode cache disabled: {e}")
+        # auto_reload recompiles a cached template when its file's mtime changes
+        self.env = Environment(loader=FileSystemLoader(os.path.abspath(template_dir)),
+                               auto_reload=True, bytecode_cache=bytecode_cache)
+        self.env.filters['strip_html_doc'] = strip_html_doc
+
+    def render(self, post, sections, uploaded_images: Optional[Dict[str, str]] = None) -> str:
+        """HTML for clan.com, with local image paths translated to uploaded URLs"""
+        # For Clan.com API, exclude header image from HTML content since it's handled by thumbnails
+        post_for_template = post.copy()
+        post_for_template['exclude_header_image'] = True
+
+        html_content = self.env.get_template(TEMPLATE_NAME).render(post=post_for_template, sections=sections)
+        html_content = rewrite_urls(html_content, uploaded_images)
+
+        if DEBUG_HTML:
+            debug_file = os.path.join(tempfile.gettempdir(), f'upload_html_post_{post["id"]}_{int(time.time())}.html')
+            with open(debug_file, 'w', encoding='utf-8') as f:
+                f.write(html_content)
+            logger.info(f"Upload HTML saved to: {debug_file}")
+        return html_content
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_clan_html_renderer() -> ClanHtmlRenderer:
+    """Process-wide renderer (one compiled template)"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = ClanHtmlRenderer()
+        return _renderer
@@ -0,0 +1,156 @@
+"""
+Clan.com Image Upload Manager
+Uploads post images to clan.com in parallel over a shared HTTP session and
+skips images whose exact bytes were uploaded before. Uploaded URLs are
+recorded by content hash in section_image_mappings.content_hash, so a
+republish after a text-only edit sends no images at all.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Parallel uploads to clan.com
+UPLOAD_WORKERS = int(os.getenv('CLAN_UPLOAD_WORKERS', 4))
+
+SCHEMA_SQL = [
+    "ALTER TABLE section_image_mappings ADD COLUMN IF NOT EXISTS content_hash CHAR(64)",
+    "CREATE INDEX IF NOT EXISTS idx_section_image_mappings_content_hash ON section_image_mappings (content_hash)",
+]
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageUploadManager:
+    """Deduplicated, bounded-parallel image uploads to clan.com"""
+
+    def __init__(self, workers: int = UPLOAD_WORKERS):
+        self.workers = max(1, workers)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._schema_ready = False
+        self._lock = threading.Lock()
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        from config.database import db_manager
+        with self._lock:
+            if self._schema_ready:
+                return
+            with db_manager.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    for sql in SCHEMA_SQL:
+                        cursor.execute(sql)
+            self._schema_ready = True
+
+    def known_urls(self, hashes: Iterable[str]) -> Dict[str, str]:
+        """Clan URLs of previously uploaded images, by content hash"""
+        hashes = list(set(hashes))
+        if not hashes:
+            return {}
+        from config.database import db_manager
+        self._ensure_schema()
+        with db_manager.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT ON (content_hash) content_hash, clan_uploaded_url
+                FROM section_image_mappings
+                WHERE content_hash = ANY(%s)
+                ORDER BY content_hash, uploaded_at DESC
+            """, (hashes,))
+            return {row['content_hash']: row['clan_uploaded_url'] for row in cursor.fetchall()}
+
+    def resolve(self, images: List[Dict]) -> Dict:
+        """Content hashes of ``images`` and the clan URLs of those already uploaded, without uploading.
+
+        Returns ``{'hashes': {key: content_hash}, 'known': {content_hash: url},
+        'pending': [keys not on clan.com yet]}``.
+        """
+        hashes = {}
+        for image in images:
+            try:
+                hashes[image['key']] = file_hash(image['fs_path'])
+            except OSError as e:
+                logger.error(f"❌ Cannot read image {image['fs_path']}: {e}")
+
+        try:
+            known = self.known_urls(hashes.values())
+        except Exception as e:
+            logger.warning(f"Image upload history unavailable, uploading everything: {e}")
+            known = {}
+        pending = [key for key, content_hash in hashes.items() if content_hash not in known]
+        return {'hashes': hashes, 'known': known, 'pending': pending}
+
+    def upload_all(self, images: List[Dict], upload: Callable[..., Optional[str]]) -> Dict:
+        """Upload ``images`` that clan.com does not have yet.
+
+        Each image is a dict with ``key`` (the web path used in the post),
+        ``fs_path`` and ``filename``. ``upload(fs_path, filename, session=...)``
+        sends one file and returns its URL. Returns ``{'urls': {key: url},
+        'hashes': {key: content_hash}, 'uploaded': n, 'reused': n}``.
+        """
+        resolved = self.resolve(images)
+        hashes, known = resolved['hashes'], resolved['known']
+
+        # One upload per distinct content, even if several sections share an image
+        pending = {}
+        for image in images:
+            content_hash = hashes.get(image['key'])
+            if content_hash and content_hash not in known and content_hash not in pending:
+                pending[content_hash] = image
+
+        uploaded = {}
+        if pending:
+            logger.info(f"Uploading {len(pending)} images ({self.workers} at a time)")
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+                futures = {content_hash: executor.submit(upload, image['fs_path'], image['filename'],
+                                                         session=self.session)
+                           for content_hash, image in pending.items()}
+                for content_hash, future in futures.items():
+                    try:
+                        url = future.result()
+                    except Exception as e:
+                        logger.error(f"❌ Upload failed for {pending[content_hash]['fs_path']}: {e}")
+                        url = None
+                    if url:
+                        uploaded[content_hash] = url
+
+        urls = {}
+        for image in images:
+            content_hash = hashes.get(image['key'])
+            url = known.get(content_hash) or uploaded.get(content_hash)
+            if url:
+                urls[image['key']] = url
+        reused = len({hashes[key] for key in urls if hashes[key] in known})
+        logger.info(f"✅ Images: {len(uploaded)} uploaded, {reused} unchanged and reused")
+        return {'urls': urls, 'hashes': hashes, 'uploaded': len(uploaded), 'reused': reused}
+
+
+_upload_manager = None
+_upload_manager_lock = threading.Lock()
+
+
+def get_upload_manager() -> ImageUploadManager:
+    """Process-wide upload manager (one HTTP session and connection pool)"""
+    global _upload_manager
+    with _upload_manager_lock:
+        if _upload_manager is None:
+            _upload_manager = ImageUploadManager()
+        return _upload_manager
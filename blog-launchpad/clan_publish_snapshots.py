@@ -0,0 +1,177 @@
+"""
+Clan.com Publish Snapshots
+Fingerprints of what was last published to clan.com for each post, so a
+republish can tell what actually changed:
+
+- fields: a hash per editPost field (title, meta tags, thumbnails, ...)
+- sections: a hash per rendered <section class="blog-section"> fragment
+- page: a hash of the rendered HTML outside the sections (header, intro,
+  cross-promotion widgets)
+- images: the content hash of every image in the post
+
+A republish with an identical fingerprint is skipped; otherwise only the
+changed fields are sent, and the HTML only when the rendered page differs.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS clan_publish_snapshots (
+    post_id INTEGER PRIMARY KEY,
+    clan_post_id INTEGER,
+    url TEXT,
+    field_hashes JSONB NOT NULL,
+    section_hashes JSONB NOT NULL,
+    page_hash CHAR(64) NOT NULL,
+    image_hashes JSONB NOT NULL,
+    published_at TIMESTAMP DEFAULT NOW()
+)
+"""
+
+_SECTION_RE = re.compile(r'<section class="blog-section" id="section-\d+">.*?</section>', re.DOTALL)
+
+
+def _digest(value) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def fingerprint(fields: Dict, html: str, sections: List[Dict], image_hashes: Dict[str, str]) -> Dict:
+    """Fingerprint of one publish: editPost fields, rendered HTML and image contents"""
+    fragments = _SECTION_RE.findall(html)
+    section_keys = [str(section.get('id', index)) for index, section in enumerate(sections)]
+    if len(fragments) != len(section_keys):
+        # Template and section list disagree; fall back to positional keys
+        section_keys = [str(index) for index in range(len(fragments))]
+    return {
+        'fields': {name: _digest(value) for name, value in fields.items()},
+        'sections': {key: _digest(fragment) for key, fragment in zip(section_keys, fragments)},
+        'page': _digest(_SECTION_RE.sub('', html)),
+        'images': dict(image_hashes),
+    }
+
+
+def _compare(previous: Dict, current: Dict) -> Dict[str, List[str]]:
+    return {
+        'changed': sorted(key for key in current if key in previous and previous[key] != current[key]),
+        'added': sorted(key for key in current if key not in previous),
+        'removed': sorted(key for key in previous if key not in current),
+    }
+
+
+def diff(previous: Optional[Dict], current: Dict) -> Dict:
+    """What changed between the last published fingerprint and ``current``"""
+    if previous is None:
+        return {
+            'first_publish': True,
+            'changed': True,
+            'fields': sorted(current['fields']),
+            'sections': {'changed': [], 'added': sorted(current['sections']), 'removed': []},
+            'page_changed': True,
+            'html_changed': True,
+            'images': {'changed': [], 'added': sorted(current['images']), 'removed': []},
+        }
+
+    fields = _compare(previous['fields'], current['fields'])
+    sections = _compare(previous['sections'], current['sections'])
+    images = _compare(previous['images'], current['images'])
+    page_changed = previous['page'] != current['page']
+    # Fragments carry their position (id="section-N"), so reordering shows up as changed sections
+    html_changed = page_changed or any(sections.values())
+    changed_fields = sorted(fields['changed'] + fields['added'])
+    return {
+        'first_publish': False,
+        'changed': bool(changed_fields or html_changed or any(images.values())),
+        'fields': changed_fields,
+        'sections': sections,
+        'page_changed': page_changed,
+        'html_changed': html_changed,
+        'images': images,
+    }
+
+
+class PublishSnapshots:
+    """Last published fingerprint per post, in clan_publish_snapshots"""
+
+    def __init__(self):
+        self._schema_ready = False
+        self._lock = threading.Lock()
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        from config.database import db_manager
+        with self._lock:
+            if self._schema_ready:
+                return
+            with db_manager.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(SCHEMA_SQL)
+            self._schema_ready = True
+
+    def get(self, post_id) -> Optional[Dict]:
+        """Last published snapshot for a post, or None"""
+        from config.database import db_manager
+        self._ensure_schema()
+        with db_manager.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT clan_post_id, url, field_hashes, section_hashes, page_hash, image_hashes, published_at
+                FROM clan_publish_snapshots WHERE post_id = %s
+            """, (post_id,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        return {
+            'clan_post_id': row['clan_post_id'],
+            'url': row['url'],
+            'published_at': row['published_at'],
+            'fingerprint': {
+                'fields': row['field_hashes'],
+                'sections': row['section_hashes'],
+                'page': row['page_hash'],
+                'images': row['image_hashes'],
+            },
+        }
+
+    def save(self, post_id, clan_post_id, url, current: Dict):
+        """Record ``current`` as what clan.com now has for the post"""
+        from config.database import db_manager
+        self._ensure_schema()
+        with db_manager.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO clan_publish_snapshots
+                        (post_id, clan_post_id, url, field_hashes, section_hashes, page_hash, image_hashes, published_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+                    ON CONFLICT (post_id) DO UPDATE SET
+                        clan_post_id = EXCLUDED.clan_post_id,
+                        url = EXCLUDED.url,
+                        field_hashes = EXCLUDED.field_hashes,
+                        section_hashes = EXCLUDED.section_hashes,
+                        page_hash = EXCLUDED.page_hash,
+                        image_hashes = EXCLUDED.image_hashes,
+                        published_at = NOW()
+                """, (post_id, clan_post_id, url, json.dumps(current['fields']), json.dumps(current['sections']),
+                      current['page'], json.dumps(current['images'])))
+        logger.info(f"Saved publish snapshot for post {post_id}")
+
+
+_snapshots = None
+_snapshots_lock = threading.Lock()
+
+
+def get_publish_snapshots() -> PublishSnapshots:
+    """Process-wide snapshot store"""
+    global _snapshots
+    with _snapshots_lock:
+        if _snapshots is None:
+            _snapshots = PublishSnapshots()
+        return _snapshots
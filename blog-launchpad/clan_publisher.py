@@ -22,6 +22,9 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env file
 load_dotenv()
 
+# Send only changed fields (and the HTML only if it changed) when updating a post
+PARTIAL_UPDATES = os.getenv('CLAN_PARTIAL_UPDATES', '1') == '1'
+
 class ClanPublisher:
     def __init__(self):
         self.api_base_url = os.getenv('CLAN_API_BASE_URL', 'https://clan.com/clan/blog_api/')
@@ -239,8 +242,11 @@ class ClanPublisher:
         
         return api_data
     
-    def upload_image(self, image_path, filename=None):
-        """Upload an image to clan.com and return the uploaded URL"""
+    def upload_image(self, image_path, filename=None, session=None):
+        """Upload an image to clan.com and return the uploaded URL.
+        
+        Pass a ``requests.Session`` to reuse its connection pool.
+        """
         try:
             if not filename:
                 filename = os.path.basename(image_path)
@@ -304,7 +310,7 @@ class ClanPublisher:
                 logger.info(f"Uploading image: {filename} to {upload_url}")
                 logger.info(f"MIME type: {mime_type}")
                 logger.info(f"API data: {data}")
-                response = requests.post(upload_url, files=files, data=data, timeout=15)
+                response = (session or requests).post(upload_url, files=files, data=data, timeout=15)
                 
                 logger.info(f"Upload response status: {response.status_code}")
                 logger.info(f"Upload response headers: {dict(response.headers)}")
@@ -399,108 +405,80 @@ class ClanPublisher:
             # Plain text - escape HTML special characters
             return html.escape(text_str)
 
-    def process_images(self, post, sections):
-        """Upload all images and update paths in the post content"""
-        import time
-        uploaded_images = {}
+    def _collect_images(self, post, sections):
+        """Header and section images to publish, as upload manager entries"""
+        from config.paths import path_resolver
         
         logger.info(f"=== PROCESS_IMAGES DEBUG START ===")
         logger.info(f"Post ID: {post.get('id')}")
         logger.info(f"Post header_image: {post.get('header_image')}")
-        logger.info(f"Post header_image_id: {post.get('header_image_id')}")
         
-        # Process header image - use header image path from post data
+        timestamp = int(time.time())
+        images = []
+        
+        def add_image(web_path, filename):
+            # Convert web path to file system path for upload
+            fs_path = path_resolver.convert_web_path_to_filesystem(web_path)
+            if os.path.exists(fs_path):
+                logger.info(f"✅ Image file exists at: {fs_path} ({os.path.getsize(fs_path)} bytes)")
+                images.append({'key': web_path, 'fs_path': fs_path, 'filename': filename})
+            else:
+                logger.error(f"❌ Image file NOT found at: {fs_path}")
+        
+        # Header image - use header image path from post data
         header_path = post.get('header_image', {}).get('path')
         if header_path:
             logger.info(f"✅ Found header image: {header_path}")
-            
-            # Check if file exists - convert web path to file system path
-            from config.paths import path_resolver
-            
-            fs_path = path_resolver.convert_web_path_to_filesystem(header_path)
-            if os.path.exists(fs_path):
-                logger.info(f"✅ Header image file exists at: {fs_path}")
-                logger.info(f"File size: {os.path.getsize(fs_path)} bytes")
-            else:
-                logger.error(f"❌ Header image file NOT found at: {fs_path}")
-                logger.error(f"Current working directory: {os.getcwd()}")
-            
-            # Generate unique filename with timestamp for cache busting
-            filename = f"header_{post['id']}_{int(time.time())}.jpg"
-            logger.info(f"Uploading header image with filename: {filename}")
-            
-            try:
-                # Convert web path to file system path for upload
-                fs_path = path_resolver.convert_web_path_to_filesystem(header_path)
-                logger.info(f"Converting web path '{header_path}' to file system path '{fs_path}'")
-                
-                uploaded_url = self.upload_image(fs_path, filename)
-                logger.info(f"upload_image returned: {uploaded_url}")
-                
-                if uploaded_url:
-                    uploaded_images[header_path] = uploaded_url
-                    logger.info(f"✅ Header image uploaded successfully: {header_path} -> {uploaded_url}")
-                    logger.info(f"✅ uploaded_images dictionary now contains: {uploaded_images}")
-                else:
-                    logger.error(f"❌ upload_image returned None/empty for: {header_path}")
-            except Exception as e:
-                logger.error(f"❌ Exception during header image upload: {str(e)}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
+            # Unique filename with timestamp for cache busting (only used if the image is new)
+            add_image(header_path, f"header_{post['id']}_{timestamp}.jpg")
         else:
             logger.warning(f"❌ No header image found using find_header_image function")
         
-        # Process section images
+        # Section images
         logger.info(f"Processing {len(sections)} sections for images...")
         for i, section in enumerate(sections):
-            logger.info(f"Section {i+1}: {section.get('title', 'No title')}")
-            logger.info(f"Section image data: {section.get('image')}")
-            
             if section.get('image') and section['image'].get('path') and not section['image'].get('placeholder'):
                 section_path = section['image']['path']
-                logger.info(f"Processing section image: {section_path}")
-                
-                # Check if file exists - convert web path to file system path
-                fs_path = path_resolver.convert_web_path_to_filesystem(section_path)
-                if os.path.exists(fs_path):
-                    logger.info(f"✅ Section image file exists at: {fs_path}")
-                    logger.info(f"File size: {os.path.getsize(fs_path)} bytes")
-                else:
-                    logger.error(f"❌ Section image file NOT found at: {fs_path}")
-                    logger.error(f"Current working directory: {os.getcwd()}")
-                
-                # Generate unique filename
-                filename = f"section_{post['id']}_{i+1}_{int(time.time())}.jpg"
-                logger.info(f"Uploading section image with filename: {filename}")
-                
-                try:
-                    # Convert web path to file system path for upload
-                    fs_path = path_resolver.convert_web_path_to_filesystem(section_path)
-                    logger.info(f"Converting section web path '{section_path}' to file system path '{fs_path}'")
-                    
-                    uploaded_url = self.upload_image(fs_path, filename)
-                    if uploaded_url:
-                        uploaded_images[section_path] = uploaded_url
-                        logger.info(f"✅ Section image uploaded: {section_path} -> {uploaded_url}")
-                    else:
-                        logger.error(f"❌ Failed to upload section image: {section_path}")
-                except Exception as e:
-                    logger.error(f"❌ Exception during section image upload: {str(e)}")
+                logger.info(f"Section {i+1} image: {section_path}")
+                add_image(section_path, f"section_{post['id']}_{i+1}_{timestamp}.jpg")
             else:
                 logger.info(f"No image for section {i+1}")
+        return images
+    
+    def process_images(self, post, sections, content_hashes=None):
+        """Upload all images and update paths in the post content.
+        
+        Images go up in parallel; images whose bytes clan.com already has
+        (matched by content hash) are not re-sent. If ``content_hashes`` is
+        given it is filled with local path -> SHA-256 of each image.
+        """
+        from clan_image_uploads import get_upload_manager
+        
+        images = self._collect_images(post, sections)
+        result = get_upload_manager().upload_all(images, self.upload_image)
+        uploaded_images = result['urls']
+        if content_hashes is not None:
+            content_hashes.update(result['hashes'])
+        for image in images:
+            if image['key'] not in uploaded_images:
+                logger.error(f"❌ Failed to upload image: {image['key']}")
         
         logger.info(f"=== PROCESS_IMAGES DEBUG END ===")
         logger.info(f"Final uploaded_images dictionary: {uploaded_images}")
-        logger.info(f"Final uploaded_images count: {len(uploaded_images)}")
+        logger.info(f"Uploaded {result['uploaded']} new images, reused {result['reused']}")
         
-        # Save image mappings to database for future reference
+        # Save image mappings (with content hashes) to database for future reference
         if uploaded_images:
-            self._save_image_mappings_to_db(post, sections, uploaded_images)
+            self._save_image_mappings_to_db(post, sections, uploaded_images, result['hashes'])
         
         return uploaded_images
     
-    def _save_image_mappings_to_db(self, post, sections, uploaded_images):
-        """Save section image mappings to database for future reference."""
+    def _save_image_mappings_to_db(self, post, sections, uploaded_images, content_hashes=None):
+        """Save section image mappings to database for future reference.
+        
+        ``content_hashes`` maps local paths to the SHA-256 of the uploaded
+        file; later publishes reuse the clan.com URL for identical images.
+        """
         try:
             import os
             from config.database import db_manager
@@ -552,9 +530,10 @@ class ClanPublisher:
                         # Insert the mapping
                         cursor.execute("""
                             INSERT INTO section_image_mappings 
-                            (post_id, section_id, local_image_path, clan_uploaded_url, image_filename, image_size_bytes, image_dimensions)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        """, (post['id'], section_id, local_path, clan_url, filename, file_size, dimensions))
+                            (post_id, section_id, local_image_path, clan_uploaded_url, image_filename, image_size_bytes, image_dimensions, content_hash)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        """, (post['id'], section_id, local_path, clan_url, filename, file_size, dimensions,
+                              (content_hashes or {}).get(local_path)))
                         
                         logger.info(f"✅ Saved image mapping: {local_path} -> {clan_url}")
                 
@@ -573,8 +552,148 @@ class ClanPublisher:
         """REMOVED: This method should not exist. The script should use the preview HTML template verbatim."""
         raise NotImplementedError("This method should not exist. Use the preview HTML template instead.")
     
-    def create_or_update_post(self, post, html_content, is_update=False, uploaded_images=None):
-        """Create or update a post on clan.com"""
+    def _build_post_fields(self, post, uploaded_images):
+        """The createPost/editPost fields for a post (everything except post_id and the HTML)"""
+        # Get header image path for thumbnails
+        header_image_path = None
+        if post.get('header_image') and post['header_image'].get('path'):
+            header_image_path = post['header_image']['path']
+        
+        # Set thumbnails based on uploaded header image availability
+        # CRITICAL: These fields are MANDATORY according to clan.com API docs
+        list_thumbnail = '/blog/placeholder.jpg'  # Default fallback that should exist on clan.com
+        post_thumbnail = '/blog/placeholder.jpg'  # Default fallback that should exist on clan.com
+        
+        # Look for header image in uploaded_images
+        header_image_path = None
+        for path in uploaded_images.keys():
+            if 'header' in path:
+                header_image_path = path
+                break
+        
+        if uploaded_images and header_image_path and header_image_path in uploaded_images:
+            # Extract the filename from the clan.com URL and create the thumbnail path
+            uploaded_url = uploaded_images[header_image_path]
+            if uploaded_url and '/media/blog/' in uploaded_url:
+                # Extract filename from URL like "https://static.clan.com/media/blog/header_53_1703123456.jpg"
+                # We need the path relative to /media, so extract everything after /media/
+                media_path = uploaded_url.split('/media/')[-1]
+                thumbnail_path = f"/{media_path}"  # This gives us /blog/header_53_1703123456.jpg
+                list_thumbnail = thumbnail_path
+                post_thumbnail = thumbnail_path
+                logger.info(f"✅ Using uploaded header image for thumbnails: {thumbnail_path}")
+            else:
+                logger.warning(f"Unexpected uploaded URL format: {uploaded_url}")
+                logger.info("Using default placeholder thumbnails due to unexpected URL format")
+        elif list_thumbnail and list_thumbnail.startswith('/blog/header_'):
+            # Header image was uploaded for thumbnails but not included in uploaded_images
+            # Add it to uploaded_images for HTML replacement
+            header_image_path = full_post_data.get('header_image', {}).get('path')
+            if header_image_path:
+                # Convert thumbnail path to full URL
+                thumbnail_filename = list_thumbnail.split('/')[-1]  # e.g., "header_53_1758883937.jpg"
+                clan_url = f"https://static.clan.com/media/blog/{thumbnail_filename}"
+                uploaded_images[header_image_path] = clan_url
+                logger.info(f"✅ Added header image to uploaded_images for HTML replacement: {header_image_path} -> {clan_url}")
+        elif uploaded_images:
+            # Try to use any available image as thumbnail if no header image
+            first_image_url = list(uploaded_images.values())[0]
+            if first_image_url and '/media/blog/' in first_image_url:
+                media_path = first_image_url.split('/media/')[-1]
+                thumbnail_path = f"/{media_path}"
+                list_thumbnail = thumbnail_path
+                post_thumbnail = thumbnail_path
+                logger.info(f"✅ Using first available image for thumbnails: {thumbnail_path}")
+            else:
+                logger.info("No header image available, using default placeholder thumbnails")
+        else:
+            logger.info("No images available, using default placeholder thumbnails")
+        
+        # Common post metadata - using new database meta fields for proper OG tags
+        meta_title = post.get('meta_title') or post.get('title')
+        if not meta_title:
+            raise ValueError("Post title is required but not provided")
+        
+        meta_tags = post.get('meta_tags') or self._generate_meta_tags(post)
+        
+        # Clean meta_description - require at least one description field
+        raw_description = post.get('meta_description') or post.get('subtitle') or post.get('summary', '')
+        if not raw_description:
+            raise ValueError("Post must have meta_description, subtitle, or summary")
+        
+        # Strip HTML tags and limit to 160 characters
+        import re
+        clean_description = re.sub(r'<[^>]+>', '', raw_description)
+        meta_description = clean_description[:160] if clean_description else raw_description[:160]
+        
+        # Ensure all meta fields are strings and not None
+        meta_title = str(meta_title)
+        meta_tags = str(meta_tags) if meta_tags else 'scottish,heritage,culture,blog'
+        meta_description = str(meta_description)
+        
+        # Log the meta data being sent for debugging
+        logger.info(f"Meta data for post {post.get('id')}:")
+        logger.info(f"   meta_title: {repr(meta_title)}")
+        logger.info(f"   meta_tags: {repr(meta_tags)}")
+        logger.info(f"   meta_description: {repr(meta_description)}")
+        
+        # Check for problematic characters
+        logger.info(f"Meta title length: {len(meta_title)}")
+        logger.info(f"Meta tags length: {len(meta_tags)}")
+        logger.info(f"Meta description length: {len(meta_description)}")
+        
+        # Validate meta data before sending
+        if not isinstance(meta_title, str) or len(meta_title) > 200:
+            logger.error(f"Invalid meta_title: {type(meta_title)}, length: {len(meta_title) if isinstance(meta_title, str) else 'N/A'}")
+            raise ValueError(f"Invalid meta_title: must be string under 200 chars, got {type(meta_title)} with length {len(meta_title) if isinstance(meta_title, str) else 'N/A'}")
+        
+        if not isinstance(meta_tags, str) or len(meta_tags) > 500:
+            logger.error(f"Invalid meta_tags: {type(meta_tags)}, length: {len(meta_tags) if isinstance(meta_tags, str) else 'N/A'}")
+            raise ValueError(f"Invalid meta_tags: must be string under 500 chars, got {type(meta_tags)} with length {len(meta_tags) if isinstance(meta_tags, str) else 'N/A'}")
+        
+        if not isinstance(meta_description, str) or len(meta_description) > 160:
+            logger.error(f"Invalid meta_description: {type(meta_description)}, length: {len(meta_description) if isinstance(meta_description, str) else 'N/A'}")
+            raise ValueError(f"Invalid meta_description: must be string under 160 chars, got {type(meta_description)} with length {len(meta_description) if isinstance(meta_description, str) else 'N/A'}")
+        
+        fields = {
+            'title': post.get('title'),  # required
+            'url_key': self._generate_url_key(post),  # required - use slug or generate from title
+            'short_content': post.get('subtitle') or post.get('summary'),  # prioritize subtitle over summary
+            'status': 2,  # required - 2 = enabled (not 'published' string)
+            'categories': [14, 15],  # required - note: 'categories' not 'category_ids'
+            'list_thumbnail': list_thumbnail,  # required - path from /media (now uses real uploaded image)
+            'post_thumbnail': post_thumbnail,  # required - path from /media (now uses real uploaded image)
+            'meta_title': meta_title,  # use new meta_title field
+            'meta_tags': meta_tags,  # use new meta_tags field
+            'meta_description': meta_description  # use new meta_description field
+        }
+        
+        # Validate required fields
+        required_fields = ['title', 'url_key', 'short_content', 'status', 'categories', 'list_thumbnail', 'post_thumbnail', 'meta_title', 'meta_tags', 'meta_description']
+        missing_fields = []
+        
+        for field in required_fields:
+            value = fields.get(field)
+            # Check if field is missing or None
+            if value is None:
+                missing_fields.append(field)
+            # For string fields, allow empty strings (clan.com might accept them)
+            elif isinstance(value, str) and value.strip() == '':
+                logger.warning(f"Field '{field}' is empty string, but proceeding anyway")
+        
+        if missing_fields:
+            logger.error(f"Missing required fields: {missing_fields}")
+            logger.error(f"Field values: {fields}")
+            raise ValueError(f"Missing required fields: {', '.join(missing_fields)}")
+        
+        return fields
+    
+    def create_or_update_post(self, post, html_content, is_update=False, uploaded_images=None, fields=None, changes=None):
+        """Create or update a post on clan.com.
+        
+        ``changes`` (a clan_publish_snapshots.diff) limits an update to the
+        fields that changed, and to sending the HTML only if it changed.
+        """
         try:
             # Determine endpoint
             if is_update and post.get('clan_post_id'):
@@ -586,140 +705,16 @@ class ClanPublisher:
                 endpoint = f"{self.api_base_url}createPost"
                 json_args = {}
             
-            # Get header image path for thumbnails
-            header_image_path = None
-            if post.get('header_image') and post['header_image'].get('path'):
-                header_image_path = post['header_image']['path']
+            if fields is None:
+                fields = self._build_post_fields(post, uploaded_images)
             
-            # Set thumbnails based on uploaded header image availability
-            # CRITICAL: These fields are MANDATORY according to clan.com API docs
-            list_thumbnail = '/blog/placeholder.jpg'  # Default fallback that should exist on clan.com
-            post_thumbnail = '/blog/placeholder.jpg'  # Default fallback that should exist on clan.com
-            
-            # Look for header image in uploaded_images
-            header_image_path = None
-            for path in uploaded_images.keys():
-                if 'header' in path:
-                    header_image_path = path
-                    break
-            
-            if uploaded_images and header_image_path and header_image_path in uploaded_images:
-                # Extract the filename from the clan.com URL and create the thumbnail path
-                uploaded_url = uploaded_images[header_image_path]
-                if uploaded_url and '/media/blog/' in uploaded_url:
-                    # Extract filename from URL like "https://static.clan.com/media/blog/header_53_1703123456.jpg"
-                    # We need the path relative to /media, so extract everything after /media/
-                    media_path = uploaded_url.split('/media/')[-1]
-                    thumbnail_path = f"/{media_path}"  # This gives us /blog/header_53_1703123456.jpg
-                    list_thumbnail = thumbnail_path
-                    post_thumbnail = thumbnail_path
-                    logger.info(f"✅ Using uploaded header image for thumbnails: {thumbnail_path}")
-                else:
-                    logger.warning(f"Unexpected uploaded URL format: {uploaded_url}")
-                    logger.info("Using default placeholder thumbnails due to unexpected URL format")
-            elif list_thumbnail and list_thumbnail.startswith('/blog/header_'):
-                # Header image was uploaded for thumbnails but not included in uploaded_images
-                # Add it to uploaded_images for HTML replacement
-                header_image_path = full_post_data.get('header_image', {}).get('path')
-                if header_image_path:
-                    # Convert thumbnail path to full URL
-                    thumbnail_filename = list_thumbnail.split('/')[-1]  # e.g., "header_53_1758883937.jpg"
-                    clan_url = f"https://static.clan.com/media/blog/{thumbnail_filename}"
-                    uploaded_images[header_image_path] = clan_url
-                    logger.info(f"✅ Added header image to uploaded_images for HTML replacement: {header_image_path} -> {clan_url}")
-            elif uploaded_images:
-                # Try to use any available image as thumbnail if no header image
-                first_image_url = list(uploaded_images.values())[0]
-                if first_image_url and '/media/blog/' in first_image_url:
-                    media_path = first_image_url.split('/media/')[-1]
-                    thumbnail_path = f"/{media_path}"
-                    list_thumbnail = thumbnail_path
-                    post_thumbnail = thumbnail_path
-                    logger.info(f"✅ Using first available image for thumbnails: {thumbnail_path}")
-                else:
-                    logger.info("No header image available, using default placeholder thumbnails")
+            send_html = True
+            if 'post_id' in json_args and changes is not None and PARTIAL_UPDATES:
+                json_args.update({name: fields[name] for name in changes['fields']})
+                send_html = changes['html_changed']
+                logger.info(f"Partial update: fields {changes['fields']}, HTML {'changed' if send_html else 'unchanged'}")
             else:
-                logger.info("No images available, using default placeholder thumbnails")
-            
-            # Common post metadata - using new database meta fields for proper OG tags
-            meta_title = post.get('meta_title') or post.get('title')
-            if not meta_title:
-                raise ValueError("Post title is required but not provided")
-            
-            meta_tags = post.get('meta_tags') or self._generate_meta_tags(post)
-            
-            # Clean meta_description - require at least one description field
-            raw_description = post.get('meta_description') or post.get('subtitle') or post.get('summary', '')
-            if not raw_description:
-                raise ValueError("Post must have meta_description, subtitle, or summary")
-            
-            # Strip HTML tags and limit to 160 characters
-            import re
-            clean_description = re.sub(r'<[^>]+>', '', raw_description)
-            meta_description = clean_description[:160] if clean_description else raw_description[:160]
-            
-            # Ensure all meta fields are strings and not None
-            meta_title = str(meta_title)
-            meta_tags = str(meta_tags) if meta_tags else 'scottish,heritage,culture,blog'
-            meta_description = str(meta_description)
-            
-            # Log the meta data being sent for debugging
-            logger.info(f"Meta data for post {post.get('id')}:")
-            logger.info(f"   meta_title: {repr(meta_title)}")
-            logger.info(f"   meta_tags: {repr(meta_tags)}")
-            logger.info(f"   meta_description: {repr(meta_description)}")
-            
-            # Check for problematic characters
-            logger.info(f"Meta title length: {len(meta_title)}")
-            logger.info(f"Meta tags length: {len(meta_tags)}")
-            logger.info(f"Meta description length: {len(meta_description)}")
-            
-            # Validate meta data before sending
-            if not isinstance(meta_title, str) or len(meta_title) > 200:
-                logger.error(f"Invalid meta_title: {type(meta_title)}, length: {len(meta_title) if isinstance(meta_title, str) else 'N/A'}")
-                raise ValueError(f"Invalid meta_title: must be string under 200 chars, got {type(meta_title)} with length {len(meta_title) if isinstance(meta_title, str) else 'N/A'}")
-            
-            if not isinstance(meta_tags, str) or len(meta_tags) > 500:
-                logger.error(f"Invalid meta_tags: {type(meta_tags)}, length: {len(meta_tags) if isinstance(meta_tags, str) else 'N/A'}")
-                raise ValueError(f"Invalid meta_tags: must be string under 500 chars, got {type(meta_tags)} with length {len(meta_tags) if isinstance(meta_tags, str) else 'N/A'}")
-            
-            if not isinstance(meta_description, str) or len(meta_description) > 160:
-                logger.error(f"Invalid meta_description: {type(meta_description)}, length: {len(meta_description) if isinstance(meta_description, str) else 'N/A'}")
-                raise ValueError(f"Invalid meta_description: must be string under 160 chars, got {type(meta_description)} with length {len(meta_description) if isinstance(meta_description, str) else 'N/A'}")
-            
-            json_args.update({
-                'title': post.get('title'),  # required
-                'url_key': self._generate_url_key(post),  # required - use slug or generate from title
-                'short_content': post.get('subtitle') or post.get('summary'),  # prioritize subtitle over summary
-                'status': 2,  # required - 2 = enabled (not 'published' string)
-                'categories': [14, 15],  # required - note: 'categories' not 'category_ids'
-                'list_thumbnail': list_thumbnail,  # required - path from /media (now uses real uploaded image)
-                'post_thumbnail': post_thumbnail,  # required - path from /media (now uses real uploaded image)
-                'meta_title': meta_title,  # use new meta_title field
-                'meta_tags': meta_tags,  # use new meta_tags field
-                'meta_description': meta_description  # use new meta_description field
-            })
-            
-            # Validate required fields
-            required_fields = ['title', 'url_key', 'short_content', 'status', 'categories', 'list_thumbnail', 'post_thumbnail', 'meta_title', 'meta_tags', 'meta_description']
-            missing_fields = []
-            
-            for field in required_fields:
-                value = json_args.get(field)
-                # Check if field is missing or None
-                if value is None:
-                    missing_fields.append(field)
-                # For string fields, allow empty strings (clan.com might accept them)
-                elif isinstance(value, str) and value.strip() == '':
-                    logger.warning(f"Field '{field}' is empty string, but proceeding anyway")
-            
-            if missing_fields:
-                logger.error(f"Missing required fields: {missing_fields}")
-                logger.error(f"Field values: {json_args}")
-                return {
-                    'success': False,
-                    'error': f"Missing required fields: {', '.join(missing_fields)}"
-                }
+                json_args.update(fields)
             
             # Prepare the API request data
             try:
@@ -748,41 +743,46 @@ class ClanPublisher:
             for field, value in json_args.items():
                 logger.info(f"Field '{field}': {value} (type: {type(value)})")
             
-            # Create HTML file in a known location that clan.com can access
-            import os
-            import time
-            html_filename = f"post_{post['id']}_{int(time.time())}.html"
-            html_filepath = os.path.join(os.getcwd(), html_filename)
-            
-            try:
-                # Write HTML content to file
-                with open(html_filepath, 'w', encoding='utf-8') as html_file:
-                    html_file.write(html_content)
-                
-                logger.info(f"{'Updating' if is_update else 'Creating'} post: {json_args['title']}")
-                logger.info(f"HTML content length: {len(html_content)} characters")
-                logger.info(f"HTML file created at: {html_filepath}")
-                
-                # Send the request with the actual HTML file content
-                files = {'html_file': (html_filename, open(html_filepath, 'rb'), 'text/html')}
-                
-                # DIAGNOSTIC LOGGING: Dump exact API data being sent
-                self._dump_api_call('post_create_update', endpoint, api_data, files, html_filename, json_args, html_content)
-                
-                response = requests.post(endpoint, data=api_data, files=files, timeout=15)
-                
-                # Close file handles
-                for file_tuple in files.values():
-                    if hasattr(file_tuple[1], 'close'):
-                        file_tuple[1].close()
+            if not send_html:
+                logger.info(f"Updating post {post['id']} without HTML (unchanged since last publish)")
+                self._dump_api_call('post_create_update', endpoint, api_data, json_args=json_args)
+                response = requests.post(endpoint, data=api_data, timeout=15)
+            else:
+                # Create HTML file in a known location that clan.com can access
+                import os
+                import time
+                html_filename = f"post_{post['id']}_{int(time.time())}.html"
+                html_filepath = os.path.join(os.getcwd(), html_filename)
                 
-            finally:
-                # Clean up the HTML file
                 try:
-                    os.unlink(html_filepath)
-                    logger.info(f"Cleaned up HTML file: {html_filepath}")
-                except Exception as e:
-                    logger.warning(f"Failed to clean up HTML file: {e}")
+                    # Write HTML content to file
+                    with open(html_filepath, 'w', encoding='utf-8') as html_file:
+                        html_file.write(html_content)
+                    
+                    logger.info(f"{'Updating' if is_update else 'Creating'} post: {post.get('title')}")
+                    logger.info(f"HTML content length: {len(html_content)} characters")
+                    logger.info(f"HTML file created at: {html_filepath}")
+                    
+                    # Send the request with the actual HTML file content
+                    files = {'html_file': (html_filename, open(html_filepath, 'rb'), 'text/html')}
+                    
+                    # DIAGNOSTIC LOGGING: Dump exact API data being sent
+                    self._dump_api_call('post_create_update', endpoint, api_data, files, html_filename, json_args, html_content)
+                    
+                    response = requests.post(endpoint, data=api_data, files=files, timeout=15)
+                    
+                    # Close file handles
+                    for file_tuple in files.values():
+                        if hasattr(file_tuple[1], 'close'):
+                            file_tuple[1].close()
+                    
+                finally:
+                    # Clean up the HTML file
+                    try:
+                        os.unlink(html_filepath)
+                        logger.info(f"Cleaned up HTML file: {html_filepath}")
+                    except Exception as e:
+                        logger.warning(f"Failed to clean up HTML file: {e}")
             
             if response.status_code == 200:
                 result = response.json()
@@ -859,8 +859,14 @@ class ClanPublisher:
                 'error': error_msg
             }
 
-    def publish_to_clan(self, post, sections):
-        """Main method to publish a post to clan.com"""
+    def publish_to_clan(self, post, sections, force=False, dry_run=False):
+        """Main method to publish a post to clan.com.
+        
+        Republishing compares the post with the snapshot of its last publish:
+        nothing is sent if nothing changed (unless ``force``), otherwise only
+        the changed fields. ``dry_run`` reports the changes without uploading
+        or contacting clan.com.
+        """
         try:
             logger.info("=== PUBLISH_TO_CLAN DEBUG START ===")
             logger.info(f"Post ID: {post.get('id')}")
@@ -877,9 +883,8 @@ class ClanPublisher:
                         'error': f'Post {post["id"]} not found in database'
                     }
                 
-                # Get column names and convert to dict
-                column_names = [desc[0] for desc in cursor.description]
-                full_post_data = dict(zip(column_names, post_row))
+                # db_manager cursors return dict rows
+                full_post_data = dict(post_row)
             
             # Merge the passed post data with the database data (passed data takes precedence)
             full_post_data.update(post)
@@ -917,40 +922,57 @@ class ClanPublisher:
                 
             # Step 1: Process and upload images (header + section images)
             logger.info("Step 1: Processing and uploading images...")
-            try:
-                uploaded_images = self.process_images(full_post_data, sections_list)
-                logger.info(f"✅ Image processing completed. Uploaded {len(uploaded_images)} images.")
-                logger.info(f"uploaded_images dictionary: {uploaded_images}")
+            content_hashes = {}
+            pending_uploads = []
+            if dry_run:
+                # Use the URLs of images clan.com already has; report the rest
+                from clan_image_uploads import get_upload_manager
+                resolved = get_upload_manager().resolve(self._collect_images(full_post_data, sections_list))
+                content_hashes = resolved['hashes']
+                pending_uploads = resolved['pending']
+                uploaded_images = {key: resolved['known'][content_hash] for key, content_hash in content_hashes.items()
+                                   if content_hash in resolved['known']}
+            else:
+                try:
+                    uploaded_images = self.process_images(full_post_data, sections_list, content_hashes)
+                    logger.info(f"✅ Image processing completed. Uploaded {len(uploaded_images)} images.")
+                    logger.info(f"uploaded_images dictionary: {uploaded_images}")
                 
-                # Fix: Ensure header image is included in uploaded_images for HTML replacement
-                header_image_path = full_post_data.get('header_image', {}).get('path')
-                if header_image_path and header_image_path not in uploaded_images:
-                    # Header image was processed but not added to uploaded_images
-                    # We need to upload it separately and add to uploaded_images
-                    logger.info(f"Header image not in uploaded_images, uploading separately: {header_image_path}")
-                    try:
-                        from config.paths import path_resolver
-                        fs_path = path_resolver.convert_web_path_to_filesystem(header_image_path)
-                        if os.path.exists(fs_path):
-                            filename = f"header_{full_post_data['id']}_{int(time.time())}.jpg"
-                            uploaded_url = self.upload_image(fs_path, filename)
-                            if uploaded_url:
-                                uploaded_images[header_image_path] = uploaded_url
-                                logger.info(f"✅ Header image uploaded and added to uploaded_images: {header_image_path} -> {uploaded_url}")
+                    # Fix: Ensure header image is included in uploaded_images for HTML replacement
+                    header_image_path = full_post_data.get('header_image', {}).get('path')
+                    if header_image_path and header_image_path not in uploaded_images:
+                        # Header image was processed but not added to uploaded_images
+                        # We need to upload it separately and add to uploaded_images
+                        logger.info(f"Header image not in uploaded_images, uploading separately: {header_image_path}")
+                        try:
+                            from config.paths import path_resolver
+                            from clan_image_uploads import get_upload_manager
+                            fs_path = path_resolver.convert_web_path_to_filesystem(header_image_path)
+                            if os.path.exists(fs_path):
+                                filename = f"header_{full_post_data['id']}_{int(time.time())}.jpg"
+                                header_result = get_upload_manager().upload_all(
+                                    [{'key': header_image_path, 'fs_path': fs_path, 'filename': filename}],
+                                    self.upload_image
+                                )
+                                content_hashes.update(header_result['hashes'])
+                                uploaded_url = header_result['urls'].get(header_image_path)
+                                if uploaded_url:
+                                    uploaded_images[header_image_path] = uploaded_url
+                                    logger.info(f"✅ Header image uploaded and added to uploaded_images: {header_image_path} -> {uploaded_url}")
+                                else:
+                                    logger.warning(f"❌ Header image upload failed: {header_image_path}")
                             else:
-                                logger.warning(f"❌ Header image upload failed: {header_image_path}")
-                        else:
-                            logger.warning(f"❌ Header image file not found: {fs_path}")
-                    except Exception as e:
-                        logger.error(f"❌ Error uploading header image: {str(e)}")
-            except Exception as e:
-                logger.error(f"❌ Error during image processing: {str(e)}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                return {
-                    'success': False,
-                    'error': f'Image processing failed: {str(e)}'
-                }
+                                logger.warning(f"❌ Header image file not found: {fs_path}")
+                        except Exception as e:
+                            logger.error(f"❌ Error uploading header image: {str(e)}")
+                except Exception as e:
+                    logger.error(f"❌ Error during image processing: {str(e)}")
+                    import traceback
+                    logger.error(f"Traceback: {traceback.format_exc()}")
+                    return {
+                        'success': False,
+                        'error': f'Image processing failed: {str(e)}'
+                    }
             
             # Step 2: Mapping cross-promotion data
             logger.info("Step 2: Mapping cross-promotion data...")
@@ -996,14 +1018,65 @@ class ClanPublisher:
                     'error': f'Preview HTML content retrieval failed: {str(e)}'
                 }
             
-            # Step 4: Create or update post on clan.com
-            logger.info("Step 4: Creating/updating post on clan.com...")
+            # Step 4: Compare with the last publish
+            logger.info("Step 4: Comparing with last publish...")
+            try:
+                from clan_publish_snapshots import diff, fingerprint, get_publish_snapshots
+                fields = self._build_post_fields(full_post_data, uploaded_images)
+                current = fingerprint(fields, html_content, sections_list, content_hashes)
+                try:
+                    previous = get_publish_snapshots().get(full_post_data['id'])
+                except Exception as e:
+                    logger.warning(f"Publish snapshot unavailable, sending full update: {e}")
+                    previous = None
+                # A snapshot only describes the clan.com post it was published to
+                if previous and (not is_update or previous['clan_post_id'] != full_post_data.get('clan_post_id')):
+                    previous = None
+                changes = diff(previous['fingerprint'] if previous else None, current)
+                logger.info(f"Changes since last publish: {changes}")
+            except Exception as e:
+                logger.error(f"❌ Error comparing with last publish: {str(e)}")
+                return {
+                    'success': False,
+                    'error': f'Publish comparison failed: {str(e)}'
+                }
+            
+            if dry_run:
+                return {
+                    'success': True,
+                    'dry_run': True,
+                    'is_update': is_update,
+                    'would_skip': previous is not None and not changes['changed'],
+                    'last_published_at': previous['published_at'] if previous else None,
+                    'pending_uploads': pending_uploads,
+                    'changes': changes
+                }
+            
+            if previous and not changes['changed'] and not force:
+                logger.info(f"✅ Post {full_post_data['id']} unchanged since last publish, nothing sent to clan.com")
+                return {
+                    'success': True,
+                    'skipped': True,
+                    'clan_post_id': full_post_data.get('clan_post_id'),
+                    'url': previous['url'] or full_post_data.get('clan_uploaded_url'),
+                    'changes': changes
+                }
+            
+            # Step 5: Create or update post on clan.com
+            logger.info("Step 5: Creating/updating post on clan.com...")
             logger.info(f"Is update: {is_update} (clan_post_id: {full_post_data.get('clan_post_id')})")
             
             try:
-                result = self.create_or_update_post(full_post_data, html_content, is_update, uploaded_images)
+                result = self.create_or_update_post(full_post_data, html_content, is_update, uploaded_images,
+                                                    fields=fields, changes=None if force else changes)
                 if result['success']:
                     logger.info(f"✅ Successfully published post {full_post_data['id']} to clan.com")
+                    result['changes'] = changes
+                    try:
+                        published_id = full_post_data.get('clan_post_id') if is_update else result.get('clan_post_id')
+                        get_publish_snapshots().save(full_post_data['id'], published_id, result.get('url'), current)
+                    except Exception as e:
+                        logger.warning(f"Failed to save publish snapshot: {e}")
                     return result
                 else:
                     logger.error(f"❌ Failed to publish post {full_post_data['id']}: {result.get('error', 'Unknown error')}")
@@ -1033,82 +1106,11 @@ class ClanPublisher:
         This shows the ACTUAL HTML that gets uploaded, not placeholder widgets.
         """
         try:
-            import os
-            
-            # Get the clan_post_raw.html template content
-            template_path = os.path.join(os.path.dirname(__file__), '..', 'templates', 'launchpad', 'clan_post_raw.html')
-            with open(template_path, 'r', encoding='utf-8') as f:
-                template_content = f.read()
-            
-            # Create Jinja2 environment with the strip_html_doc filter
-            from jinja2 import Environment, BaseLoader
-            
-            def strip_html_doc(content):
-                """Strip HTML document tags and return just the content"""
-                if not content:
-                    return content
-                # Remove DOCTYPE, html, head, body tags and their content
-                import re
-                content = re.sub(r'<!DOCTYPE[^>]*>', '', content)
-                content = re.sub(r'<html[^>]*>.*?</html>', '', content, flags=re.DOTALL)
-                content = re.sub(r'<head[^>]*>.*?</head>', '', content, flags=re.DOTALL)
-                content = re.sub(r'<body[^>]*>.*?</body>', '', content, flags=re.DOTALL)
-                return content.strip()
-            
-            env = Environment(loader=BaseLoader())
-            env.filters['strip_html_doc'] = strip_html_doc
+            from clan_html_renderer import get_clan_html_renderer
             
-            template = env.from_string(template_content)
-            
-            # For Clan.com API, exclude header image from HTML content since it's handled by thumbnails
-            post_for_template = post.copy()
-            post_for_template['exclude_header_image'] = True
-            
-            html_content = template.render(post=post_for_template, sections=sections)
-            
-            # Translate local image/file paths to uploaded clan.com URLs
             if uploaded_images:
-                logger.info('Translating image paths to clan.com URLs...')
-                logger.info(f'Uploaded images mapping: {uploaded_images}')
-                
-                # Create a comprehensive path mapping
-                path_mapping = {}
-                for local_path, clan_url in uploaded_images.items():
-                    # Add the exact path as found in uploaded_images
-                    path_mapping[local_path] = clan_url
-                    
-                    # Also add variations that might appear in the HTML
-                    if local_path.startswith('/static/'):
-                        # Keep the original path
-                        path_mapping[local_path] = clan_url
-                        
-                        # Add the path without /static/ prefix (in case HTML uses relative paths)
-                        if local_path.startswith('/static/'):
-                            relative_path = local_path[7:]  # Remove '/static/' prefix
-                            path_mapping[relative_path] = clan_url
-                            logger.info(f"Added relative path mapping: {relative_path} -> {clan_url}")
-                
-                logger.info(f'Final path mapping: {path_mapping}')
-                
-                # Replace all paths in the HTML content
-                for local_path, clan_url in path_mapping.items():
-                    # Replace src attributes
-                    html_content = html_content.replace(f'src="{local_path}"', f'src="{clan_url}"')
-                    # Replace href attributes  
-                    html_content = html_content.replace(f'href="{local_path}"', f'href="{clan_url}"')
-                    # Replace any other occurrences
-                    html_content = html_content.replace(local_path, clan_url)
-                    logger.info(f"Replaced {local_path} -> {clan_url}")
-            
-            # Remove localhost refs that may linger
-            import re
-            html_content = re.sub(r'http://localhost:\d+', '', html_content)
-            
-            # Save the HTML file for inspection
-            debug_file = f'/tmp/upload_html_post_{post["id"]}_{int(time.time())}.html'
-            with open(debug_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            logger.info(f"Upload HTML saved to: {debug_file}")
+                logger.info(f'Translating image paths to clan.com URLs: {uploaded_images}')
+            html_content = get_clan_html_renderer().render(post, sections, uploaded_images)
             
             logger.info(f"Final HTML content length: {len(html_content)}")
             return html_content
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Random product sampling for the clan.com product cache
+Keeps a dense in-memory index of live products so N distinct products can be
+drawn without ORDER BY RANDOM(), optionally weighted by category and by how
+long ago each product was last queued, and excluding recent posts.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rebuild the index at most this often; catalogue syncs also invalidate it
+INDEX_TTL_SECONDS = 300
+
+# Products queued within this many days are never drawn
+DEFAULT_EXCLUDE_DAYS = 14
+
+# Products last queued less than this many days ago are drawn with a
+# probability proportional to the time since (full weight after the window)
+DEFAULT_RECENCY_DAYS = 60
+
+# Extra products drawn to cover products tombstoned since the index was built
+OVERSAMPLE = 5
+
+# Rejection-sampling attempts per requested product before giving up
+MAX_ATTEMPTS_PER_ITEM = 50
+
+PRODUCT_FIELDS = 'id, name, sku, price, description, image_url, url, category_ids'
+
+
+class ProductIndex:
+    """Dense positional index over live clan_products rows"""
+
+    def __init__(self, rows: List[Dict]):
+        self.ids = [row['id'] for row in rows]
+        self.skus = [row['sku'] for row in rows]
+        self.has_price = [bool(row['has_price']) for row in rows]
+        self.has_description = [bool(row['has_description']) for row in rows]
+        self.by_category = {}
+        for position, row in enumerate(rows):
+            for category_id in row['category_ids'] or []:
+                self.by_category.setdefault(category_id, []).append(position)
+        self.position_by_sku = {sku: position for position, sku in enumerate(self.skus)}
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class ProductSampler:
+    """Draws distinct random products; works with any dict-row psycopg cursor"""
+
+    def __init__(self, ttl: int = INDEX_TTL_SECONDS):
+        self.ttl = ttl
+        self._index = None
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def invalidate(self):
+        """Drop the index so the next draw rebuilds it (call after catalogue changes)"""
+        with self._lock:
+            self._index = None
+
+    def _get_index(self, cursor) -> ProductIndex:
+        with self._lock:
+            index = self._index
+            if index is not None and time.monotonic() - index.built_at < self.ttl:
+                return index
+
+            cursor.execute('''
+                SELECT id, sku, category_ids,
+                       (price IS NOT NULL AND price != '') AS has_price,
+                       (description IS NOT NULL AND description != '') AS has_description
+                FROM clan_products
+                WHERE deleted_at IS NULL
+                ORDER BY id
+            ''')
+            self._index = ProductIndex(cursor.fetchall())
+            logger.info(f"Built product sampling index: {len(self._index)} products, "
+                        f"{len(self._index.by_category)} categories")
+            return self._index
+
+    def _recent_activity(self, cursor, window_days: int) -> Dict[int, float]:
+        """Days since each product was last queued, for products queued within the window"""
+        cursor.execute('''
+            SELECT product_id,
+                   EXTRACT(EPOCH FROM NOW() - MAX(COALESCE(scheduled_timestamp, created_at))) / 86400.0 AS days_ago
+            FROM posting_queue
+            WHERE product_id IS NOT NULL
+              AND COALESCE(scheduled_timestamp, created_at) > NOW() - make_interval(days => %s)
+            GROUP BY product_id
+        ''', (window_days,))
+        return {row['product_id']: float(row['days_ago']) for row in cursor.fetchall()}
+
+    def sample(self, cursor, count: int, category_weights: Optional[Dict[int, float]] = None,
+               exclude_days: Optional[int] = None, recency_days: Optional[int] = None,
+               exclude_ids: Iterable[int] = (), exclude_skus: Iterable[str] = (),
+               require_price: bool = False, require_description: bool = False) -> List[Dict]:
+        """Draw up to ``count`` distinct live products.
+
+        ``category_weights`` maps category id to relative weight; each draw
+        picks a category by weight and then a product within it (categories
+        with no products are ignored, no weights means uniform over all
+        products, and exhausted categories fall back to the whole catalogue). ``exclude_days`` and ``recency_days`` consult posting_queue
+        with one aggregate query; without them a draw is a single row fetch.
+        """
+        if count <= 0:
+            return []
+
+        index = self._get_index(cursor)
+        if not len(index):
+            return []
+
+        excluded = {index.position_by_sku[sku] for sku in exclude_skus if sku in index.position_by_sku}
+        excluded_ids = set(exclude_ids)
+
+        days_ago = {}
+        window = max(exclude_days or 0, recency_days or 0)
+        if window:
+            days_ago = self._recent_activity(cursor, window)
+
+        categories, weights = [], []
+        for category_id, weight in (category_weights or {}).items():
+            if weight > 0 and index.by_category.get(category_id):
+                categories.append(category_id)
+                weights.append(weight)
+
+        def acceptable(position):
+            if position in excluded:
+                return False
+            if require_price and not index.has_price[position]:
+                return False
+            if require_description and not index.has_description[position]:
+                return False
+            product_id = index.ids[position]
+            if product_id in excluded_ids:
+                return False
+            last = days_ago.get(product_id)
+            if last is not None:
+                if exclude_days and last < exclude_days:
+                    return False
+                if recency_days and last < recency_days:
+                    return self._random.random() < max(last, 0) / recency_days
+            return True
+
+        target = min(count + OVERSAMPLE, len(index))
+        chosen = []
+        seen = set()
+        attempts = 0
+        max_attempts = target * MAX_ATTEMPTS_PER_ITEM
+        while len(chosen) < target and attempts < max_attempts:
+            attempts += 1
+            # Fall back to the whole catalogue if the weighted categories run dry
+            if categories and attempts <= max_attempts // 2:
+                pool = index.by_category[self._random.choices(categories, weights)[0]]
+                position = pool[self._random.randrange(len(pool))]
+            else:
+                position = self._random.randrange(len(index))
+            if position in seen:
+                continue
+            seen.add(position)
+            if acceptable(position):
+                chosen.append(position)
+
+        if len(chosen) < count:
+            logger.warning(f"Product sampler found {len(chosen)} of {count} requested products "
+                           f"after {attempts} draws")
+
+        if not chosen:
+            return []
+
+        cursor.execute(f'''
+            SELECT {PRODUCT_FIELDS}
+            FROM clan_products
+            WHERE id = ANY(%s) AND deleted_at IS NULL
+        ''', ([index.ids[position] for position in chosen],))
+        rows = {row['id']: row for row in cursor.fetchall()}
+
+        products = []
+        for position in chosen:
+            row = rows.get(index.ids[position])
+            if row:
+                product = dict(row)
+                product['category_ids'] = product['category_ids'] or []
+                products.append(product)
+        return products[:count]
+
+
+# Global sampler instance
+product_sampler = ProductSampler()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Product search for the clan.com product cache
+Ranked full-text search (tsvector + GIN) with pg_trgm fuzzy matching,
+category filtering and keyset pagination over clan_products.
+"""
+
+import base64
+import json
+import logging
+import re
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Weight of trigram similarity on the name relative to the text-search rank
+TRIGRAM_WEIGHT = 0.5
+
+PRODUCT_FIELDS = 'id, name, sku, price, description, image_url, url, printable_design_type, category_ids'
+
+SEARCH_SCHEMA_SQL = [
+    '''
+    ALTER TABLE clan_products
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(sku, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_clan_products_search ON clan_products USING GIN (search_vector)',
+    'CREATE INDEX IF NOT EXISTS idx_clan_products_category_ids ON clan_products USING GIN (category_ids jsonb_path_ops)',
+    'CREATE INDEX IF NOT EXISTS idx_clan_products_name_id ON clan_products (name, id)',
+]
+
+TRIGRAM_SCHEMA_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS idx_clan_products_name_trgm ON clan_products USING GIN (name gin_trgm_ops)',
+]
+
+
+def encode_cursor(values: List) -> str:
+    """Opaque keyset cursor for the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[List]:
+    """Decode a cursor produced by encode_cursor; invalid tokens restart from the top"""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return values if isinstance(values, list) and len(values) == 2 else None
+    except (ValueError, TypeError):
+        logger.warning(f"Ignoring invalid product search cursor: {token!r}")
+        return None
+
+
+def to_prefix_tsquery(query: str) -> str:
+    """Turn free text into a prefix tsquery ('tart kil' -> 'tart:* & kil:*')"""
+    terms = re.findall(r'\w+', query.lower())
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+class ProductSearch:
+    """Search engine over clan_products; works with any dict-row psycopg cursor"""
+
+    def __init__(self):
+        self._has_search_vector = None
+        self._has_trigram = None
+
+    def ensure_indexes(self, conn) -> bool:
+        """Create the search column and indexes (pg_trgm is optional)"""
+        cursor = conn.cursor()
+        for sql in SEARCH_SCHEMA_SQL:
+            cursor.execute(sql)
+        conn.commit()
+
+        try:
+            for sql in TRIGRAM_SCHEMA_SQL:
+                cursor.execute(sql)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"pg_trgm unavailable, fuzzy product matching disabled: {e}")
+
+        self._has_search_vector = self._has_trigram = None
+        return True
+
+    def _detect_features(self, cursor):
+        """Check once per process which search structures exist"""
+        if self._has_search_vector is not None:
+            return
+        cursor.execute('''
+            SELECT
+                EXISTS (SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'clan_products' AND column_name = 'search_vector') AS has_vector,
+                EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS has_trigram
+        ''')
+        row = cursor.fetchone()
+        self._has_search_vector, self._has_trigram = row['has_vector'], row['has_trigram']
+        if not self._has_search_vector:
+            logger.warning("clan_products.search_vector missing; product search falls back to ILIKE")
+
+    def search(self, cursor, query: str = '', category_id: Optional[int] = None,
+               limit: Optional[int] = None, after: Optional[str] = None) -> Dict:
+        """Ranked, filtered, keyset-paginated product search.
+
+        With a query, results are ordered by relevance (text rank plus name
+        similarity); without one, alphabetically. ``after`` is the
+        ``next_cursor`` of the previous page. ``cursor`` must return dict rows.
+        """
+        self._detect_features(cursor)
+
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        query = (query or '').strip()
+        tsquery = to_prefix_tsquery(query) if query else ''
+        keyset = decode_cursor(after)
+
+        where = ['deleted_at IS NULL']
+        params = {'q': query, 'tsq': tsquery, 'like': f'%{query}%', 'limit': limit + 1}
+
+        if category_id is not None:
+            where.append('category_ids @> jsonb_build_array(%(category)s::int)')
+            params['category'] = int(category_id)
+
+        if tsquery or query:
+            matches, score_parts = [], []
+            if self._has_search_vector and tsquery:
+                matches.append("search_vector @@ to_tsquery('english', %(tsq)s)")
+                score_parts.append("ts_rank_cd(search_vector, to_tsquery('english', %(tsq)s))")
+            else:
+                matches.append('name ILIKE %(like)s OR description ILIKE %(like)s')
+            if self._has_trigram:
+                matches.append('name %% %(q)s')
+                score_parts.append(f'similarity(name, %(q)s) * {TRIGRAM_WEIGHT}')
+            matches.append('sku ILIKE %(like)s')
+            where.append('(' + ' OR '.join(matches) + ')')
+            score = '(' + ' + '.join(score_parts) + ')::float8' if score_parts else '0::float8'
+
+            keyset_clause = 'TRUE'
+            if keyset:
+                keyset_clause = '(score < %(last_score)s OR (score = %(last_score)s AND id > %(last_id)s))'
+                params['last_score'], params['last_id'] = float(keyset[0]), int(keyset[1])
+
+            sql = f'''
+                SELECT * FROM (
+                    SELECT {PRODUCT_FIELDS}, {score} AS score
+                    FROM clan_products
+                    WHERE {' AND '.join(where)}
+                ) ranked
+                WHERE {keyset_clause}
+                ORDER BY score DESC, id
+                LIMIT %(limit)s
+            '''
+            sort_key = lambda row: [row['score'], row['id']]
+        else:
+            if keyset:
+                where.append('(name, id) > (%(last_name)s, %(last_id)s)')
+                params['last_name'], params['last_id'] = str(keyset[0]), int(keyset[1])
+            sql = f'''
+                SELECT {PRODUCT_FIELDS}
+                FROM clan_products
+                WHERE {' AND '.join(where)}
+                ORDER BY name, id
+                LIMIT %(limit)s
+            '''
+            sort_key = lambda row: [row['name'], row['id']]
+
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(sort_key(rows[-1]))
+
+        products = []
+        for row in rows:
+            product = {key: row[key] for key in PRODUCT_FIELDS.split(', ')}
+            product['category_ids'] = product['category_ids'] or []
+            if 'score' in row:
+                product['score'] = round(row['score'], 4)
+            products.append(product)
+
+        return {'products': products, 'next_cursor': next_cursor}
+
+
+# Global search engine instance
+product_search = ProductSearch()
@@ -1,6 +1,7 @@
 from flask import Flask, render_template, request, jsonify
 from flask_cors import CORS
 import os
+import sys
 import psycopg2
 import psycopg2.extras
 import requests
@@ -12,6 +13,10 @@ from dotenv import load_dotenv
 # Import preview blueprint
 from preview import bp as preview_bp
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_client import LLMClient, LLMTimeoutError, get_llm_client, get_ollama_supervisor
+from llm_config_cache import get_config_cache
+
 # Load environment variables
 load_dotenv()
 
@@ -32,6 +37,9 @@ def get_db_conn():
     """Get database connection."""
     return psycopg2.connect(app.config['DATABASE_URL'], connect_timeout=5)
 
+# Prompts, actions and the active LLM config, held in memory until a write
+config_cache = get_config_cache(get_db_conn)
+
 class LLMService:
     """Service for interacting with LLM providers."""
     
@@ -40,59 +48,32 @@ class LLMService:
         self.ollama_url = ollama_url or os.environ.get("OLLAMA_API_URL", "http://localhost:11434")
         self.openai_api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
         self.default_model = default_model or os.environ.get("DEFAULT_LLM_MODEL", "mistral")
+        self.client = get_llm_client()
+        if ollama_url or openai_api_key:
+            self.client = LLMClient(ollama_url=self.ollama_url, openai_api_key=self.openai_api_key,
+                                    default_model=self.default_model)
 
-    def generate(self, prompt, model_name=None, temperature=0.7, max_tokens=1000, timeout=60):
+    def generate(self, prompt, model_name=None, temperature=0.7, max_tokens=1000, timeout=60, bypass_cache=False):
         """Generate text using configured LLM."""
         if not model_name:
             model_name = self.default_model
         logger.info(f"Generating with model: {model_name}, temperature: {temperature}, max_tokens: {max_tokens}")
         
         if self.ollama_url:
-            return self._generate_ollama(prompt, model_name, temperature, max_tokens, timeout)
+            provider = 'ollama'
         elif self.openai_api_key:
-            return self._generate_openai(prompt, model_name, temperature, max_tokens)
+            provider = 'openai'
         else:
             raise ValueError(f"Unsupported provider type: {self.ollama_url}")
-
-    def _generate_ollama(self, prompt, model_name, temperature=0.7, max_tokens=1000, timeout=60):
-        """Generate text using Ollama."""
+        options = {'temperature': float(temperature), 'max_tokens': int(max_tokens), 'timeout': timeout or 60,
+                   'bypass_cache': bypass_cache}
         try:
-            request_data = {
-                "model": model_name,
-                "prompt": prompt,
-                "temperature": float(temperature),
-                "max_tokens": int(max_tokens),
-                "stream": False
-            }
-            logger.debug(f"Sending request to Ollama: {request_data}")
-            
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json=request_data,
-                timeout=timeout or 60
-            )
-            response.raise_for_status()
-            response_data = response.json()
-            
-            if "response" in response_data:
-                return response_data["response"]
-            else:
-                logger.error(f"Unexpected response format from Ollama: {response_data}")
-                raise ValueError("Unexpected response format from Ollama")
-                
-        except requests.Timeout:
-            logger.error(f"Timeout while generating with Ollama (model: {model_name})")
-            raise TimeoutError("Request to Ollama timed out")
-        except requests.RequestException as e:
-            logger.error(f"HTTP error while generating with Ollama: {str(e)}")
-            raise
-        except Exception as e:
-            logger.exception(f"Error generating with Ollama: {str(e)}")
-            raise
-
-    def _generate_openai(self, prompt, model_name, temperature=0.7, max_tokens=1000):
-        """Generate text using OpenAI (stubbed for testing)."""
-        return "[DUMMY OPENAI RESPONSE]"
+            if isinstance(prompt, list):
+                return self.client.chat(prompt, model=model_name, provider=provider, **options)
+            return self.client.generate(prompt, model=model_name, provider=provider, **options)
+        except LLMTimeoutError:
+            logger.error(f"Timeout while generating with {provider} (model: {model_name})")
+            raise TimeoutError(f"Request to {provider} timed out")
 
 def execute_llm_request(provider, model, prompt, temperature=0.7, max_tokens=1000, api_key=None, api_endpoint=None):
     """Execute an LLM request with the given parameters."""
@@ -271,69 +252,24 @@ def task():
 
 @app.route('/api/start-ollama', methods=['POST'])
 def start_ollama():
-    """Start Ollama service."""
+    """Start Ollama service (via the shared supervisor) and warm the configured models."""
+    supervisor = get_ollama_supervisor()
     try:
-        import subprocess
-        import sys
-        
-        # Check if Ollama is already running
-        try:
-            response = requests.get('http://localhost:11434/api/tags', timeout=2)
-            if response.ok:
-                return jsonify({
-                    'status': 'success',
-                    'message': 'Ollama is already running'
-                })
-        except:
-            pass  # Ollama is not running, continue to start it
-        
-        # Try to start Ollama
-        try:
-            # Use subprocess to start Ollama in the background
-            if sys.platform == 'darwin':  # macOS
-                subprocess.Popen(['ollama', 'serve'], 
-                               stdout=subprocess.DEVNULL, 
-                               stderr=subprocess.DEVNULL,
-                               start_new_session=True)
-            else:  # Linux/Windows
-                subprocess.Popen(['ollama', 'serve'], 
-                               stdout=subprocess.DEVNULL, 
-                               stderr=subprocess.DEVNULL)
-            
-            # Wait a moment for Ollama to start
-            import time
-            time.sleep(3)
-            
-            # Check if Ollama started successfully
-            try:
-                response = requests.get('http://localhost:11434/api/tags', timeout=5)
-                if response.ok:
-                    return jsonify({
-                        'status': 'success',
-                        'message': 'Ollama started successfully'
-                    })
-                else:
-                    return jsonify({
-                        'status': 'error',
-                        'error': 'Ollama started but is not responding properly'
-                    }), 500
-            except requests.RequestException:
-                return jsonify({
-                    'status': 'error',
-                    'error': 'Ollama started but is not responding. Please check if it\'s running properly.'
-                }), 500
-                
-        except FileNotFoundError:
+        already_running = supervisor.is_healthy()
+        if supervisor.ensure_running():
             return jsonify({
-                'status': 'error',
-                'error': 'Ollama is not installed. Please install Ollama first.'
-            }), 404
-        except Exception as e:
-            return jsonify({
-                'status': 'error',
-                'error': f'Failed to start Ollama: {str(e)}'
-            }), 500
-            
+                'status': 'success',
+                'message': 'Ollama is already running' if already_running else 'Ollama started successfully'
+            })
+        return jsonify({
+            'status': 'error',
+            'error': 'Ollama started but is not responding. Please check if it\'s running properly.'
+        }), 500
+    except FileNotFoundError:
+        return jsonify({
+            'status': 'error',
+            'error': 'Ollama is not installed. Please install Ollama first.'
+        }), 404
     except Exception as e:
         logger.error(f"Error starting Ollama: {str(e)}")
         return jsonify({
@@ -341,30 +277,19 @@ def start_ollama():
             'error': str(e)
         }), 500
 
+@app.route('/api/ollama/status', methods=['GET'])
+def ollama_status():
+    """Ollama health, loaded models and request latency."""
+    return jsonify(get_ollama_supervisor().stats())
+
 @app.route('/api/run-llm', methods=['POST'])
 def run_llm():
     """Execute LLM action."""
     data = request.get_json()
     
     try:
-        # Get LLM configuration from database
-        with get_db_conn() as conn:
-            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            cur.execute("""
-                SELECT provider_type, model_name, api_base
-                FROM llm_config
-                WHERE is_active = true
-                ORDER BY id DESC
-                LIMIT 1
-            """)
-            config = cur.fetchone()
-            if not config:
-                # Fallback to default configuration
-                config = {
-                    'provider_type': 'ollama',
-                    'model_name': 'mistral',
-                    'api_base': 'http://localhost:11434'
-                }
+        # Active LLM configuration (cached; falls back to the default config)
+        config = config_cache.get_active_config()
         
         # Get section-specific context if section_id is provided
         section_id = data.get('section_id')
@@ -509,14 +434,14 @@ def run_llm():
             'output': result
         })
         
-    except requests.ConnectionError as e:
+    except ConnectionError as e:
         logger.error(f"Connection error in run_llm: {str(e)}")
         return jsonify({
             'status': 'error',
             'error': 'LLM service is not available. Please ensure Ollama is running on port 11434.',
             'details': 'Connection refused to localhost:11434'
         }), 503
-    except requests.Timeout as e:
+    except TimeoutError as e:
         logger.error(f"Timeout error in run_llm: {str(e)}")
         return jsonify({
             'status': 'error',
@@ -534,35 +459,24 @@ def run_llm():
 def get_llm_config():
     """Get current LLM configuration."""
     try:
-        with get_db_conn() as conn:
-            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            cur.execute("""
-                SELECT provider_type, model_name, api_base, is_active
-                FROM llm_config
-                WHERE is_active = true
-                ORDER BY id DESC
-                LIMIT 1
-            """)
-            config = cur.fetchone()
-            
-        if config:
-            return jsonify({
-                'provider_type': config['provider_type'],
-                'model_name': config['model_name'],
-                'api_base': config['api_base'],
-                'is_active': config['is_active']
-            })
-        else:
-            return jsonify({
-                'provider_type': 'ollama',
-                'model_name': 'mistral',
-                'api_base': 'http://localhost:11434',
-                'is_active': True
-            })
+        config = config_cache.get_active_config()
+        return jsonify({
+            'provider_type': config['provider_type'],
+            'model_name': config['model_name'],
+            'api_base': config['api_base'],
+            'is_active': config['is_active']
+        })
     except Exception as e:
         logger.error(f"Error getting LLM config: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/llm/config-cache', methods=['GET', 'DELETE'])
+def llm_config_cache():
+    """Config cache counters; DELETE forces a reload on the next lookup."""
+    if request.method == 'DELETE':
+        config_cache.invalidate('manual')
+    return jsonify(config_cache.stats())
+
 @app.route('/api/llm/test', methods=['POST'])
 def test_llm():
     """Test LLM connection."""
@@ -576,7 +490,8 @@ def test_llm():
             prompt=prompt,
             model_name=model,
             temperature=0.7,
-            max_tokens=100
+            max_tokens=100,
+            bypass_cache=True  # a connection test must reach the model
         )
         
         return jsonify({
@@ -639,151 +554,44 @@ def get_models():
 def get_actions():
     """Get all TASK prompts organized exactly like workflow_prompts page."""
     try:
-        # Use the same database connection as blog-core to get the correct data
-        import sys
-        import os
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'blog-core'))
-        from db import get_db_conn as get_blog_core_db_conn
-        
-        with get_blog_core_db_conn() as conn:
-            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            
-            # Get ALL task prompts (not just linked ones) - this is the fix!
-            cur.execute("""
-                SELECT lp.id, lp.name, lp.description, 
-                       COALESCE(lp.system_prompt, '') as system_prompt,
-                       COALESCE(lp.prompt_text, '') as prompt_text,
-                       wsp.step_id,
-                       wse.name as step_name,
-                       wse.sub_stage_id,
-                       wsse.name as substage_name,
-                       wsse.stage_id,
-                       wstage.name as stage_name,
-                       wstage.stage_order,
-                       wsse.sub_stage_order,
-                       wse.step_order
-                FROM llm_prompt lp
-                LEFT JOIN workflow_step_prompt wsp ON lp.id = wsp.task_prompt_id
-                LEFT JOIN workflow_step_entity wse ON wsp.step_id = wse.id
-                LEFT JOIN workflow_sub_stage_entity wsse ON wse.sub_stage_id = wsse.id
-                LEFT JOIN workflow_stage_entity wstage ON wsse.stage_id = wstage.id
-                WHERE lp.system_prompt IS NULL OR lp.system_prompt = ''
-                ORDER BY lp.name
-            """)
-            task_prompts = cur.fetchall()
-
-            # Get workflow stages and substages (EXACT same queries as workflow_prompts)
-            cur.execute("""
-                SELECT id, name, description, stage_order
-                FROM workflow_stage_entity
-                ORDER BY stage_order
-            """)
-            stages = cur.fetchall()
+        # Served from the config cache; no queries in steady state
+        task_prompts = config_cache.task_prompt_rows()
 
-            cur.execute("""
-                SELECT id, stage_id, name, description, sub_stage_order
-                FROM workflow_sub_stage_entity
-                ORDER BY stage_id, sub_stage_order
-            """)
-            substages = cur.fetchall()
-
-            # Get all steps (EXACT same query as workflow_prompts)
-            cur.execute("""
-                SELECT id, name, sub_stage_id, step_order
-                FROM workflow_step_entity
-                ORDER BY step_order
-            """)
-            steps = cur.fetchall()
+        # Convert to flat list - show ALL prompts regardless of step assignment
+        flat_prompts = []
+        
+        for prompt in task_prompts:
+            if prompt['step_id'] is not None:
+                # Prompt is linked to a step
+                flat_prompts.append({
+                    'id': prompt['id'],
+                    'field_name': prompt['name'],
+                    'prompt_template': prompt['prompt_text'],
+                    'description': prompt['description'],
+                    'created_at': prompt.get('created_at'),
+                    'updated_at': prompt.get('updated_at'),
+                    'step_id': prompt['step_id'],
+                    'step_name': prompt['step_name'],
+                    'substage_name': prompt['substage_name'],
+                    'stage_name': prompt['stage_name'],
+                    'group': f"{prompt['stage_name']} > {prompt['substage_name']} > {prompt['step_name']}"
+                })
+            else:
+                # Prompt is not linked to any step - show it as available
+                flat_prompts.append({
+                    'id': prompt['id'],
+                    'field_name': prompt['name'],
+                    'prompt_template': prompt['prompt_text'],
+                    'description': prompt['description'],
+                    'created_at': prompt.get('created_at'),
+                    'updated_at': prompt.get('updated_at'),
+                    'step_id': None,
+                    'step_name': None,
+                    'substage_name': None,
+                    'stage_name': None,
+                    'group': 'Available Prompts'
+                })
 
-            # Organize task prompts by stage/substage/step (EXACT same logic as workflow_prompts)
-            tasks_by_stage = {}
-            unassigned_prompts = []
-            
-            for prompt in task_prompts:
-                if prompt['step_id'] is None:
-                    unassigned_prompts.append(prompt)
-                else:
-                    stage_id = prompt['stage_id']
-                    substage_id = prompt['sub_stage_id']
-                    step_id = prompt['step_id']
-                    
-                    if stage_id not in tasks_by_stage:
-                        tasks_by_stage[stage_id] = {
-                            'name': prompt['stage_name'],
-                            'stage_order': next((s['stage_order'] for s in stages if s['id'] == stage_id), 0),
-                            'substages': {}
-                        }
-                    
-                    if substage_id not in tasks_by_stage[stage_id]['substages']:
-                        tasks_by_stage[stage_id]['substages'][substage_id] = {
-                            'name': prompt['substage_name'],
-                            'sub_stage_order': next((ss['sub_stage_order'] for ss in substages if ss['id'] == substage_id), 0),
-                            'steps': {}
-                        }
-                    
-                    if step_id not in tasks_by_stage[stage_id]['substages'][substage_id]['steps']:
-                        tasks_by_stage[stage_id]['substages'][substage_id]['steps'][step_id] = {
-                            'name': prompt['step_name'],
-                            'step_order': next((st['step_order'] for st in steps if st['id'] == step_id), 0),
-                            'prompts': []
-                        }
-                    
-                    tasks_by_stage[stage_id]['substages'][substage_id]['steps'][step_id]['prompts'].append(prompt)
-            
-            # Sort stages by stage_order, substages by sub_stage_order, and steps by step_order (EXACT same logic as workflow_prompts)
-            sorted_tasks_by_stage = {}
-            for stage_id in sorted(tasks_by_stage.keys(), key=lambda x: tasks_by_stage[x]['stage_order']):
-                stage_data = tasks_by_stage[stage_id]
-                sorted_substages = {}
-                for substage_id in sorted(stage_data['substages'].keys(), key=lambda x: stage_data['substages'][x]['sub_stage_order']):
-                    substage_data = stage_data['substages'][substage_id]
-                    sorted_steps = {}
-                    for step_id in sorted(substage_data['steps'].keys(), key=lambda x: substage_data['steps'][x]['step_order']):
-                        sorted_steps[step_id] = substage_data['steps'][step_id]
-                    sorted_substages[substage_id] = {
-                        'name': substage_data['name'],
-                        'steps': sorted_steps
-                    }
-                sorted_tasks_by_stage[stage_id] = {
-                    'name': stage_data['name'],
-                    'substages': sorted_substages
-                }
-            
-            # Convert to flat list - show ALL prompts regardless of step assignment
-            flat_prompts = []
-            
-            for prompt in task_prompts:
-                if prompt['step_id'] is not None:
-                    # Prompt is linked to a step
-                    flat_prompts.append({
-                        'id': prompt['id'],
-                        'field_name': prompt['name'],
-                        'prompt_template': prompt['prompt_text'],
-                        'description': prompt['description'],
-                        'created_at': prompt.get('created_at'),
-                        'updated_at': prompt.get('updated_at'),
-                        'step_id': prompt['step_id'],
-                        'step_name': prompt['step_name'],
-                        'substage_name': prompt['substage_name'],
-                        'stage_name': prompt['stage_name'],
-                        'group': f"{prompt['stage_name']} > {prompt['substage_name']} > {prompt['step_name']}"
-                    })
-                else:
-                    # Prompt is not linked to any step - show it as available
-                    flat_prompts.append({
-                        'id': prompt['id'],
-                        'field_name': prompt['name'],
-                        'prompt_template': prompt['prompt_text'],
-                        'description': prompt['description'],
-                        'created_at': prompt.get('created_at'),
-                        'updated_at': prompt.get('updated_at'),
-                        'step_id': None,
-                        'step_name': None,
-                        'substage_name': None,
-                        'stage_name': None,
-                        'group': 'Available Prompts'
-                    })
-            
         return jsonify(flat_prompts)
     except Exception as e:
         logger.error(f"Error getting task prompts: {str(e)}")
@@ -793,19 +601,14 @@ def get_actions():
 def get_system_prompts():
     """Get all SYSTEM prompts from llm_prompt table (not task prompts)."""
     try:
-        with get_db_conn() as conn:
-            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            cur.execute("""
-                SELECT id, name, description, 
-                       COALESCE(system_prompt, '') as system_prompt,
-                       COALESCE(prompt_text, '') as prompt_text
-                FROM llm_prompt
-                WHERE system_prompt IS NOT NULL AND system_prompt != ''
-                ORDER BY name
-            """)
-            prompts = cur.fetchall()
-            
-        return jsonify([dict(p) for p in prompts])
+        prompts = config_cache.system_prompts()
+        return jsonify([{
+            'id': p['id'],
+            'name': p['name'],
+            'description': p['description'],
+            'system_prompt': p['system_prompt'],
+            'prompt_text': p['prompt_text'] or ''
+        } for p in prompts])
     except Exception as e:
         logger.error(f"Error getting system prompts: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -886,32 +689,17 @@ def execute_action(action_id):
     try:
         data = request.get_json()
         
-        # First get the llm_action to find the prompt_template_id
-        with get_db_conn() as conn:
-            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            cur.execute("""
-                SELECT id, field_name, prompt_template_id, prompt_template
-                FROM llm_action 
-                WHERE id = %s
-            """, (action_id,))
-            action = cur.fetchone()
-            
+        # Action, prompt and LLM config all come from the config cache
+        action = config_cache.get_action(action_id)
         if not action:
             return jsonify({'error': 'LLM action not found'}), 404
             
         action = dict(action)
         
-        # Get task prompt from database using prompt_template_id
+        # Get task prompt using prompt_template_id
         prompt_id = action.get('prompt_template_id')
         if prompt_id:
-            with get_db_conn() as conn:
-                cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-                cur.execute("""
-                    SELECT id, name, prompt_text, description, system_prompt
-                    FROM llm_prompt 
-                    WHERE id = %s
-                """, (prompt_id,))
-                prompt = cur.fetchone()
+            prompt = config_cache.get_prompt(prompt_id)
         else:
             # Fallback to using prompt_template from llm_action
             prompt = {
@@ -932,24 +720,7 @@ def execute_action(action_id):
         if not input_text:
             return jsonify({'error': 'No input text provided'}), 400
         
-        # Get LLM configuration from database
-        with get_db_conn() as conn:
-            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            cur.execute("""
-                SELECT provider_type, model_name, api_base
-                FROM llm_config
-                WHERE is_active = true
-                ORDER BY id DESC
-                LIMIT 1
-            """)
-            config = cur.fetchone()
-            if not config:
-                # Fallback to default configuration
-                config = {
-                    'provider_type': 'ollama',
-                    'model_name': 'mistral',
-                    'api_base': 'http://localhost:11434'
-                }
+        config = config_cache.get_active_config()
         
         # Process prompt - replace {{input}} placeholder with actual input
         prompt_template = prompt['prompt_text']
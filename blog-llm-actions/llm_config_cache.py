@@ -0,0 +1,291 @@
+"""
+LLM Configuration Cache
+In-memory copies of llm_prompt, llm_action and the active llm_config row
+for the LLM actions service, plus the task prompt listing behind
+/api/llm/actions. Everything is loaded in one round trip on first use and
+then served from memory.
+
+Statement-level triggers on those tables (and on the workflow tables the
+listing joins) send NOTIFY llm_config_changed, whichever service made the
+write. A background LISTEN connection turns that into an invalidation, and
+the next lookup reloads. A snapshot is only trusted indefinitely while the
+LISTEN connection is up and the triggers are confirmed in pg_trigger;
+otherwise it expires after LLM_CONFIG_CACHE_TTL seconds.
+"""
+
+import logging
+import os
+import select
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import psycopg2.extensions
+import psycopg2.extras
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'llm_config_changed'
+
+# Staleness bound while notifications are unavailable
+TTL = int(os.getenv('LLM_CONFIG_CACHE_TTL', 300))
+
+LISTEN_RETRY_SECONDS = 5
+
+DEFAULT_CONFIG = {
+    'provider_type': 'ollama',
+    'model_name': 'mistral',
+    'api_base': 'http://localhost:11434',
+    'is_active': True,
+}
+
+WATCHED_TABLES = [
+    'llm_prompt', 'llm_action', 'llm_config',
+    'workflow_step_prompt', 'workflow_step_entity', 'workflow_sub_stage_entity', 'workflow_stage_entity',
+]
+
+SCHEMA_SQL = [
+    f"""
+    CREATE OR REPLACE FUNCTION notify_llm_config_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', TG_TABLE_NAME);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+] + [
+    f"""
+    DO $$
+    BEGIN
+        IF to_regclass('{table}') IS NOT NULL
+           AND NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{table}_config_notify') THEN
+            CREATE TRIGGER {table}_config_notify
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_llm_config_changed();
+        END IF;
+    END;
+    $$
+    """
+    for table in WATCHED_TABLES
+]
+
+
+class LLMConfigCache:
+    """Prompts, actions and the active LLM config, reloaded only after a change"""
+
+    def __init__(self, connect: Callable, ttl: int = TTL):
+        self._connect = connect
+        self.ttl = ttl
+        self._snapshot = None
+        self._generation = 0
+        self._load_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._listener = None
+        self._listening = False
+        self._triggers_ready = False
+        self._stats = {'hits': 0, 'loads': 0, 'invalidations': 0}
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def get_action(self, action_id: int) -> Optional[Dict]:
+        return self._get()['actions'].get(action_id)
+
+    def get_prompt(self, prompt_id: int) -> Optional[Dict]:
+        return self._get()['prompts'].get(prompt_id)
+
+    def get_active_config(self) -> Dict:
+        """Newest active llm_config row, or DEFAULT_CONFIG"""
+        return self._get()['config'] or dict(DEFAULT_CONFIG)
+
+    def system_prompts(self) -> List[Dict]:
+        """Prompts with a system prompt, by name"""
+        prompts = [p for p in self._get()['prompts'].values() if p['system_prompt']]
+        return sorted(prompts, key=lambda p: p['name'])
+
+    def task_prompt_rows(self) -> List[Dict]:
+        """Task prompts (no system prompt) joined to their workflow step, by name"""
+        return self._get()['task_prompts']
+
+    def stats(self) -> Dict:
+        snapshot = self._snapshot
+        return dict(self._stats, listening=self._listening, triggers_ready=self._triggers_ready,
+                    age_seconds=round(time.monotonic() - snapshot['loaded_at'], 1) if snapshot else None)
+
+    # ------------------------------------------------------------------
+    # Loading and invalidation
+    # ------------------------------------------------------------------
+
+    def invalidate(self, reason: str = 'write'):
+        with self._state_lock:
+            self._generation += 1
+            self._snapshot = None
+            self._stats['invalidations'] += 1
+        logger.info(f"LLM config cache invalidated ({reason})")
+
+    def _fresh(self, snapshot) -> bool:
+        return (self._listening and self._triggers_ready) or time.monotonic() - snapshot['loaded_at'] < self.ttl
+
+    def _get(self) -> Dict:
+        self._ensure_listener()
+        snapshot = self._snapshot
+        if snapshot is not None and self._fresh(snapshot):
+            self._stats['hits'] += 1
+            return snapshot
+        with self._load_lock:
+            snapshot = self._snapshot
+            if snapshot is not None and self._fresh(snapshot):
+                return snapshot
+            generation = self._generation
+            snapshot = self._load()
+            with self._state_lock:
+                # A change that arrived during the load leaves the snapshot uncached
+                if generation == self._generation:
+                    self._snapshot = snapshot
+            return snapshot
+
+    def _load(self) -> Dict:
+        conn = self._connect()
+        try:
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cur.execute("""
+                SELECT id, name, description, prompt_text,
+                       COALESCE(system_prompt, '') AS system_prompt
+                FROM llm_prompt
+            """)
+            prompts = {row['id']: dict(row) for row in cur.fetchall()}
+
+            cur.execute("SELECT id, field_name, prompt_template_id, prompt_template FROM llm_action")
+            actions = {row['id']: dict(row) for row in cur.fetchall()}
+
+            cur.execute("""
+                SELECT provider_type, model_name, api_base, is_active
+                FROM llm_config
+                WHERE is_active = true
+                ORDER BY id DESC
+                LIMIT 1
+            """)
+            config = cur.fetchone()
+
+            cur.execute("""
+                SELECT lp.id, lp.name, lp.description,
+                       COALESCE(lp.system_prompt, '') as system_prompt,
+                       COALESCE(lp.prompt_text, '') as prompt_text,
+                       wsp.step_id,
+                       wse.name as step_name,
+                       wsse.name as substage_name,
+                       wstage.name as stage_name
+                FROM llm_prompt lp
+                LEFT JOIN workflow_step_prompt wsp ON lp.id = wsp.task_prompt_id
+                LEFT JOIN workflow_step_entity wse ON wsp.step_id = wse.id
+                LEFT JOIN workflow_sub_stage_entity wsse ON wse.sub_stage_id = wsse.id
+                LEFT JOIN workflow_stage_entity wstage ON wsse.stage_id = wstage.id
+                WHERE lp.system_prompt IS NULL OR lp.system_prompt = ''
+                ORDER BY lp.name
+            """)
+            task_prompts = [dict(row) for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+        self._stats['loads'] += 1
+        logger.info(f"LLM config cache loaded: {len(prompts)} prompts, {len(actions)} actions")
+        return {
+            'prompts': prompts,
+            'actions': actions,
+            'config': dict(config) if config else None,
+            'task_prompts': task_prompts,
+            'loaded_at': time.monotonic(),
+        }
+
+    # ------------------------------------------------------------------
+    # NOTIFY listener
+    # ------------------------------------------------------------------
+
+    def ensure_schema(self):
+        """NOTIFY trigger on every watched table (idempotent)"""
+        conn = self._connect()
+        try:
+            cur = conn.cursor()
+            for sql in SCHEMA_SQL:
+                cur.execute(sql)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _triggers_installed(self, conn) -> bool:
+        """Whether every existing watched table has its NOTIFY trigger"""
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COUNT(*) FILTER (WHERE to_regclass(t.name) IS NOT NULL
+                                    AND NOT EXISTS (SELECT 1 FROM pg_trigger
+                                                    WHERE tgname = t.name || '_config_notify'))
+            FROM unnest(%s::text[]) AS t(name)
+        """, (WATCHED_TABLES,))
+        return cur.fetchone()[0] == 0
+
+    def _ensure_listener(self):
+        if self._listener is not None:
+            return
+        with self._state_lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen_forever, name='llm-config-listener', daemon=True)
+            self._listener.start()
+
+    def _listen_forever(self):
+        schema_ready = False
+        schema_warned = False
+        while True:
+            conn = None
+            if not schema_ready:
+                try:
+                    self.ensure_schema()
+                    schema_ready = True
+                except Exception as e:
+                    # Migration 013 may have installed the triggers already; the
+                    # listener checks pg_trigger before relying on notifications
+                    if not schema_warned:
+                        logger.warning(f"Could not install LLM config NOTIFY triggers, listening anyway: {e}")
+                        schema_warned = True
+            try:
+                conn = self._connect()
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f'LISTEN {NOTIFY_CHANNEL}')
+                self._triggers_ready = self._triggers_installed(conn)
+                if not self._triggers_ready:
+                    logger.warning(f"LLM config NOTIFY triggers missing; snapshots expire after {self.ttl}s")
+                self._listening = True
+                # Anything written while we were not listening has been missed
+                self.invalidate('listener connected')
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        if not self._triggers_ready and self._triggers_installed(conn):
+                            self._triggers_ready = True
+                            self.invalidate('NOTIFY triggers installed')
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        tables = sorted({notify.payload for notify in conn.notifies})
+                        conn.notifies.clear()
+                        self.invalidate(f"{', '.join(tables)} changed")
+            except Exception as e:
+                logger.warning(f"LLM config LISTEN connection unavailable: {e}")
+            finally:
+                self._listening = False
+                if conn is not None:
+                    conn.close()
+            time.sleep(LISTEN_RETRY_SECONDS)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_config_cache(connect: Callable) -> LLMConfigCache:
+    """Process-wide config cache, built on the first call with ``connect``"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMConfigCache(connect)
+        return _cache
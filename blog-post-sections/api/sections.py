@@ -1,34 +1,31 @@
 import json
 import os
+import sys
 import psycopg2
 import psycopg2.extras
 from flask import Blueprint, request, jsonify, render_template
 from database import get_db_conn
 
+# Project root, for the shared image index in config/
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+from config.image_index import get_image_index
+
+# Posts directory of the blog-images static tree
+POSTS_IMAGES_ROOT = os.getenv('BLOG_IMAGES_POSTS_ROOT',
+                              os.path.join(PROJECT_ROOT, 'blog-images', 'static', 'content', 'posts'))
+
 bp = Blueprint('sections', __name__, url_prefix='/api/sections')
 
 def find_section_image(post_id, section_id):
     """
-    Find the first available image for a section in the new directory structure.
+    Find the first available raw image for a section in the new directory structure.
     Returns the image path or None if no image found.
     """
-    # Path to the blog-images static directory
-    blog_images_static = "/Users/nickfiddes/Code/projects/blog/blog-images/static"
-    
-    # Look for images in the section's raw directory
-    section_raw_path = os.path.join(blog_images_static, "content", "posts", str(post_id), "sections", str(section_id), "raw")
-    
-    if os.path.exists(section_raw_path):
-        # Get all image files in the raw directory
-        image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp')
-        image_files = [f for f in os.listdir(section_raw_path) 
-                      if f.lower().endswith(image_extensions) and not f.startswith('.')]
-        
-        if image_files:
-            # Return the first image found
-            image_filename = image_files[0]
-            # Return path relative to blog-images static directory for serving
-            return f"/static/content/posts/{post_id}/sections/{section_id}/raw/{image_filename}"
+    image_files = get_image_index(POSTS_IMAGES_ROOT).files(post_id, 'sections', 'raw', section_id)
+    if image_files:
+        # Return path relative to blog-images static directory for serving
+        return f"/static/content/posts/{post_id}/sections/{section_id}/raw/{image_files[0]}"
     
     return None
 
@@ -1,9 +1,10 @@
 # Authoring Blueprint - Real workflow integration
 from flask import Blueprint, render_template, jsonify, request, redirect, url_for
 from config.database import db_manager
+from llm_client import LLMError, get_llm_client
+from llm_client.sse import sse_response
 import logging
 import json
-import requests
 import re
 from bs4 import BeautifulSoup
 
@@ -92,61 +93,35 @@ class LLMService:
         """Get available models for a provider."""
         try:
             if provider == 'ollama':
-                response = requests.get(f"{self.providers[provider]['base_url']}/api/tags", timeout=5)
-                if response.status_code == 200:
-                    models = [model['name'] for model in response.json().get('models', [])]
-                    return models
+                return get_llm_client().list_models(provider)
             return self.providers.get(provider, {}).get('models', [])
         except Exception as e:
             logger.error(f"Error getting models for {provider}: {e}")
             return []
     
-    def execute_llm_request(self, provider, model, messages, api_key=None):
-        """Execute LLM request."""
+    def _request_options(self, provider, api_key=None):
+        if provider == 'openai':
+            return {'temperature': 0.7, 'max_tokens': 2000, 'timeout': 30, 'api_key': api_key}
+        return {'timeout': 60}
+    
+    def execute_llm_request(self, provider, model, messages, api_key=None, bypass_cache=False):
+        """Execute LLM request (bypass_cache=True forces a fresh generation)."""
+        if provider not in self.providers:
+            return {'error': f'Unknown provider: {provider}'}
         try:
-            if provider == 'openai':
-                headers = {
-                    'Authorization': f'Bearer {api_key}',
-                    'Content-Type': 'application/json'
-                }
-                data = {
-                    'model': model,
-                    'messages': messages,
-                    'temperature': 0.7,
-                    'max_tokens': 2000
-                }
-                response = requests.post(
-                    f"{self.providers[provider]['base_url']}/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=30
-                )
-            elif provider == 'ollama':
-                data = {
-                    'model': model,
-                    'messages': messages,
-                    'stream': False
-                }
-                response = requests.post(
-                    f"{self.providers[provider]['base_url']}/api/chat",
-                    json=data,
-                    timeout=60
-                )
-            else:
-                return {'error': f'Unknown provider: {provider}'}
-            
-            if response.status_code == 200:
-                result = response.json()
-                if provider == 'openai':
-                    return {'content': result['choices'][0]['message']['content']}
-                elif provider == 'ollama':
-                    return {'content': result['message']['content']}
-            else:
-                return {'error': f'API request failed: {response.status_code} - {response.text}'}
-                
+            content = get_llm_client().chat(messages, model=model, provider=provider, bypass_cache=bypass_cache,
+                                            **self._request_options(provider, api_key))
+            return {'content': content}
         except Exception as e:
             logger.error(f"Error executing LLM request: {e}")
             return {'error': str(e)}
+    
+    def stream_llm_request(self, provider, model, messages, api_key=None, bypass_cache=False):
+        """Yield the LLM response as it is generated."""
+        if provider not in self.providers:
+            raise LLMError(f'Unknown provider: {provider}')
+        return get_llm_client().stream_chat(messages, model=model, provider=provider, bypass_cache=bypass_cache,
+                                            **self._request_options(provider, api_key))
 
 # Initialize LLM service
 llm_service = LLMService()
@@ -551,184 +526,204 @@ def api_save_section_content(post_id, section_id):
             'error': str(e)
         }), 500
 
+class SectionDraftError(Exception):
+    """A section draft cannot be requested (missing section, post, plan or prompt)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def _build_section_draft_messages(cursor, post_id, section_id):
+    """Build the Section Drafting messages for a section; returns (messages, llm_message)"""
+    # Get section details
+    cursor.execute("""
+        SELECT id, section_order, section_heading, section_description, 
+               status, draft, polished
+        FROM post_section
+        WHERE post_id = %s AND id = %s
+    """, (post_id, section_id))
+    section = cursor.fetchone()
+    
+    if not section:
+        raise SectionDraftError('Section not found', 404)
+    
+    # Get post details and sections data from planning
+    cursor.execute("""
+        SELECT title, summary
+        FROM post 
+        WHERE id = %s
+    """, (post_id,))
+    post = cursor.fetchone()
+    
+    if not post:
+        raise SectionDraftError('Post not found', 404)
+    
+    # Get sections data from post_development
+    cursor.execute("""
+        SELECT expanded_idea, sections, topic_allocation
+        FROM post_development
+        WHERE post_id = %s
+    """, (post_id,))
+    dev_data = cursor.fetchone()
+    
+    if not dev_data or not dev_data['expanded_idea']:
+        raise SectionDraftError('No expanded idea found. Please complete the planning phase first.', 400)
+    
+    # Parse sections data to get current section details
+    import json
+    sections_data = []
+    if dev_data['sections']:
+        try:
+            sections_json = json.loads(dev_data['sections'])
+            # Handle nested structure: sections_json.sections
+            if isinstance(sections_json, dict) and 'sections' in sections_json:
+                sections_data = sections_json['sections']
+            elif isinstance(sections_json, list):
+                sections_data = sections_json
+        except:
+            sections_data = []
+    
+    # Parse topic allocation data
+    topic_allocation = None
+    if dev_data['topic_allocation']:
+        try:
+            # Check if it's already a dict (parsed by DB driver) or needs JSON parsing
+            if isinstance(dev_data['topic_allocation'], dict):
+                topic_allocation = dev_data['topic_allocation']
+            else:
+                topic_allocation = json.loads(dev_data['topic_allocation'])
+        except Exception as e:
+            logger.error(f"Error parsing topic_allocation: {e}")
+            topic_allocation = None
+    
+    # Find current section in sections data
+    current_section_data = None
+    for section_data in sections_data:
+        if section_data.get('order') == section['section_order']:
+            current_section_data = section_data
+            break
+    
+    if not current_section_data:
+        # Get topics from idea_scope and assign to section based on semantic matching
+        topics_for_section = []
+        if dev_data and dev_data.get('idea_scope'):
+            try:
+                import json
+                idea_scope = json.loads(dev_data['idea_scope'])
+                all_topics = idea_scope.get('generated_topics', [])
+                
+                # Improved semantic matching based on section heading/description
+                section_text = f"{section['section_heading']} {section['section_description'] or ''}".lower()
+                
+                # Define section-specific keywords for better matching
+                section_keywords = {
+                    1: ['samhain', 'celtic', 'ancient', 'roots', 'ceres', 'festival'],
+                    2: ['agriculture', 'crop', 'farming', 'land', 'bounty', 'rotation'],
+                    3: ['celebration', 'tradition', 'timeless', 'seasonal', 'hogmanay'],
+                    4: ['symbolism', 'mythology', 'autumn', 'folklore', 'symbolic'],
+                    5: ['farmer', 'knowledge', 'folk', 'remedy', 'medicine', 'healing'],
+                    6: ['christianity', 'christian', 'religion', 'church', 'reformation'],
+                    7: ['women', 'female', 'gender', 'role', 'folk']
+                }
+                
+                # Get keywords for this section
+                keywords = section_keywords.get(section['section_order'], [])
+                
+                for topic in all_topics:
+                    topic_title = topic.get('title', '').lower()
+                    # Match topics that contain section-specific keywords
+                    if any(keyword in topic_title for keyword in keywords):
+                        topics_for_section.append(topic['title'])
+                
+                # Limit to 3-5 topics per section
+                topics_for_section = topics_for_section[:5]
+                    
+            except (json.JSONDecodeError, KeyError, TypeError):
+                # If parsing fails, use empty list
+                topics_for_section = []
+        
+        # Use section data from post_section table as fallback
+        current_section_data = {
+            'title': section['section_heading'],
+            'subtitle': section['section_description'] or '',
+            'topics': topics_for_section,
+            'order': section['section_order']
+        }
+    
+    # Get all other sections to build "avoid topics" list
+    avoid_topics = []
+    for section_data in sections_data:
+        if section_data.get('order') != section['section_order']:
+            topics = section_data.get('topics', [])
+            if isinstance(topics, list):
+                avoid_topics.extend(topics)
+    
+    # Get Section Drafting prompt
+    cursor.execute("""
+        SELECT system_prompt, prompt_text
+        FROM llm_prompt
+        WHERE name = 'Section Drafting'
+    """)
+    prompt_data = cursor.fetchone()
+    
+    if not prompt_data:
+        raise SectionDraftError('Section Drafting prompt not found', 500)
+    
+    # Prepare prompt variables with rich context
+    prompt_vars = {
+        'SELECTED_IDEA': dev_data.get('idea_seed', 'Scottish autumn folklore and traditions'),
+        'SECTION_TITLE': section['section_heading'],
+        'SECTION_SUBTITLE': section['section_description'] or '',
+        'SECTION_GROUP': 'Historical Foundations of Autumnal Traditions',  # This should come from planning data
+        'GROUP_SUMMARY': 'This group explores the Celtic roots and historical developments that shaped Scotland\'s autumnal customs, highlighting their significance in understanding the country\'s identity.',
+        'SECTION_TOPICS': ', '.join(current_section_data.get('topics', [])),
+        'AVOID_SECTIONS_DETAILED': build_avoid_topics_text(topic_allocation, {'section_id': f'section_{section["section_order"]}'})
+    }
+    
+    # Replace placeholders in prompt
+    prompt_text = prompt_data['prompt_text']
+    for key, value in prompt_vars.items():
+        prompt_text = prompt_text.replace(f'[{key}]', str(value))
+    
+    # Messages for the LLM
+    messages = [
+        {'role': 'system', 'content': prompt_data['system_prompt']},
+        {'role': 'user', 'content': prompt_text}
+    ]
+    
+    # Construct the full message for debugging
+    full_message = f"=== SYSTEM PROMPT ===\n{prompt_data['system_prompt']}\n\n=== USER PROMPT (with placeholders replaced) ===\n{prompt_text}\n\n=== MODEL ===\nollama: llama3.2:latest\n\n=== TEMPERATURE ===\n0.7\n\n=== MAX TOKENS ===\n2000"
+    
+    return messages, full_message
+
+def _save_section_draft(cursor, post_id, section_id, content):
+    """Save an LLM draft (draft=HTML, polished=plain text)"""
+    # Process the LLM response to create both HTML and plain text versions
+    draft_html, section_text_plain = process_llm_html_content(content)
+    
+    cursor.execute("""
+        UPDATE post_section 
+        SET draft = %s, polished = %s, status = 'complete'
+        WHERE post_id = %s AND id = %s
+    """, (draft_html, section_text_plain, post_id, section_id))
+    
+    cursor.connection.commit()
+
+def _regenerate_requested():
+    """True when the client asks for a fresh generation rather than a cached response"""
+    data = request.get_json(silent=True) or {}
+    return bool(data.get('regenerate')) or request.args.get('regenerate') == '1'
+
 @bp.route('/api/posts/<int:post_id>/sections/<int:section_id>/generate', methods=['POST'])
 def api_generate_section_draft(post_id, section_id):
     """Generate draft content for a specific section using LLM"""
     try:
         with db_manager.get_cursor() as cursor:
-            # Get section details
-            cursor.execute("""
-                SELECT id, section_order, section_heading, section_description, 
-                       status, draft, polished
-                FROM post_section
-                WHERE post_id = %s AND id = %s
-            """, (post_id, section_id))
-            section = cursor.fetchone()
-            
-            if not section:
-                return jsonify({
-                    'success': False,
-                    'error': 'Section not found'
-                }), 404
-            
-            # Get post details and sections data from planning
-            cursor.execute("""
-                SELECT title, summary
-                FROM post 
-                WHERE id = %s
-            """, (post_id,))
-            post = cursor.fetchone()
-            
-            if not post:
-                return jsonify({
-                    'success': False,
-                    'error': 'Post not found'
-                }), 404
-            
-            # Get sections data from post_development
-            cursor.execute("""
-                SELECT expanded_idea, sections, topic_allocation
-                FROM post_development
-                WHERE post_id = %s
-            """, (post_id,))
-            dev_data = cursor.fetchone()
-            
-            if not dev_data or not dev_data['expanded_idea']:
-                return jsonify({
-                    'success': False,
-                    'error': 'No expanded idea found. Please complete the planning phase first.'
-                }), 400
-            
-            # Parse sections data to get current section details
-            import json
-            sections_data = []
-            if dev_data['sections']:
-                try:
-                    sections_json = json.loads(dev_data['sections'])
-                    # Handle nested structure: sections_json.sections
-                    if isinstance(sections_json, dict) and 'sections' in sections_json:
-                        sections_data = sections_json['sections']
-                    elif isinstance(sections_json, list):
-                        sections_data = sections_json
-                except:
-                    sections_data = []
-            
-            # Parse topic allocation data
-            topic_allocation = None
-            if dev_data['topic_allocation']:
-                try:
-                    # Check if it's already a dict (parsed by DB driver) or needs JSON parsing
-                    if isinstance(dev_data['topic_allocation'], dict):
-                        topic_allocation = dev_data['topic_allocation']
-                    else:
-                        topic_allocation = json.loads(dev_data['topic_allocation'])
-                except Exception as e:
-                    logger.error(f"Error parsing topic_allocation: {e}")
-                    topic_allocation = None
-            
-            # Find current section in sections data
-            current_section_data = None
-            for section_data in sections_data:
-                if section_data.get('order') == section['section_order']:
-                    current_section_data = section_data
-                    break
-            
-            if not current_section_data:
-                # Get topics from idea_scope and assign to section based on semantic matching
-                topics_for_section = []
-                if dev_data and dev_data.get('idea_scope'):
-                    try:
-                        import json
-                        idea_scope = json.loads(dev_data['idea_scope'])
-                        all_topics = idea_scope.get('generated_topics', [])
-                        
-                        # Improved semantic matching based on section heading/description
-                        section_text = f"{section['section_heading']} {section['section_description'] or ''}".lower()
-                        
-                        # Define section-specific keywords for better matching
-                        section_keywords = {
-                            1: ['samhain', 'celtic', 'ancient', 'roots', 'ceres', 'festival'],
-                            2: ['agriculture', 'crop', 'farming', 'land', 'bounty', 'rotation'],
-                            3: ['celebration', 'tradition', 'timeless', 'seasonal', 'hogmanay'],
-                            4: ['symbolism', 'mythology', 'autumn', 'folklore', 'symbolic'],
-                            5: ['farmer', 'knowledge', 'folk', 'remedy', 'medicine', 'healing'],
-                            6: ['christianity', 'christian', 'religion', 'church', 'reformation'],
-                            7: ['women', 'female', 'gender', 'role', 'folk']
-                        }
-                        
-                        # Get keywords for this section
-                        keywords = section_keywords.get(section['section_order'], [])
-                        
-                        for topic in all_topics:
-                            topic_title = topic.get('title', '').lower()
-                            # Match topics that contain section-specific keywords
-                            if any(keyword in topic_title for keyword in keywords):
-                                topics_for_section.append(topic['title'])
-                        
-                        # Limit to 3-5 topics per section
-                        topics_for_section = topics_for_section[:5]
-                            
-                    except (json.JSONDecodeError, KeyError, TypeError):
-                        # If parsing fails, use empty list
-                        topics_for_section = []
-                
-                # Use section data from post_section table as fallback
-                current_section_data = {
-                    'title': section['section_heading'],
-                    'subtitle': section['section_description'] or '',
-                    'topics': topics_for_section,
-                    'order': section['section_order']
-                }
-            
-            # Get all other sections to build "avoid topics" list
-            avoid_topics = []
-            for section_data in sections_data:
-                if section_data.get('order') != section['section_order']:
-                    topics = section_data.get('topics', [])
-                    if isinstance(topics, list):
-                        avoid_topics.extend(topics)
-            
-            # Get Section Drafting prompt
-            cursor.execute("""
-                SELECT system_prompt, prompt_text
-                FROM llm_prompt
-                WHERE name = 'Section Drafting'
-            """)
-            prompt_data = cursor.fetchone()
-            
-            if not prompt_data:
-                return jsonify({
-                    'success': False,
-                    'error': 'Section Drafting prompt not found'
-                }), 500
-            
-            # Prepare prompt variables with rich context
-            prompt_vars = {
-                'SELECTED_IDEA': dev_data.get('idea_seed', 'Scottish autumn folklore and traditions'),
-                'SECTION_TITLE': section['section_heading'],
-                'SECTION_SUBTITLE': section['section_description'] or '',
-                'SECTION_GROUP': 'Historical Foundations of Autumnal Traditions',  # This should come from planning data
-                'GROUP_SUMMARY': 'This group explores the Celtic roots and historical developments that shaped Scotland\'s autumnal customs, highlighting their significance in understanding the country\'s identity.',
-                'SECTION_TOPICS': ', '.join(current_section_data.get('topics', [])),
-                'AVOID_SECTIONS_DETAILED': build_avoid_topics_text(topic_allocation, {'section_id': f'section_{section["section_order"]}'})
-            }
-            
-            # Replace placeholders in prompt
-            prompt_text = prompt_data['prompt_text']
-            for key, value in prompt_vars.items():
-                prompt_text = prompt_text.replace(f'[{key}]', str(value))
-            
-            # Call LLM service
-            messages = [
-                {'role': 'system', 'content': prompt_data['system_prompt']},
-                {'role': 'user', 'content': prompt_text}
-            ]
-            
-            # Construct the full message for debugging
-            full_message = f"=== SYSTEM PROMPT ===\n{prompt_data['system_prompt']}\n\n=== USER PROMPT (with placeholders replaced) ===\n{prompt_text}\n\n=== MODEL ===\nollama: llama3.2:latest\n\n=== TEMPERATURE ===\n0.7\n\n=== MAX TOKENS ===\n2000"
+            messages, full_message = _build_section_draft_messages(cursor, post_id, section_id)
             
             logger.info(f"Generating draft for section {section_id} of post {post_id}")
-            llm_response = llm_service.execute_llm_request('ollama', 'llama3.2:latest', messages)
+            llm_response = llm_service.execute_llm_request('ollama', 'llama3.2:latest', messages,
+                                                           bypass_cache=_regenerate_requested())
             
             if 'error' in llm_response:
                 return jsonify({
@@ -736,17 +731,7 @@ def api_generate_section_draft(post_id, section_id):
                     'error': f"LLM generation failed: {llm_response['error']}"
                 }), 500
             
-            # Process the LLM response to create both HTML and plain text versions
-            draft_html, section_text_plain = process_llm_html_content(llm_response['content'])
-            
-            # Save generated content to database (draft=HTML, polished=plain text)
-            cursor.execute("""
-                UPDATE post_section 
-                SET draft = %s, polished = %s, status = 'complete'
-                WHERE post_id = %s AND id = %s
-            """, (draft_html, section_text_plain, post_id, section_id))
-            
-            cursor.connection.commit()
+            _save_section_draft(cursor, post_id, section_id, llm_response['content'])
             
             return jsonify({
                 'success': True,
@@ -755,6 +740,11 @@ def api_generate_section_draft(post_id, section_id):
                 'llm_message': full_message
             })
             
+    except SectionDraftError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status
     except Exception as e:
         logger.error(f"Error in api_generate_section_draft: {e}")
         return jsonify({
@@ -762,6 +752,39 @@ def api_generate_section_draft(post_id, section_id):
             'error': str(e)
         }), 500
 
+@bp.route('/api/posts/<int:post_id>/sections/<int:section_id>/generate/stream', methods=['POST'])
+def api_stream_section_draft(post_id, section_id):
+    """Stream draft content for a section as server-sent events, saving it once complete"""
+    try:
+        with db_manager.get_cursor() as cursor:
+            messages, full_message = _build_section_draft_messages(cursor, post_id, section_id)
+    except SectionDraftError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status
+    except Exception as e:
+        logger.error(f"Error in api_stream_section_draft: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    def on_complete(content):
+        with db_manager.get_cursor() as cursor:
+            _save_section_draft(cursor, post_id, section_id, content)
+        return {
+            'success': True,
+            'draft_content': content,
+            'message': 'Draft generated successfully',
+            'llm_message': full_message
+        }
+    
+    logger.info(f"Streaming draft for section {section_id} of post {post_id}")
+    chunks = llm_service.stream_llm_request('ollama', 'llama3.2:latest', messages,
+                                            bypass_cache=_regenerate_requested())
+    return sse_response(chunks, on_complete)
+
 @bp.route('/api/posts/<int:post_id>/sections/<int:section_id>/save-image-concepts', methods=['POST'])
 def api_save_image_concepts(post_id, section_id):
     """Save image concepts for a specific section"""
@@ -900,7 +923,9 @@ def api_generate_image_concepts(post_id, section_id):
             image_concepts = None
             
             for attempt in range(max_retries):
-                result = llm_service.execute_llm_request('ollama', 'llama3.2:latest', messages)
+                # Retries need a fresh generation, not the cached response that just failed validation
+                result = llm_service.execute_llm_request('ollama', 'llama3.2:latest', messages,
+                                                         bypass_cache=attempt > 0 or _regenerate_requested())
                 
                 if 'error' in result:
                     if attempt == max_retries - 1:  # Last attempt
@@ -346,4 +346,8 @@ def health():
             result = cursor.fetchone()
         return jsonify({"status": "healthy", "service": "database", "test_result": result})
     except Exception as e:
-        return jsonify({"status": "unhealthy", "service": "database", "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"status": "unhealthy", "service": "database", "error": str(e)}), 500
+@bp.route('/pool')
+def pool_stats():
+    """Connection pool occupancy, wait time and checkout counters."""
+    return jsonify(db_manager.get_pool_stats())
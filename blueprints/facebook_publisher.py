@@ -0,0 +1,404 @@
+# blueprints/facebook_publisher.py
+"""
+Concurrent Facebook page publishing for posting_queue items.
+
+One pooled keep-alive session talks to the Graph API, page credentials are
+cached with a TTL, and posts fan out across queue items and pages on a
+bounded thread pool with a token-bucket rate limit per page. Every
+successful page post is recorded in posting_queue_page_posts as soon as it
+happens, so a retry after a crash or a partial failure posts only to the
+pages that have no post yet, never to the same page twice.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.database import db_manager
+from config.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+GRAPH_API_URL = os.getenv('FACEBOOK_GRAPH_API_URL', 'https://graph.facebook.com/v18.0').rstrip('/')
+PUBLISH_CONCURRENCY = int(os.getenv('FACEBOOK_PUBLISH_CONCURRENCY', 4))
+PAGE_POSTS_PER_MINUTE = float(os.getenv('FACEBOOK_PAGE_POSTS_PER_MINUTE', 30))
+PAGE_POST_BURST = float(os.getenv('FACEBOOK_PAGE_POST_BURST', 5))
+CREDENTIALS_TTL_SECONDS = int(os.getenv('FACEBOOK_CREDENTIALS_TTL', 300))
+SCRAPE_LINKS = os.getenv('FACEBOOK_SCRAPE_LINKS', 'true').lower() == 'true'
+
+# A link is re-scraped at most this often
+SCRAPE_TTL_SECONDS = 3600
+
+# Claims older than this are treated as abandoned by a crashed worker
+STALE_CLAIM_MINUTES = 15
+
+# Item statuses that may still be (re)published; 'partial' items only go to
+# the pages that failed. 'published', 'dead_letter' etc. are never claimed.
+PUBLISHABLE_STATUSES = ['draft', 'ready', 'pending', 'failed', 'partial']
+
+# Retries for throttling and 5xx answers from the Graph API
+MAX_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 2.0
+
+# Graph API error codes: expired/invalid token, and the rate-limit family
+TOKEN_ERROR_CODES = {190}
+THROTTLE_ERROR_CODES = {4, 17, 32, 613}
+
+# (credential keys, display name) for each page, in posting order
+PAGE_CREDENTIALS = [
+    ('page_id', 'page_access_token', 'Scotweb CLAN'),
+    ('page_id_2', 'page_access_token_2', 'CLAN by Scotweb'),
+]
+
+LEDGER_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS posting_queue_page_posts (
+        queue_id INTEGER NOT NULL REFERENCES posting_queue(id) ON DELETE CASCADE,
+        page_id VARCHAR(100) NOT NULL,
+        page_name VARCHAR(100),
+        platform_post_id VARCHAR(100) NOT NULL,
+        posted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (queue_id, page_id)
+    )
+"""
+
+
+class GraphClient:
+    """Graph API calls over one pooled keep-alive session"""
+
+    def __init__(self, base_url: str = None, pool_size: int = PUBLISH_CONCURRENCY, timeout: int = 30):
+        self.base_url = (base_url or GRAPH_API_URL).rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 4))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._scraped = {}
+        self._scraped_lock = threading.Lock()
+
+    def post_to_feed(self, page_id: str, access_token: str, message: str, link_url: str,
+                     page_name: str = '') -> Dict:
+        """Post a link to a page feed, retrying throttling and server errors"""
+        feed_url = f"{self.base_url}/{page_id}/feed"
+        payload = {'message': message, 'link': link_url, 'access_token': access_token}
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = self.session.post(feed_url, data=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = {'success': False, 'error': f'Facebook API request failed: {e}', 'retryable': True}
+            else:
+                logger.info(f"Facebook API response for {page_name or page_id} - Status: {response.status_code}")
+                if response.status_code == 200:
+                    result = response.json()
+                    return {'success': True, 'post_id': result.get('id'), 'response': result}
+
+                try:
+                    error_data = response.json().get('error', {}) if response.content else {}
+                except ValueError:
+                    error_data = {}
+                code = error_data.get('code')
+                error = {
+                    'success': False,
+                    'error': f'Facebook API error: {response.status_code}',
+                    'details': error_data.get('message', 'Unknown Facebook API error'),
+                    'code': code,
+                    'retryable': response.status_code >= 500 or response.status_code == 429
+                                 or code in THROTTLE_ERROR_CODES
+                }
+
+            if not error['retryable'] or attempt == MAX_RETRIES:
+                return error
+            time.sleep(RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+        return error
+
+    def scrape(self, url: str, app_token: Optional[str]) -> bool:
+        """Ask Facebook to re-scrape a link so the post preview is current.
+
+        Needs an app token (app_id|app_secret); each URL is scraped at most
+        once per SCRAPE_TTL_SECONDS.
+        """
+        if not url or not app_token:
+            return False
+        with self._scraped_lock:
+            last = self._scraped.get(url)
+            if last and time.monotonic() - last < SCRAPE_TTL_SECONDS:
+                return True
+            self._scraped[url] = time.monotonic()
+
+        try:
+            response = self.session.post(self.base_url + '/',
+                                         data={'id': url, 'scrape': 'true', 'access_token': app_token},
+                                         timeout=self.timeout)
+            if response.status_code != 200:
+                logger.warning(f"Facebook link scrape for {url} returned {response.status_code}")
+                return False
+            return True
+        except requests.RequestException as e:
+            logger.warning(f"Facebook link scrape for {url} failed: {e}")
+            return False
+
+
+class CredentialsCache:
+    """Facebook page credentials from platform_credentials, cached for ``ttl`` seconds"""
+
+    def __init__(self, ttl: int = CREDENTIALS_TTL_SECONDS):
+        self.ttl = ttl
+        self._creds = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._creds = None
+
+    def get(self) -> Dict[str, str]:
+        with self._lock:
+            if self._creds is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._creds
+            with db_manager.get_cursor() as cursor:
+                cursor.execute("""
+                    SELECT credential_key, credential_value
+                    FROM platform_credentials
+                    WHERE platform_id = (SELECT id FROM platforms WHERE name = 'facebook')
+                    AND is_active = true
+                """)
+                self._creds = {row['credential_key']: row['credential_value'] for row in cursor.fetchall()}
+            self._loaded_at = time.monotonic()
+            return self._creds
+
+    def get_pages(self) -> List[Dict]:
+        """Configured pages in posting order, skipping a duplicate second page"""
+        creds = self.get()
+        pages = []
+        for id_key, token_key, name in PAGE_CREDENTIALS:
+            if not (creds.get(id_key) and creds.get(token_key)):
+                continue
+            if any(page['page_id'] == creds[id_key] for page in pages):
+                logger.warning("Both Facebook pages have the same page_id - skipping duplicate posting to prevent double posts")
+                continue
+            pages.append({'page_id': creds[id_key], 'access_token': creds[token_key], 'name': name})
+        return pages
+
+    def get_app_token(self) -> Optional[str]:
+        creds = self.get()
+        if creds.get('app_id') and creds.get('app_secret'):
+            return f"{creds['app_id']}|{creds['app_secret']}"
+        return None
+
+
+class PublishLedger:
+    """posting_queue claims, per-page post records and final statuses"""
+
+    def __init__(self):
+        self._schema_ready = False
+
+    def _ensure_schema(self):
+        # Own transaction: read-only callers roll back when their cursor closes
+        if not self._schema_ready:
+            with db_manager.get_connection() as conn:
+                conn.cursor().execute(LEDGER_SCHEMA_SQL)
+                conn.commit()
+            self._schema_ready = True
+
+    def claim(self, queue_ids: List[int]) -> Dict[int, str]:
+        """Atomically mark items as 'publishing'; returns {id: previous status}.
+
+        Only items in PUBLISHABLE_STATUSES are claimed. Items already being
+        published by another worker are skipped unless their claim is older
+        than STALE_CLAIM_MINUTES.
+        """
+        self._ensure_schema()
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE posting_queue pq
+                SET status = 'publishing', updated_at = NOW()
+                FROM (
+                    SELECT id, status FROM posting_queue
+                    WHERE id = ANY(%s)
+                      AND (status = ANY(%s)
+                           OR (status = 'publishing' AND updated_at < NOW() - make_interval(mins => %s)))
+                    FOR UPDATE SKIP LOCKED
+                ) previous
+                WHERE pq.id = previous.id
+                RETURNING pq.id, previous.status
+            """, ([int(queue_id) for queue_id in queue_ids], PUBLISHABLE_STATUSES, STALE_CLAIM_MINUTES))
+            claimed = {row['id']: row['status'] for row in cursor.fetchall()}
+            conn.commit()
+        return claimed
+
+    def release(self, previous: Dict[int, str]):
+        """Give claimed items back their previous status (nothing was posted)"""
+        if not previous:
+            return
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                UPDATE posting_queue SET status = %s, updated_at = NOW()
+                WHERE id = %s AND status = 'publishing'
+            """, [(status, queue_id) for queue_id, status in previous.items()])
+            conn.commit()
+
+    def posted_pages(self, queue_ids: List[int]) -> Dict[int, Dict[str, str]]:
+        """{queue_id: {page_id: platform_post_id}} for pages already posted"""
+        self._ensure_schema()
+        with db_manager.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT queue_id, page_id, platform_post_id
+                FROM posting_queue_page_posts
+                WHERE queue_id = ANY(%s)
+            """, (list(queue_ids),))
+            posted = {}
+            for row in cursor.fetchall():
+                posted.setdefault(row['queue_id'], {})[row['page_id']] = row['platform_post_id']
+            return posted
+
+    def record_page_post(self, queue_id: int, page: Dict, platform_post_id: str):
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO posting_queue_page_posts (queue_id, page_id, page_name, platform_post_id)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (queue_id, page_id) DO NOTHING
+            """, (queue_id, page['page_id'], page['name'], platform_post_id))
+            conn.commit()
+
+    def finish(self, queue_id: int, platform_post_id: Optional[str], error: Optional[str]):
+        """Final status with the first page's post id: published, partial (some
+        pages failed, ``error`` lists them) or failed (no page posted)"""
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            if platform_post_id and not error:
+                cursor.execute("""
+                    UPDATE posting_queue
+                    SET status = 'published', platform_post_id = %s, error_message = NULL, updated_at = NOW()
+                    WHERE id = %s
+                """, (platform_post_id, queue_id))
+            elif platform_post_id:
+                cursor.execute("""
+                    UPDATE posting_queue
+                    SET status = 'partial', platform_post_id = %s, error_message = %s, updated_at = NOW()
+                    WHERE id = %s
+                """, (platform_post_id, error, queue_id))
+            else:
+                cursor.execute("""
+                    UPDATE posting_queue
+                    SET status = 'failed', error_message = %s, updated_at = NOW()
+                    WHERE id = %s
+                """, (error, queue_id))
+            conn.commit()
+
+
+class FacebookPublisher:
+    """Fans posts out across queue items and pages"""
+
+    def __init__(self, graph: GraphClient = None, credentials: CredentialsCache = None,
+                 ledger: PublishLedger = None, concurrency: int = PUBLISH_CONCURRENCY,
+                 page_posts_per_minute: float = PAGE_POSTS_PER_MINUTE):
+        self.graph = graph or GraphClient(pool_size=concurrency)
+        self.credentials = credentials or CredentialsCache()
+        self.ledger = ledger or PublishLedger()
+        self.concurrency = max(1, concurrency)
+        self.page_rate = page_posts_per_minute / 60.0
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+
+    def _limiter(self, page_id: str) -> TokenBucket:
+        with self._limiters_lock:
+            if page_id not in self._limiters:
+                self._limiters[page_id] = TokenBucket(self.page_rate, PAGE_POST_BURST)
+            return self._limiters[page_id]
+
+    def post_to_page(self, page: Dict, message: str, link_url: str) -> Dict:
+        """Rate-limited post to one page"""
+        self._limiter(page['page_id']).acquire()
+        result = self.graph.post_to_feed(page['page_id'], page['access_token'], message, link_url, page['name'])
+        if not result['success'] and result.get('code') in TOKEN_ERROR_CODES:
+            self.credentials.invalidate()
+        return result
+
+    def publish(self, jobs: List[Dict], claimed: Dict[int, str]) -> Dict[int, Dict]:
+        """Publish prepared jobs ({'queue_id', 'message', 'link_url'}) to every page.
+
+        ``claimed`` is the {id: previous status} map from PublishLedger.claim;
+        each job's item must be claimed. Returns {queue_id: result} in the
+        shape execute_facebook_post has always returned.
+        """
+        if not jobs:
+            return {}
+
+        pages = self.credentials.get_pages()
+        if not pages:
+            self.ledger.release({job['queue_id']: claimed[job['queue_id']] for job in jobs})
+            return {job['queue_id']: {'success': False, 'message': 'No Facebook pages configured'} for job in jobs}
+
+        already_posted = self.ledger.posted_pages([job['queue_id'] for job in jobs])
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            if SCRAPE_LINKS:
+                app_token = self.credentials.get_app_token()
+                links = {job['link_url'] for job in jobs if job.get('link_url')}
+                list(pool.map(lambda url: self.graph.scrape(url, app_token), links))
+
+            futures = {}
+            for job in jobs:
+                for page in pages:
+                    if page['page_id'] in already_posted.get(job['queue_id'], {}):
+                        continue
+                    futures[(job['queue_id'], page['page_id'])] = pool.submit(
+                        self._post_and_record, job, page)
+
+            results = {}
+            for job in jobs:
+                queue_id = job['queue_id']
+                successful_posts, failed_posts = [], []
+                for page in pages:
+                    post_id = already_posted.get(queue_id, {}).get(page['page_id'])
+                    if post_id:
+                        successful_posts.append(post_id)
+                        continue
+                    result = futures[(queue_id, page['page_id'])].result()
+                    if result['success']:
+                        successful_posts.append(result['post_id'])
+                    else:
+                        failed_posts.append(f"{page['name']}: {result['error']}")
+
+                results[queue_id] = self._finish(queue_id, successful_posts, failed_posts)
+
+        return results
+
+    def _post_and_record(self, job: Dict, page: Dict) -> Dict:
+        try:
+            result = self.post_to_page(page, job['message'], job['link_url'])
+            if result['success']:
+                self.ledger.record_page_post(job['queue_id'], page, result['post_id'])
+            return result
+        except Exception as e:
+            logger.error(f"Error posting queue item {job['queue_id']} to {page['name']}: {e}")
+            return {'success': False, 'error': str(e)}
+
+    def _finish(self, queue_id: int, successful_posts: List[str], failed_posts: List[str]) -> Dict:
+        if successful_posts and not failed_posts:
+            self.ledger.finish(queue_id, successful_posts[0], None)
+            return {'success': True, 'message': f'Successfully posted to {len(successful_posts)} page(s)',
+                    'platform_post_ids': successful_posts}
+
+        if successful_posts:
+            # 'partial': a later run posts only to the pages that failed
+            self.ledger.finish(queue_id, successful_posts[0], ", ".join(failed_posts))
+            message = (f'Posted to {len(successful_posts)} page(s), failed on {len(failed_posts)}: '
+                       f'{", ".join(failed_posts)}')
+            return {'success': False, 'partial': True, 'message': message, 'platform_post_ids': successful_posts}
+
+        self.ledger.finish(queue_id, None, ", ".join(failed_posts))
+        return {'success': False, 'message': f'Failed to post to all pages: {", ".join(failed_posts)}'}
+
+
+# Shared publisher instance
+facebook_publisher = FacebookPublisher()
@@ -1,117 +1,140 @@
 # blueprints/launchpad.py
 from flask import Blueprint, render_template, jsonify, request, send_file, redirect, url_for
 import logging
-import json
 import os
+import sys
 import requests
-from datetime import datetime, date, time, timedelta
 import pytz
 from humanize import naturaltime
 from config.database import db_manager
+from blueprints.facebook_publisher import facebook_publisher
 import psycopg
 
 bp = Blueprint('launchpad', __name__)
 logger = logging.getLogger(__name__)
 
+# product_sampler and clan_publisher live in the blog-launchpad service; add it to the path once
+LAUNCHPAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'blog-launchpad')
+if LAUNCHPAD_DIR not in sys.path:
+    sys.path.append(LAUNCHPAD_DIR)
+
+# Days of schedule expanded into candidate slots (at least; large batches look further ahead)
+SLOT_HORIZON_DAYS = 30
+
+# Free posting slots for one platform/content type, earliest first. Each
+# active schedule is expanded over the horizon in its own timezone, then
+# anti-joined against posting_queue (one post per date/time slot). The
+# slot instant is converted to the database session's local time for
+# scheduled_timestamp, which the posting executor compares against now().
+FREE_SLOTS_SQL = """
+    WITH candidates AS (
+        SELECT DISTINCT ON (d::date, s.time)
+               d::date AS slot_date,
+               s.time AS slot_time,
+               s.timezone,
+               s.id AS schedule_id,
+               (d::date + s.time) AT TIME ZONE s.timezone AS slot_at
+        FROM daily_posts_schedule s
+        CROSS JOIN LATERAL generate_series(
+            (NOW() AT TIME ZONE s.timezone)::date,
+            (NOW() AT TIME ZONE s.timezone)::date + %(days)s,
+            interval '1 day'
+        ) AS d
+        WHERE s.is_active = true AND s.platform = %(platform)s AND s.content_type = %(content_type)s
+          AND (s.days @> to_jsonb(EXTRACT(ISODOW FROM d)::int)
+               OR s.days ? lower(to_char(d, 'FMDay')))
+        ORDER BY d::date, s.time, s.id
+    ),
+    free AS (
+        SELECT c.*, row_number() OVER (ORDER BY c.slot_at, c.schedule_id) AS slot_order
+        FROM candidates c
+        WHERE c.slot_at > NOW()
+          AND NOT EXISTS (
+              SELECT 1 FROM posting_queue pq
+              WHERE pq.scheduled_date = c.slot_date AND pq.scheduled_time = c.slot_time
+                AND pq.content_type = %(content_type)s
+                AND COALESCE(pq.platform, 'facebook') = %(platform)s
+                AND pq.id <> ALL(%(ids)s::int[])
+          )
+    )
+"""
+
+def _slot_lock_key(platform, content_type):
+    return f'posting_slots:{platform}:{content_type}'
+
 def get_next_posting_slot(cursor, platform='facebook', content_type='product'):
-    """Calculate the next available posting slot based on schedules and existing queue."""
+    """Return the next free posting slot without claiming it (None if there is none)."""
     try:
-        # Get active schedules for the specific platform and content type
-        cursor.execute("""
-            SELECT id, time, timezone, days, is_active
-            FROM daily_posts_schedule
-            WHERE is_active = true AND platform = %s AND content_type = %s
-            ORDER BY time ASC
-        """, (platform, content_type))
-        schedules = cursor.fetchall()
-        
-        if not schedules:
-            return None
-        
-        # Get the latest scheduled post for THIS content type to know where to start
-        cursor.execute("""
-            SELECT scheduled_timestamp, scheduled_date, scheduled_time
-            FROM posting_queue
-            WHERE scheduled_timestamp IS NOT NULL AND content_type = %s
-            ORDER BY scheduled_timestamp DESC
+        cursor.execute(FREE_SLOTS_SQL + """
+            SELECT slot_date, slot_time, (slot_at AT TIME ZONE current_setting('TimeZone')) AS slot_timestamp,
+                   schedule_id, timezone
+            FROM free
+            ORDER BY slot_order
             LIMIT 1
-        """, (content_type,))
-        latest_scheduled = cursor.fetchone()
+        """, {'days': SLOT_HORIZON_DAYS, 'platform': platform, 'content_type': content_type, 'ids': []})
+        slot = cursor.fetchone()
         
-        # Start from current time or latest scheduled time + 1 day
-        if latest_scheduled and latest_scheduled['scheduled_timestamp']:
-            start_date = latest_scheduled['scheduled_date'] + timedelta(days=1)
-        else:
-            start_date = date.today()
-        
-        # First, try to fill existing scheduled days for THIS content type
-        cursor.execute("""
-            SELECT scheduled_date, scheduled_time, COUNT(*) as count
-            FROM posting_queue
-            WHERE scheduled_timestamp IS NOT NULL AND content_type = %s
-            GROUP BY scheduled_date, scheduled_time
-            ORDER BY scheduled_date, scheduled_time
-        """, (content_type,))
-        existing_slots = cursor.fetchall()
-        
-        # Check existing slots first to fill them up
-        for slot in existing_slots:
-            slot_date = slot['scheduled_date']
-            slot_time = slot['scheduled_time']
-            existing_count = slot['count']
-            
-            # Allow only 1 post per time slot
-            max_posts_per_slot = 1
-            
-            if existing_count < max_posts_per_slot:
-                # Found an available slot in existing day
-                slot_timestamp = datetime.combine(slot_date, slot_time)
-                return {
-                    'date': slot_date,
-                    'time': slot_time,
-                    'timestamp': slot_timestamp,
-                    'schedule_name': f'Existing Slot',
-                    'timezone': 'GMT'
-                }
-        
-        # If no existing slots available, find the next new slot
-        for days_ahead in range(30):  # Look up to 30 days ahead
-            check_date = start_date + timedelta(days=days_ahead)
-            day_of_week = check_date.isoweekday()  # 1=Monday, 7=Sunday
-            
-            for schedule in schedules:
-                schedule_days = schedule['days'] if isinstance(schedule['days'], list) else json.loads(schedule['days'])
-                
-                if day_of_week in schedule_days:
-                    # This schedule applies to this day
-                    schedule_time = schedule['time']
-                    schedule_timestamp = datetime.combine(check_date, schedule_time)
-                    
-                    # Check if this slot already exists for THIS content type
-                    cursor.execute("""
-                        SELECT COUNT(*) as count
-                        FROM posting_queue
-                        WHERE scheduled_date = %s AND scheduled_time = %s AND content_type = %s
-                    """, (check_date, schedule_time, content_type))
-                    
-                    existing_count = cursor.fetchone()['count']
-                    
-                    if existing_count == 0:
-                        # Found a new available slot
-                        return {
-                            'date': check_date,
-                            'time': schedule_time,
-                            'timestamp': schedule_timestamp,
-                            'schedule_name': f'Schedule {schedule["id"]}',
-                            'timezone': schedule['timezone']
-                        }
+        if not slot:
+            return None
         
-        return None
+        return {
+            'date': slot['slot_date'],
+            'time': slot['slot_time'],
+            'timestamp': slot['slot_timestamp'],
+            'schedule_name': f'Schedule {slot["schedule_id"]}',
+            'timezone': slot['timezone']
+        }
         
     except Exception as e:
         logger.error(f"Error calculating next posting slot: {e}")
         return None
 
+def allocate_posting_slots(cursor, queue_ids, platform='facebook', content_type='product', status='ready'):
+    """Assign queue items to the next free posting slots in one statement.
+    
+    Items are given slots in the order of queue_ids. A transaction-scoped
+    advisory lock per platform/content type serialises concurrent
+    allocators so a slot is never double-booked; the caller commits.
+    Returns the scheduled rows; items beyond the free slots in the horizon
+    are left untouched.
+    """
+    queue_ids = [int(queue_id) for queue_id in queue_ids]
+    if not queue_ids:
+        return []
+    
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (_slot_lock_key(platform, content_type),))
+    
+    cursor.execute(FREE_SLOTS_SQL + """
+        , items AS (
+            SELECT id, slot_order FROM unnest(%(ids)s::int[]) WITH ORDINALITY AS t(id, slot_order)
+        )
+        UPDATE posting_queue pq
+        SET status = %(status)s,
+            scheduled_date = f.slot_date,
+            scheduled_time = f.slot_time,
+            scheduled_timestamp = f.slot_at AT TIME ZONE current_setting('TimeZone'),
+            schedule_name = 'Schedule ' || f.schedule_id,
+            timezone = f.timezone,
+            updated_at = NOW()
+        FROM items i
+        JOIN free f ON f.slot_order = i.slot_order
+        WHERE pq.id = i.id
+        RETURNING pq.id, pq.scheduled_date, pq.scheduled_time, pq.scheduled_timestamp,
+                  pq.schedule_name, pq.timezone
+    """, {
+        'days': max(SLOT_HORIZON_DAYS, 7 * len(queue_ids)),
+        'platform': platform,
+        'content_type': content_type,
+        'ids': queue_ids,
+        'status': status
+    })
+    
+    assigned = {row['id']: row for row in cursor.fetchall()}
+    if len(assigned) < len(queue_ids):
+        logger.warning(f"Only {len(assigned)} of {len(queue_ids)} {platform}/{content_type} items "
+                       f"could be given a posting slot")
+    return [assigned[queue_id] for queue_id in queue_ids if queue_id in assigned]
+
 # Custom Jinja2 filter to strip HTML document structure
 def strip_html_doc(content):
     """Strip HTML document structure and return only body content."""
@@ -322,44 +345,39 @@ def update_queue_status():
         
         with db_manager.get_connection() as conn:
             with conn.cursor() as cursor:
-                # Get the next available posting slot for this platform and content type
-                next_slot = get_next_posting_slot(cursor, platform='facebook', content_type=content_type)
-                
-                if not next_slot:
-                    return jsonify({
-                        'success': False,
-                        'error': 'No available posting slots found'
-                    }), 400
-                
-                # Update the status and schedule the post
                 cursor.execute(f"""
-                    UPDATE posting_queue 
-                    SET status = %s, 
-                        scheduled_date = %s,
-                        scheduled_time = %s,
-                        scheduled_timestamp = %s,
-                        schedule_name = %s,
-                        timezone = %s,
-                        updated_at = NOW()
+                    SELECT id FROM posting_queue
                     WHERE {id_field} = %s AND content_type = %s AND status IN ('draft', 'pending', 'ready')
-                """, (status, next_slot['date'], next_slot['time'], next_slot['timestamp'], 
-                      next_slot['schedule_name'], next_slot['timezone'], item_id, content_type))
+                    ORDER BY id
+                """, (item_id, content_type))
+                queue_ids = [row['id'] for row in cursor.fetchall()]
                 
-                if cursor.rowcount > 0:
-                    conn.commit()
-                    return jsonify({
-                        'success': True,
-                        'message': f'Queue item scheduled for {next_slot["date"]} at {next_slot["time"]} {next_slot["timezone"]}',
-                        'scheduled_date': next_slot['date'].isoformat(),
-                        'scheduled_time': str(next_slot['time']),
-                        'scheduled_timestamp': next_slot['timestamp'].isoformat()
-                    })
-                else:
+                if not queue_ids:
                     return jsonify({
                         'success': False,
                         'error': f'No draft content found for this {id_field.replace("_", " ")} and content type'
                     }), 404
                 
+                # Claim the next free posting slots for this platform and content type
+                slots = allocate_posting_slots(cursor, queue_ids, platform='facebook',
+                                               content_type=content_type, status=status)
+                
+                if not slots:
+                    return jsonify({
+                        'success': False,
+                        'error': 'No available posting slots found'
+                    }), 400
+                
+                conn.commit()
+                next_slot = slots[0]
+                return jsonify({
+                    'success': True,
+                    'message': f'Queue item scheduled for {next_slot["scheduled_date"]} at {next_slot["scheduled_time"]} {next_slot["timezone"]}',
+                    'scheduled_date': next_slot['scheduled_date'].isoformat(),
+                    'scheduled_time': str(next_slot['scheduled_time']),
+                    'scheduled_timestamp': next_slot['scheduled_timestamp'].isoformat()
+                })
+                
     except Exception as e:
         logger.error(f"Error updating queue status: {e}")
         return jsonify({
@@ -367,6 +385,53 @@ def update_queue_status():
             'error': str(e)
         }), 500
 
+@bp.route('/api/syndication/schedule-queue', methods=['POST'])
+def schedule_queue():
+    """Schedule many queue items into free posting slots at once."""
+    try:
+        data = request.get_json() or {}
+        platform = data.get('platform', 'facebook')
+        content_type = data.get('content_type', 'product')
+        status = data.get('status', 'ready')
+        queue_ids = data.get('ids')
+        
+        with db_manager.get_connection() as conn:
+            with conn.cursor() as cursor:
+                if not queue_ids:
+                    # Default to every unscheduled item of this type, oldest first
+                    cursor.execute("""
+                        SELECT id FROM posting_queue
+                        WHERE content_type = %s AND COALESCE(platform, 'facebook') = %s
+                          AND status IN ('draft', 'pending', 'ready') AND scheduled_timestamp IS NULL
+                        ORDER BY queue_order, created_at, id
+                        LIMIT %s
+                    """, (content_type, platform, int(data.get('limit', 50))))
+                    queue_ids = [row['id'] for row in cursor.fetchall()]
+                
+                slots = allocate_posting_slots(cursor, queue_ids, platform=platform,
+                                               content_type=content_type, status=status)
+                conn.commit()
+        
+        return jsonify({
+            'success': True,
+            'requested': len(queue_ids),
+            'scheduled': len(slots),
+            'slots': [{
+                'id': slot['id'],
+                'scheduled_date': slot['scheduled_date'].isoformat(),
+                'scheduled_time': str(slot['scheduled_time']),
+                'scheduled_timestamp': slot['scheduled_timestamp'].isoformat(),
+                'timezone': slot['timezone']
+            } for slot in slots]
+        })
+        
+    except Exception as e:
+        logger.error(f"Error scheduling queue: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @bp.route('/cross-promotion')
 def cross_promotion():
     """Cross-promotion management page."""
@@ -1138,204 +1203,112 @@ def prepare_product_post_data(queue_item):
 
 def refresh_facebook_cache(url):
     """Refresh Facebook's cache for a given URL using the Sharing Debugger API."""
-    import requests
-    
     try:
-        # Use Facebook's Sharing Debugger API to refresh cache
-        debug_url = "https://graph.facebook.com/v18.0/"
-        params = {
-            'id': url,
-            'scrape': 'true',
-            'access_token': 'YOUR_APP_ACCESS_TOKEN'  # This would need to be configured
-        }
-        
-        logger.info(f"Refreshing Facebook cache for: {url}")
-        # Note: This requires an app access token, which we don't currently have configured
-        # For now, we'll just log the attempt
-        logger.info("Facebook cache refresh attempted (requires app access token)")
-        return True
-        
+        return facebook_publisher.graph.scrape(url, facebook_publisher.credentials.get_app_token())
     except Exception as e:
         logger.error(f"Error refreshing Facebook cache: {e}")
         return False
 
 def post_to_facebook_unified(page_id, access_token, message, link_url, page_name=""):
     """Unified Facebook posting function - always uses /feed endpoint with link."""
-    import requests
-    
     logger.info(f"Posting to {page_name} (Page ID: {page_id})")
     logger.info(f"Post content: {message[:100]}...")
     logger.info(f"Link URL: {link_url}")
-    logger.info(f"Access token being used: {access_token[:20]}...")
     
     # Try to refresh Facebook's cache for the link URL
     refresh_facebook_cache(link_url)
     
-    # Always use /feed endpoint for link sharing
-    feed_url = f"https://graph.facebook.com/v18.0/{page_id}/feed"
+    return facebook_publisher.post_to_page(
+        {'page_id': page_id, 'access_token': access_token, 'name': page_name},
+        message, link_url
+    )
+
+def publish_facebook_items(queue_item_ids):
+    """
+    Post many queue items to Facebook (all configured pages) concurrently.
+    Items already published (or being published elsewhere) are skipped, and
+    pages an item was already posted to are never posted again.
+    Returns: {queue_item_id: {'success': bool, 'message': str, 'platform_post_ids': list}}
+    """
+    queue_item_ids = [int(queue_item_id) for queue_item_id in queue_item_ids]
+    results = {}
     
-    feed_payload = {
-        'message': message,
-        'link': link_url,
-        'access_token': access_token
-    }
+    claimed = facebook_publisher.ledger.claim(queue_item_ids)
+    for queue_item_id in queue_item_ids:
+        if queue_item_id not in claimed:
+            results[queue_item_id] = {'success': False, 'skipped': True,
+                                      'message': 'Queue item not found, already published or being published'}
     
-    logger.info(f"Facebook API call - URL: {feed_url}")
-    response = requests.post(feed_url, data=feed_payload, timeout=30)
-    logger.info(f"Facebook API response - Status: {response.status_code}")
-    logger.info(f"Facebook API response - Content: {response.text}")
+    if not claimed:
+        return results
     
-    if response.status_code == 200:
-        result = response.json()
-        return {
-            'success': True,
-            'post_id': result.get('id'),
-            'response': result
-        }
-    else:
-        error_data = response.json() if response.content else {}
-        error_msg = error_data.get('error', {}).get('message', 'Unknown Facebook API error')
-        return {
-            'success': False,
-            'error': f'Facebook API error: {response.status_code}',
-            'details': error_msg
-        }
+    results.update(publish_claimed_facebook_items(claimed))
+    return results
 
-def execute_facebook_post(queue_item_id):
+def publish_claimed_facebook_items(claimed):
     """
-    Shared function to post a queue item to Facebook (both pages).
-    Used by both manual posting and automated posting systems.
-    Returns: {'success': bool, 'message': str, 'platform_post_ids': list}
+    Publish queue items that the caller has already claimed (status
+    'publishing'). ``claimed`` maps queue item id to the status to restore
+    if an item cannot be published at all.
+    Returns: {queue_item_id: {'success': bool, 'message': str, 'platform_post_ids': list}}
     """
-    try:
-        with db_manager.get_cursor() as cursor:
-            # Get the queue item details
-            cursor.execute("""
-                SELECT pq.*, cp.name as product_name
-                FROM posting_queue pq
-                LEFT JOIN clan_products cp ON pq.product_id = cp.id
-                WHERE pq.id = %s
-            """, (queue_item_id,))
-            
-            queue_item = cursor.fetchone()
-            if not queue_item:
-                return {'success': False, 'message': 'Queue item not found'}
-            
-            # Prepare data based on content type
-            content_type = queue_item['content_type']
+    results = {}
+    
+    with db_manager.get_cursor() as cursor:
+        cursor.execute("""
+            SELECT pq.*, cp.name as product_name
+            FROM posting_queue pq
+            LEFT JOIN clan_products cp ON pq.product_id = cp.id
+            WHERE pq.id = ANY(%s)
+        """, (list(claimed),))
+        queue_items = cursor.fetchall()
+    
+    # Prepare data based on content type
+    jobs = []
+    unpublishable = {}
+    for queue_item in queue_items:
+        content_type = queue_item['content_type']
+        try:
             if content_type == 'blog_post':
                 post_data = prepare_blog_post_data(queue_item)
             elif content_type == 'product':
                 post_data = prepare_product_post_data(queue_item)
             else:
-                return {'success': False, 'message': f'Unsupported content type: {content_type}'}
-            
-            # Get Facebook credentials for both pages
-            cursor.execute("""
-                SELECT credential_key, credential_value
-                FROM platform_credentials 
-                WHERE platform_id = (SELECT id FROM platforms WHERE name = 'facebook')
-                AND is_active = true
-            """)
-            credentials = cursor.fetchall()
-            
-            # Convert to dictionary
-            creds = {}
-            for cred in credentials:
-                creds[cred['credential_key']] = cred['credential_value']
-            
-            # Define both pages to post to
-            pages_to_post = []
-            
-            # Page 1 (Scotweb CLAN)
-            if creds.get('page_access_token') and creds.get('page_id'):
-                pages_to_post.append({
-                    'page_id': creds['page_id'],
-                    'access_token': creds['page_access_token'],
-                    'name': 'Scotweb CLAN'
-                })
-            
-            # Page 2 (CLAN by Scotweb) - only add if different from Page 1
-            if (creds.get('page_access_token_2') and creds.get('page_id_2') and 
-                creds.get('page_id_2') != creds.get('page_id')):
-                pages_to_post.append({
-                    'page_id': creds['page_id_2'],
-                    'access_token': creds['page_access_token_2'],
-                    'name': 'CLAN by Scotweb'
-                })
-            elif creds.get('page_id_2') == creds.get('page_id'):
-                logger.warning("Both Facebook pages have the same page_id - skipping duplicate posting to prevent double posts")
-            
-            if not pages_to_post:
-                return {'success': False, 'message': 'No Facebook pages configured'}
-            
-            # Post to both pages using unified function
-            results = []
-            successful_posts = []
-            failed_posts = []
-            
-            for page in pages_to_post:
-                result = post_to_facebook_unified(
-                    page['page_id'], 
-                    page['access_token'], 
-                    post_data['message'],
-                    post_data['link_url'],
-                    page['name']
-                )
-                results.append({
-                    'page_name': page['name'],
-                    'page_id': page['page_id'],
-                    'result': result
-                })
-                
-                if result['success']:
-                    successful_posts.append(result['post_id'])
-                else:
-                    failed_posts.append(f"{page['name']}: {result['error']}")
-            
-            # Update queue item status
-            if successful_posts:
-                cursor.execute("""
-                    UPDATE posting_queue 
-                    SET status = 'published', 
-                        platform_post_id = %s,
-                        updated_at = NOW()
-                    WHERE id = %s
-                """, (successful_posts[0], queue_item_id))  # Store first post ID as primary
-                
-                conn = cursor.connection
-                conn.commit()
-                
-                if len(failed_posts) == 0:
-                    return {
-                        'success': True, 
-                        'message': f'Successfully posted to {len(successful_posts)} page(s)',
-                        'platform_post_ids': successful_posts
-                    }
-                else:
-                    return {
-                        'success': True, 
-                        'message': f'Posted to {len(successful_posts)} page(s), failed on {len(failed_posts)}: {", ".join(failed_posts)}',
-                        'platform_post_ids': successful_posts
-                    }
-            else:
-                # All posts failed
-                cursor.execute("""
-                    UPDATE posting_queue 
-                    SET status = 'failed', 
-                        error_message = %s,
-                        updated_at = NOW()
-                    WHERE id = %s
-                """, (", ".join(failed_posts), queue_item_id))
-                
-                conn = cursor.connection
-                conn.commit()
-                
-                return {
-                    'success': False, 
-                    'message': f'Failed to post to all pages: {", ".join(failed_posts)}'
-                }
-                
+                unpublishable[queue_item['id']] = f'Unsupported content type: {content_type}'
+                continue
+        except Exception as e:
+            logger.error(f"Error preparing queue item {queue_item['id']} for Facebook: {e}")
+            unpublishable[queue_item['id']] = str(e)
+            continue
+        jobs.append({
+            'queue_id': queue_item['id'],
+            'message': post_data['message'],
+            'link_url': post_data['link_url']
+        })
+    
+    if unpublishable:
+        facebook_publisher.ledger.release({queue_item_id: claimed[queue_item_id] for queue_item_id in unpublishable})
+        for queue_item_id, message in unpublishable.items():
+            results[queue_item_id] = {'success': False, 'message': message}
+    
+    try:
+        results.update(facebook_publisher.publish(jobs, claimed))
+    except Exception as e:
+        logger.error(f"Error publishing queue items to Facebook: {e}")
+        facebook_publisher.ledger.release({job['queue_id']: claimed[job['queue_id']] for job in jobs})
+        for job in jobs:
+            results[job['queue_id']] = {'success': False, 'message': str(e)}
+    
+    return results
+
+def execute_facebook_post(queue_item_id):
+    """
+    Shared function to post a queue item to Facebook (both pages).
+    Used by both manual posting and automated posting systems.
+    Returns: {'success': bool, 'message': str, 'platform_post_ids': list}
+    """
+    try:
+        return publish_facebook_items([queue_item_id])[int(queue_item_id)]
     except Exception as e:
         logger.error(f"Error in execute_facebook_post: {e}")
         return {'success': False, 'message': str(e)}
@@ -1556,6 +1529,8 @@ def facebook_credentials():
                             DO UPDATE SET credential_value = EXCLUDED.credential_value, updated_at = NOW()
                         """, (platform_id, key, value))
                 
+                facebook_publisher.credentials.invalidate()
+                
                 return jsonify({
                     'success': True,
                     'message': 'Credentials saved successfully'
@@ -1635,7 +1610,11 @@ def replenish_queue(config):
     threshold = config['threshold']
     add_count = config['add_count']
     
-    with db_manager.get_cursor() as cursor:
+    from product_sampler import product_sampler, DEFAULT_EXCLUDE_DAYS, DEFAULT_RECENCY_DAYS
+    
+    with db_manager.get_connection() as conn:
+        cursor = conn.cursor()
+        
         # Check current queue count
         cursor.execute("""
             SELECT COUNT(*) as count
@@ -1662,39 +1641,39 @@ def replenish_queue(config):
                 'message': f'No items needed (current: {current_count}, threshold: {threshold})'
             }
         
-        # Add items to queue (reuse the "Add 10 items" logic)
+        # Draw all products in one go: distinct, skipping anything queued recently
+        products = product_sampler.sample(
+            cursor, items_to_add,
+            exclude_days=DEFAULT_EXCLUDE_DAYS,
+            recency_days=DEFAULT_RECENCY_DAYS
+        )
+        
+        if not products:
+            logger.warning("No products found for auto-replenish")
+            return {
+                'items_added': 0,
+                'message': f'No products available for {queue_type} queue'
+            }
+        
+        # Generate content (simplified - just create basic content) and add
+        # every item in a single batched insert
         items_added = 0
         errors = 0
         
-        for i in range(items_to_add):
-            try:
-                # Step 1: Select random product
-                cursor.execute("""
-                    SELECT id, name, sku, price, description, image_url, url
-                    FROM clan_products
-                    ORDER BY RANDOM()
-                    LIMIT 1
-                """)
-                product = cursor.fetchone()
-                
-                if not product:
-                    logger.warning("No products found for auto-replenish")
-                    break
-                
-                # Step 2: Generate content (simplified - just create basic content)
-                generated_content = f"Auto-generated content for {product['name']} - {product['sku']}"
-                
-                # Step 3: Add to queue
-                cursor.execute("""
-                    INSERT INTO posting_queue (product_id, content_type, generated_content, status, platform, created_at, updated_at)
-                    VALUES (%s, %s, %s, 'draft', %s, NOW(), NOW())
-                """, (product['id'], queue_type, generated_content, platform))
-                
-                items_added += 1
-                
-            except Exception as e:
-                logger.error(f"Error adding item {i+1} to {queue_type} queue: {e}")
-                errors += 1
+        try:
+            cursor.executemany("""
+                INSERT INTO posting_queue (product_id, content_type, generated_content, status, platform, created_at, updated_at)
+                VALUES (%s, %s, %s, 'draft', %s, NOW(), NOW())
+            """, [
+                (product['id'], queue_type, f"Auto-generated content for {product['name']} - {product['sku']}", platform)
+                for product in products
+            ])
+            conn.commit()
+            items_added = len(products)
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error adding items to {queue_type} queue: {e}")
+            errors = len(products)
         
         return {
             'items_added': items_added,
@@ -1760,6 +1739,7 @@ def get_post_sections_with_images(post_id):
         
         raw_sections = cursor.fetchall()
         sections = []
+        section_images = _image_index().best_sections(post_id)
         
         for section in raw_sections:
             section_dict = dict(section)
@@ -1767,7 +1747,8 @@ def get_post_sections_with_images(post_id):
             # Add image data if available
             if section_dict.get('image_title'):
                 # Find the actual image file path
-                section_image_path = find_section_image(post_id, section['id'])
+                section_image_path = (section_images.get(str(section['id'])) or
+                                      _legacy_image(post_id, section['id']))
                 
                 section_dict['image'] = {
                     'path': section_image_path,
@@ -1784,141 +1765,121 @@ def get_post_sections_with_images(post_id):
         
         return sections
 
-def find_header_image(post_id):
-    """Find header image for a post."""
-    import urllib.parse
+def _image_index():
+    """Shared index of the blog-images post image tree"""
     from config.paths import path_resolver
-    
-    image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp')
+    from config.image_index import get_image_index
+    return get_image_index(os.path.join(path_resolver.images_static, 'content', 'posts'))
 
-    # Priority order: watermarked -> optimized -> raw
-    image_types = ['watermarked', 'optimized', 'raw']
-    
-    for image_type in image_types:
-        header_path = path_resolver.get_header_image_path(post_id, image_type)
-        if os.path.exists(header_path):
-            image_files = [f for f in os.listdir(header_path)
-                          if f.lower().endswith(image_extensions) and not f.startswith('.')]
-            if image_files:
-                image_filename = image_files[0]
-                # URL-encode the filename to handle spaces and special characters
-                encoded_filename = urllib.parse.quote(image_filename)
-                return f"/static/content/posts/{post_id}/header/{image_type}/{encoded_filename}"
-    
-    # Fallback to legacy structure
-    legacy_path = f"/Users/autojenny/Documents/projects/blog/blog-images/static/images/posts/{post_id}/header.jpg"
+def _legacy_image(post_id, section_id=None):
+    """Image from the legacy static/images/posts structure, if present"""
+    if section_id is None:
+        legacy_path = f"/Users/autojenny/Documents/projects/blog/blog-images/static/images/posts/{post_id}/header.jpg"
+    else:
+        legacy_path = f"/Users/autojenny/Documents/projects/blog/blog-images/static/images/posts/{post_id}/sections/{section_id}.jpg"
     if os.path.exists(legacy_path):
         return legacy_path
-    
     return None
 
+def find_header_image(post_id):
+    """Find header image for a post (watermarked -> optimized -> raw)."""
+    return _image_index().best_header(post_id) or _legacy_image(post_id)
+
 def find_section_image(post_id, section_id):
-    """Find section image for a post."""
-    import urllib.parse
-    from config.paths import path_resolver
-    
-    image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp')
+    """Find section image for a post (watermarked -> optimized -> raw)."""
+    return _image_index().best_section(post_id, section_id) or _legacy_image(post_id, section_id)
 
-    # Priority order: watermarked -> optimized -> raw
-    image_types = ['watermarked', 'optimized', 'raw']
+def _load_post_for_publish(post_id):
+    """Post and sections as publish_to_clan expects them, or (None, None) if the post does not exist"""
+    # Get post data
+    post = get_post_with_development(post_id)
+    if not post:
+        return None, None
     
-    for image_type in image_types:
-        section_path = path_resolver.get_section_image_path(post_id, section_id, image_type)
-        if os.path.exists(section_path):
-            image_files = [f for f in os.listdir(section_path)
-                          if f.lower().endswith(image_extensions) and not f.startswith('.')]
-            if image_files:
-                image_filename = image_files[0]
-                # URL-encode the filename to handle spaces and special characters
-                encoded_filename = urllib.parse.quote(image_filename)
-                return f"/static/content/posts/{post_id}/sections/{section_id}/{image_type}/{encoded_filename}"
+    sections = get_post_sections_with_images(post_id)
     
-    # Fallback to legacy structure
-    legacy_path = f"/Users/autojenny/Documents/projects/blog/blog-images/static/images/posts/{post_id}/sections/{section_id}.jpg"
-    if os.path.exists(legacy_path):
-        return legacy_path
+    # Fix field mapping - ensure post has the fields our function expects
+    if post.get('post_id') and not post.get('id'):
+        post['id'] = post['post_id']
     
-    return None
+    # Ensure summary field exists and has content
+    if not post.get('summary'):
+        post['summary'] = post.get('intro_blurb')
+        if not post['summary']:
+            raise ValueError("Post must have either summary or intro_blurb")
+    
+    # Ensure created_at is handled properly - convert to datetime object for template
+    if post.get('created_at'):
+        logger.info(f"Original created_at: {post['created_at']} (type: {type(post['created_at'])})")
+        if isinstance(post['created_at'], str):
+            from datetime import datetime
+            try:
+                post['created_at'] = datetime.fromisoformat(post['created_at'].replace('Z', '+00:00'))
+                logger.info(f"Converted to datetime: {post['created_at']}")
+            except Exception as e:
+                logger.error(f"Failed to parse date: {e}")
+                # If parsing fails, try other formats
+                try:
+                    post['created_at'] = datetime.strptime(post['created_at'], '%a, %d %b %Y %H:%M:%S %Z')
+                    logger.info(f"Converted with strptime: {post['created_at']}")
+                except Exception as e2:
+                    logger.error(f"Failed to parse with strptime: {e2}")
+                    post['created_at'] = None
+        elif hasattr(post['created_at'], 'isoformat'):
+            # Already a datetime object, keep as is
+            logger.info(f"Already datetime object: {post['created_at']}")
+            pass
+        else:
+            logger.error(f"Unknown date type: {type(post['created_at'])}")
+            post['created_at'] = None
+    
+    # Add header image if exists
+    header_image_path = find_header_image(post_id)
+    if header_image_path:
+        with db_manager.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT header_image_caption, header_image_title, header_image_width, header_image_height,
+                       cross_promotion_category_id, cross_promotion_category_title,
+                       cross_promotion_product_id, cross_promotion_product_title,
+                       cross_promotion_category_position, cross_promotion_product_position,
+                       cross_promotion_category_widget_html, cross_promotion_product_widget_html
+                FROM post WHERE id = %s
+            """, (post_id,))
+            header_data = cursor.fetchone()
+            
+            post['header_image'] = {
+                'path': header_image_path,
+                'alt_text': f"Header image for {post.get('title', 'this post')}",
+                'caption': header_data['header_image_caption'] if header_data else None,
+                'title': header_data['header_image_title'] if header_data else None,
+                'width': header_data['header_image_width'] if header_data else None,
+                'height': header_data['header_image_height'] if header_data else None
+            }
+            
+            post['cross_promotion'] = {
+                'category_id': header_data['cross_promotion_category_id'] if header_data else None,
+                'category_title': header_data['cross_promotion_category_title'] if header_data else None,
+                'product_id': header_data['cross_promotion_product_id'] if header_data else None,
+                'product_title': header_data['cross_promotion_product_title'] if header_data else None,
+                'category_position': header_data.get('cross_promotion_category_position'),
+                'product_position': header_data.get('cross_promotion_product_position'),
+                'category_widget_html': header_data.get('cross_promotion_category_widget_html'),
+                'product_widget_html': header_data.get('cross_promotion_product_widget_html')
+            }
+    
+    return post, sections
 
 @bp.route('/api/publish/<int:post_id>', methods=['POST'])
 def publish_post_to_clan(post_id):
     """Publish a post to clan.com"""
     try:
         # Get post data
-        post = get_post_with_development(post_id)
+        post, sections = _load_post_for_publish(post_id)
         if not post:
             return jsonify({'success': False, 'error': 'Post not found'}), 404
         
-        sections = get_post_sections_with_images(post_id)
-        
-        # Fix field mapping - ensure post has the fields our function expects
-        if post.get('post_id') and not post.get('id'):
-            post['id'] = post['post_id']
-        
-        # Ensure summary field exists and has content
-        if not post.get('summary'):
-            post['summary'] = post.get('intro_blurb')
-            if not post['summary']:
-                raise ValueError("Post must have either summary or intro_blurb")
-        
-        # Ensure created_at is handled properly - convert to datetime object for template
-        if post.get('created_at'):
-            logger.info(f"Original created_at: {post['created_at']} (type: {type(post['created_at'])})")
-            if isinstance(post['created_at'], str):
-                from datetime import datetime
-                try:
-                    post['created_at'] = datetime.fromisoformat(post['created_at'].replace('Z', '+00:00'))
-                    logger.info(f"Converted to datetime: {post['created_at']}")
-                except Exception as e:
-                    logger.error(f"Failed to parse date: {e}")
-                    # If parsing fails, try other formats
-                    try:
-                        post['created_at'] = datetime.strptime(post['created_at'], '%a, %d %b %Y %H:%M:%S %Z')
-                        logger.info(f"Converted with strptime: {post['created_at']}")
-                    except Exception as e2:
-                        logger.error(f"Failed to parse with strptime: {e2}")
-                        post['created_at'] = None
-            elif hasattr(post['created_at'], 'isoformat'):
-                # Already a datetime object, keep as is
-                logger.info(f"Already datetime object: {post['created_at']}")
-                pass
-            else:
-                logger.error(f"Unknown date type: {type(post['created_at'])}")
-                post['created_at'] = None
-        
-        # Add header image if exists
-        header_image_path = find_header_image(post_id)
-        if header_image_path:
-            with db_manager.get_cursor() as cursor:
-                cursor.execute("""
-                    SELECT header_image_caption, header_image_title, header_image_width, header_image_height,
-                           cross_promotion_category_id, cross_promotion_category_title,
-                           cross_promotion_product_id, cross_promotion_product_title,
-                           cross_promotion_category_position, cross_promotion_product_position,
-                           cross_promotion_category_widget_html, cross_promotion_product_widget_html
-                    FROM post WHERE id = %s
-                """, (post_id,))
-                header_data = cursor.fetchone()
-                
-                post['header_image'] = {
-                    'path': header_image_path,
-                    'alt_text': f"Header image for {post.get('title', 'this post')}",
-                    'caption': header_data['header_image_caption'] if header_data else None,
-                    'title': header_data['header_image_title'] if header_data else None,
-                    'width': header_data['header_image_width'] if header_data else None,
-                    'height': header_data['header_image_height'] if header_data else None
-                }
-                
-                post['cross_promotion'] = {
-                    'category_id': header_data['cross_promotion_category_id'] if header_data else None,
-                    'category_title': header_data['cross_promotion_category_title'] if header_data else None,
-                    'product_id': header_data['cross_promotion_product_id'] if header_data else None,
-                    'product_title': header_data['cross_promotion_product_title'] if header_data else None,
-                    'category_position': header_data.get('cross_promotion_category_position'),
-                    'product_position': header_data.get('cross_promotion_product_position'),
-                    'category_widget_html': header_data.get('cross_promotion_category_widget_html'),
-                    'product_widget_html': header_data.get('cross_promotion_product_widget_html')
-                }
+        # Republish even if nothing changed since the last publish
+        force = bool((request.get_json(silent=True) or {}).get('force')) or request.args.get('force') == '1'
         
         # Import publishing class
         import sys
@@ -1935,7 +1896,7 @@ def publish_post_to_clan(post_id):
         
         # Create publisher instance and attempt to publish
         publisher = ClanPublisher()
-        result = publisher.publish_to_clan(post, sections)
+        result = publisher.publish_to_clan(post, sections, force=force)
         
         # Debug: Log the result
         logger.info(f"Publishing result: {result}")
@@ -1955,9 +1916,11 @@ def publish_post_to_clan(post_id):
             
             return jsonify({
                 'success': True, 
-                'message': 'Post published successfully to clan.com',
+                'message': 'No changes since last publish' if result.get('skipped') else 'Post published successfully to clan.com',
                 'clan_post_id': result.get('clan_post_id'),
-                'url': result.get('url')
+                'url': result.get('url'),
+                'skipped': bool(result.get('skipped')),
+                'changes': result.get('changes')
             })
         else:
             # Update database with error
@@ -1993,6 +1956,23 @@ def publish_post_to_clan(post_id):
         
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@bp.route('/api/publish/<int:post_id>/diff')
+def publish_post_diff(post_id):
+    """Dry run of a republish: what changed since the last publish to clan.com (nothing is uploaded)"""
+    try:
+        post, sections = _load_post_for_publish(post_id)
+        if not post:
+            return jsonify({'success': False, 'error': 'Post not found'}), 404
+        
+        from clan_publisher import ClanPublisher
+        publisher = ClanPublisher()
+        result = publisher.publish_to_clan(post, sections, dry_run=True)
+        return jsonify(result), 200 if result['success'] else 500
+        
+    except Exception as e:
+        logger.error(f"Error diffing post {post_id} against last publish: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @bp.route('/clan-api-data/<int:post_id>')
 def clan_api_data(post_id):
     """View the actual API request data that was/will be sent to Clan.com."""
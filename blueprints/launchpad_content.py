@@ -3,6 +3,7 @@ from flask import Blueprint, render_template, jsonify, request, send_file, redir
 import logging
 import json
 import os
+import sys
 import requests
 from datetime import datetime, date, time, timedelta
 import pytz
@@ -13,6 +14,11 @@ import psycopg
 bp = Blueprint('launchpad_content', __name__)
 logger = logging.getLogger(__name__)
 
+# product_search lives in the blog-launchpad service; add it to the path once
+LAUNCHPAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'blog-launchpad')
+if LAUNCHPAD_DIR not in sys.path:
+    sys.path.append(LAUNCHPAD_DIR)
+
 def strip_html_doc(content):
     """Strip HTML tags from content."""
     import re
@@ -283,13 +289,20 @@ def get_categories():
 
 @bp.route('/api/syndication/products')
 def get_products():
-    """Get all products for browsing."""
+    """Get all products for browsing.
+    
+    With any of q, category_id, limit or cursor the response is one ranked
+    page from the product search engine plus a next_cursor for the next page.
+    """
+    if any(arg in request.args for arg in ('q', 'category_id', 'limit', 'cursor')):
+        return search_products()
     try:
         with db_manager.get_cursor() as cursor:
             cursor.execute("""
                 SELECT id, name, sku, price, description, image_url, url, printable_design_type,
                        category_ids
                 FROM clan_products
+                WHERE deleted_at IS NULL
                 ORDER BY name
             """)
             
@@ -317,6 +330,32 @@ def get_products():
             'error': str(e)
         }), 500
 
+def search_products():
+    """One page of ranked product search results."""
+    try:
+        from product_search import product_search
+        
+        with db_manager.get_cursor() as cursor:
+            result = product_search.search(
+                cursor,
+                query=request.args.get('q', ''),
+                category_id=request.args.get('category_id', type=int),
+                limit=request.args.get('limit', type=int),
+                after=request.args.get('cursor')
+            )
+        
+        return jsonify({
+            'success': True,
+            'products': result['products'],
+            'next_cursor': result['next_cursor']
+        })
+    except Exception as e:
+        logger.error(f"Error in search_products: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @bp.route('/api/syndication/last-updated')
 def get_last_updated():
     """Get last updated timestamp and product count."""
@@ -325,6 +364,7 @@ def get_last_updated():
             cursor.execute("""
                 SELECT COUNT(*) as count
                 FROM clan_products
+                WHERE deleted_at IS NULL
             """)
             result = cursor.fetchone()
             product_count = result['count']
@@ -353,6 +393,7 @@ def select_random_product():
             cursor.execute("""
                 SELECT id, name, sku, price, description, image_url, url
                 FROM clan_products
+                WHERE deleted_at IS NULL
                 ORDER BY RANDOM()
                 LIMIT 1
             """)
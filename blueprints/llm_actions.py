@@ -3,9 +3,9 @@ from flask import Blueprint, render_template, jsonify, request
 import logging
 import json
 import os
-import requests
 from datetime import datetime
 from config.database import db_manager
+from llm_client import get_llm_client, get_ollama_supervisor, get_response_cache
 
 bp = Blueprint('llm_actions', __name__)
 logger = logging.getLogger(__name__)
@@ -31,58 +31,24 @@ class LLMService:
         """Get available models for a provider."""
         try:
             if provider == 'ollama':
-                response = requests.get(f"{self.providers[provider]['base_url']}/api/tags", timeout=5)
-                if response.status_code == 200:
-                    models = [model['name'] for model in response.json().get('models', [])]
-                    return models
+                return get_llm_client().list_models(provider)
             return self.providers.get(provider, {}).get('models', [])
         except Exception as e:
             logger.error(f"Error getting models for {provider}: {e}")
             return []
     
-    def execute_llm_request(self, provider, model, messages, api_key=None):
-        """Execute LLM request."""
+    def execute_llm_request(self, provider, model, messages, api_key=None, bypass_cache=False):
+        """Execute LLM request (bypass_cache=True forces a fresh generation)."""
+        if provider not in self.providers:
+            return {'error': f'Unknown provider: {provider}'}
+        if provider == 'openai':
+            options = {'temperature': 0.7, 'max_tokens': 2000, 'timeout': 30, 'api_key': api_key}
+        else:
+            options = {'timeout': 60}
         try:
-            if provider == 'openai':
-                headers = {
-                    'Authorization': f'Bearer {api_key}',
-                    'Content-Type': 'application/json'
-                }
-                data = {
-                    'model': model,
-                    'messages': messages,
-                    'temperature': 0.7,
-                    'max_tokens': 2000
-                }
-                response = requests.post(
-                    f"{self.providers[provider]['base_url']}/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=30
-                )
-            elif provider == 'ollama':
-                data = {
-                    'model': model,
-                    'messages': messages,
-                    'stream': False
-                }
-                response = requests.post(
-                    f"{self.providers[provider]['base_url']}/api/chat",
-                    json=data,
-                    timeout=60
-                )
-            else:
-                return {'error': f'Unknown provider: {provider}'}
-            
-            if response.status_code == 200:
-                result = response.json()
-                if provider == 'openai':
-                    return {'content': result['choices'][0]['message']['content']}
-                elif provider == 'ollama':
-                    return {'content': result['message']['content']}
-            else:
-                return {'error': f'API request failed: {response.status_code} - {response.text}'}
-                
+            content = get_llm_client().chat(messages, model=model, provider=provider, bypass_cache=bypass_cache,
+                                            **options)
+            return {'content': content}
         except Exception as e:
             logger.error(f"Error executing LLM request: {e}")
             return {'error': str(e)}
@@ -260,6 +226,44 @@ def execute_action(action_id):
         logger.error(f"Error executing action: {e}")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/api/llm/cache', methods=['GET'])
+def get_cache_stats():
+    """LLM response cache hit/miss counters and size."""
+    try:
+        return jsonify(get_response_cache().stats())
+    except Exception as e:
+        logger.error(f"Error getting LLM cache stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/llm/cache', methods=['DELETE'])
+def clear_cache():
+    """Drop every cached LLM response."""
+    try:
+        return jsonify({'success': True, 'cleared': get_response_cache().clear()})
+    except Exception as e:
+        logger.error(f"Error clearing LLM cache: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/ollama/status', methods=['GET'])
+def get_ollama_status():
+    """Ollama health, loaded models and request latency."""
+    try:
+        return jsonify(get_ollama_supervisor().stats())
+    except Exception as e:
+        logger.error(f"Error getting Ollama status: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/ollama/start', methods=['POST'])
+def start_ollama():
+    """Start Ollama if needed and warm the configured models."""
+    try:
+        return jsonify({'success': get_ollama_supervisor().ensure_running()})
+    except FileNotFoundError:
+        return jsonify({'success': False, 'error': 'Ollama is not installed'}), 404
+    except Exception as e:
+        logger.error(f"Error starting Ollama: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @bp.route('/health')
 def health():
     """Health check endpoint."""
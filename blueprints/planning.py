@@ -5,9 +5,9 @@ Manually extracted key functions with proper imports
 
 from flask import Blueprint, render_template, request, redirect, url_for, jsonify
 from config.database import db_manager
+from llm_client import get_llm_client
 import logging
 import json
-import requests
 import re
 from datetime import datetime
 
@@ -34,61 +34,24 @@ class LLMService:
         """Get available models for a provider."""
         try:
             if provider == 'ollama':
-                response = requests.get(f"{self.providers[provider]['base_url']}/api/tags", timeout=5)
-                if response.status_code == 200:
-                    models = [model['name'] for model in response.json().get('models', [])]
-                    return models
+                return get_llm_client().list_models(provider)
             return self.providers.get(provider, {}).get('models', [])
         except Exception as e:
             logger.error(f"Error getting models for {provider}: {e}")
             return []
     
-    def execute_llm_request(self, provider, model, messages, api_key=None, max_tokens=2000):
-        """Execute LLM request."""
+    def execute_llm_request(self, provider, model, messages, api_key=None, max_tokens=2000, bypass_cache=False):
+        """Execute LLM request (bypass_cache=True forces a fresh generation)."""
+        if provider not in self.providers:
+            return {'error': f'Unknown provider: {provider}'}
+        if provider == 'openai':
+            options = {'temperature': 0.7, 'max_tokens': max_tokens, 'timeout': 30, 'api_key': api_key}
+        else:
+            options = {'max_tokens': max_tokens, 'timeout': 120}
         try:
-            if provider == 'openai':
-                headers = {
-                    'Authorization': f'Bearer {api_key}',
-                    'Content-Type': 'application/json'
-                }
-                data = {
-                    'model': model,
-                    'messages': messages,
-                    'temperature': 0.7,
-                    'max_tokens': max_tokens
-                }
-                response = requests.post(
-                    f"{self.providers[provider]['base_url']}/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=30
-                )
-            elif provider == 'ollama':
-                data = {
-                    'model': model,
-                    'messages': messages,
-                    'stream': False,
-                    'options': {
-                        'num_predict': max_tokens
-                    }
-                }
-                response = requests.post(
-                    f"{self.providers[provider]['base_url']}/api/chat",
-                    json=data,
-                    timeout=120
-                )
-            else:
-                return {'error': f'Unknown provider: {provider}'}
-            
-            if response.status_code == 200:
-                result = response.json()
-                if provider == 'openai':
-                    return {'content': result['choices'][0]['message']['content']}
-                elif provider == 'ollama':
-                    return {'content': result['message']['content']}
-            else:
-                return {'error': f'API request failed: {response.status_code} - {response.text}'}
-                
+            content = get_llm_client().chat(messages, model=model, provider=provider, bypass_cache=bypass_cache,
+                                            **options)
+            return {'content': content}
         except Exception as e:
             logger.error(f"Error executing LLM request: {e}")
             return {'error': str(e)}
@@ -405,7 +368,9 @@ Requirements:
         messages.append({'role': 'user', 'content': user_prompt})
         
         # Execute LLM request
-        result = llm_service.execute_llm_request('ollama', 'llama3.2:latest', messages, max_tokens=4000)
+        # Reloads are served from the LLM response cache unless a regenerate is requested
+        result = llm_service.execute_llm_request('ollama', 'llama3.2:latest', messages, max_tokens=4000,
+                                                 bypass_cache=bool(data.get('regenerate')))
         
         if result and 'content' in result:
             topics = parse_brainstorm_topics(result['content'])
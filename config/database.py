@@ -1,57 +1,344 @@
 # config/database.py
-import psycopg
+from psycopg.pq import TransactionStatus
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool, PoolTimeout
+from contextlib import contextmanager
 from config.unified_config import get_config
+import atexit
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Key under which the request-bound connection is stored on flask.g
+_G_CONNECTION_KEY = '_db_manager_connection'
+# Set on flask.g while a scope (connection, cursor, transaction) holds it
+_G_IN_USE_KEY = '_db_manager_connection_in_use'
+
+
+class PooledConnection:
+    """Proxy around a pooled psycopg connection.
+
+    Behaves like a psycopg connection (``cursor()``, ``commit()``,
+    ``rollback()``...). Used as a context manager it commits or rolls back
+    like ``psycopg.Connection``, but hands the connection back to the pool
+    instead of closing it. Connections bound to the current request are
+    only returned when the app context tears down, but the scope is
+    released so later scopes can reuse them.
+    """
+
+    def __init__(self, manager, connection, owned):
+        self._manager = manager
+        self._connection = connection
+        self._owned = owned
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self._connection.commit()
+            else:
+                self._connection.rollback()
+        finally:
+            self.close()
+
+    def __del__(self):
+        # Safety net for callers that never close the connection
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    @property
+    def closed(self):
+        return self._connection is None or self._connection.closed
+
+    def close(self):
+        """Return the connection to the pool (request-bound: end this scope only)."""
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        if self._owned:
+            self._manager._release(connection)
+        else:
+            self._manager._end_scope()
+
+
+class PooledCursor:
+    """Proxy around a cursor taken from a pooled connection.
+
+    Closing the cursor ends its transaction scope: any transaction left
+    open (uncommitted or aborted) is rolled back so the connection goes
+    back idle, and owned connections are returned to the pool.
+    """
+
+    def __init__(self, manager, connection, owned):
+        self._manager = manager
+        self._connection = connection
+        self._owned = owned
+        self._cursor = connection.cursor()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    @property
+    def closed(self):
+        return self._cursor is None or self._cursor.closed
+
+    def close(self):
+        cursor, self._cursor = self._cursor, None
+        if cursor is None:
+            return
+        connection = self._connection
+        try:
+            cursor.close()
+            if not connection.closed and connection.info.transaction_status != TransactionStatus.IDLE:
+                connection.rollback()
+        except Exception as e:
+            logger.error(f"Error closing pooled cursor: {e}")
+        finally:
+            if self._owned:
+                self._manager._release(connection)
+            else:
+                self._manager._end_scope()
+
+
 class DatabaseManager:
-    """Unified database connection manager."""
-    
+    """Unified database connection manager backed by a connection pool."""
+
     def __init__(self, config_name=None):
         self.config = get_config(config_name)
         self._connection = None
-    
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'checkout_errors': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Pool management
+    # ------------------------------------------------------------------
+
+    @property
+    def pool(self):
+        """Lazily create and open the connection pool."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = self._create_pool()
+        return self._pool
+
+    def _create_pool(self):
+        cfg = self.config
+        pool = ConnectionPool(
+            cfg.DATABASE_URL,
+            min_size=cfg.DB_POOL_MIN_SIZE,
+            max_size=cfg.DB_POOL_MAX_SIZE,
+            timeout=cfg.DB_POOL_TIMEOUT,
+            max_idle=cfg.DB_POOL_MAX_IDLE,
+            max_lifetime=cfg.DB_POOL_MAX_LIFETIME,
+            check=ConnectionPool.check_connection if cfg.DB_POOL_CHECK else None,
+            kwargs={'row_factory': dict_row},
+            name='blog',
+            open=False,
+        )
+        pool.open(wait=False)
+        atexit.register(pool.close)
+        logger.info(f"Database pool opened (min={cfg.DB_POOL_MIN_SIZE}, max={cfg.DB_POOL_MAX_SIZE})")
+        return pool
+
+    def init_app(self, app):
+        """Bind checkouts to the Flask app context.
+
+        Inside a request, ``get_connection()``/``get_cursor()``/
+        ``transaction()`` scopes reuse one pooled connection, which is
+        returned on teardown. Only one scope holds it at a time: a scope
+        opened while another is still open gets its own checkout, so its
+        commit or rollback never touches the enclosing scope's transaction.
+        """
+        app.extensions['db_manager'] = self
+        app.teardown_appcontext(self._teardown_appcontext)
+
+    def _teardown_appcontext(self, exc):
+        from flask import g
+        connection = g.pop(_G_CONNECTION_KEY, None)
+        g.pop(_G_IN_USE_KEY, None)
+        if connection is None:
+            return
+        try:
+            if not connection.closed and connection.info.transaction_status != TransactionStatus.IDLE:
+                connection.rollback()
+        except Exception as e:
+            logger.error(f"Error during request connection rollback: {e}")
+        self._release(connection)
+
+    def _checkout(self):
+        """Take a connection from the pool, recording wait time."""
+        started = time.perf_counter()
+        try:
+            connection = self.pool.getconn()
+        except PoolTimeout:
+            with self._stats_lock:
+                self._stats['checkout_errors'] += 1
+            logger.error("Timed out waiting for a database connection from the pool")
+            raise
+        waited_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            stats = self._stats
+            stats['checkouts'] += 1
+            stats['in_use'] += 1
+            stats['peak_in_use'] = max(stats['peak_in_use'], stats['in_use'])
+            stats['wait_ms_total'] += waited_ms
+            stats['wait_ms_max'] = max(stats['wait_ms_max'], waited_ms)
+        return connection
+
+    def _release(self, connection):
+        with self._stats_lock:
+            self._stats['in_use'] -= 1
+        try:
+            self.pool.putconn(connection)
+        except Exception as e:
+            logger.error(f"Failed to return connection to pool: {e}")
+
+    def _request_bound(self):
+        from flask import current_app, has_app_context
+        return has_app_context() and current_app.extensions.get('db_manager') is self
+
+    def _acquire(self):
+        """Return ``(connection, owned)``.
+
+        Within an app context registered via ``init_app`` the request-bound
+        connection is reused (``owned`` is False) unless another scope is
+        still using it; the caller ends the scope with ``_end_scope()``.
+        Otherwise a connection is checked out and the caller must release it.
+        """
+        from flask import g
+        if self._request_bound() and not g.get(_G_IN_USE_KEY):
+            connection = g.get(_G_CONNECTION_KEY)
+            if connection is not None and connection.closed:
+                # Broken connection: give its slot back before replacing it
+                g.pop(_G_CONNECTION_KEY)
+                self._release(connection)
+                connection = None
+            if connection is None:
+                connection = self._checkout()
+                setattr(g, _G_CONNECTION_KEY, connection)
+            setattr(g, _G_IN_USE_KEY, True)
+            return connection, False
+        return self._checkout(), True
+
+    def _end_scope(self):
+        """Make the request-bound connection available to the next scope."""
+        if self._request_bound():
+            from flask import g
+            g.pop(_G_IN_USE_KEY, None)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
     def get_connection(self):
-        """Get database connection with proper configuration."""
-        # Always create a new connection to avoid transaction state issues
+        """Get a pooled database connection.
+
+        Use as a context manager; on exit the transaction is committed (or
+        rolled back on error) and the connection is returned to the pool.
+        """
         try:
-            connection = psycopg.connect(
-                self.config.DATABASE_URL,
-                row_factory=dict_row
-            )
-            logger.info("Database connection established")
-            return connection
+            connection, owned = self._acquire()
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
             raise
-    
+        return PooledConnection(self, connection, owned)
+
     def get_cursor(self):
         """Get database cursor with proper context management."""
-        return self.get_connection().cursor()
-    
+        connection, owned = self._acquire()
+        return PooledCursor(self, connection, owned)
+
+    @contextmanager
+    def transaction(self):
+        """Run a block in one transaction.
+
+        Yields the connection; commits on success, rolls back on error and
+        always returns the connection to the pool.
+        """
+        connection, owned = self._acquire()
+        try:
+            yield connection
+            connection.commit()
+        except Exception:
+            try:
+                connection.rollback()
+            except Exception as e:
+                logger.error(f"Error during rollback: {e}")
+            raise
+        finally:
+            if owned:
+                self._release(connection)
+            else:
+                self._end_scope()
+
+    def get_pool_stats(self):
+        """Pool occupancy, wait time and checkout counters."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['wait_ms_avg'] = round(stats['wait_ms_total'] / stats['checkouts'], 3) if stats['checkouts'] else 0.0
+        stats['wait_ms_total'] = round(stats['wait_ms_total'], 3)
+        stats['wait_ms_max'] = round(stats['wait_ms_max'], 3)
+        if self._pool is not None:
+            stats['pool'] = self._pool.get_stats()
+        else:
+            stats['pool'] = None
+        stats['min_size'] = self.config.DB_POOL_MIN_SIZE
+        stats['max_size'] = self.config.DB_POOL_MAX_SIZE
+        return stats
+
     def __enter__(self):
         """Context manager entry."""
-        return self.get_cursor()
-    
+        self._connection = self.get_cursor()
+        return self._connection
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit - ensure proper cleanup."""
-        if exc_type is not None:
-            # If there was an exception, rollback the transaction
-            try:
-                if hasattr(self, '_connection') and self._connection and not self._connection.closed:
-                    self._connection.rollback()
-                    logger.info("Transaction rolled back due to exception")
-            except Exception as e:
-                logger.error(f"Error during rollback: {e}")
-    
+        cursor, self._connection = self._connection, None
+        if cursor is not None:
+            # Closing the cursor rolls back any transaction left open
+            cursor.close()
+
     def close_connection(self):
-        """Close database connection."""
-        if self._connection and not self._connection.closed:
-            self._connection.close()
-            logger.info("Database connection closed")
-    
+        """Close the connection pool."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+            logger.info("Database pool closed")
+
     def execute_query(self, query, params=None):
         """Execute a query and return results."""
         try:
@@ -61,14 +348,13 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Query execution failed: {e}")
             raise
-    
+
     def execute_update(self, query, params=None):
         """Execute an update query."""
         try:
-            with self.get_connection() as conn:
+            with self.transaction() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute(query, params)
-                    conn.commit()
                     return cursor.rowcount
         except Exception as e:
             logger.error(f"Update execution failed: {e}")
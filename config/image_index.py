@@ -0,0 +1,285 @@
+"""
+Filesystem Image Index
+In-process index of the post image tree (static/content/posts/<post_id>/...),
+so image lookups are dictionary reads instead of os.path.exists/os.listdir
+walks on every request.
+
+    <root>/<post_id>/header/<stage>/<file>
+    <root>/<post_id>/featured/<stage>/<file>
+    <root>/<post_id>/sections/<section_id>/<stage>/<file>
+
+Each post is scanned once, on first lookup, and the best variant per header
+and section (watermarked > optimized > raw) is precomputed. Entries are kept
+current by:
+
+- watchdog events on the root (when the watchdog package is installed);
+  any create/delete/move under a post drops that post's entry
+- writers calling invalidate() / invalidate_path() after upload, optimize
+  and watermark
+- otherwise, re-checking the scanned directories' mtimes at most every
+  IMAGE_INDEX_REVALIDATE_SECONDS
+"""
+
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp')
+
+# Priority order for the image shown/published for a header or section
+BEST_VARIANT_ORDER = ('watermarked', 'optimized', 'raw')
+
+REVALIDATE_SECONDS = float(os.getenv('IMAGE_INDEX_REVALIDATE_SECONDS', 2))
+WATCH_ENABLED = os.getenv('IMAGE_INDEX_WATCH', '1') != '0'
+
+URL_PREFIX = '/static/content/posts'
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _subdirs(path: str) -> List[str]:
+    try:
+        with os.scandir(path) as entries:
+            return [entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.')]
+    except OSError:
+        return []
+
+
+def _image_files(path: str) -> List[str]:
+    try:
+        with os.scandir(path) as entries:
+            return [entry.name for entry in entries
+                    if not entry.name.startswith('.') and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+                    and entry.is_file()]
+    except OSError:
+        return []
+
+
+def _best(stages: Dict[str, List[str]]) -> Optional[tuple]:
+    for stage in BEST_VARIANT_ORDER:
+        if stages.get(stage):
+            return stage, stages[stage][0]
+    return None
+
+
+class PostImages:
+    """Snapshot of one post's image directories"""
+
+    def __init__(self, post_id: str, post_dir: str):
+        self.post_id = post_id
+        self.post_dir = post_dir
+        self.header: Dict[str, List[str]] = {}
+        self.featured: Dict[str, List[str]] = {}
+        self.sections: Dict[str, Dict[str, List[str]]] = {}
+        self.best_header: Optional[tuple] = None
+        self.best_sections: Dict[str, tuple] = {}
+        self.dir_mtimes: Dict[str, Optional[int]] = {}
+        self.checked_at = 0.0
+
+    @classmethod
+    def scan(cls, post_id: str, post_dir: str) -> 'PostImages':
+        snapshot = cls(post_id, post_dir)
+        mtimes = snapshot.dir_mtimes
+
+        def scan_stages(base: str) -> Dict[str, List[str]]:
+            mtimes[base] = _mtime(base)
+            stages = {}
+            for stage in _subdirs(base):
+                stage_dir = os.path.join(base, stage)
+                mtimes[stage_dir] = _mtime(stage_dir)
+                stages[stage] = _image_files(stage_dir)
+            return stages
+
+        mtimes[post_dir] = _mtime(post_dir)
+        snapshot.header = scan_stages(os.path.join(post_dir, 'header'))
+        snapshot.featured = scan_stages(os.path.join(post_dir, 'featured'))
+        sections_dir = os.path.join(post_dir, 'sections')
+        mtimes[sections_dir] = _mtime(sections_dir)
+        for section_id in _subdirs(sections_dir):
+            snapshot.sections[section_id] = scan_stages(os.path.join(sections_dir, section_id))
+
+        snapshot.best_header = _best(snapshot.header)
+        snapshot.best_sections = {section_id: best for section_id, best in
+                                  ((section_id, _best(stages)) for section_id, stages in snapshot.sections.items())
+                                  if best}
+        snapshot.checked_at = time.monotonic()
+        return snapshot
+
+    def is_current(self) -> bool:
+        """True while none of the scanned directories have changed"""
+        return all(_mtime(path) == mtime for path, mtime in self.dir_mtimes.items())
+
+
+class _InvalidationHandler(FileSystemEventHandler):
+    """Drops a post's entry when files under it are created, deleted or moved"""
+
+    def __init__(self, index: 'ImageIndex'):
+        super().__init__()
+        self.index = index
+
+    def on_any_event(self, event):
+        # Reads and content writes do not change listings
+        if event.event_type not in ('created', 'deleted', 'moved'):
+            return
+        self.index.invalidate_path(event.src_path)
+        if getattr(event, 'dest_path', None):
+            self.index.invalidate_path(event.dest_path)
+
+
+class ImageIndex:
+    """Post image index for one content/posts root"""
+
+    def __init__(self, root: str, url_prefix: str = URL_PREFIX,
+                 revalidate_seconds: float = REVALIDATE_SECONDS, watch: bool = WATCH_ENABLED):
+        self.root = os.path.abspath(root)
+        self.url_prefix = url_prefix
+        self.revalidate_seconds = revalidate_seconds
+        self._posts: Dict[str, PostImages] = {}
+        self._epochs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._observer = None
+        if watch:
+            self.start_watching()
+
+    def start_watching(self) -> bool:
+        """Follow filesystem events with watchdog; False if unavailable"""
+        if self._observer is not None:
+            return True
+        if Observer is None or not os.path.isdir(self.root):
+            return False
+        try:
+            observer = Observer()
+            observer.schedule(_InvalidationHandler(self), self.root, recursive=True)
+            observer.daemon = True
+            observer.start()
+        except Exception as e:
+            logger.warning(f"Image index falling back to mtime checks for {self.root}: {e}")
+            return False
+        self._observer = observer
+        logger.info(f"Image index watching {self.root}")
+        return True
+
+    @property
+    def watching(self) -> bool:
+        return self._observer is not None and self._observer.is_alive()
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def invalidate(self, post_id=None):
+        """Forget one post (or everything); the next lookup rescans it"""
+        with self._lock:
+            if post_id is None:
+                for key in self._posts:
+                    self._epochs[key] = self._epochs.get(key, 0) + 1
+                self._posts.clear()
+            else:
+                key = str(post_id)
+                self._epochs[key] = self._epochs.get(key, 0) + 1
+                self._posts.pop(key, None)
+
+    def invalidate_path(self, path: str):
+        """Forget the post that ``path`` belongs to (no-op outside the root)"""
+        relative = os.path.relpath(os.path.abspath(path), self.root)
+        if relative == '.' or relative.startswith('..'):
+            return
+        self.invalidate(relative.split(os.sep, 1)[0])
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def post(self, post_id) -> PostImages:
+        key = str(post_id)
+        snapshot = self._posts.get(key)
+        if snapshot is not None:
+            if self.watching or time.monotonic() - snapshot.checked_at < self.revalidate_seconds:
+                return snapshot
+            if snapshot.is_current():
+                snapshot.checked_at = time.monotonic()
+                return snapshot
+
+        with self._lock:
+            epoch = self._epochs.get(key, 0)
+        snapshot = PostImages.scan(key, os.path.join(self.root, key))
+        with self._lock:
+            # An invalidation during the scan means the snapshot may be stale
+            if self._epochs.get(key, 0) == epoch:
+                self._posts[key] = snapshot
+        return snapshot
+
+    def files(self, post_id, kind: str, stage: str, section_id=None) -> List[str]:
+        """Image filenames in one stage directory (kind: header, featured or sections)"""
+        snapshot = self.post(post_id)
+        if kind == 'sections':
+            stages = snapshot.sections.get(str(section_id), {})
+        else:
+            stages = getattr(snapshot, kind)
+        return list(stages.get(stage, []))
+
+    def section_ids(self, post_id) -> List[str]:
+        """Section directories present for a post"""
+        return list(self.post(post_id).sections)
+
+    def url(self, post_id, stage: str, filename: str, section_id=None, quote: bool = True) -> str:
+        name = urllib.parse.quote(filename) if quote else filename
+        if section_id is None:
+            return f"{self.url_prefix}/{post_id}/header/{stage}/{name}"
+        return f"{self.url_prefix}/{post_id}/sections/{section_id}/{stage}/{name}"
+
+    def best_header(self, post_id) -> Optional[str]:
+        """URL of the best header image variant, or None"""
+        best = self.post(post_id).best_header
+        return self.url(post_id, *best) if best else None
+
+    def best_section(self, post_id, section_id) -> Optional[str]:
+        """URL of the best image variant for one section, or None"""
+        best = self.post(post_id).best_sections.get(str(section_id))
+        return self.url(post_id, *best, section_id=section_id) if best else None
+
+    def best_path(self, post_id, section_id=None) -> Optional[str]:
+        """Filesystem path of the best header (or section) image variant, or None"""
+        snapshot = self.post(post_id)
+        if section_id is None:
+            best = snapshot.best_header
+            base = os.path.join(snapshot.post_dir, 'header')
+        else:
+            best = snapshot.best_sections.get(str(section_id))
+            base = os.path.join(snapshot.post_dir, 'sections', str(section_id))
+        return os.path.join(base, *best) if best else None
+
+    def best_sections(self, post_id) -> Dict[str, str]:
+        """URLs of the best image variant for every section of a post, keyed by section id"""
+        return {section_id: self.url(post_id, stage, filename, section_id=section_id)
+                for section_id, (stage, filename) in self.post(post_id).best_sections.items()}
+
+
+_indexes: Dict[str, ImageIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_image_index(root: str) -> ImageIndex:
+    """Shared index for a content/posts root (one per process)"""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = ImageIndex(root)
+        return _indexes[root]
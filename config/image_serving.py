@@ -0,0 +1,75 @@
+"""
+Image Serving
+Conditional, range-capable responses for post images under
+static/content/posts. Every response carries a strong ETag and
+Last-Modified so reloads are answered with 304s, Range requests get 206
+partial content, and the file body goes out through the WSGI server's
+file wrapper (sendfile where the server supports it, or X-Sendfile when
+USE_X_SENDFILE is set).
+
+The ETag is built from the file's inode, size and mtime. Optimized and
+watermarked images are hard links into the content-addressed derivative
+store, so re-linking an unchanged derivative keeps its ETag.
+
+URLs carrying ?v=<version> (see versioned_url) are cached as immutable for a
+year; any change to the file changes its version and therefore its URL.
+Unversioned URLs are served with no-cache and revalidated on each use.
+"""
+
+import os
+import urllib.parse
+from typing import Optional
+
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+URL_PREFIX = '/static/content/posts/'
+
+
+def file_version(path: str) -> Optional[str]:
+    """Version token for a file (also its ETag), or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def versioned_url(url: str, root: str) -> str:
+    """Append ?v=<version> to a post image URL so it can be cached as immutable.
+
+    ``root`` is the filesystem directory behind URL_PREFIX. Other URLs and
+    missing files are returned unchanged.
+    """
+    if not url or not url.startswith(URL_PREFIX) or '?' in url:
+        return url
+    relative = urllib.parse.unquote(url[len(URL_PREFIX):])
+    path = safe_join(root, relative)
+    version = file_version(path) if path else None
+    return f"{url}?v={version}" if version else url
+
+
+def send_image(root: str, relative_path: str, immutable: Optional[bool] = None, mimetype: Optional[str] = None):
+    """Serve ``relative_path`` under ``root`` with validators, Range and cache headers.
+
+    ``immutable`` defaults to whether the request's ?v= matches the file's version.
+    """
+    path = safe_join(os.path.abspath(root), relative_path)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    version = file_version(path)
+
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=version,
+                         last_modified=os.path.getmtime(path))
+    if immutable is None:
+        immutable = request.args.get('v') == version
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
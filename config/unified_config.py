@@ -27,6 +27,14 @@ class Config:
     DB_USER = os.environ.get('DB_USER', 'autojenny')
     DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
     
+    # Database Connection Pool Configuration
+    DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 600))  # seconds before idle connections are closed
+    DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600))
+    DB_POOL_CHECK = os.environ.get('DB_POOL_CHECK', 'True').lower() == 'true'  # health-check connections on checkout
+    
     # Server Configuration
     HOST = os.environ.get('HOST', '0.0.0.0')
     PORT = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,13 @@
+"""
+Shared LLM client: pooled connections, streaming, request coalescing, a
+persistent response cache and the Ollama supervisor for every service that
+talks to Ollama or OpenAI.
+"""
+
+from .cache import ResponseCache, get_response_cache
+from .client import LLMClient, get_llm_client
+from .ollama import OllamaSupervisor, get_ollama_supervisor
+from .providers import LLMConnectionError, LLMError, LLMTimeoutError
+
+__all__ = ['LLMClient', 'get_llm_client', 'ResponseCache', 'get_response_cache', 'OllamaSupervisor',
+           'get_ollama_supervisor', 'LLMError', 'LLMTimeoutError', 'LLMConnectionError']
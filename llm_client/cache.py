@@ -0,0 +1,241 @@
+"""
+LLM Response Cache
+Completed LLM responses stored in Postgres (llm_response_cache), keyed by a
+hash of the provider, model, canonical prompt or messages, temperature and
+max_tokens. A repeated prompt is answered from the table instead of a new
+generation.
+
+Only deterministic requests are cached by default: temperature 0, or a
+caller that passes cache=True. Sampled drafts are generated fresh every
+time. Callers that want a fresh answer ("regenerate") pass
+bypass_cache=True, which skips the lookup but still stores the new response.
+
+Entries expire after LLM_CACHE_TTL seconds. When the stored responses
+exceed LLM_CACHE_MAX_BYTES, the least recently used ones are evicted. The
+eviction scan is not run on every store. Each process keeps an approximate
+running total of the table size, and the scan runs only when that total
+passes the limit or LLM_CACHE_EVICT_INTERVAL seconds have gone by.
+
+The cache uses its own pooled connections, never the request-bound one,
+so a lookup or store cannot commit a caller's open transaction.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') == '1'
+DEFAULT_TTL = int(os.getenv('LLM_CACHE_TTL', 7 * 24 * 3600))
+MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+EVICT_INTERVAL = int(os.getenv('LLM_CACHE_EVICT_INTERVAL', 300))
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS llm_response_cache (
+        key CHAR(64) PRIMARY KEY,
+        provider VARCHAR(20) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        response TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        last_used_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        expires_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used ON llm_response_cache (last_used_at)",
+    "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_expires ON llm_response_cache (expires_at)",
+]
+
+
+def request_key(provider: str, model: str, messages: Optional[List[Dict]] = None, prompt: Optional[str] = None,
+                temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+    """Hash identifying one LLM request (also used to coalesce in-flight calls)"""
+    canonical = json.dumps([provider, model, messages, prompt, temperature, max_tokens],
+                           sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Postgres-backed LLM response cache with TTL and size-based LRU eviction"""
+
+    def __init__(self, ttl: int = DEFAULT_TTL, max_bytes: int = MAX_BYTES,
+                 evict_interval: int = EVICT_INTERVAL):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        # Approximate table size: read from the table when unknown, then
+        # advanced by each store and re-read after each eviction
+        self._approx_bytes: Optional[int] = None
+        self._last_evict: Optional[float] = None
+        self._schema_ready = False
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0, 'evictions': 0, 'errors': 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _connection(self):
+        from config.database import db_manager
+        # psycopg_pool's context manager commits on exit and returns the connection
+        return db_manager.pool.connection()
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        with self._lock:
+            if self._schema_ready:
+                return
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    for sql in SCHEMA_SQL:
+                        cursor.execute(sql)
+            self._schema_ready = True
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for ``key``, or None (missing, expired or cache unavailable)"""
+        try:
+            self._ensure_schema()
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        UPDATE llm_response_cache
+                        SET hits = hits + 1, last_used_at = NOW()
+                        WHERE key = %s AND expires_at > NOW()
+                        RETURNING response
+                    """, (key,))
+                    row = cursor.fetchone()
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            self._count('errors')
+            return None
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return row['response']
+
+    def bypass(self):
+        """Record a lookup skipped on purpose (regenerate)"""
+        self._count('bypassed')
+
+    def put(self, key: str, provider: str, model: str, response: str, ttl: Optional[int] = None):
+        """Store a completed response; evict when the table may be over budget"""
+        if not response:
+            return
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        try:
+            self._ensure_schema()
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        INSERT INTO llm_response_cache
+                            (key, provider, model, response, size_bytes, expires_at)
+                        VALUES (%s, %s, %s, %s, %s, NOW() + make_interval(secs => %s))
+                        ON CONFLICT (key) DO UPDATE SET
+                            response = EXCLUDED.response,
+                            size_bytes = EXCLUDED.size_bytes,
+                            created_at = NOW(),
+                            last_used_at = NOW(),
+                            expires_at = EXCLUDED.expires_at
+                    """, (key, provider, model, response, size, ttl or self.ttl))
+                    evicted = self._evict(cursor) if self._should_evict(cursor, size) else 0
+        except Exception as e:
+            logger.warning(f"LLM cache store failed: {e}")
+            self._count('errors')
+            return
+        self._count('stores')
+        if evicted:
+            self._count('evictions', evicted)
+            logger.info(f"LLM cache evicted {evicted} entries")
+
+    def _should_evict(self, cursor, added: int) -> bool:
+        with self._lock:
+            if self._approx_bytes is not None:
+                self._approx_bytes += added
+            approx = self._approx_bytes
+            due = self._last_evict is None or time.monotonic() - self._last_evict >= self.evict_interval
+        if approx is None:
+            approx = self._table_bytes(cursor)
+            with self._lock:
+                self._approx_bytes = approx
+        return due or approx > self.max_bytes
+
+    def _table_bytes(self, cursor) -> int:
+        cursor.execute("SELECT COALESCE(SUM(size_bytes), 0) AS bytes FROM llm_response_cache")
+        return int(cursor.fetchone()['bytes'])
+
+    def _evict(self, cursor) -> int:
+        cursor.execute("DELETE FROM llm_response_cache WHERE expires_at <= NOW()")
+        evicted = cursor.rowcount
+        # Keep the most recently used entries that fit in max_bytes
+        cursor.execute("""
+            DELETE FROM llm_response_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size_bytes) OVER (ORDER BY last_used_at DESC, key) AS running_bytes
+                    FROM llm_response_cache
+                ) ranked
+                WHERE running_bytes > %s
+            )
+        """, (self.max_bytes,))
+        evicted += cursor.rowcount
+        remaining = self._table_bytes(cursor)
+        with self._lock:
+            self._approx_bytes = remaining
+            self._last_evict = time.monotonic()
+        return evicted
+
+    def clear(self) -> int:
+        """Drop every cached response"""
+        self._ensure_schema()
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM llm_response_cache")
+                with self._lock:
+                    self._approx_bytes = 0
+                return cursor.rowcount
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus the table's size"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['ttl'] = self.ttl
+        stats['max_bytes'] = self.max_bytes
+        stats['approx_bytes'] = self._approx_bytes
+        try:
+            self._ensure_schema()
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS bytes,
+                               COALESCE(SUM(hits), 0) AS total_hits
+                        FROM llm_response_cache WHERE expires_at > NOW()
+                    """)
+                    stats.update(cursor.fetchone())
+        except Exception as e:
+            logger.warning(f"LLM cache stats unavailable: {e}")
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,206 @@
+"""
+LLM Client
+One process-wide entry point for LLM calls. Identical requests that are in
+flight at the same time (same provider, model, prompt and sampling
+settings) share a single upstream call: the first caller starts it and
+later callers attach to it, whether they want the whole completion or a
+token stream. Completed deterministic responses (temperature 0, or
+cache=True) go into the persistent response cache (see cache.py), so a
+repeated request is answered without a generation.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from .cache import CACHE_ENABLED, ResponseCache, get_response_cache, request_key
+from .providers import LLMError, OllamaProvider, OpenAIProvider, Provider
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_URL = os.getenv('OLLAMA_API_URL', 'http://localhost:11434')
+OPENAI_URL = os.getenv('OPENAI_API_URL', 'https://api.openai.com/v1')
+DEFAULT_MODEL = os.getenv('DEFAULT_LLM_MODEL', 'mistral')
+
+# Upstream calls running at once; further calls queue
+WORKERS = int(os.getenv('LLM_CLIENT_WORKERS', 8))
+
+
+class _Flight:
+    """One upstream call; chunks are kept so late joiners replay from the start"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self._cond = threading.Condition()
+
+    def feed(self, text: str):
+        with self._cond:
+            self.chunks.append(text)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[Exception] = None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def __iter__(self) -> Iterator[str]:
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                pending = self.chunks[index:]
+                index = len(self.chunks)
+                finished = self.done
+            yield from pending
+            if finished and index == len(self.chunks):
+                if self.error:
+                    raise self.error
+                return
+
+    def text(self) -> str:
+        return ''.join(self)
+
+    @classmethod
+    def completed(cls, text: str) -> '_Flight':
+        flight = cls()
+        flight.chunks.append(text)
+        flight.done = True
+        return flight
+
+
+class LLMClient:
+    """Pooled, coalescing, cached LLM client for Ollama and OpenAI
+
+    Responses are cached only for temperature 0 unless the call passes
+    ``cache=True`` (always cache) or ``cache=False`` (never). Every call
+    also accepts ``bypass_cache=True`` to skip the cache lookup and any
+    identical call already in flight (the fresh response is still stored,
+    and later identical calls join it), and ``ttl`` to override how long
+    the response is kept.
+    """
+
+    def __init__(self, ollama_url: str = OLLAMA_URL, openai_url: str = OPENAI_URL,
+                 openai_api_key: Optional[str] = None, default_model: str = DEFAULT_MODEL,
+                 workers: int = WORKERS, cache: Optional[ResponseCache] = None):
+        self.default_model = default_model
+        self.cache = cache or (get_response_cache() if CACHE_ENABLED else None)
+        self.providers: Dict[str, Provider] = {
+            'ollama': OllamaProvider(ollama_url),
+            'openai': OpenAIProvider(openai_url, openai_api_key or os.getenv('OPENAI_API_KEY')),
+        }
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='llm')
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def provider(self, name: str) -> Provider:
+        try:
+            return self.providers[name]
+        except KeyError:
+            raise LLMError(f"Unknown provider: {name}")
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+
+    def chat(self, messages: List[Dict], model: Optional[str] = None, provider: str = 'ollama', **options) -> str:
+        """Complete a chat (list of {role, content}) and return the full text"""
+        return self._flight(provider, model, messages=messages, **options).text()
+
+    def generate(self, prompt: str, model: Optional[str] = None, provider: str = 'ollama', **options) -> str:
+        """Complete a single prompt and return the full text"""
+        return self._flight(provider, model, prompt=prompt, **options).text()
+
+    def stream_chat(self, messages: List[Dict], model: Optional[str] = None, provider: str = 'ollama',
+                    **options) -> Iterator[str]:
+        """Yield a chat completion as it is generated"""
+        return iter(self._flight(provider, model, messages=messages, **options))
+
+    def stream_generate(self, prompt: str, model: Optional[str] = None, provider: str = 'ollama',
+                        **options) -> Iterator[str]:
+        """Yield a prompt completion as it is generated"""
+        return iter(self._flight(provider, model, prompt=prompt, **options))
+
+    def list_models(self, provider: str = 'ollama') -> List[str]:
+        return self.provider(provider).list_models()
+
+    # ------------------------------------------------------------------
+    # Coalescing
+    # ------------------------------------------------------------------
+
+    def _flight(self, provider: str, model: Optional[str], messages: Optional[List[Dict]] = None,
+                prompt: Optional[str] = None, temperature: Optional[float] = None,
+                max_tokens: Optional[int] = None, timeout: float = 60, api_key: Optional[str] = None,
+                bypass_cache: bool = False, ttl: Optional[int] = None,
+                cache: Optional[bool] = None) -> _Flight:
+        backend = self.provider(provider)
+        model = model or self.default_model
+        key = request_key(provider, model, messages, prompt, temperature, max_tokens)
+        # A regenerate must not be answered by a call that started before it
+        if not bypass_cache:
+            with self._lock:
+                flight = self._flights.get(key)
+            if flight is not None:
+                logger.info(f"Joining in-flight {provider} call for {model}")
+                return flight
+
+        # Sampled output is meant to differ between calls; only cache it on request
+        cacheable = self.cache is not None and (cache if cache is not None else temperature == 0)
+        if cacheable:
+            if bypass_cache:
+                self.cache.bypass()
+            else:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    logger.info(f"LLM cache hit: {provider} {model}")
+                    return _Flight.completed(cached)
+
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and not bypass_cache:
+                return flight
+            flight = _Flight()
+            self._flights[key] = flight
+
+        logger.info(f"LLM call: {provider} {model}, temperature={temperature}, max_tokens={max_tokens}")
+        self._executor.submit(self._run, key, flight, backend, model, messages, prompt, temperature,
+                              max_tokens, timeout, api_key, ttl, cacheable)
+        return flight
+
+    def _run(self, key, flight, backend, model, messages, prompt, temperature, max_tokens, timeout, api_key, ttl,
+             cacheable):
+        try:
+            for text in backend.stream(model, messages=messages, prompt=prompt, temperature=temperature,
+                                       max_tokens=max_tokens, timeout=timeout, api_key=api_key):
+                flight.feed(text)
+            flight.finish()
+            if cacheable:
+                self.cache.put(key, backend.name, model, ''.join(flight.chunks), ttl)
+        except LLMError as e:
+            logger.error(f"LLM call failed ({backend.name} {model}): {e}")
+            flight.finish(e)
+        except Exception as e:
+            logger.exception(f"LLM call failed ({backend.name} {model})")
+            flight.finish(LLMError(str(e)))
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Process-wide LLM client (one connection pool per provider)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
@@ -0,0 +1,324 @@
+"""
+Ollama Supervisor
+Starts, warms and meters the local Ollama server for every service.
+
+Only one process owns ``ollama serve``: the owner holds an exclusive lock
+on OLLAMA_SUPERVISOR_LOCK while the server runs, and every other process
+just waits for readiness. Readiness is polled on /api/tags, no fixed
+sleep. Once the server answers, the models in OLLAMA_PRELOAD_MODELS are
+loaded with keep_alive=OLLAMA_KEEP_ALIVE, so the first real generation
+hits a warm model.
+
+Ollama requests from the shared client go through ``slot()``. It allows at
+most OLLAMA_NUM_PARALLEL calls at once (the same value the server is
+started with), so extra calls queue here rather than inside Ollama.
+The slots are per process: each service that uses the client has its
+own OLLAMA_NUM_PARALLEL slots, so with several services running the
+server can still see more calls than that and queue the rest itself.
+It also records latency. ``stats()`` reports health and latency figures.
+"""
+
+import fcntl
+import logging
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_URL = os.getenv('OLLAMA_API_URL', 'http://localhost:11434')
+NUM_PARALLEL = int(os.getenv('OLLAMA_NUM_PARALLEL', 4))
+KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+# Models loaded as soon as the server is up (comma-separated)
+PRELOAD_MODELS = [model.strip() for model in
+                  os.getenv('OLLAMA_PRELOAD_MODELS', os.getenv('DEFAULT_LLM_MODEL', 'mistral')).split(',')
+                  if model.strip()]
+START_TIMEOUT = float(os.getenv('OLLAMA_START_TIMEOUT', 30))
+LOCK_PATH = os.getenv('OLLAMA_SUPERVISOR_LOCK', '/tmp/blog-ollama-supervisor.lock')
+
+POLL_INTERVAL = 0.25
+
+
+class OllamaSupervisor:
+    """Single-owner lifecycle, warm-up, concurrency limit and metrics for Ollama"""
+
+    def __init__(self, base_url: str = OLLAMA_URL, num_parallel: int = NUM_PARALLEL,
+                 keep_alive: str = KEEP_ALIVE, preload_models: Optional[List[str]] = None):
+        self.base_url = base_url.rstrip('/')
+        self.num_parallel = max(1, num_parallel)
+        self.keep_alive = keep_alive
+        self.preload_models = PRELOAD_MODELS if preload_models is None else preload_models
+        self._slots = threading.BoundedSemaphore(self.num_parallel)
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._lock_file = None
+        self._process = None
+        self._warmed = set()
+        # Models with a warm-up thread running; they join _warmed only once it succeeds
+        self._warming = set()
+        self._warm_lock = threading.Lock()
+        self._stats = {
+            'healthy': None, 'health_checks': 0, 'health_latency_ms': None,
+            'starts': 0, 'start_seconds': None,
+            'requests': 0, 'failures': 0, 'in_flight': 0, 'waiting': 0,
+            'queue_wait_ms': 0.0, 'first_token_ms': None, 'latency_ms': None,
+            'warm_models': {},
+        }
+
+    @property
+    def pid(self) -> Optional[int]:
+        """PID of ``ollama serve`` if this process started it"""
+        return self._process.pid if self._owns_server() else None
+
+    @property
+    def local(self) -> bool:
+        return urlparse(self.base_url).hostname in ('localhost', '127.0.0.1', '::1')
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def is_healthy(self, timeout: float = 2) -> bool:
+        started = time.monotonic()
+        try:
+            healthy = requests.get(f"{self.base_url}/api/tags", timeout=timeout).status_code == 200
+        except requests.RequestException:
+            healthy = False
+        with self._stats_lock:
+            self._stats['health_checks'] += 1
+            self._stats['healthy'] = healthy
+            if healthy:
+                self._stats['health_latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return healthy
+
+    def ensure_running(self, timeout: float = START_TIMEOUT, warm: bool = True) -> bool:
+        """Make sure the server answers, starting it if this process may; then warm models
+
+        Returns False if it is not ready within ``timeout``. Raises
+        FileNotFoundError when the server has to be started here and the
+        ``ollama`` binary is not installed.
+        """
+        if self.is_healthy():
+            if warm:
+                self.warm_up_async()
+            return True
+        if not self.local:
+            logger.error(f"Ollama at {self.base_url} is not responding (remote, not starting it)")
+            return False
+
+        with self._start_lock:
+            spawned_at = None
+            if not self._owns_server():
+                if self._acquire_owner_lock():
+                    spawned_at = time.monotonic()
+                    self._spawn()
+                else:
+                    logger.info("Ollama is being started by another process, waiting for readiness")
+            ready = self.wait_ready(timeout)
+            if ready and spawned_at is not None:
+                with self._stats_lock:
+                    self._stats['start_seconds'] = round(time.monotonic() - spawned_at, 2)
+
+        if ready and warm:
+            self.warm_up_async()
+        return ready
+
+    def wait_ready(self, timeout: float = START_TIMEOUT) -> bool:
+        """Poll /api/tags until it answers, the owned process exits, or ``timeout`` passes"""
+        started = time.monotonic()
+        deadline = started + timeout
+        while time.monotonic() < deadline:
+            if self.is_healthy(timeout=1):
+                logger.info(f"Ollama ready after {time.monotonic() - started:.2f}s")
+                return True
+            if self._process is not None and self._process.poll() is not None:
+                logger.error(f"ollama serve exited with code {self._process.returncode}")
+                self._release_owner()
+                return False
+            time.sleep(POLL_INTERVAL)
+        logger.error(f"Ollama not ready after {timeout:.0f}s")
+        return False
+
+    def _owns_server(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _acquire_owner_lock(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        lock_file = open(LOCK_PATH, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _release_owner(self):
+        self._process = None
+        with self._warm_lock:
+            self._warmed.clear()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _spawn(self):
+        host = urlparse(self.base_url)
+        env = dict(os.environ,
+                   OLLAMA_HOST=f"{host.hostname}:{host.port or 11434}",
+                   OLLAMA_NUM_PARALLEL=str(self.num_parallel),
+                   OLLAMA_KEEP_ALIVE=self.keep_alive)
+        logger.info(f"Starting ollama serve (num_parallel={self.num_parallel}, keep_alive={self.keep_alive})")
+        try:
+            self._process = subprocess.Popen(['ollama', 'serve'], env=env, stdout=subprocess.DEVNULL,
+                                             stderr=subprocess.DEVNULL, start_new_session=True)
+        except FileNotFoundError:
+            self._release_owner()
+            raise
+        self._lock_file.seek(0)
+        self._lock_file.truncate()
+        self._lock_file.write(str(self._process.pid))
+        self._lock_file.flush()
+        with self._stats_lock:
+            self._stats['starts'] += 1
+
+    def stop(self):
+        """Stop the server if this process started it"""
+        with self._start_lock:
+            if self._owns_server():
+                self._process.terminate()
+                self._process.wait(timeout=10)
+            self._release_owner()
+
+    # ------------------------------------------------------------------
+    # Warm-up
+    # ------------------------------------------------------------------
+
+    def warm_up(self, models: Optional[List[str]] = None) -> Dict[str, float]:
+        """Load ``models`` (default: the preload list) and keep them resident; returns seconds per model"""
+        timings = {}
+        for model in models or self.preload_models:
+            started = time.monotonic()
+            try:
+                # A generate request without a prompt only loads the model
+                response = requests.post(f"{self.base_url}/api/generate",
+                                         json={'model': model, 'keep_alive': self.keep_alive}, timeout=300)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                logger.warning(f"Ollama warm-up failed for {model}: {e}")
+                continue
+            timings[model] = round(time.monotonic() - started, 2)
+            with self._warm_lock:
+                self._warmed.add(model)
+            with self._stats_lock:
+                self._stats['warm_models'][model] = timings[model]
+            logger.info(f"Ollama model {model} warm ({timings[model]}s)")
+        return timings
+
+    def warm_up_async(self):
+        """Warm every preload model not yet warmed by this process, in the background
+
+        A model that fails to load is tried again on the next call.
+        """
+        with self._warm_lock:
+            pending = [model for model in self.preload_models
+                       if model not in self._warmed and model not in self._warming]
+            self._warming.update(pending)
+        if pending:
+            threading.Thread(target=self._warm_up_pending, args=(pending,), name='ollama-warm-up',
+                             daemon=True).start()
+
+    def _warm_up_pending(self, models: List[str]):
+        try:
+            self.warm_up(models)
+        finally:
+            with self._warm_lock:
+                self._warming.difference_update(models)
+
+    # ------------------------------------------------------------------
+    # Concurrency and metrics
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the num_parallel request slots for an Ollama call
+
+        The limit applies to this process only; it is not shared with
+        other services through the owner lock.
+
+        Yields a callback to invoke when the first token arrives, for the
+        time-to-first-token figure.
+        """
+        queued = time.monotonic()
+        with self._stats_lock:
+            self._stats['waiting'] += 1
+        self._slots.acquire()
+        started = time.monotonic()
+        first_token = []
+
+        def on_first_token():
+            if not first_token:
+                first_token.append(time.monotonic())
+
+        with self._stats_lock:
+            self._stats['waiting'] -= 1
+            self._stats['in_flight'] += 1
+            self._stats['requests'] += 1
+            self._stats['queue_wait_ms'] = self._average('queue_wait_ms', (started - queued) * 1000)
+        try:
+            yield on_first_token
+        except Exception:
+            with self._stats_lock:
+                self._stats['failures'] += 1
+            raise
+        finally:
+            self._slots.release()
+            finished = time.monotonic()
+            with self._stats_lock:
+                self._stats['in_flight'] -= 1
+                self._stats['latency_ms'] = self._average('latency_ms', (finished - started) * 1000)
+                if first_token:
+                    self._stats['first_token_ms'] = self._average('first_token_ms',
+                                                                  (first_token[0] - started) * 1000)
+
+    def _average(self, name: str, value: float) -> float:
+        """Exponential moving average, so the figures follow recent behaviour"""
+        previous = self._stats[name]
+        return round(value if previous is None else previous * 0.8 + value * 0.2, 1)
+
+    def loaded_models(self) -> List[Dict]:
+        """Models currently resident in the server (/api/ps)"""
+        try:
+            response = requests.get(f"{self.base_url}/api/ps", timeout=2)
+            response.raise_for_status()
+        except requests.RequestException:
+            return []
+        return [{'name': model['name'], 'expires_at': model.get('expires_at')}
+                for model in response.json().get('models', [])]
+
+    def stats(self) -> Dict:
+        self.is_healthy()
+        with self._stats_lock:
+            stats = dict(self._stats, warm_models=dict(self._stats['warm_models']))
+        stats.update(base_url=self.base_url, num_parallel=self.num_parallel, keep_alive=self.keep_alive,
+                     owner=self._owns_server(), loaded_models=self.loaded_models())
+        return stats
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_ollama_supervisor() -> OllamaSupervisor:
+    """Process-wide Ollama supervisor"""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = OllamaSupervisor()
+        return _supervisor
@@ -0,0 +1,190 @@
+"""
+LLM Providers
+HTTP transport for each LLM backend. Every provider owns one pooled
+requests.Session, so calls reuse keep-alive connections instead of opening
+a new one per request, and every request is made in streaming mode: the
+provider yields text chunks as the backend produces them.
+"""
+
+import json
+import logging
+import os
+from typing import Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ollama import OllamaSupervisor, get_ollama_supervisor
+
+logger = logging.getLogger(__name__)
+
+# Connections kept per provider; should cover the client's worker count
+POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', 8))
+
+
+class LLMError(Exception):
+    """An LLM call failed"""
+
+
+class LLMTimeoutError(LLMError, TimeoutError):
+    """The LLM backend stopped responding within the timeout"""
+
+
+class LLMConnectionError(LLMError, ConnectionError):
+    """The LLM backend could not be reached"""
+
+
+def _pooled_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class Provider:
+    """One LLM backend (base URL plus a pooled session)"""
+
+    name = None
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+        self.session = _pooled_session()
+
+    def stream(self, model: str, messages: Optional[List[Dict]] = None, prompt: Optional[str] = None,
+               temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+               timeout: float = 60, api_key: Optional[str] = None) -> Iterator[str]:
+        """Yield the completion text chunk by chunk (chat ``messages`` or a single ``prompt``)"""
+        raise NotImplementedError
+
+    def list_models(self, timeout: float = 5) -> List[str]:
+        raise NotImplementedError
+
+    def _post(self, path: str, payload: Dict, timeout: float, headers: Optional[Dict] = None) -> requests.Response:
+        try:
+            # timeout bounds the wait for each chunk, not the whole completion
+            response = self.session.post(f"{self.base_url}{path}", json=payload, headers=headers,
+                                         timeout=timeout, stream=True)
+        except requests.Timeout:
+            raise LLMTimeoutError(f"Request to {self.name} timed out")
+        except requests.ConnectionError as e:
+            raise LLMConnectionError(f"Could not connect to {self.name} at {self.base_url}: {e}")
+        except requests.RequestException as e:
+            raise LLMError(f"Request to {self.name} failed: {e}")
+        if response.status_code != 200:
+            text = response.text
+            response.close()
+            raise LLMError(f"API request failed: {response.status_code} - {text}")
+        return response
+
+    def _lines(self, response: requests.Response) -> Iterator[bytes]:
+        try:
+            for line in response.iter_lines():
+                if line:
+                    yield line
+        except requests.Timeout:
+            raise LLMTimeoutError(f"{self.name} stopped responding")
+        except requests.RequestException as e:
+            raise LLMError(f"Stream from {self.name} failed: {e}")
+        finally:
+            response.close()
+
+
+class OllamaProvider(Provider):
+    """Ollama /api/chat and /api/generate (newline-delimited JSON stream)
+
+    Calls run inside the supervisor's request slots. If the local server
+    is down, it is started (and the call retried once) instead of failing.
+    """
+
+    name = 'ollama'
+
+    def __init__(self, base_url: str, supervisor: Optional[OllamaSupervisor] = None):
+        super().__init__(base_url)
+        if supervisor is None:
+            supervisor = get_ollama_supervisor()
+            if supervisor.base_url != self.base_url:
+                supervisor = OllamaSupervisor(self.base_url)
+        self.supervisor = supervisor
+
+    def stream(self, model, messages=None, prompt=None, temperature=None, max_tokens=None,
+               timeout=60, api_key=None):
+        options = {}
+        if temperature is not None:
+            options['temperature'] = float(temperature)
+        if max_tokens is not None:
+            options['num_predict'] = int(max_tokens)
+        payload = {'model': model, 'stream': True, 'keep_alive': self.supervisor.keep_alive}
+        if options:
+            payload['options'] = options
+        if messages is not None:
+            path, payload['messages'] = '/api/chat', messages
+        else:
+            path, payload['prompt'] = '/api/generate', prompt
+
+        with self.supervisor.slot() as first_token:
+            try:
+                response = self._post(path, payload, timeout)
+            except LLMConnectionError:
+                if not self.supervisor.ensure_running(warm=False):
+                    raise
+                response = self._post(path, payload, timeout)
+
+            for line in self._lines(response):
+                data = json.loads(line)
+                if data.get('error'):
+                    raise LLMError(data['error'])
+                text = data['message'].get('content', '') if 'message' in data else data.get('response', '')
+                if text:
+                    first_token()
+                    yield text
+                if data.get('done'):
+                    return
+
+    def list_models(self, timeout=5):
+        response = self.session.get(f"{self.base_url}/api/tags", timeout=timeout)
+        response.raise_for_status()
+        return [model['name'] for model in response.json().get('models', [])]
+
+
+class OpenAIProvider(Provider):
+    """OpenAI-compatible /chat/completions (server-sent events stream)"""
+
+    name = 'openai'
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None):
+        super().__init__(base_url)
+        self.api_key = api_key
+
+    def stream(self, model, messages=None, prompt=None, temperature=None, max_tokens=None,
+               timeout=60, api_key=None):
+        key = api_key or self.api_key
+        if not key:
+            raise LLMError("OpenAI API key not configured")
+        if messages is None:
+            messages = [{'role': 'user', 'content': prompt}]
+        payload = {'model': model, 'messages': messages, 'stream': True}
+        if temperature is not None:
+            payload['temperature'] = temperature
+        if max_tokens is not None:
+            payload['max_tokens'] = max_tokens
+        headers = {'Authorization': f'Bearer {key}'}
+
+        for line in self._lines(self._post('/chat/completions', payload, timeout, headers)):
+            if not line.startswith(b'data:'):
+                continue
+            data = line[5:].strip()
+            if data == b'[DONE]':
+                return
+            choices = json.loads(data).get('choices') or [{}]
+            text = (choices[0].get('delta') or {}).get('content')
+            if text:
+                yield text
+
+    def list_models(self, timeout=5):
+        if not self.api_key:
+            return []
+        response = self.session.get(f"{self.base_url}/models", timeout=timeout,
+                                    headers={'Authorization': f'Bearer {self.api_key}'})
+        response.raise_for_status()
+        return [model['id'] for model in response.json().get('data', [])]
@@ -0,0 +1,40 @@
+"""
+LLM Server-Sent Events
+Streams an LLM completion to the browser as text/event-stream:
+
+- ``event: token`` with ``{"text": ...}`` for each chunk
+- ``event: done`` with the payload returned by ``on_complete(full_text)``
+- ``event: error`` with ``{"error": ...}`` if the call fails
+"""
+
+import json
+import logging
+from typing import Callable, Dict, Iterable, Optional
+
+from flask import Response, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+
+def _event(name: str, data: Dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(chunks: Iterable[str], on_complete: Optional[Callable[[str], Dict]] = None) -> Response:
+    """Flask response streaming ``chunks`` as SSE token events"""
+
+    def events():
+        parts = []
+        try:
+            for text in chunks:
+                parts.append(text)
+                yield _event('token', {'text': text})
+            result = on_complete(''.join(parts)) if on_complete else {}
+            yield _event('done', result or {})
+        except Exception as e:
+            logger.error(f"LLM stream failed: {e}")
+            yield _event('error', {'error': str(e)})
+
+    # X-Accel-Buffering stops nginx holding tokens back until the response ends
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
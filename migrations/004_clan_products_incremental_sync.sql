@@ -0,0 +1,35 @@
+-- Incremental clan.com catalogue sync
+-- Migration: 004_clan_products_incremental_sync.sql
+
+-- content_hash: md5 of the product columns, used to skip unchanged products
+-- last_seen:    when the catalogue feed last listed the product
+-- deleted_at:   tombstone for products that disappeared from the feed
+ALTER TABLE clan_products
+ADD COLUMN IF NOT EXISTS printable_design_type VARCHAR(50),
+ADD COLUMN IF NOT EXISTS has_detailed_data BOOLEAN DEFAULT TRUE,
+ADD COLUMN IF NOT EXISTS content_hash TEXT,
+ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP,
+ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+
+COMMENT ON COLUMN clan_products.content_hash IS 'md5 of the product columns (see HASH_COLUMNS in blog-launchpad/clan_cache.py)';
+COMMENT ON COLUMN clan_products.last_seen IS 'When the catalogue feed last listed this product';
+COMMENT ON COLUMN clan_products.deleted_at IS 'Set when the product disappears from the catalogue feed';
+
+-- content_hash is derived from the stored row on every write, so the bulk
+-- merge, the enrichment writer, single-product updates and scripts agree.
+-- The column list must match HASH_COLUMNS in blog-launchpad/clan_cache.py.
+CREATE OR REPLACE FUNCTION clan_products_set_content_hash() RETURNS trigger AS $$
+BEGIN
+    NEW.content_hash := md5(ROW(NEW.name, NEW.sku, NEW.price, NEW.image_url, NEW.url, NEW.description, NEW.category_ids, NEW.printable_design_type, NEW.has_detailed_data)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS clan_products_content_hash ON clan_products;
+CREATE TRIGGER clan_products_content_hash
+BEFORE INSERT OR UPDATE ON clan_products
+FOR EACH ROW EXECUTE FUNCTION clan_products_set_content_hash();
+
+-- Backfill (the trigger computes the hash)
+UPDATE clan_products p SET content_hash = NULL
+WHERE p.content_hash IS DISTINCT FROM md5(ROW(p.name, p.sku, p.price, p.image_url, p.url, p.description, p.category_ids, p.printable_design_type, p.has_detailed_data)::text);
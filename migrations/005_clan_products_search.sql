@@ -0,0 +1,21 @@
+-- Ranked product search over the clan.com product cache
+-- Migration: 005_clan_products_search.sql
+
+-- search_vector: weighted tsvector of name (A), sku (B) and description (C),
+-- maintained by PostgreSQL so catalogue merges never have to touch it
+ALTER TABLE clan_products
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(sku, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_clan_products_search ON clan_products USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_clan_products_category_ids ON clan_products USING GIN (category_ids jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS idx_clan_products_name_id ON clan_products (name, id);
+
+-- Fuzzy (typo-tolerant) name matching; ships with postgresql-contrib
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_clan_products_name_trgm ON clan_products USING GIN (name gin_trgm_ops);
+
+COMMENT ON COLUMN clan_products.search_vector IS 'Weighted full-text vector of name, sku and description';
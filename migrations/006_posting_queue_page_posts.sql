@@ -0,0 +1,15 @@
+-- Per-page Facebook post ledger for idempotent publishing
+-- Migration: 006_posting_queue_page_posts.sql
+
+-- One row per successful page post, written as soon as the Graph API
+-- answers, so a retried queue item is never posted to the same page twice
+CREATE TABLE IF NOT EXISTS posting_queue_page_posts (
+    queue_id INTEGER NOT NULL REFERENCES posting_queue(id) ON DELETE CASCADE,
+    page_id VARCHAR(100) NOT NULL,
+    page_name VARCHAR(100),
+    platform_post_id VARCHAR(100) NOT NULL,
+    posted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (queue_id, page_id)
+);
+
+COMMENT ON TABLE posting_queue_page_posts IS 'Facebook page posts made for each posting_queue item';
@@ -0,0 +1,31 @@
+-- Lease, retry and wake-up support for scripts/posting_worker.py
+-- Migration: 007_posting_queue_worker.sql
+
+ALTER TABLE posting_queue
+ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0,
+ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP,
+ADD COLUMN IF NOT EXISTS lease_owner VARCHAR(100),
+ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+
+COMMENT ON COLUMN posting_queue.attempts IS 'Publishing attempts made by the posting worker';
+COMMENT ON COLUMN posting_queue.next_attempt_at IS 'Earliest retry time after a failed attempt';
+COMMENT ON COLUMN posting_queue.lease_owner IS 'Worker currently publishing this item';
+COMMENT ON COLUMN posting_queue.lease_expires_at IS 'When an unrenewed lease may be taken over';
+
+CREATE INDEX IF NOT EXISTS idx_posting_queue_due
+ON posting_queue (scheduled_timestamp)
+WHERE status IN ('ready', 'pending', 'publishing');
+
+-- Wake idle workers (LISTEN posting_queue) when an item becomes due-able
+CREATE OR REPLACE FUNCTION notify_posting_queue() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('posting_queue', NEW.id::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS posting_queue_notify ON posting_queue;
+CREATE TRIGGER posting_queue_notify
+AFTER INSERT OR UPDATE OF status, scheduled_timestamp, next_attempt_at ON posting_queue
+FOR EACH ROW WHEN (NEW.status IN ('ready', 'pending'))
+EXECUTE FUNCTION notify_posting_queue();
@@ -0,0 +1,41 @@
+-- Content-addressed derivative store manifest for blog-images
+-- Migration: 008_image_derivatives.sql
+
+-- One row per stored derivative (source content hash + settings variant)
+CREATE TABLE IF NOT EXISTS image_derivatives (
+    cache_key VARCHAR(200) PRIMARY KEY,
+    source_hash CHAR(64) NOT NULL,
+    variant VARCHAR(100) NOT NULL,
+    store_path TEXT NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    hits INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT NOW(),
+    last_used_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_image_derivatives_last_used ON image_derivatives (last_used_at);
+
+-- One row per post file linked from the store
+CREATE TABLE IF NOT EXISTS image_derivative_outputs (
+    output_path TEXT PRIMARY KEY,
+    post_id INTEGER,
+    stage VARCHAR(20) NOT NULL,
+    cache_key VARCHAR(200) NOT NULL,
+    variant VARCHAR(100) NOT NULL,
+    source_path TEXT NOT NULL,
+    source_hash CHAR(64) NOT NULL,
+    source_size BIGINT,
+    source_mtime_ns BIGINT,
+    size_bytes BIGINT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_image_derivative_outputs_post ON image_derivative_outputs (post_id, stage);
+CREATE INDEX IF NOT EXISTS idx_image_derivative_outputs_source ON image_derivative_outputs (source_path, variant);
+
+COMMENT ON TABLE image_derivatives IS 'Encoded image derivatives in the blog-images content-addressed store';
+COMMENT ON TABLE image_derivative_outputs IS 'Post image files linked from image_derivatives';
@@ -0,0 +1,39 @@
+-- Incremental storage accounting for blog-images
+-- Migration: 009_image_storage_stats.sql
+
+-- One row per image file under static/content/posts (path relative to that root)
+CREATE TABLE IF NOT EXISTS image_storage_files (
+    path TEXT PRIMARY KEY,
+    post_id INTEGER NOT NULL,
+    image_type VARCHAR(20) NOT NULL,
+    stage VARCHAR(20) NOT NULL,
+    section_id INTEGER,
+    filename TEXT NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    mtime_ns BIGINT,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_image_storage_files_size ON image_storage_files (size_bytes DESC);
+CREATE INDEX IF NOT EXISTS idx_image_storage_files_post ON image_storage_files (post_id);
+
+-- Running totals per post, image type (header/section/featured) and stage
+CREATE TABLE IF NOT EXISTS image_storage_totals (
+    post_id INTEGER NOT NULL,
+    image_type VARCHAR(20) NOT NULL,
+    stage VARCHAR(20) NOT NULL,
+    file_count INTEGER NOT NULL DEFAULT 0,
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (post_id, image_type, stage)
+);
+
+-- Daily growth, stamped with the library totals at the day's last change
+CREATE TABLE IF NOT EXISTS image_storage_daily (
+    day DATE PRIMARY KEY,
+    bytes_added BIGINT NOT NULL DEFAULT 0,
+    bytes_removed BIGINT NOT NULL DEFAULT 0,
+    files_added INTEGER NOT NULL DEFAULT 0,
+    files_removed INTEGER NOT NULL DEFAULT 0,
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    total_files INTEGER NOT NULL DEFAULT 0
+);
@@ -0,0 +1,7 @@
+-- Content-hash dedup for clan.com image uploads
+-- Migration: 010_clan_image_content_hash.sql
+
+-- SHA-256 of the uploaded file; a republish reuses clan_uploaded_url for identical images
+ALTER TABLE section_image_mappings ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+
+CREATE INDEX IF NOT EXISTS idx_section_image_mappings_content_hash ON section_image_mappings (content_hash);
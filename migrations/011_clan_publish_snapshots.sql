@@ -0,0 +1,14 @@
+-- Snapshots of the last clan.com publish per post, for diff-based republishing
+-- Migration: 011_clan_publish_snapshots.sql
+
+-- Hashes of the editPost fields, each rendered section, the rest of the page, and the post's images
+CREATE TABLE IF NOT EXISTS clan_publish_snapshots (
+    post_id INTEGER PRIMARY KEY,
+    clan_post_id INTEGER,
+    url TEXT,
+    field_hashes JSONB NOT NULL,
+    section_hashes JSONB NOT NULL,
+    page_hash CHAR(64) NOT NULL,
+    image_hashes JSONB NOT NULL,
+    published_at TIMESTAMP DEFAULT NOW()
+);
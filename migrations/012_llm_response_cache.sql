@@ -0,0 +1,19 @@
+-- Persistent cache of completed LLM responses
+-- Migration: 012_llm_response_cache.sql
+
+-- key is a SHA-256 of provider, model, prompt/messages, temperature and max_tokens
+CREATE TABLE IF NOT EXISTS llm_response_cache (
+    key CHAR(64) PRIMARY KEY,
+    provider VARCHAR(20) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    response TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    last_used_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- LRU eviction and expiry sweeps
+CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used ON llm_response_cache (last_used_at);
+CREATE INDEX IF NOT EXISTS idx_llm_response_cache_expires ON llm_response_cache (expires_at);
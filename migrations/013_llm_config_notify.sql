@@ -0,0 +1,45 @@
+-- Change notifications for the LLM actions config cache (blog-llm-actions/llm_config_cache.py)
+-- Migration: 013_llm_config_notify.sql
+
+-- One NOTIFY per writing statement; the payload is the table name
+CREATE OR REPLACE FUNCTION notify_llm_config_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('llm_config_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS llm_prompt_config_notify ON llm_prompt;
+CREATE TRIGGER llm_prompt_config_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON llm_prompt
+FOR EACH STATEMENT EXECUTE FUNCTION notify_llm_config_changed();
+
+DROP TRIGGER IF EXISTS llm_action_config_notify ON llm_action;
+CREATE TRIGGER llm_action_config_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON llm_action
+FOR EACH STATEMENT EXECUTE FUNCTION notify_llm_config_changed();
+
+DROP TRIGGER IF EXISTS llm_config_config_notify ON llm_config;
+CREATE TRIGGER llm_config_config_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON llm_config
+FOR EACH STATEMENT EXECUTE FUNCTION notify_llm_config_changed();
+
+DROP TRIGGER IF EXISTS workflow_step_prompt_config_notify ON workflow_step_prompt;
+CREATE TRIGGER workflow_step_prompt_config_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON workflow_step_prompt
+FOR EACH STATEMENT EXECUTE FUNCTION notify_llm_config_changed();
+
+DROP TRIGGER IF EXISTS workflow_step_entity_config_notify ON workflow_step_entity;
+CREATE TRIGGER workflow_step_entity_config_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON workflow_step_entity
+FOR EACH STATEMENT EXECUTE FUNCTION notify_llm_config_changed();
+
+DROP TRIGGER IF EXISTS workflow_sub_stage_entity_config_notify ON workflow_sub_stage_entity;
+CREATE TRIGGER workflow_sub_stage_entity_config_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON workflow_sub_stage_entity
+FOR EACH STATEMENT EXECUTE FUNCTION notify_llm_config_changed();
+
+DROP TRIGGER IF EXISTS workflow_stage_entity_config_notify ON workflow_stage_entity;
+CREATE TRIGGER workflow_stage_entity_config_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON workflow_stage_entity
+FOR EACH STATEMENT EXECUTE FUNCTION notify_llm_config_changed();
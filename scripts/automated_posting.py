@@ -121,6 +121,33 @@ class AutomatedPostingSystem:
                 
         return True
     
+    def get_staggered_time(self, post: Dict) -> datetime:
+        """
+        Pick the staggered publishing time for a due post
+        """
+        scheduled_time = post['scheduled_timestamp']
+        platform = post['platform']
+        content_type = post['content_type']
+        
+        # Calculate staggered time
+        now = datetime.now()
+        if scheduled_time <= now:
+            # If post is overdue, schedule for immediate posting (within 5 minutes)
+            staggered_time = now + timedelta(minutes=1)
+        else:
+            # If post is in the future, use normal staggering
+            staggered_time = self.calculate_staggered_time(scheduled_time)
+            
+            # Check if the staggered time is optimal
+            if not self.is_optimal_posting_time(staggered_time, platform, content_type):
+                # If not optimal, try a different random time within the next 2 hours
+                for _ in range(3):  # Try up to 3 times
+                    staggered_time = self.calculate_staggered_time(scheduled_time, 1, 119)
+                    if self.is_optimal_posting_time(staggered_time, platform, content_type):
+                        break
+        
+        return staggered_time
+    
     def schedule_post(self, post: Dict) -> bool:
         """
         Schedule a post for publishing with staggered timing
@@ -128,25 +155,7 @@ class AutomatedPostingSystem:
         try:
             post_id = post['id']
             scheduled_time = post['scheduled_timestamp']
-            platform = post['platform']
-            content_type = post['content_type']
-            
-            # Calculate staggered time
-            now = datetime.now()
-            if scheduled_time <= now:
-                # If post is overdue, schedule for immediate posting (within 5 minutes)
-                staggered_time = now + timedelta(minutes=1)
-            else:
-                # If post is in the future, use normal staggering
-                staggered_time = self.calculate_staggered_time(scheduled_time)
-                
-                # Check if the staggered time is optimal
-                if not self.is_optimal_posting_time(staggered_time, platform, content_type):
-                    # If not optimal, try a different random time within the next 2 hours
-                    for _ in range(3):  # Try up to 3 times
-                        staggered_time = self.calculate_staggered_time(scheduled_time, 1, 119)
-                        if self.is_optimal_posting_time(staggered_time, platform, content_type):
-                            break
+            staggered_time = self.get_staggered_time(post)
             
             # Update the post with staggered time
             with self.db_manager.get_connection() as conn:
@@ -154,10 +163,13 @@ class AutomatedPostingSystem:
                     cursor.execute("""
                         UPDATE posting_queue 
                         SET scheduled_timestamp = %s, status = 'pending'
-                        WHERE id = %s
+                        WHERE id = %s AND status = 'ready'
                     """, (staggered_time, post_id))
                     
                     conn.commit()
+                    if cursor.rowcount == 0:
+                        logger.info(f"Post {post_id} was already picked up elsewhere")
+                        return False
                     logger.info(f"Scheduled post {post_id} for {staggered_time} (originally {scheduled_time})")
                     return True
                 
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Local stub of the Facebook Graph API
+Answers page feed posts and link scrapes with configurable latency, per-page
+rate limiting and error injection, so Facebook publishing can be developed
+and benchmarked without touching real pages.
+
+    # Serve on :8766 and point the app at it
+    python scripts/fake_graph_api.py --port 8766
+    FACEBOOK_GRAPH_API_URL=http://localhost:8766/v18.0 python unified_app.py
+
+    # Benchmark the publisher against it (no database writes)
+    python scripts/fake_graph_api.py --benchmark --items 50 --latency 0.5
+
+    # End to end through posting_queue (creates and removes temporary rows)
+    python scripts/fake_graph_api.py --benchmark --items 50 --db
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logger = logging.getLogger(__name__)
+
+
+class FakeGraphState:
+    """Shared latency, rate-limit and bookkeeping for the handler"""
+
+    def __init__(self, latency: float, page_max_rps: float, error_rate: float):
+        self.latency = latency
+        self.page_max_rps = page_max_rps
+        self.error_rate = error_rate
+        self.posts = defaultdict(list)
+        self.scrapes = 0
+        self.throttled = 0
+        self._ids = itertools.count(1)
+        self._recent = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def admit(self, page_id: str) -> bool:
+        """Sliding one-second window per page; False means answer with error code 32"""
+        if not self.page_max_rps:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            recent = self._recent[page_id]
+            while recent and now - recent[0] > 1.0:
+                recent.popleft()
+            if len(recent) >= self.page_max_rps:
+                self.throttled += 1
+                return False
+            recent.append(now)
+            return True
+
+    def record_post(self, page_id: str, message: str) -> str:
+        with self._lock:
+            post_id = f'{page_id}_{next(self._ids)}'
+            self.posts[page_id].append({'id': post_id, 'message': message})
+            return post_id
+
+
+class FakeGraphHandler(BaseHTTPRequestHandler):
+    state: FakeGraphState = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, code, message):
+        self._send_json({'error': {'message': message, 'type': 'OAuthException', 'code': code}}, status)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        state = self.state
+
+        if not form.get('access_token'):
+            return self._send_error(400, 190, 'An access token is required to request this resource.')
+
+        time.sleep(state.latency)
+
+        # Link scrape: POST /v18.0/ with id=<url>&scrape=true
+        if form.get('scrape') == 'true':
+            with state._lock:
+                state.scrapes += 1
+            return self._send_json({'id': form.get('id'), 'url': form.get('id')})
+
+        if len(parts) >= 2 and parts[-1] == 'feed':
+            page_id = parts[-2]
+            if not state.admit(page_id):
+                return self._send_error(400, 32, 'Page request limit reached')
+            if state.error_rate and random.random() < state.error_rate:
+                return self._send_error(500, 2, 'An unexpected error has occurred.')
+            return self._send_json({'id': state.record_post(page_id, form.get('message', ''))})
+
+        self._send_error(400, 100, 'Unsupported post request.')
+
+
+def start_server(port: int = 0, latency: float = 0.5, page_max_rps: float = 0, error_rate: float = 0.0):
+    """Start the stub in a daemon thread; returns (server, graph_url)"""
+    handler = type('BoundFakeGraphHandler', (FakeGraphHandler,), {
+        'state': FakeGraphState(latency, page_max_rps, error_rate)
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/v18.0'
+
+
+class _StaticCredentials:
+    """Two fake pages instead of platform_credentials"""
+
+    def __init__(self, pages: int):
+        self.pages = [{'page_id': f'10000{i}', 'access_token': f'fake-token-{i}', 'name': f'Fake Page {i}'}
+                      for i in range(1, pages + 1)]
+
+    def get_pages(self):
+        return self.pages
+
+    def get_app_token(self):
+        return 'fake-app|fake-secret'
+
+    def invalidate(self):
+        pass
+
+
+class _NullLedger:
+    """In-memory stand-in for PublishLedger so benchmarks don't touch the database"""
+
+    def __init__(self):
+        self.posted = defaultdict(dict)
+        self.finished = {}
+
+    def claim(self, queue_ids):
+        return {queue_id: 'pending' for queue_id in queue_ids}
+
+    def release(self, previous):
+        pass
+
+    def posted_pages(self, queue_ids):
+        return {queue_id: dict(self.posted[queue_id]) for queue_id in queue_ids if queue_id in self.posted}
+
+    def record_page_post(self, queue_id, page, platform_post_id):
+        self.posted[queue_id][page['page_id']] = platform_post_id
+
+    def finish(self, queue_id, platform_post_id, error):
+        self.finished[queue_id] = platform_post_id or error
+
+
+def _create_queue_items(count):
+    from config.database import db_manager
+    with db_manager.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO posting_queue (content_type, generated_content, status, platform, schedule_name)
+            SELECT 'product', 'Benchmark post ' || n, 'pending', 'facebook', 'graph-api-benchmark'
+            FROM generate_series(1, %s) AS n
+            RETURNING id
+        """, (count,))
+        ids = [row['id'] for row in cursor.fetchall()]
+        conn.commit()
+    return ids
+
+
+def _delete_queue_items(ids):
+    from config.database import db_manager
+    with db_manager.get_connection() as conn:
+        conn.cursor().execute("DELETE FROM posting_queue WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+
+
+def benchmark(args):
+    from blueprints.facebook_publisher import FacebookPublisher, GraphClient, PublishLedger
+
+    server, graph_url = start_server(0, args.latency, args.page_max_rps, args.error_rate)
+    ledger = PublishLedger() if args.db else _NullLedger()
+    publisher = FacebookPublisher(
+        graph=GraphClient(base_url=graph_url, pool_size=args.concurrency),
+        credentials=_StaticCredentials(args.pages),
+        ledger=ledger,
+        concurrency=args.concurrency,
+        page_posts_per_minute=args.page_rate * 60
+    )
+
+    queue_ids = _create_queue_items(args.items) if args.db else list(range(1, args.items + 1))
+    try:
+        start = time.monotonic()
+        claimed = ledger.claim(queue_ids)
+        jobs = [{'queue_id': queue_id, 'message': f'Benchmark post {queue_id}',
+                 'link_url': f'https://clan.com/benchmark-{queue_id % 10}'} for queue_id in claimed]
+        results = publisher.publish(jobs, claimed)
+        elapsed = time.monotonic() - start
+
+        # A second run over the same items must not post anything again
+        replay = publisher.publish(jobs, claimed)
+    finally:
+        if args.db:
+            _delete_queue_items(queue_ids)
+        server.shutdown()
+
+    state = server.RequestHandlerClass.state
+    page_posts = args.items * args.pages
+    sequential = page_posts * args.latency + args.items * args.latency  # old loop + per-item cache refresh
+    print(json.dumps({
+        'items': args.items,
+        'pages': args.pages,
+        'concurrency': args.concurrency,
+        'page_rate_limit_per_s': args.page_rate,
+        'server_latency_s': args.latency,
+        'elapsed_s': round(elapsed, 2),
+        'page_posts_per_second': round(page_posts / elapsed, 1) if elapsed else None,
+        'published': sum(1 for result in results.values() if result['success']),
+        'failed': sum(1 for result in results.values() if not result['success']),
+        'server_posts': sum(len(posts) for posts in state.posts.values()),
+        'server_scrapes': state.scrapes,
+        'server_throttled': state.throttled,
+        'replay_published': sum(1 for result in replay.values() if result['success']),
+        'sequential_estimate_s': round(sequential, 1),
+        'speedup': round(sequential / elapsed, 1) if elapsed else None
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Facebook Graph API stub')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per request')
+    parser.add_argument('--page-max-rps', type=float, default=0, help='server-side per-page limit (0 = none)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of feed posts answered with 500')
+    parser.add_argument('--benchmark', action='store_true', help='run the publisher against the stub')
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--pages', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--page-rate', type=float, default=20.0, help='client-side posts per second per page')
+    parser.add_argument('--db', action='store_true', help='go through posting_queue with temporary rows')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.benchmark:
+        benchmark(args)
+        return
+
+    server, graph_url = start_server(args.port, args.latency, args.page_max_rps, args.error_rate)
+    print(f'Fake Graph API serving at {graph_url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
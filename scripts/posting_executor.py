@@ -112,6 +112,8 @@ class PostingExecutor:
                 'error': f'Unknown platform: {platform}'
             }
         
+        return result
+    
     def process_pending_posts(self) -> Dict[str, int]:
         """
         Process all pending posts that are due for publishing
@@ -132,8 +134,30 @@ class PostingExecutor:
                 logger.info("No pending posts ready for publishing")
                 return stats
             
-            # Process each post
-            for post in pending_posts:
+            # Facebook posts are published together: items and pages fan out
+            # concurrently, and items claimed by another run are skipped
+            facebook_posts = [post for post in pending_posts
+                              if post['status'] == 'pending' and (post['platform'] or '').lower() == 'facebook']
+            other_posts = [post for post in pending_posts if post not in facebook_posts]
+            
+            if facebook_posts:
+                try:
+                    from blueprints.launchpad import publish_facebook_items
+                    results = publish_facebook_items([post['id'] for post in facebook_posts])
+                    for post in facebook_posts:
+                        result = results.get(post['id'], {})
+                        if result.get('success'):
+                            stats['successfully_published'] += 1
+                        elif result.get('skipped'):
+                            stats['skipped'] += 1
+                        else:
+                            stats['failed'] += 1
+                except Exception as e:
+                    logger.error(f"Error publishing Facebook posts: {e}")
+                    stats['failed'] += len(facebook_posts)
+            
+            # Process each remaining post
+            for post in other_posts:
                 try:
                     # Check if post is still pending
                     if post['status'] != 'pending':
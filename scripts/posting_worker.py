@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Posting Worker - long-running replacement for the posting cron jobs
+Claims due posting_queue items with FOR UPDATE SKIP LOCKED, wakes on
+LISTEN/NOTIFY (or when the next item falls due), holds a heartbeated lease
+while publishing, retries failures with exponential backoff and moves items
+that keep failing to the 'dead_letter' status. Any number of workers can run
+side by side.
+
+    python3 scripts/posting_worker.py                 # run forever
+    python3 scripts/posting_worker.py --once          # one pass, then exit
+    python3 scripts/posting_worker.py --worker-id w2  # name a second worker
+    python3 scripts/posting_worker.py --lock-file /tmp/posting_worker_1.lock
+                                                      # exit if that worker already runs
+"""
+
+import argparse
+import fcntl
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import psycopg
+
+# Add project root to path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from config.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'posting_queue'
+
+# Exit status when --lock-file is held by a running worker (EX_TEMPFAIL)
+EXIT_ALREADY_RUNNING = 75
+
+# How far ahead 'ready' items are given their staggered publishing time
+STAGGER_WINDOW_MINUTES = 30
+
+SCHEMA_SQL = [
+    """
+    ALTER TABLE posting_queue
+    ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS lease_owner VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_posting_queue_due
+    ON posting_queue (scheduled_timestamp)
+    WHERE status IN ('ready', 'pending', 'publishing')
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_posting_queue() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('posting_queue', NEW.id::text);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'posting_queue_notify') THEN
+            CREATE TRIGGER posting_queue_notify
+            AFTER INSERT OR UPDATE OF status, scheduled_timestamp, next_attempt_at ON posting_queue
+            FOR EACH ROW WHEN (NEW.status IN ('ready', 'pending'))
+            EXECUTE FUNCTION notify_posting_queue();
+        END IF;
+    END;
+    $$
+    """,
+]
+
+
+class PostingWorker:
+    def __init__(self, worker_id: str = None, batch_size: int = 10, lease_seconds: int = 300,
+                 heartbeat_seconds: int = 30, max_attempts: int = 5, backoff_seconds: int = 60,
+                 max_idle_seconds: int = 60, stagger: bool = True):
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self.stagger = stagger
+        self.running = True
+        self._listen_conn = None
+        self._notified = threading.Event()
+        self._scheduler = None
+
+    # ------------------------------------------------------------------
+    # Setup
+    # ------------------------------------------------------------------
+
+    def ensure_schema(self):
+        """Lease/retry columns and the NOTIFY trigger (idempotent)"""
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            for sql in SCHEMA_SQL:
+                cursor.execute(sql)
+            conn.commit()
+
+    def listen(self):
+        """Open the dedicated autocommit connection that receives notifications"""
+        self._listen_conn = psycopg.connect(db_manager.config.DATABASE_URL, autocommit=True)
+        self._listen_conn.add_notify_handler(lambda notify: self._notified.set())
+        self._listen_conn.execute(f'LISTEN {NOTIFY_CHANNEL}')
+
+    def stop(self, *args):
+        logger.info(f"Worker {self.worker_id} stopping")
+        self.running = False
+
+    # ------------------------------------------------------------------
+    # Stage 1: give ready items their staggered publishing time
+    # ------------------------------------------------------------------
+
+    def stagger_ready_posts(self) -> int:
+        if self._scheduler is None:
+            from automated_posting import AutomatedPostingSystem
+            self._scheduler = AutomatedPostingSystem()
+
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, platform, content_type, scheduled_timestamp
+                FROM posting_queue
+                WHERE status = 'ready'
+                AND scheduled_timestamp IS NOT NULL
+                AND scheduled_timestamp <= LOCALTIMESTAMP + make_interval(mins => %s)
+                ORDER BY scheduled_timestamp
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (STAGGER_WINDOW_MINUTES, self.batch_size))
+            posts = cursor.fetchall()
+            if not posts:
+                return 0
+
+            cursor.executemany("""
+                UPDATE posting_queue
+                SET scheduled_timestamp = %s, status = 'pending', updated_at = NOW()
+                WHERE id = %s
+            """, [(self._scheduler.get_staggered_time(post), post['id']) for post in posts])
+            conn.commit()
+
+        logger.info(f"Staggered {len(posts)} ready posts")
+        return len(posts)
+
+    # ------------------------------------------------------------------
+    # Stage 2: publish due items under a lease
+    # ------------------------------------------------------------------
+
+    def claim_due_posts(self) -> List[Dict]:
+        """Lease a batch of due pending items (or items whose lease expired)"""
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE posting_queue pq
+                SET status = 'publishing',
+                    lease_owner = %(worker)s,
+                    lease_expires_at = LOCALTIMESTAMP + make_interval(secs => %(lease)s),
+                    updated_at = NOW()
+                FROM (
+                    SELECT id FROM posting_queue
+                    WHERE (status = 'pending'
+                           AND scheduled_timestamp <= LOCALTIMESTAMP
+                           AND (next_attempt_at IS NULL OR next_attempt_at <= LOCALTIMESTAMP))
+                       OR (status = 'publishing'
+                           AND lease_expires_at IS NOT NULL AND lease_expires_at < LOCALTIMESTAMP)
+                    ORDER BY scheduled_timestamp
+                    LIMIT %(limit)s
+                    FOR UPDATE SKIP LOCKED
+                ) due
+                WHERE pq.id = due.id
+                RETURNING pq.id, pq.platform, COALESCE(pq.attempts, 0) AS attempts
+            """, {'worker': self.worker_id, 'lease': self.lease_seconds, 'limit': self.batch_size})
+            posts = cursor.fetchall()
+            conn.commit()
+        return posts
+
+    def heartbeat(self):
+        """Extend the lease on everything this worker is publishing"""
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE posting_queue
+                SET lease_expires_at = LOCALTIMESTAMP + make_interval(secs => %s), updated_at = NOW()
+                WHERE lease_owner = %s AND status = 'publishing'
+            """, (self.lease_seconds, self.worker_id))
+            conn.commit()
+
+    def _heartbeat_loop(self, done: threading.Event):
+        while not done.wait(self.heartbeat_seconds):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"Heartbeat failed for worker {self.worker_id}: {e}")
+
+    def publish(self, posts: List[Dict]) -> Dict[int, Dict]:
+        from blueprints.launchpad import publish_claimed_facebook_items
+
+        results = {}
+        facebook = {post['id']: 'pending' for post in posts if (post['platform'] or '').lower() == 'facebook'}
+        for post in posts:
+            if post['id'] not in facebook:
+                results[post['id']] = {'success': False, 'permanent': True,
+                                       'message': f"Unsupported platform: {post['platform']}"}
+
+        if facebook:
+            done = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat_loop, args=(done,), daemon=True)
+            heartbeat.start()
+            try:
+                results.update(publish_claimed_facebook_items(facebook))
+            finally:
+                done.set()
+                heartbeat.join()
+        return results
+
+    def record_results(self, posts: List[Dict], results: Dict[int, Dict]) -> Dict[str, int]:
+        """Release leases: published, back to pending with backoff, or dead-lettered"""
+        stats = {'published': 0, 'retrying': 0, 'dead_letter': 0}
+        rows = []
+        for post in posts:
+            result = results.get(post['id'], {'success': False, 'message': 'No result'})
+            attempts = post['attempts'] + 1
+            if result['success']:
+                status, next_attempt, error = 'published', None, None
+            elif result.get('permanent') or attempts >= self.max_attempts:
+                status, next_attempt, error = 'dead_letter', None, result['message']
+            else:
+                delay = self.backoff_seconds * (2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                status, next_attempt, error = 'pending', datetime.now() + timedelta(seconds=delay), result['message']
+            stats['retrying' if status == 'pending' else status] += 1
+            rows.append((status, attempts, next_attempt, error, post['id'], self.worker_id))
+
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                UPDATE posting_queue
+                SET status = %s, attempts = %s, next_attempt_at = %s,
+                    error_message = COALESCE(%s, error_message),
+                    lease_owner = NULL, lease_expires_at = NULL, updated_at = NOW()
+                WHERE id = %s AND lease_owner = %s
+            """, rows)
+            conn.commit()
+
+        for post in posts:
+            result = results.get(post['id'], {})
+            if not result.get('success'):
+                logger.warning(f"Post {post['id']} failed (attempt {post['attempts'] + 1}): {result.get('message')}")
+        return stats
+
+    # ------------------------------------------------------------------
+    # Main loop
+    # ------------------------------------------------------------------
+
+    def run_once(self) -> int:
+        """Stagger and publish until nothing is due; returns items handled"""
+        handled = 0
+        while self.running:
+            staggered = self.stagger_ready_posts() if self.stagger else 0
+            posts = self.claim_due_posts()
+            if posts:
+                stats = self.record_results(posts, self.publish(posts))
+                logger.info(f"Worker {self.worker_id} handled {len(posts)} posts: {stats}")
+            handled += staggered + len(posts)
+            if not staggered and not posts:
+                return handled
+        return handled
+
+    def seconds_until_next_due(self) -> float:
+        with db_manager.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT EXTRACT(EPOCH FROM MIN(due_at) - LOCALTIMESTAMP) AS seconds
+                FROM (
+                    SELECT GREATEST(scheduled_timestamp, COALESCE(next_attempt_at, scheduled_timestamp)) AS due_at
+                    FROM posting_queue
+                    WHERE status = 'pending' AND scheduled_timestamp IS NOT NULL
+                    UNION ALL
+                    SELECT scheduled_timestamp - make_interval(mins => %s)
+                    FROM posting_queue
+                    WHERE status = 'ready' AND scheduled_timestamp IS NOT NULL AND %s
+                    UNION ALL
+                    SELECT lease_expires_at
+                    FROM posting_queue
+                    WHERE status = 'publishing' AND lease_expires_at IS NOT NULL
+                ) due
+            """, (STAGGER_WINDOW_MINUTES, self.stagger))
+            row = cursor.fetchone()
+        if row['seconds'] is None:
+            return self.max_idle_seconds
+        return max(0.0, min(float(row['seconds']), self.max_idle_seconds))
+
+    def wait(self, timeout: float):
+        """Sleep until a NOTIFY arrives or the timeout passes"""
+        if timeout <= 0:
+            return
+        if self._listen_conn is None:
+            time.sleep(timeout)
+            return
+        if not self._notified.is_set():
+            select.select([self._listen_conn.fileno()], [], [], timeout)
+        # Running any statement delivers pending notifications to the handler
+        self._listen_conn.execute('SELECT 1')
+        self._notified.clear()
+
+    def run_forever(self):
+        logger.info(f"Posting worker {self.worker_id} started")
+        self.listen()
+        while self.running:
+            try:
+                self.run_once()
+                self.wait(self.seconds_until_next_due())
+            except Exception as e:
+                logger.error(f"Posting worker {self.worker_id} error: {e}")
+                time.sleep(5)
+                try:
+                    if self._listen_conn is None or self._listen_conn.closed:
+                        self.listen()
+                except Exception as listen_error:
+                    logger.error(f"Could not re-open LISTEN connection: {listen_error}")
+        if self._listen_conn is not None:
+            self._listen_conn.close()
+        logger.info(f"Posting worker {self.worker_id} stopped")
+
+
+def acquire_lock_file(path: str):
+    """Exclusive lock on ``path`` for the life of the process, or None if
+    another worker holds it (cron relaunches use this instead of flock(1),
+    which macOS does not ship)"""
+    lock_file = open(path, 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-running posting_queue worker')
+    parser.add_argument('--worker-id', help='unique name for this worker (default host:pid)')
+    parser.add_argument('--batch-size', type=int, default=int(os.getenv('POSTING_WORKER_BATCH_SIZE', 10)))
+    parser.add_argument('--lease-seconds', type=int, default=int(os.getenv('POSTING_WORKER_LEASE_SECONDS', 300)))
+    parser.add_argument('--max-attempts', type=int, default=int(os.getenv('POSTING_WORKER_MAX_ATTEMPTS', 5)))
+    parser.add_argument('--backoff-seconds', type=int, default=int(os.getenv('POSTING_WORKER_BACKOFF_SECONDS', 60)))
+    parser.add_argument('--no-stagger', action='store_true', help='publish ready items at their exact time')
+    parser.add_argument('--once', action='store_true', help='process everything due, then exit')
+    parser.add_argument('--lock-file', help='exit at once if another worker holds this lock file')
+    args = parser.parse_args()
+
+    # Checked before logging is set up, so the every-minute cron relaunch stays silent
+    lock = acquire_lock_file(args.lock_file) if args.lock_file else None
+    if args.lock_file and lock is None:
+        sys.exit(EXIT_ALREADY_RUNNING)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(PROJECT_ROOT, 'logs', 'posting_worker.log')),
+            logging.StreamHandler()
+        ]
+    )
+
+    worker = PostingWorker(
+        worker_id=args.worker_id,
+        batch_size=args.batch_size,
+        lease_seconds=args.lease_seconds,
+        max_attempts=args.max_attempts,
+        backoff_seconds=args.backoff_seconds,
+        stagger=not args.no_stagger
+    )
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+
+    worker.ensure_schema()
+    if args.once:
+        handled = worker.run_once()
+        logger.info(f"Posting worker pass complete: {handled} items")
+        return
+    worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
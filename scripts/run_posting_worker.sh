@@ -0,0 +1,27 @@
+#!/bin/bash
+# Posting Worker Script
+# Starts a long-running posting worker; cron re-launches it every minute and
+# the worker's own lock file makes extra launches exit straight away
+
+# Set working directory
+cd /Users/autojenny/Documents/projects/blog
+
+# Set environment variables
+export PYTHONPATH="/Users/autojenny/Documents/projects/blog:$PYTHONPATH"
+export DB_HOST="localhost"
+export DB_NAME="blog"
+export DB_USER="autojenny"
+
+# Run the worker (optionally named, e.g. run_posting_worker.sh worker-2)
+NAME="${1:-default}"
+if [ -n "$1" ]; then
+    python3 scripts/posting_worker.py --worker-id "$(hostname):$1" --lock-file "/tmp/posting_worker_$NAME.lock"
+else
+    python3 scripts/posting_worker.py --lock-file "/tmp/posting_worker_$NAME.lock"
+fi
+CODE=$?
+
+# Log the exit code (75: this worker is already running)
+if [ "$CODE" -ne 75 ]; then
+    echo "$(date): Posting worker $NAME exited with code $CODE" >> logs/posting_worker_cron.log
+fi
@@ -1,20 +1,30 @@
 #!/bin/bash
-# Setup script for automated posting cron job
+# Setup script for the posting worker cron jobs
+# Each entry tries every minute to start a worker; the worker's own lock file
+# (posting_worker.py --lock-file, no flock(1) needed on macOS) keeps exactly
+# one process per worker alive, so cron only matters after a crash or reboot.
 
-echo "Setting up automated posting cron job..."
+echo "Setting up posting worker cron jobs..."
 
-# Create the cron job entry
-CRON_JOB="*/30 * * * * /Users/autojenny/Documents/projects/blog/scripts/run_automated_posting.sh"
+BLOG_DIR="/Users/autojenny/Documents/projects/blog"
+WORKERS="${POSTING_WORKERS:-1}"
 
-# Add to crontab
-(crontab -l 2>/dev/null; echo "$CRON_JOB") | crontab -
+# Drop the old 30-minute polling job and any previous worker entries
+CRONTAB=$(crontab -l 2>/dev/null | grep -v "run_automated_posting.sh" | grep -v "run_posting_worker.sh")
 
-echo "Cron job added: $CRON_JOB"
-echo "This will run every 30 minutes to check for due posts"
+for i in $(seq 1 "$WORKERS"); do
+    CRON_JOB="* * * * * $BLOG_DIR/scripts/run_posting_worker.sh worker-$i"
+    CRONTAB="$CRONTAB"$'\n'"$CRON_JOB"
+    echo "Cron job added: $CRON_JOB"
+done
+
+echo "$CRONTAB" | sed '/^$/d' | crontab -
+
+echo "$WORKERS posting worker(s) will be kept running (set POSTING_WORKERS to change)"
 echo ""
 echo "To view current crontab: crontab -l"
-echo "To remove this cron job: crontab -e (then delete the line)"
+echo "To remove these cron jobs: crontab -e (then delete the lines)"
 echo ""
 echo "Logs will be written to:"
-echo "  - /Users/autojenny/Documents/projects/blog/logs/automated_posting.log"
-echo "  - /Users/autojenny/Documents/projects/blog/logs/automated_posting_cron.log"
+echo "  - $BLOG_DIR/logs/posting_worker.log"
+echo "  - $BLOG_DIR/logs/posting_worker_cron.log"
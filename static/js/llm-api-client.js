@@ -125,6 +125,110 @@ class LLMAPIClient {
         }
     }
 
+    /**
+     * Generate content as a server-sent event stream
+     * @param {string} streamEndpoint - SSE endpoint (token / done / error events)
+     * @param {Object} requestData - Request data
+     * @param {Function} onToken - Called with each chunk of text as it arrives
+     * @returns {Promise<Object>} Same shape as generateContent, once the stream ends
+     */
+    async streamContent(streamEndpoint, requestData, onToken) {
+        try {
+            this.displayLLMMessage(requestData);
+
+            const response = await fetch(streamEndpoint, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream'
+                },
+                body: JSON.stringify(requestData)
+            });
+
+            if (!response.ok || !response.body) {
+                const data = await response.json().catch(() => ({}));
+                return {
+                    success: false,
+                    error: data.error || 'Generation failed'
+                };
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let data = null;
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const event = this.parseStreamEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+
+                    if (event.name === 'token') {
+                        onToken(event.data.text);
+                    } else if (event.name === 'error') {
+                        return {
+                            success: false,
+                            error: event.data.error || 'Generation failed'
+                        };
+                    } else if (event.name === 'done') {
+                        data = event.data;
+                    }
+                }
+            }
+
+            if (!data) {
+                return {
+                    success: false,
+                    error: 'Generation stream ended unexpectedly'
+                };
+            }
+
+            if (data.llm_message) {
+                this.displayLLMMessageFromResponse(data.llm_message);
+            }
+
+            return {
+                success: true,
+                results: data.results || data,
+                draft_content: data.draft_content,
+                error: null
+            };
+        } catch (error) {
+            console.error('Error streaming content:', error);
+            return {
+                success: false,
+                error: 'Generation failed'
+            };
+        }
+    }
+
+    /**
+     * Parse one server-sent event block
+     * @param {string} block - "event: name" and "data: json" lines
+     * @returns {Object} {name, data}
+     */
+    parseStreamEvent(block) {
+        let name = 'message';
+        const dataLines = [];
+        block.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                name = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                dataLines.push(line.slice(5).trim());
+            }
+        });
+        return {
+            name: name,
+            data: dataLines.length ? JSON.parse(dataLines.join('\n')) : {}
+        };
+    }
+
     /**
      * Display the actual message being sent to LLM for debugging
      * @param {Object} requestData - The request data being sent
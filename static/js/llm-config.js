@@ -44,7 +44,8 @@ const LLM_CONFIGS = {
         generateEndpoint: '/authoring/api/posts/{id}/sections/{section_id}/generate',
         resultsField: 'draft_content',
         resultsTitle: 'Generated Draft',
-        allowEdit: true
+        allowEdit: true,
+        stream: true // Endpoint also serves {generateEndpoint}/stream (server-sent events)
     },
     'section_structure': { // New config for section structure design
         promptEndpoint: '/planning/api/llm/prompts/section-structure',
@@ -16,6 +16,7 @@ class LLMModule {
         this.currentPrompt = null;
         this.isEditing = false;
         this.postId = null;
+        this.hasGenerated = false;
         this.uiManager = new LLMUIManager();
         this.apiClient = new LLMAPIClient();
         this.eventManager = new LLMEventManager();
@@ -83,12 +84,26 @@ class LLMModule {
         resultsDisplay.innerHTML = '<div class="loading">Generating content...</div>';
         
         const requestData = {
-            post_id: this.postId
+            post_id: this.postId,
+            // Generating again asks for a fresh response instead of the cached one
+            regenerate: this.hasGenerated
         };
         
-        const result = await this.apiClient.generateContent(this.config.generateEndpoint, requestData);
+        let result;
+        if (this.config.stream) {
+            // Show tokens as they arrive instead of waiting for the whole completion
+            let streamed = '';
+            result = await this.apiClient.streamContent(`${this.config.generateEndpoint}/stream`, requestData, text => {
+                streamed += text;
+                resultsDisplay.textContent = streamed;
+            });
+        } else {
+            result = await this.apiClient.generateContent(this.config.generateEndpoint, requestData);
+        }
         
         if (result.success) {
+            this.hasGenerated = true;
+            
             // Display raw LLM response
             this.displayRawResponse(result.raw_response || result.content || 'No raw response available');
             
@@ -0,0 +1,23 @@
+"""Shared fixtures for the project-level test suite."""
+
+import os
+import sys
+
+import psycopg
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'blog-images'))
+
+
+@pytest.fixture(scope='session')
+def database_url():
+    """URL of the development database; tests that need it are skipped when it is down"""
+    from config.unified_config import get_config
+    url = get_config().DATABASE_URL
+    try:
+        psycopg.connect(url, connect_timeout=2).close()
+    except psycopg.OperationalError as e:
+        pytest.skip(f"PostgreSQL not available: {e}")
+    return url
@@ -0,0 +1,71 @@
+"""Tests for the pooled DatabaseManager and its request-bound scopes."""
+
+import pytest
+from flask import Flask
+
+from config.database import DatabaseManager
+
+
+@pytest.fixture
+def manager(database_url):
+    manager = DatabaseManager()
+    yield manager
+    manager.close_connection()
+
+
+@pytest.fixture
+def app(manager):
+    app = Flask(__name__)
+    manager.init_app(app)
+    return app
+
+
+def backend_pid(cursor):
+    cursor.execute("SELECT pg_backend_pid() AS pid")
+    return cursor.fetchone()['pid']
+
+
+def test_request_scopes_reuse_one_connection(app, manager):
+    """Consecutive scopes in one app context share a single checkout."""
+    with app.app_context():
+        with manager.get_cursor() as cursor:
+            first = backend_pid(cursor)
+        with manager.get_connection() as conn:
+            second = backend_pid(conn.cursor())
+        with manager.transaction() as conn:
+            third = backend_pid(conn.cursor())
+        assert first == second == third
+        assert manager.get_pool_stats()['checkouts'] == 1
+    assert manager.get_pool_stats()['in_use'] == 0
+
+
+def test_nested_scope_gets_its_own_connection(app, manager):
+    """A scope opened inside another never shares (or commits) its transaction."""
+    with app.app_context():
+        with manager.get_cursor() as outer:
+            outer_pid = backend_pid(outer)
+            with manager.get_connection() as conn:
+                inner_pid = backend_pid(conn.cursor())
+                assert manager.get_pool_stats()['in_use'] == 2
+            assert inner_pid != outer_pid
+    assert manager.get_pool_stats()['in_use'] == 0
+
+
+def test_scopes_outside_app_context_return_their_connection(manager):
+    with manager.get_cursor() as cursor:
+        backend_pid(cursor)
+    with manager.get_connection() as conn:
+        backend_pid(conn.cursor())
+    stats = manager.get_pool_stats()
+    assert stats['checkouts'] == 2
+    assert stats['in_use'] == 0
+
+
+def test_cursor_close_rolls_back_open_transaction(app, manager):
+    """Work left uncommitted in one scope is not seen by the next one on the same connection."""
+    with app.app_context():
+        with manager.get_cursor() as cursor:
+            cursor.execute("CREATE TEMP TABLE pool_scope_probe (id INTEGER)")
+        with manager.get_cursor() as cursor:
+            cursor.execute("SELECT to_regclass('pool_scope_probe') AS name")
+            assert cursor.fetchone()['name'] is None
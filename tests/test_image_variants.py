@@ -0,0 +1,73 @@
+"""Tests for the size-bounded VariantCache in blog-images."""
+
+import os
+import random
+
+import pytest
+from PIL import Image
+
+from image_variants import VariantCache, VariantSpec
+
+
+@pytest.fixture
+def source(tmp_path):
+    """A noisy image, so every encoded variant has a real size"""
+    rng = random.Random(0)
+    img = Image.new('RGB', (400, 300))
+    img.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(400 * 300)])
+    path = tmp_path / 'source.png'
+    img.save(path)
+    return str(path)
+
+
+def make_cache(tmp_path, max_bytes):
+    return VariantCache(cache_dir=str(tmp_path / 'variants'), max_bytes=max_bytes, workers=2)
+
+
+def cached_bytes(cache):
+    return sum(entry['size'] for entry in cache._entries())
+
+
+def get(cache, source, width, age=0):
+    """Encode one variant; ``age`` seconds back-dates its last use"""
+    relative = cache.get(source, 'v1', VariantSpec(width=width, fmt='jpeg'))
+    path = os.path.join(cache.cache_dir, relative)
+    if age:
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns - age * 10 ** 9, stat.st_mtime_ns))
+    return path
+
+
+def test_variants_within_budget_are_kept(tmp_path, source):
+    cache = make_cache(tmp_path, 10 * 1024 * 1024)
+    paths = [get(cache, source, width) for width in (100, 200, 300)]
+    assert all(os.path.exists(path) for path in paths)
+    assert cache.get(source, 'v1', VariantSpec(width=100, fmt='jpeg')) == os.path.relpath(paths[0], cache.cache_dir)
+
+
+def test_least_recently_used_variants_are_evicted(tmp_path, source):
+    probe = make_cache(tmp_path / 'probe', 10 * 1024 * 1024)
+    sizes = {width: os.path.getsize(get(probe, source, width)) for width in (150, 160, 170, 180)}
+
+    # Room for about three of the four variants
+    cache = make_cache(tmp_path, sum(sizes.values()) - min(sizes.values()) // 2)
+    oldest = get(cache, source, 150, age=300)
+    older = get(cache, source, 160, age=200)
+    old = get(cache, source, 170, age=100)
+    newest = get(cache, source, 180)
+
+    assert not os.path.exists(oldest)
+    assert os.path.exists(newest)
+    assert cached_bytes(cache) <= cache.max_bytes * 0.9
+    # Eviction goes oldest first
+    remaining = [os.path.exists(path) for path in (older, old)]
+    assert remaining in ([True, True], [False, True], [False, False])
+
+
+def test_new_variant_larger_than_budget_is_still_served(tmp_path, source):
+    cache = make_cache(tmp_path, 100)
+    for width in (100, 200, 300):
+        path = get(cache, source, width)
+        assert os.path.exists(path)
+        # Everything older than the variant just served has been evicted
+        assert [entry['path'] for entry in cache._entries()] == [path]
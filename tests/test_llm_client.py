@@ -0,0 +1,226 @@
+"""Tests for LLMClient request coalescing and the ResponseCache."""
+
+import threading
+import time
+
+import psycopg
+import pytest
+from psycopg.rows import dict_row
+
+from llm_client import LLMClient, LLMError, ResponseCache
+from llm_client.cache import request_key
+from llm_client.providers import Provider
+
+
+class FakeProvider(Provider):
+    """Counts upstream calls; each one blocks until ``release`` is set"""
+
+    name = 'ollama'
+
+    def __init__(self, fail=False):
+        super().__init__('http://fake-ollama')
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = fail
+
+    def stream(self, model, messages=None, prompt=None, temperature=None, max_tokens=None,
+               timeout=60, api_key=None):
+        self.calls.append(prompt)
+        self.release.wait(5)
+        if self.fail:
+            raise LLMError('model not loaded')
+        yield 'Reply '
+        yield f'{len(self.calls)}'
+
+    def list_models(self, timeout=5):
+        return ['mistral:latest']
+
+
+class FakeCache:
+    """In-memory stand-in for ResponseCache"""
+
+    def __init__(self):
+        self.entries = {}
+        self.bypassed = 0
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, provider, model, response, ttl=None):
+        self.entries[key] = response
+
+    def bypass(self):
+        self.bypassed += 1
+
+
+@pytest.fixture
+def provider():
+    return FakeProvider()
+
+
+@pytest.fixture
+def cache():
+    return FakeCache()
+
+
+@pytest.fixture
+def client(provider, cache):
+    client = LLMClient(default_model='mistral', workers=4, cache=cache)
+    client.providers['ollama'] = provider
+    return client
+
+
+def wait_for_calls(provider, count):
+    deadline = time.monotonic() + 5
+    while len(provider.calls) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(provider.calls) == count
+
+
+def wait_until_stored(cache, count):
+    # The response is stored after the flight finishes, on the worker thread
+    deadline = time.monotonic() + 5
+    while len(cache.entries) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_identical_calls_in_flight_share_one_upstream_call(client, provider):
+    provider.release.clear()
+    first = client._flight('ollama', None, prompt='Describe a kilt')
+    wait_for_calls(provider, 1)
+    second = client._flight('ollama', None, prompt='Describe a kilt')
+    streamed = client.stream_generate('Describe a kilt')
+    provider.release.set()
+
+    assert second is first
+    assert first.text() == second.text() == ''.join(streamed) == 'Reply 1'
+    assert len(provider.calls) == 1
+
+
+def test_different_calls_are_not_coalesced(client, provider):
+    assert client.generate('Describe a kilt') == 'Reply 1'
+    assert client.generate('Describe a sporran') == 'Reply 2'
+    assert client.generate('Describe a kilt', temperature=0.8) == 'Reply 3'
+
+
+def test_bypass_cache_does_not_join_a_call_in_flight(client, provider, cache):
+    provider.release.clear()
+    first = client._flight('ollama', None, prompt='Describe a kilt')
+    wait_for_calls(provider, 1)
+    fresh = client._flight('ollama', None, prompt='Describe a kilt', bypass_cache=True)
+    joiner = client._flight('ollama', None, prompt='Describe a kilt')
+    provider.release.set()
+
+    assert fresh is not first
+    assert joiner is fresh
+    for flight in (first, fresh):
+        flight.text()
+    assert len(provider.calls) == 2
+
+
+def test_errors_reach_every_joined_caller(cache):
+    provider = FakeProvider(fail=True)
+    provider.release.clear()
+    client = LLMClient(default_model='mistral', cache=cache)
+    client.providers['ollama'] = provider
+    flights = [client._flight('ollama', None, prompt='Describe a kilt') for _ in range(3)]
+    provider.release.set()
+
+    for flight in flights:
+        with pytest.raises(LLMError, match='model not loaded'):
+            flight.text()
+    assert len(provider.calls) == 1
+    assert cache.entries == {}
+
+
+def test_temperature_zero_responses_are_cached(client, provider, cache):
+    assert client.generate('Describe a kilt', temperature=0) == 'Reply 1'
+    wait_until_stored(cache, 1)
+    assert client.generate('Describe a kilt', temperature=0) == 'Reply 1'
+    assert len(provider.calls) == 1
+
+
+def test_sampled_responses_are_not_cached(client, provider, cache):
+    assert client.generate('Describe a kilt', temperature=0.8) == 'Reply 1'
+    assert client.generate('Describe a kilt') == 'Reply 2'
+    assert cache.entries == {}
+
+
+def test_cache_flag_overrides_the_temperature_rule(client, provider, cache):
+    client.generate('Describe a kilt', temperature=0.8, cache=True)
+    wait_until_stored(cache, 1)
+    assert client.generate('Describe a kilt', temperature=0.8, cache=True) == 'Reply 1'
+
+    client.generate('Describe a sporran', temperature=0, cache=False)
+    client.generate('Describe a sporran', temperature=0, cache=False)
+    assert len(provider.calls) == 3
+    assert len(cache.entries) == 1
+
+
+def test_bypass_cache_skips_the_lookup_but_stores_the_reply(client, provider, cache):
+    client.generate('Describe a kilt', temperature=0)
+    wait_until_stored(cache, 1)
+    assert client.generate('Describe a kilt', temperature=0, bypass_cache=True) == 'Reply 2'
+    assert cache.bypassed == 1
+    deadline = time.monotonic() + 5
+    while cache.entries[request_key('ollama', 'mistral', None, 'Describe a kilt', 0, None)] != 'Reply 2':
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert client.generate('Describe a kilt', temperature=0) == 'Reply 2'
+
+
+# ----------------------------------------------------------------------
+# ResponseCache (PostgreSQL)
+# ----------------------------------------------------------------------
+
+SCHEMA = 'pytest_llm_cache'
+
+
+@pytest.fixture
+def response_cache(database_url, monkeypatch):
+    """ResponseCache whose table lives in a throwaway schema"""
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.execute(f"CREATE SCHEMA {SCHEMA}")
+
+    def connection(self):
+        return psycopg.connect(database_url, row_factory=dict_row, options=f'-c search_path={SCHEMA}')
+
+    monkeypatch.setattr(ResponseCache, '_connection', connection)
+    yield ResponseCache(ttl=60, max_bytes=100, evict_interval=3600)
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+
+
+def test_response_cache_round_trip(response_cache):
+    response_cache.put('a' * 64, 'ollama', 'mistral', 'Cached reply')
+    assert response_cache.get('a' * 64) == 'Cached reply'
+    assert response_cache.get('b' * 64) is None
+    stats = response_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stores']) == (1, 1, 1)
+    assert stats['entries'] == 1
+
+
+def test_response_cache_ignores_expired_entries(response_cache):
+    response_cache.put('a' * 64, 'ollama', 'mistral', 'Short-lived reply', ttl=1)
+    time.sleep(1.1)
+    assert response_cache.get('a' * 64) is None
+
+
+def test_response_cache_evicts_only_when_the_estimate_passes_the_limit(response_cache, monkeypatch):
+    scans = []
+    evict = ResponseCache._evict
+    monkeypatch.setattr(ResponseCache, '_evict', lambda self, cursor: scans.append(1) or evict(self, cursor))
+
+    # The first store sweeps once (nothing has been evicted yet), then 30-byte
+    # replies fit three to the 100-byte budget before a scan is needed
+    for n in range(4):
+        response_cache.put(f'{n}' * 64, 'ollama', 'mistral', 'x' * 30)
+    assert len(scans) == 2
+
+    stats = response_cache.stats()
+    assert stats['bytes'] <= response_cache.max_bytes
+    assert stats['approx_bytes'] == stats['bytes']
+    assert response_cache.get('0' * 64) is None
+    assert response_cache.get('3' * 64) == 'x' * 30
@@ -0,0 +1,98 @@
+"""Tests for PublishLedger claims and final statuses on posting_queue."""
+
+import pytest
+
+from blueprints.facebook_publisher import STALE_CLAIM_MINUTES, PublishLedger
+from config.database import db_manager
+
+SCHEDULE_NAME = 'pytest-publish-ledger'
+
+
+@pytest.fixture
+def ledger(database_url):
+    return PublishLedger()
+
+
+@pytest.fixture
+def make_items(database_url):
+    """Insert posting_queue rows with the given statuses; all are deleted afterwards"""
+    def make(*statuses, age_minutes=0):
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO posting_queue (content_type, generated_content, status, platform, schedule_name, updated_at)
+                SELECT 'product', 'Ledger test post', status, 'facebook', %s,
+                       NOW() - make_interval(mins => %s)
+                FROM unnest(%s::text[]) WITH ORDINALITY AS s(status, n)
+                ORDER BY n
+                RETURNING id, status
+            """, (SCHEDULE_NAME, age_minutes, list(statuses)))
+            rows = cursor.fetchall()
+        return {row['status']: row['id'] for row in rows}
+
+    yield make
+    with db_manager.get_connection() as conn:
+        conn.cursor().execute("DELETE FROM posting_queue WHERE schedule_name = %s", (SCHEDULE_NAME,))
+
+
+def status_of(queue_id):
+    with db_manager.get_cursor() as cursor:
+        cursor.execute("SELECT status, platform_post_id, error_message FROM posting_queue WHERE id = %s",
+                       (queue_id,))
+        return cursor.fetchone()
+
+
+def test_claim_takes_only_publishable_items(ledger, make_items):
+    items = make_items('ready', 'pending', 'failed', 'partial', 'published', 'dead_letter', 'publishing')
+
+    claimed = ledger.claim(list(items.values()))
+
+    assert set(claimed.values()) == {'ready', 'pending', 'failed', 'partial'}
+    assert claimed == {items[status]: status for status in ('ready', 'pending', 'failed', 'partial')}
+    for status in ('ready', 'pending', 'failed', 'partial'):
+        assert status_of(items[status])['status'] == 'publishing'
+    assert status_of(items['published'])['status'] == 'published'
+    assert status_of(items['dead_letter'])['status'] == 'dead_letter'
+
+
+def test_claimed_items_are_not_claimed_twice(ledger, make_items):
+    items = make_items('ready')
+    assert ledger.claim(list(items.values())) == {items['ready']: 'ready'}
+    assert ledger.claim(list(items.values())) == {}
+
+
+def test_stale_claims_are_taken_over(ledger, make_items):
+    items = make_items('publishing', age_minutes=STALE_CLAIM_MINUTES + 1)
+    assert ledger.claim(list(items.values())) == {items['publishing']: 'publishing'}
+
+
+def test_release_restores_previous_status(ledger, make_items):
+    items = make_items('ready', 'failed')
+    ledger.release(ledger.claim(list(items.values())))
+    assert status_of(items['ready'])['status'] == 'ready'
+    assert status_of(items['failed'])['status'] == 'failed'
+
+
+def test_posted_pages_are_recorded_once(ledger, make_items):
+    queue_id = make_items('ready')['ready']
+    page = {'page_id': 'page-1', 'name': 'Page One'}
+    ledger.claim([queue_id])
+    ledger.record_page_post(queue_id, page, 'post-1')
+    ledger.record_page_post(queue_id, page, 'post-2')
+    assert ledger.posted_pages([queue_id]) == {queue_id: {'page-1': 'post-1'}}
+
+
+@pytest.mark.parametrize('post_id, error, expected', [
+    ('post-1', None, 'published'),
+    ('post-1', 'Page Two: rate limited', 'partial'),
+    (None, 'Page One: token expired', 'failed'),
+])
+def test_finish_records_final_status(ledger, make_items, post_id, error, expected):
+    queue_id = make_items('ready')['ready']
+    ledger.claim([queue_id])
+    ledger.finish(queue_id, post_id, error)
+    row = status_of(queue_id)
+    assert row['status'] == expected
+    assert row['error_message'] == error
+    if post_id:
+        assert row['platform_post_id'] == post_id
@@ -16,6 +16,9 @@ def create_app(config_name=None):
     config_class = get_config(config_name)
     app.config.from_object(config_class)
     
+    # Bind pooled database connections to the app context
+    db_manager.init_app(app)
+    
     # Enable CORS for all routes
     CORS(app, origins=config_class.CORS_ORIGINS, supports_credentials=True)
     